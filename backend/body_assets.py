@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import struct
+from pathlib import Path
+
+import numpy as np
+import trimesh
+
+from result_cache import atomic_write_bytes
+
+# 人體 GLB 格式：
+#   每個人體只存量化後的頂點（KHR_mesh_quantization：位置 int16、法線 int8，節點的
+#   translation / scale 還原座標），三角形索引固定為 MHR 拓樸，存成共用的外部 buffer
+#   （topology/<hash>.bin），所有人體 GLB 以相對 URI 參照同一份，瀏覽器也只需下載一次。
+#   MHR 參數記錄在 mesh.extras，可在需要時重新生成。
+TOPOLOGY_DIRNAME = "topology"
+MHR_PARAM_KEYS = (
+    "shape_params",
+    "scale_params",
+    "body_pose_params",
+    "hand_pose_params",
+    "expr_params",
+    "global_rot",
+    "pred_cam_t",
+)
+
+GLB_MAGIC = 0x46546C67
+GLB_VERSION = 2
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# glTF componentType / target
+BYTE, SHORT, UNSIGNED_SHORT, UNSIGNED_INT = 5120, 5122, 5123, 5125
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+POSITION_RANGE = 32767
+NORMAL_RANGE = 127
+
+
+def write_topology(directory: Path, faces) -> Path:
+    """將三角形索引寫成以內容雜湊命名的共用 buffer（已存在則沿用）"""
+    indices = _index_array(faces)
+    data = indices.tobytes()
+    path = Path(directory) / f"{hashlib.sha256(data).hexdigest()[:16]}.bin"
+    if not path.exists():
+        atomic_write_bytes(path, data)
+    return path
+
+
+def _index_array(faces) -> np.ndarray:
+    faces = np.asarray(faces).reshape(-1)
+    return np.ascontiguousarray(faces, dtype="<u2" if faces.max() < 65535 else "<u4")
+
+
+def encode_body_glb(vertices, faces, topology_path: Path, glb_path: Path, params=None) -> bytes:
+    """
+    將人體頂點編碼為參照共用拓樸的 GLB
+
+    Args:
+        vertices: (V, 3) 頂點
+        faces: (F, 3) 三角形索引（需與 topology_path 的內容相同）
+        topology_path: write_topology 回傳的共用索引檔
+        glb_path: GLB 的輸出位置（用於計算拓樸檔的相對 URI）
+        params: 可選的 MHR 參數，寫入 mesh.extras
+    """
+    vertices = np.asarray(vertices, dtype=np.float32)
+    faces = np.asarray(faces)
+    indices = _index_array(faces)
+
+    # 位置：各軸以中心與半徑正規化到 [-1, 1] 後量化為 int16，節點 transform 還原
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    center = (lo + hi) / 2
+    half_extent = np.where(hi > lo, (hi - lo) / 2, 1.0).astype(np.float32)
+    q_pos = np.round((vertices - center) / half_extent * POSITION_RANGE).astype(np.int16)
+    positions = np.zeros((len(vertices), 4), dtype="<i2")  # 每個頂點補齊到 8 bytes
+    positions[:, :3] = q_pos
+
+    # 法線：在原始空間計算後轉到正規化空間（乘上 half_extent，節點縮放的反轉置會還原），量化為 int8
+    # 各軸縮放不同時，直接在正規化空間計算會改變面積權重，使頂點法線偏離原網格
+    normals_src = trimesh.Trimesh(vertices=vertices, faces=faces, process=False).vertex_normals * half_extent
+    normals_src /= np.maximum(np.linalg.norm(normals_src, axis=1, keepdims=True), 1e-12)
+    normals = np.zeros((len(vertices), 4), dtype=np.int8)
+    normals[:, :3] = np.round(np.clip(normals_src, -1, 1) * NORMAL_RANGE)
+
+    binary = positions.tobytes() + normals.tobytes()
+    topology_uri = Path(os.path.relpath(topology_path, Path(glb_path).parent)).as_posix()
+
+    gltf = {
+        "asset": {"version": "2.0", "generator": "body_assets"},
+        "extensionsUsed": ["KHR_mesh_quantization"],
+        "extensionsRequired": ["KHR_mesh_quantization"],
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{
+            "mesh": 0,
+            "translation": center.tolist(),
+            "scale": half_extent.tolist(),
+        }],
+        "meshes": [{
+            "primitives": [{
+                "attributes": {"POSITION": 0, "NORMAL": 1},
+                "indices": 2,
+                "material": 0,
+                "mode": 4,
+            }],
+            "extras": _params_extras(params),
+        }],
+        "materials": [{
+            "pbrMetallicRoughness": {
+                "baseColorFactor": [0.8, 0.8, 0.8, 1.0],
+                "metallicFactor": 0.0,
+                "roughnessFactor": 0.8,
+            },
+        }],
+        "buffers": [
+            {"byteLength": len(binary)},
+            {"byteLength": indices.nbytes, "uri": topology_uri},
+        ],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": positions.nbytes, "byteStride": 8, "target": ARRAY_BUFFER},
+            {"buffer": 0, "byteOffset": positions.nbytes, "byteLength": normals.nbytes, "byteStride": 4, "target": ARRAY_BUFFER},
+            {"buffer": 1, "byteOffset": 0, "byteLength": indices.nbytes, "target": ELEMENT_ARRAY_BUFFER},
+        ],
+        "accessors": [
+            {
+                "bufferView": 0, "componentType": SHORT, "normalized": True,
+                "count": len(vertices), "type": "VEC3",
+                "min": q_pos.min(axis=0).tolist(), "max": q_pos.max(axis=0).tolist(),
+            },
+            {"bufferView": 1, "componentType": BYTE, "normalized": True, "count": len(vertices), "type": "VEC3"},
+            {
+                "bufferView": 2,
+                "componentType": UNSIGNED_SHORT if indices.dtype.itemsize == 2 else UNSIGNED_INT,
+                "count": len(indices), "type": "SCALAR",
+            },
+        ],
+    }
+    return _pack_glb(gltf, binary)
+
+
+def _params_extras(params):
+    if not params:
+        return {}
+    return {
+        "mhr_params": {
+            key: np.asarray(params[key], dtype=np.float32).tolist()
+            for key in MHR_PARAM_KEYS
+            if params.get(key) is not None
+        }
+    }
+
+
+def _pack_glb(gltf, binary: bytes) -> bytes:
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    binary += b"\0" * (-len(binary) % 4)
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b"".join([
+        struct.pack("<III", GLB_MAGIC, GLB_VERSION, length),
+        struct.pack("<II", len(json_chunk), CHUNK_JSON), json_chunk,
+        struct.pack("<II", len(binary), CHUNK_BIN), binary,
+    ])
+
+
+def decode_body_glb(glb_path: Path):
+    """讀回 encode_body_glb 的輸出，回傳 (vertices, faces, mhr_params)"""
+    glb_path = Path(glb_path)
+    data = glb_path.read_bytes()
+    magic, _, _ = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC:
+        raise ValueError(f"Not a GLB file: {glb_path}")
+    json_len, _ = struct.unpack_from("<II", data, 12)
+    gltf = json.loads(data[20:20 + json_len])
+    bin_len, _ = struct.unpack_from("<II", data, 20 + json_len)
+    binary = data[28 + json_len:28 + json_len + bin_len]
+    topology = (glb_path.parent / gltf["buffers"][1]["uri"]).read_bytes()
+
+    pos_accessor, _, idx_accessor = gltf["accessors"]
+    count = pos_accessor["count"]
+    q_pos = np.frombuffer(binary, dtype="<i2", count=count * 4).reshape(count, 4)[:, :3]
+    node = gltf["nodes"][0]
+    vertices = (
+        q_pos.astype(np.float32) / POSITION_RANGE * np.asarray(node["scale"], dtype=np.float32)
+        + np.asarray(node["translation"], dtype=np.float32)
+    )
+    index_dtype = "<u2" if idx_accessor["componentType"] == UNSIGNED_SHORT else "<u4"
+    faces = np.frombuffer(topology, dtype=index_dtype, count=idx_accessor["count"]).reshape(-1, 3)
+    params = gltf["meshes"][0].get("extras", {}).get("mhr_params", {})
+    return vertices, faces.astype(np.int64), params
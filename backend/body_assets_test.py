@@ -0,0 +1,211 @@
+"""
+body_assets 的往返精度測試，以及與舊 OBJ 輸出的大小 / 編碼時間比較：
+
+    python body_assets_test.py outputs/bodies/*.obj
+
+未指定檔案時使用與 MHR 相同面數（36874）的合成人體尺寸網格。
+"""
+import argparse
+import json
+import statistics
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+import trimesh
+
+from body_assets import (
+    NORMAL_RANGE,
+    POSITION_RANGE,
+    TOPOLOGY_DIRNAME,
+    decode_body_glb,
+    encode_body_glb,
+    write_topology,
+)
+from conftest import best_time
+from result_cache import atomic_export
+
+MHR_PARAMS = {
+    "shape_params": np.linspace(-1, 1, 45),
+    "scale_params": np.linspace(0, 0.5, 28),
+    "body_pose_params": np.linspace(-0.3, 0.3, 133),
+    "hand_pose_params": None,
+    "global_rot": np.array([0.1, -0.2, 3.1]),
+    "pred_cam_t": np.array([0.02, 0.3, 4.8]),
+}
+
+
+def synthetic_body(seed=0, rows=179, cols=103):
+    """
+    人體尺寸的替身網格：rows × cols 的環面（面數 2 × rows × cols = 36874，與 MHR 拓樸相同），
+    拉成約 1.7 m 高、加上起伏，位置在相機座標系前方
+    """
+    u, v = np.meshgrid(np.linspace(0, 2 * np.pi, rows, endpoint=False), np.linspace(0, 2 * np.pi, cols, endpoint=False), indexing="ij")
+    radius = 0.15 + 0.05 * np.sin(3 * u) + 0.02 * np.random.default_rng(seed).random(u.shape)
+    vertices = np.stack([(0.2 + radius * np.cos(v)) * 0.8, 0.85 * np.sin(u), radius * np.sin(v)], axis=-1).reshape(-1, 3)
+    vertices += [0.02, 0.3, 4.8]
+
+    i, j = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    a, b = i * cols + j, ((i + 1) % rows) * cols + j
+    c, d = ((i + 1) % rows) * cols + (j + 1) % cols, i * cols + (j + 1) % cols
+    faces = np.concatenate([np.stack([a, b, c], -1).reshape(-1, 3), np.stack([a, c, d], -1).reshape(-1, 3)])
+    return vertices.astype(np.float32), faces
+
+
+def _encode(tmp_path, vertices, faces, name="person_body_0.glb", params=None):
+    topology_path = write_topology(tmp_path / TOPOLOGY_DIRNAME, faces)
+    glb_path = tmp_path / name
+    glb_path.write_bytes(encode_body_glb(vertices, faces, topology_path, glb_path, params=params))
+    return glb_path
+
+
+def _gltf(glb_path):
+    data = glb_path.read_bytes()
+    json_len, _ = struct.unpack_from("<II", data, 12)
+    return json.loads(data[20:20 + json_len]), data[28 + json_len:]
+
+
+def _decoded_normals(glb_path):
+    """NORMAL 屬性（正規化空間）經節點縮放的反轉置轉回世界空間"""
+    gltf, binary = _gltf(glb_path)
+    count = gltf["accessors"][1]["count"]
+    offset = gltf["bufferViews"][1]["byteOffset"]
+    normals = np.frombuffer(binary, dtype=np.int8, count=count * 4, offset=offset).reshape(count, 4)[:, :3]
+    normals = normals.astype(np.float64) / NORMAL_RANGE / gltf["nodes"][0]["scale"]
+    return normals / np.linalg.norm(normals, axis=1, keepdims=True)
+
+
+def test_round_trip_accuracy(tmp_path):
+    vertices, faces = synthetic_body()
+    glb_path = _encode(tmp_path, vertices, faces, params=MHR_PARAMS)
+    decoded_vertices, decoded_faces, params = decode_body_glb(glb_path)
+
+    # 拓樸完全相同；位置誤差不超過半個量化步長（各軸 half_extent / 32767 / 2）
+    np.testing.assert_array_equal(decoded_faces, faces)
+    half_extent = (vertices.max(axis=0) - vertices.min(axis=0)) / 2
+    error = np.abs(decoded_vertices - vertices).max(axis=0)
+    assert np.all(error <= half_extent / POSITION_RANGE / 2 + 1e-6)
+    # 人體尺寸（約 1.7 m）下為數十微米
+    assert error.max() < 3e-5
+
+    # int8 法線：與原始網格的頂點法線夾角在 2 度內（正規化空間的量化誤差經各軸縮放放大）
+    reference_normals = trimesh.Trimesh(vertices, faces, process=False).vertex_normals
+    cos = np.sum(_decoded_normals(glb_path) * reference_normals, axis=1)
+    assert np.degrees(np.arccos(np.clip(cos, -1, 1))).max() < 2.0
+
+    # MHR 參數以 float32 保存，未提供的參數不寫入
+    assert set(params) == {key for key, value in MHR_PARAMS.items() if value is not None}
+    for key, value in params.items():
+        np.testing.assert_array_equal(np.asarray(value, dtype=np.float32), np.asarray(MHR_PARAMS[key], dtype=np.float32))
+
+
+def test_bodies_share_one_topology_file(tmp_path):
+    vertices, faces = synthetic_body()
+    first = _encode(tmp_path, vertices, faces, "a_body_0.glb")
+    topology_file = next((tmp_path / TOPOLOGY_DIRNAME).iterdir())
+    mtime = topology_file.stat().st_mtime_ns
+    second = _encode(tmp_path, synthetic_body(seed=1)[0], faces, "b_body_0.glb")
+
+    # 同一份拓樸只寫一次，兩個 GLB 以相同的相對 URI 參照
+    assert list((tmp_path / TOPOLOGY_DIRNAME).iterdir()) == [topology_file]
+    assert topology_file.stat().st_mtime_ns == mtime
+    assert _gltf(first)[0]["buffers"][1]["uri"] == _gltf(second)[0]["buffers"][1]["uri"] == f"{TOPOLOGY_DIRNAME}/{topology_file.name}"
+    # GLB 本身只有各自的頂點（位置 8 bytes + 法線 4 bytes），不含索引
+    assert second.stat().st_size < len(vertices) * 12 + 2048
+    np.testing.assert_array_equal(decode_body_glb(second)[1], faces)
+
+    # 不同拓樸寫成另一個檔案
+    write_topology(tmp_path / TOPOLOGY_DIRNAME, faces[::-1])
+    assert len(list((tmp_path / TOPOLOGY_DIRNAME).iterdir())) == 2
+
+
+def test_round_trip_of_flat_and_large_meshes(tmp_path):
+    # 某軸沒有厚度（half_extent 以 1 代替）
+    flat = trimesh.creation.box().vertices.astype(np.float32)
+    flat[:, 2] = 0.5
+    faces = trimesh.creation.box().faces
+    decoded_vertices, decoded_faces, params = decode_body_glb(_encode(tmp_path, flat, faces, "flat.glb"))
+    np.testing.assert_allclose(decoded_vertices, flat, atol=1e-4)
+    assert params == {}
+
+    # 頂點數超過 uint16 時索引改用 uint32
+    grid = trimesh.creation.icosphere(subdivisions=7)
+    assert len(grid.vertices) > 65535
+    decoded_vertices, decoded_faces, _ = decode_body_glb(_encode(tmp_path, grid.vertices, grid.faces, "large.glb"))
+    np.testing.assert_array_equal(decoded_faces, grid.faces)
+    np.testing.assert_allclose(decoded_vertices, grid.vertices, atol=2e-5)
+
+
+def compare_with_obj(bodies, output_dir, repeats=3):
+    """
+    每個人體以舊格式（trimesh 匯出 OBJ）與 GLB 各輸出一次，回傳大小與編碼時間；
+    GLB 的總大小包含共用拓樸（只算一次）
+    """
+    output_dir = Path(output_dir)
+    rows = []
+    topology_path = None
+    for i, (vertices, faces) in enumerate(bodies):
+        obj_path = output_dir / f"body_{i}.obj"
+        glb_path = output_dir / f"body_{i}.glb"
+
+        def export_obj():
+            atomic_export(trimesh.Trimesh(vertices=vertices, faces=faces), obj_path)
+
+        def export_glb():
+            nonlocal topology_path
+            topology_path = write_topology(output_dir / TOPOLOGY_DIRNAME, faces)
+            glb_path.write_bytes(encode_body_glb(vertices, faces, topology_path, glb_path))
+
+        rows.append({
+            "obj_ms": best_time(export_obj, repeats=repeats)[1] * 1e3,
+            "glb_ms": best_time(export_glb, repeats=repeats)[1] * 1e3,
+            "obj_bytes": obj_path.stat().st_size,
+            "glb_bytes": glb_path.stat().st_size,
+        })
+    topology_bytes = sum(path.stat().st_size for path in (output_dir / TOPOLOGY_DIRNAME).iterdir())
+    return rows, topology_bytes
+
+
+def format_comparison(rows, topology_bytes):
+    obj_total = sum(row["obj_bytes"] for row in rows)
+    glb_total = sum(row["glb_bytes"] for row in rows) + topology_bytes
+    return "\n".join([
+        f"{len(rows)} bodies",
+        f"  OBJ : {statistics.median(row['obj_bytes'] for row in rows) / 1024:8.1f} KiB/body, "
+        f"{statistics.median(row['obj_ms'] for row in rows):7.1f} ms/body, total {obj_total / 1024:8.1f} KiB",
+        f"  GLB : {statistics.median(row['glb_bytes'] for row in rows) / 1024:8.1f} KiB/body, "
+        f"{statistics.median(row['glb_ms'] for row in rows):7.1f} ms/body, total {glb_total / 1024:8.1f} KiB "
+        f"(shared topology {topology_bytes / 1024:.1f} KiB)",
+        f"  size {obj_total / glb_total:.1f}x smaller",
+    ])
+
+
+@pytest.mark.benchmark
+def test_size_and_encode_time_against_obj(tmp_path):
+    bodies = [synthetic_body(seed) for seed in range(4)]
+    rows, topology_bytes = compare_with_obj(bodies, tmp_path)
+    print()
+    print(format_comparison(rows, topology_bytes))
+
+    for row in rows:
+        assert row["glb_bytes"] * 4 < row["obj_bytes"]
+    # 共用拓樸只存一份
+    assert topology_bytes == bodies[0][1].size * 2
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("obj", nargs="*", help="舊格式輸出的人體 OBJ")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.obj:
+        meshes = [trimesh.load(path, process=False) for path in args.obj]
+        bodies = [(np.asarray(mesh.vertices, dtype=np.float32), np.asarray(mesh.faces)) for mesh in meshes]
+    else:
+        bodies = [synthetic_body(seed) for seed in range(4)]
+    with tempfile.TemporaryDirectory() as directory:
+        print(format_comparison(*compare_with_obj(bodies, directory, args.repeats)))
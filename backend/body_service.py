@@ -5,6 +5,15 @@ import os
 import sys
 import trimesh
 from pathlib import Path
+from model_registry import (
+    GB,
+    model_registry,
+    offload_modules_to_cpu,
+    restore_modules,
+    release_device_cache,
+)
+from result_cache import atomic_export, atomic_write_bytes
+from body_assets import TOPOLOGY_DIRNAME, MHR_PARAM_KEYS, encode_body_glb, write_topology
 
 # 將 sam-3d-body 的目錄加入 Python 路徑
 CURRENT_DIR = Path(__file__).parent.absolute()
@@ -31,6 +40,11 @@ except ImportError as e:
     except ImportError as e2:
         IMPORT_ERROR_MSG = f"Original error: {e}, Secondary error: {e2}"
 
+BODY_HF_REPO_ID = "facebook/sam-3d-body-dinov3"
+
+# 輸出格式：glb（量化頂點 + 共用 MHR 拓樸，見 body_assets）或 obj（舊格式）
+BODY_EXPORT_FORMAT = os.environ.get("BODY_EXPORT_FORMAT", "glb")
+
 class BodyReconstructionService:
     _instance = None
     _initialized = False
@@ -48,36 +62,40 @@ class BodyReconstructionService:
             self.device = "cuda" if torch.cuda.is_available() else ("mps" if torch.backends.mps.is_available() else "cpu")
             self.output_dir = CURRENT_DIR / "outputs" / "bodies"
             self.output_dir.mkdir(parents=True, exist_ok=True)
+            # 由 model_registry 決定何時載入 / 淘汰，不再互相卸載對方的模型
+            model_registry.register(
+                "body",
+                loader=self._load_estimator,
+                unloader=lambda _: self._release_estimator(),
+                size_bytes=int(float(os.environ.get("BODY_MODEL_SIZE_GB", 4)) * GB),
+                priority=0,
+                offloader=lambda estimator: offload_modules_to_cpu([estimator.model]),
+                restorer=lambda estimator: restore_modules([estimator.model], self.device),
+            )
             BodyReconstructionService._initialized = True
 
-    def load_model(self, unload_other_model=True):
+    def load_model(self):
         """
-        延遲加載模型，確保只在第一次呼叫時加載
-        
-        Args:
-            unload_other_model: 如果為 True，會先卸載 Clothes 模型以釋放 VRAM
+        取得常駐的模型，必要時由 model_registry 載入（記憶體不足時會淘汰其他閒置模型）
         """
         if not AI_MODULES_AVAILABLE:
             raise RuntimeError(f"Body reconstruction AI modules are not available in current environment: {IMPORT_ERROR_MSG}")
-        
-        # 如果指定要卸載其他模型，則卸載 Clothes 模型以釋放 VRAM
-        if unload_other_model and self.estimator is None:
-            from clothes_service import clothes_service
-            if clothes_service.inference is not None:
-                print("Unloading Clothes model to free VRAM for Body model...")
-                clothes_service.unload_model()
-            
-        if self.estimator is None:
-            print(f"Loading SAM 3D Body model on {self.device}...")
-            self.estimator = setup_sam_3d_body(
-                hf_repo_id="facebook/sam-3d-body-dinov3", 
-                device=None # 會自動偵測
-            )
-            print("Model loaded successfully!")
+        return model_registry.acquire("body")
+
+    def _load_estimator(self):
+        print(f"Loading SAM 3D Body model on {self.device}...")
+        self.estimator = setup_sam_3d_body(
+            hf_repo_id=BODY_HF_REPO_ID, 
+            device=None # 會自動偵測
+        )
+        print("Model loaded successfully!")
         return self.estimator
 
     def unload_model(self):
         """卸載模型以釋放 VRAM"""
+        model_registry.unload("body")
+
+    def _release_estimator(self):
         if self.estimator is not None:
             print(f"Unloading Body model to free VRAM...")
             # 將模型移到 CPU 並刪除引用
@@ -88,10 +106,7 @@ class BodyReconstructionService:
                     del self.estimator.model
                 
                 # 清理 CUDA 快取
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-                elif torch.backends.mps.is_available():
-                    torch.mps.empty_cache()
+                release_device_cache()
                 
                 del self.estimator
                 self.estimator = None
@@ -100,60 +115,77 @@ class BodyReconstructionService:
                 print(f"Warning: Error unloading Body model: {e}")
                 self.estimator = None
 
-    def process_image(self, image_path: str, auto_unload=True):
+    def process_image(self, image_path: str, auto_unload=False):
         """
         處理單張圖片並生成 3D 模型
         
         Args:
             image_path: 圖片路徑
-            auto_unload: 處理完成後是否自動卸載模型以釋放 VRAM
+            auto_unload: 處理完成後是否強制卸載模型（預設保持常駐，由 model_registry 管理）
         
-        回傳: 生成的 .obj 檔案路徑清單
+        回傳: 生成的 .glb（或 .obj）檔案路徑清單
         """
+        if not AI_MODULES_AVAILABLE:
+            raise RuntimeError(f"Body reconstruction AI modules are not available in current environment: {IMPORT_ERROR_MSG}")
         try:
-            estimator = self.load_model()
-            
-            # 1. 讀取並轉換圖片
-            img_bgr = cv2.imread(image_path)
-            if img_bgr is None:
-                raise ValueError(f"Could not read image at {image_path}")
-            
-            img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-
-            # 2. 執行 AI 推論
-            with torch.no_grad():
-                outputs = estimator.process_one_image(img_rgb)
-
-            if not outputs:
-                return []
-
-            # 3. 匯出 3D Mesh (.obj)
-            generated_files = []
-            faces = estimator.faces
-            
-            for i, person_output in enumerate(outputs):
-                if 'pred_vertices' in person_output:
-                    vertices = person_output['pred_vertices']
-                    if isinstance(vertices, torch.Tensor):
-                        vertices = vertices.cpu().numpy()
-                    
-                    # 建立唯一的檔名 (可以使用時間戳或原始圖片名)
-                    base_name = Path(image_path).stem
-                    obj_filename = f"{base_name}_body_{i}.obj"
-                    obj_path = self.output_dir / obj_filename
-                    
-                    mesh = trimesh.Trimesh(vertices=vertices, faces=faces)
-                    mesh.export(str(obj_path))
-                    generated_files.append(str(obj_path))
-                    
-                    print(f"Generated 3D mesh: {obj_path}")
-
-            return generated_files
+            with model_registry.use("body") as estimator:
+                return self._process_image(estimator, image_path)
         finally:
-            # 處理完成後自動卸載模型以釋放 VRAM
             if auto_unload:
                 self.unload_model()
 
+    def _process_image(self, estimator, image_path: str):
+        # 1. 讀取並轉換圖片
+        img_bgr = cv2.imread(image_path)
+        if img_bgr is None:
+            raise ValueError(f"Could not read image at {image_path}")
+        
+        img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+
+        # 2. 執行 AI 推論
+        with torch.no_grad():
+            outputs = estimator.process_one_image(img_rgb)
+
+        if not outputs:
+            return []
+
+        # 3. 匯出 3D Mesh（所有人體共用 MHR 拓樸，GLB 只存各自的頂點）
+        generated_files = []
+        faces = estimator.faces
+        if isinstance(faces, torch.Tensor):
+            faces = faces.cpu().numpy()
+        if BODY_EXPORT_FORMAT == "glb":
+            topology_path = write_topology(self.output_dir / TOPOLOGY_DIRNAME, faces)
+        
+        for i, person_output in enumerate(outputs):
+            if 'pred_vertices' in person_output:
+                vertices = person_output['pred_vertices']
+                if isinstance(vertices, torch.Tensor):
+                    vertices = vertices.cpu().numpy()
+                
+                # 建立唯一的檔名 (可以使用時間戳或原始圖片名)
+                base_name = Path(image_path).stem
+                mesh_path = self.output_dir / f"{base_name}_body_{i}.{BODY_EXPORT_FORMAT}"
+                
+                if BODY_EXPORT_FORMAT == "glb":
+                    params = {key: person_output.get(key) for key in MHR_PARAM_KEYS}
+                    atomic_write_bytes(
+                        mesh_path,
+                        encode_body_glb(vertices, faces, topology_path, mesh_path, params=params),
+                    )
+                else:
+                    mesh = trimesh.Trimesh(vertices=vertices, faces=faces)
+                    atomic_export(mesh, mesh_path)
+                generated_files.append(str(mesh_path))
+                
+                print(f"Generated 3D mesh: {mesh_path}")
+
+        return generated_files
+
+    def cache_config(self):
+        """影響輸出結果的設定，用於結果快取鍵"""
+        return {"pipeline": "sam-3d-body", "hf_repo_id": BODY_HF_REPO_ID, "format": BODY_EXPORT_FORMAT}
+
     def get_all_bodies(self, presets_only=True):
         """
         獲取 body 模型列表
@@ -166,7 +198,7 @@ class BodyReconstructionService:
         # 只獲取預設模型（用戶不應該看到其他用戶上傳的模型）
         presets_dir = self.output_dir / "presets"
         if presets_dir.exists():
-            for ext in ["*.obj"]:
+            for ext in ["*.obj", "*.glb"]:
                 for file in presets_dir.glob(ext):
                     # 從文件名提取基礎名稱（例如 FullBody01_body_0.obj -> FullBody01）
                     name = file.stem.replace("_body_0", "").replace("_body_1", "")
@@ -194,7 +226,7 @@ class BodyReconstructionService:
         
         # 如果 presets_only 為 False，也包含動態生成的 bodies（僅用於管理員）
         if not presets_only:
-            for ext in ["*.obj"]:
+            for ext in ["*.obj", "*.glb"]:
                 for file in self.output_dir.glob(ext):
                     # 跳過 presets 目錄
                     if "presets" in str(file):
@@ -6,10 +6,21 @@ import torch
 import numpy as np
 import sys
 import logging
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from PIL import Image
 import cv2
 import trimesh
+from model_registry import (
+    GB,
+    model_registry,
+    offload_modules_to_cpu,
+    restore_modules,
+    release_device_cache,
+)
+from result_cache import atomic_export, atomic_write_bytes
 
 # 將 sam-3d-objects 的目錄加入 Python 路徑
 CURRENT_DIR = Path(__file__).parent.absolute()
@@ -29,6 +40,71 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ClothesService")
 
+# pipeline 設定（同時作為結果快取鍵的一部分，修改後舊的快取會自動失效）
+PIPELINE_SEED = 42
+PIPELINE_RUN_KWARGS = dict(
+    stage1_only=False,
+    with_mesh_postprocess=True,
+    with_texture_baking=True,
+    with_layout_postprocess=False,
+    use_vertex_color=False,
+)
+EXPORT_PROFILE_KWARGS = dict(
+    simplify=0.7,  # 保留 30% 的三角形（而不是 5%），保持更多細節
+    texture_size=2048,  # 使用 2048 紋理（而不是 1024），更好的圖案/logo 品質
+    fill_holes=True,
+    fill_holes_max_size=0.04,
+    fill_holes_convergence_tol=1e-3,  # 視角不再看到新的面時提前結束補洞的光柵化（最多 1000 個視角）
+    bake_pyramid_levels=3,  # 紋理由粗到細優化 512 -> 1024 -> 2048，各層收斂後提前結束
+    bake_min_rel_improvement=2e-3,  # 見 bake_utils_test 的 PSNR/時間比較
+)
+
+# 品質等級（上傳時選擇）：
+# - preview：蒸餾（shortcut）模型各 4 步採樣、頂點顏色、不做網格後處理與紋理烘焙，數秒內回傳
+# - standard：上方的預設設定（25 + 25 步 CFG 與紋理烘焙）
+# - high：加倍採樣步數並保留更多三角形
+QUALITY_TIERS = {
+    "preview": {
+        "run": dict(
+            PIPELINE_RUN_KWARGS,
+            with_mesh_postprocess=False,
+            with_texture_baking=False,
+            use_vertex_color=True,
+            stage1_inference_steps=4,
+            stage2_inference_steps=4,
+            use_stage1_distillation=True,
+            use_stage2_distillation=True,
+        ),
+        "export_profile": EXPORT_PROFILE_KWARGS,
+    },
+    "standard": {
+        "run": PIPELINE_RUN_KWARGS,
+        "export_profile": EXPORT_PROFILE_KWARGS,
+    },
+    "high": {
+        "run": dict(PIPELINE_RUN_KWARGS, stage1_inference_steps=50, stage2_inference_steps=50),
+        "export_profile": dict(EXPORT_PROFILE_KWARGS, simplify=0.5),
+    },
+}
+DEFAULT_QUALITY = "standard"
+# preview 的結果另外命名（{name}_preview.glb），不列入衣物清單：背景的 standard 升級完成後，
+# 同一件衣物只以正式的結果出現一次
+PREVIEW_MODEL_SUFFIX = "_preview"
+
+# 在 GLB 旁輸出壓縮的 Gaussian splat 預覽（.csplat，約為 float32 PLY 的 1/4.5 大小）
+# 目前前端尚未顯示 splat，預設關閉以免每次生成多花編碼時間與磁碟空間；設 EXPORT_SPLAT=1 開啟
+EXPORT_SPLAT = os.environ.get("EXPORT_SPLAT", "0") == "1"
+SPLAT_CHUNK_SIZE = 256
+
+# 生成過程中經由 SSE 推送中間預覽（第一階段體素點雲、烘焙前的頂點顏色網格）
+STREAM_PREVIEWS = os.environ.get("STREAM_PREVIEWS", "1") == "1"
+
+# SAM image embedding 快取數量（vit_h 每張約 4MB）
+SAM_EMBEDDING_CACHE_SIZE = int(os.environ.get("SAM_EMBEDDING_CACHE_SIZE", 8))
+
+# 在 meta device 上建立模型並直接指派 checkpoint 權重，略過隨機初始化以加快啟動
+META_INIT = os.environ.get("SAM3D_META_INIT", "0") == "1"
+
 class ClothesReconstructionService:
     _instance = None
     _initialized = False
@@ -44,135 +120,216 @@ class ClothesReconstructionService:
         if not ClothesReconstructionService._initialized:
             self.inference = None
             self.sam_predictor = None
+            self._sam_embedding_cache = OrderedDict()
+            self._sam_embedding_lock = threading.Lock()
+            self.sam_embedding_hits = 0
+            self.sam_embedding_misses = 0
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
             self.output_dir = CURRENT_DIR / "outputs" / "clothes"
             self.output_dir.mkdir(parents=True, exist_ok=True)
             
+            # 由 model_registry 決定何時載入 / 淘汰；重建 pipeline 成本最高，優先保留
+            model_registry.register(
+                "clothes",
+                loader=self._load_inference,
+                unloader=lambda _: self._release_inference(),
+                size_bytes=int(float(os.environ.get("CLOTHES_MODEL_SIZE_GB", 14)) * GB),
+                priority=1,
+                offloader=self._offload_inference,
+                restorer=lambda inf: restore_modules(self._pipeline_modules(inf), self.device),
+            )
+            model_registry.register(
+                "sam",
+                loader=self._load_sam_predictor,
+                unloader=lambda _: self._release_sam_predictor(),
+                size_bytes=int(float(os.environ.get("SAM_MODEL_SIZE_GB", 3)) * GB),
+                priority=0,
+                offloader=lambda predictor: offload_modules_to_cpu([predictor.model]),
+                restorer=lambda predictor: restore_modules([predictor.model], self.device),
+            )
+            
             # 由於已經安裝了正確版本的 MoGe 和 utils3d，不再需要強制設定 LIDRA_SKIP_INIT
             logger.info(f"Initialized ClothesService on {self.device}")
             ClothesReconstructionService._initialized = True
 
     def load_sam(self):
-        if self.sam_predictor is None:
-            logger.info("Loading SAM for Auto-Masking...")
-            try:
-                from segment_anything import sam_model_registry, SamPredictor
-                sam_checkpoint = CLOTHING_FACTORY_DIR / "checkpoints" / "sam" / "sam_vit_h_4b8939.pth"
-                if not sam_checkpoint.exists():
-                    logger.warning(f"SAM checkpoint not found at {sam_checkpoint}.")
-                    return None
-                
-                model_type = "vit_h"
-                sam = sam_model_registry[model_type](checkpoint=str(sam_checkpoint))
-                sam.to(device=self.device)
-                self.sam_predictor = SamPredictor(sam)
-                logger.info("SAM loaded successfully!")
-            except Exception as e:
-                logger.error(f"Failed to load SAM: {e}")
-                return None
+        try:
+            return model_registry.acquire("sam")
+        except Exception as e:
+            logger.error(f"Failed to load SAM: {e}")
+            return None
+
+    def _load_sam_predictor(self):
+        logger.info("Loading SAM for Auto-Masking...")
+        from segment_anything import sam_model_registry, SamPredictor
+        from sam3d_objects.model.snapshots import resolve_snapshot
+        # 本地 snapshot 登錄（SAM3D_SNAPSHOT_DIR / SAM3D_SNAPSHOT_SAM_VIT_H），預設即 checkpoints/sam 下的檔案
+        sam_checkpoint = Path(
+            resolve_snapshot("sam_vit_h")
+            or CLOTHING_FACTORY_DIR / "checkpoints" / "sam" / "sam_vit_h_4b8939.pth"
+        )
+        if not sam_checkpoint.exists():
+            raise FileNotFoundError(f"SAM checkpoint not found at {sam_checkpoint}.")
+        
+        model_type = "vit_h"
+        sam = sam_model_registry[model_type](checkpoint=str(sam_checkpoint))
+        sam.to(device=self.device)
+        self.sam_predictor = SamPredictor(sam)
+        logger.info("SAM loaded successfully!")
         return self.sam_predictor
 
-    def get_auto_mask(self, image_np):
-        predictor = self.load_sam()
-        if predictor is None: 
-            logger.warning("SAM predictor is None, using full image mask")
+    def _release_sam_predictor(self):
+        if self.sam_predictor is not None:
+            if hasattr(self.sam_predictor, 'model'):
+                if hasattr(self.sam_predictor.model, 'cpu'):
+                    self.sam_predictor.model.cpu()
+                del self.sam_predictor.model
+            del self.sam_predictor
+            self.sam_predictor = None
+            release_device_cache()
+
+    def get_auto_mask(self, image_np, point_coords=None, point_labels=None):
+        """
+        以 SAM 自動產生衣物 mask
+
+        Args:
+            image_np: RGB 圖片 (H, W, 3)
+            point_coords / point_labels: 自訂提示點；預設為中心正面提示 + 四角負面提示。
+                同一張圖片的 SAM image embedding 會被快取，換提示點重試只需執行 mask decoder。
+        """
+        # 使用期間鎖定 SAM，避免被並行請求淘汰
+        try:
+            with model_registry.use("sam") as predictor:
+                return self._get_auto_mask(predictor, image_np, point_coords, point_labels)
+        except Exception as e:
+            logger.warning(f"SAM predictor unavailable ({e}), using full image mask")
             return None
-        
+
+    def _set_image_cached(self, predictor, image_np):
+        """
+        predictor.set_image 的快取版本：以圖片內容雜湊為鍵保存 image embedding，
+        命中時直接還原 predictor 狀態，略過 vit_h 的影像編碼
+        """
+        key = hashlib.sha256(image_np.tobytes() + str(image_np.shape).encode()).hexdigest()
+        with self._sam_embedding_lock:
+            cached = self._sam_embedding_cache.get(key)
+            if cached is not None:
+                self._sam_embedding_cache.move_to_end(key)
+                self.sam_embedding_hits += 1
+        if cached is not None:
+            predictor.reset_image()
+            predictor.features, predictor.original_size, predictor.input_size = cached
+            predictor.is_image_set = True
+            logger.info("SAM image embedding cache hit")
+            return
+
+        predictor.set_image(image_np)
+        with self._sam_embedding_lock:
+            self.sam_embedding_misses += 1
+            self._sam_embedding_cache[key] = (predictor.features, predictor.original_size, predictor.input_size)
+            while len(self._sam_embedding_cache) > SAM_EMBEDDING_CACHE_SIZE:
+                self._sam_embedding_cache.popitem(last=False)
+
+    @staticmethod
+    def _select_mask(masks, h, w):
+        """
+        一次向量化計算所有候選 mask 的覆蓋率，選出主 mask 並依序合併與目前聯集重疊的小 mask
+        """
+        flat = masks.reshape(len(masks), -1)
+        mask_areas = np.count_nonzero(flat, axis=1)
+        mask_coverage_ratios = mask_areas / (h * w)
+
+        # 過濾掉過大（可能是背景）或過小（可能是圖案）的 mask
+        # 理想的衣物 mask 應該覆蓋 20%-70% 的圖片
+        valid = (mask_coverage_ratios >= 0.2) & (mask_coverage_ratios <= 0.7)
+        if not valid.any():
+            # 如果沒有符合條件的，選擇中等大小的（不是最大也不是最小）
+            logger.warning("No mask in ideal coverage range (20%-70%), selecting medium-sized mask")
+            best_mask_idx = int(np.argsort(mask_areas)[len(mask_areas) // 2])
+        else:
+            # 從有效範圍內選擇面積最大的
+            best_mask_idx = int(np.argmax(np.where(valid, mask_areas, -1)))
+        logger.info(f"Selected mask {best_mask_idx} with coverage: {mask_coverage_ratios[best_mask_idx] * 100:.2f}%")
+
+        # 只合併與目前聯集（主 mask 加上已合併的 mask）有明顯重疊的小 mask（可能是物件的其他部分），
+        # 避免合併背景。重疊量一次算出所有候選，之後每合併一個 mask 只累加它新增像素的重疊
+        union = flat[best_mask_idx].copy()
+        candidates = np.flatnonzero((mask_areas < mask_areas[best_mask_idx] * 0.5) & (mask_areas > 0))
+        candidates = candidates[candidates != best_mask_idx]
+        overlap = np.count_nonzero(flat[candidates] & union, axis=1)
+        for i, idx in enumerate(candidates):
+            overlap_ratio = overlap[i] / mask_areas[idx]
+            if overlap_ratio > 0.5:
+                added = flat[idx] & ~union
+                overlap[i + 1:] += np.count_nonzero(flat[candidates[i + 1:]] & added, axis=1)
+                union |= added
+                logger.info(f"Merging overlapping mask {idx} (overlap: {overlap_ratio:.2%})")
+        return union.reshape(masks.shape[1:])
+
+    @staticmethod
+    def _refine_mask(mask_bool):
+        """
+        形態學處理平滑 mask 邊緣（OpenCV 的矩形 kernel 為可分離運算，原解析度下即足夠快）
+        """
+        mask_uint8 = mask_bool.astype(np.uint8) * 255
+
+        # 先閉運算（closing）填充小洞
+        kernel_closing = np.ones((15, 15), np.uint8)
+        mask_closed = cv2.morphologyEx(mask_uint8, cv2.MORPH_CLOSE, kernel_closing)
+
+        # 再輕微擴張（dilation）確保邊緣完整
+        kernel_dilate = np.ones((10, 10), np.uint8)
+        dilated_mask = cv2.dilate(mask_closed, kernel_dilate, iterations=1)
+
+        return dilated_mask > 0
+
+    def _get_auto_mask(self, predictor, image_np, point_coords=None, point_labels=None):
         try:
             logger.info(f"Setting image to SAM predictor (shape: {image_np.shape})...")
-            predictor.set_image(image_np)
+            self._set_image_cached(predictor, image_np)
             logger.info("Image set to SAM predictor successfully")
             
             h, w = image_np.shape[:2]
             
-            # 策略 1: 使用中心點作為主要提示，並使用四角作為負面提示（排除背景）
-            # 正面提示點：中心區域（衣物通常在中心）
-            positive_points = np.array([
-                [w // 2, h // 2],           # 中心
-            ])
-            positive_labels = np.ones(len(positive_points))
-            
-            # 負面提示點：四角（背景通常在角落）
-            negative_points = np.array([
-                [w * 0.05, h * 0.05],      # 左上角
-                [w * 0.95, h * 0.05],      # 右上角
-                [w * 0.05, h * 0.95],      # 左下角
-                [w * 0.95, h * 0.95],      # 右下角
-            ])
-            negative_labels = np.zeros(len(negative_points))  # 0 表示背景
-            
-            # 合併所有提示點
-            all_points = np.vstack([positive_points, negative_points])
-            all_labels = np.hstack([positive_labels, negative_labels])
+            if point_coords is None:
+                # 策略 1: 使用中心點作為主要提示，並使用四角作為負面提示（排除背景）
+                # 正面提示點：中心區域（衣物通常在中心）
+                positive_points = np.array([
+                    [w // 2, h // 2],           # 中心
+                ])
+                
+                # 負面提示點：四角（背景通常在角落）
+                negative_points = np.array([
+                    [w * 0.05, h * 0.05],      # 左上角
+                    [w * 0.95, h * 0.05],      # 右上角
+                    [w * 0.05, h * 0.95],      # 左下角
+                    [w * 0.95, h * 0.95],      # 右下角
+                ])
+                
+                # 合併所有提示點（0 表示背景）
+                point_coords = np.vstack([positive_points, negative_points])
+                point_labels = np.hstack([np.ones(len(positive_points)), np.zeros(len(negative_points))])
             
-            logger.info(f"Running SAM prediction with {len(positive_points)} positive and {len(negative_points)} negative points...")
+            point_coords = np.asarray(point_coords, dtype=np.float32)
+            point_labels = np.asarray(point_labels)
+            logger.info(
+                f"Running SAM prediction with {int((point_labels == 1).sum())} positive and "
+                f"{int((point_labels == 0).sum())} negative points..."
+            )
             
-            # 使用正面和負面提示點
             masks, scores, logits = predictor.predict(
-                point_coords=all_points,
-                point_labels=all_labels,
+                point_coords=point_coords,
+                point_labels=point_labels,
                 multimask_output=True
             )
             
             logger.info(f"SAM prediction completed. Found {len(masks)} mask candidates")
             
-            # 策略 2: 選擇最適合的 mask（避免選擇背景）
-            # 計算每個 mask 的面積和覆蓋率
-            mask_areas = [np.sum(mask) for mask in masks]
-            mask_coverage_ratios = [area / (h * w) for area in mask_areas]
-            
-            # 過濾掉過大（可能是背景）或過小（可能是圖案）的 mask
-            # 理想的衣物 mask 應該覆蓋 20%-70% 的圖片
-            valid_indices = [
-                i for i, coverage in enumerate(mask_coverage_ratios)
-                if 0.2 <= coverage <= 0.7
-            ]
-            
-            if not valid_indices:
-                # 如果沒有符合條件的，選擇中等大小的
-                logger.warning("No mask in ideal coverage range (20%-70%), selecting medium-sized mask")
-                sorted_indices = np.argsort(mask_areas)
-                # 選擇中等大小的（不是最大也不是最小）
-                best_mask_idx = sorted_indices[len(sorted_indices) // 2]
-            else:
-                # 從有效範圍內選擇面積最大的
-                valid_areas = [mask_areas[i] for i in valid_indices]
-                best_valid_idx = valid_indices[np.argmax(valid_areas)]
-                best_mask_idx = best_valid_idx
-            
-            mask_bool = masks[best_mask_idx]
-            best_coverage = mask_coverage_ratios[best_mask_idx] * 100
-            logger.info(f"Selected mask {best_mask_idx} with coverage: {best_coverage:.2f}%")
-            
-            # 策略 3: 只合併重疊的 mask（避免合併背景）
-            # 不再自動合併所有大 mask，因為可能包含背景
-            # 只合併與主 mask 有明顯重疊的小 mask（可能是物件的其他部分）
-            main_mask_area = mask_areas[best_mask_idx]
-            for idx, mask in enumerate(masks):
-                if idx == best_mask_idx:
-                    continue
-                
-                # 計算重疊率
-                overlap = np.sum(mask & mask_bool)
-                overlap_ratio = overlap / np.sum(mask) if np.sum(mask) > 0 else 0
-                
-                # 只合併小 mask（可能是物件的一部分）且重疊率 > 50%
-                if mask_areas[idx] < main_mask_area * 0.5 and overlap_ratio > 0.5:
-                    mask_bool = mask_bool | mask
-                    logger.info(f"Merging overlapping mask {idx} (overlap: {overlap_ratio:.2%})")
+            # 策略 2 + 3: 選擇最適合的 mask 並合併重疊的小 mask（向量化）
+            mask_bool = self._select_mask(np.asarray(masks, dtype=bool), h, w)
             
             # 策略 4: 形態學處理來平滑 mask 邊緣
-            mask_uint8 = mask_bool.astype(np.uint8) * 255
-            
-            # 先閉運算（closing）填充小洞
-            kernel_closing = np.ones((15, 15), np.uint8)
-            mask_closed = cv2.morphologyEx(mask_uint8, cv2.MORPH_CLOSE, kernel_closing)
-            
-            # 再輕微擴張（dilation）確保邊緣完整
-            kernel_dilate = np.ones((10, 10), np.uint8)
-            dilated_mask = cv2.dilate(mask_closed, kernel_dilate, iterations=1)
-            
-            final_mask = dilated_mask > 0
+            final_mask = self._refine_mask(mask_bool)
             
             final_coverage = np.sum(final_mask) / final_mask.size * 100
             logger.info(f"Final mask coverage: {final_coverage:.2f}%")
@@ -184,98 +341,126 @@ class ClothesReconstructionService:
             return None
 
 
-    def load_model(self, unload_other_model=True):
+    def load_model(self):
         """
-        加載 SAM 3D Objects 模型
-        
-        Args:
-            unload_other_model: 如果為 True，會先卸載 Body 模型以釋放 VRAM
+        取得常駐的 SAM 3D Objects 模型，必要時由 model_registry 載入
+        （記憶體不足時會淘汰其他閒置模型）
         """
-        # 如果指定要卸載其他模型，則卸載 Body 模型以釋放 VRAM
-        if unload_other_model and self.inference is None:
-            from body_service import body_service
-            if body_service.estimator is not None:
-                logger.info("Unloading Body model to free VRAM for Clothes model...")
-                body_service.unload_model()
-        
-        if self.inference is None:
-            logger.info("Loading SAM 3D Objects model with Native Nvdiffrast & MoGe support...")
-            try:
-                # 這裡不再需要任何 Monkey Patch，因為我們已經安裝了正確版本的 MoGe / utils3d
-                from inference import Inference
-                tag = "hf"
-                config_path = CLOTHING_FACTORY_DIR / "checkpoints" / tag / "checkpoints" / "pipeline.yaml"
-                
-                # 使用 eager 模式（compile=False）以確保穩定性
-                self.inference = Inference(str(config_path), compile=False)
-                
-                # 確認渲染引擎為 nvdiffrast
-                self.inference._pipeline.rendering_engine = "nvdiffrast"
-                
-                logger.info("✅ Clothes model loaded successfully")
-            except Exception as e:
-                logger.error(f"Failed to load clothes model: {e}", exc_info=True)
-                raise e
+        return model_registry.acquire("clothes")
+
+    def _load_inference(self):
+        logger.info("Loading SAM 3D Objects model with Native Nvdiffrast & MoGe support...")
+        try:
+            # 這裡不再需要任何 Monkey Patch，因為我們已經安裝了正確版本的 MoGe / utils3d
+            from inference import Inference
+            tag = "hf"
+            config_path = CLOTHING_FACTORY_DIR / "checkpoints" / tag / "checkpoints" / "pipeline.yaml"
+            
+            # 使用 eager 模式（compile=False）以確保穩定性
+            self.inference = Inference(str(config_path), compile=False, meta_init=META_INIT)
+            
+            # 確認渲染引擎為 nvdiffrast
+            self.inference._pipeline.rendering_engine = "nvdiffrast"
+            
+            logger.info("✅ Clothes model loaded successfully")
+        except Exception as e:
+            logger.error(f"Failed to load clothes model: {e}", exc_info=True)
+            raise e
         return self.inference
 
+    @staticmethod
+    def _pipeline_modules(inf):
+        """pipeline 中所有持有權重的 nn.Module（用於 CPU offload / 卸載）"""
+        pipeline = inf._pipeline
+        modules = [pipeline.models]
+        modules.extend(getattr(pipeline, "condition_embedders", {}).values())
+        depth_model = getattr(pipeline, "depth_model", None)
+        if depth_model is not None:
+            modules.append(getattr(depth_model, "model", None))
+        return modules
+
+    def _offload_inference(self, inf):
+        """
+        pipeline 的權重移到 pinned CPU 記憶體；共用的 DINO token 快取存放在 GPU 上，
+        不在 model_registry 的裝置預算內，一併清除
+        """
+        offload_modules_to_cpu(self._pipeline_modules(inf))
+        self._clear_dino_embedding_cache()
+        release_device_cache()
+
     def unload_model(self):
-        """卸載模型以釋放 VRAM"""
+        """卸載模型（含 SAM）以釋放 VRAM"""
+        model_registry.unload("clothes")
+        model_registry.unload("sam")
+
+    def _release_inference(self):
         if self.inference is not None:
             logger.info("Unloading Clothes model to free VRAM...")
             try:
-                # 卸載主模型
-                if hasattr(self.inference, '_pipeline') and self.inference._pipeline is not None:
-                    # 嘗試清理 pipeline 中的模型
-                    if hasattr(self.inference._pipeline, 'model') and self.inference._pipeline.model is not None:
-                        if hasattr(self.inference._pipeline.model, 'cpu'):
-                            self.inference._pipeline.model.cpu()
-                        del self.inference._pipeline.model
-                
-                # 卸載 SAM predictor
-                if self.sam_predictor is not None:
-                    if hasattr(self.sam_predictor, 'model'):
-                        if hasattr(self.sam_predictor.model, 'cpu'):
-                            self.sam_predictor.model.cpu()
-                        del self.sam_predictor.model
-                    del self.sam_predictor
-                    self.sam_predictor = None
+                # 將 pipeline 中的模型移到 CPU 再釋放
+                for module in self._pipeline_modules(self.inference):
+                    if module is not None and hasattr(module, 'cpu'):
+                        module.cpu()
                 
                 del self.inference
                 self.inference = None
+
+                # 共用的 DINO token 快取存放在 GPU 上，隨模型一起釋放
+                self._clear_dino_embedding_cache()
                 
                 # 清理 CUDA 快取
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
-                elif torch.backends.mps.is_available():
-                    torch.mps.empty_cache()
+                release_device_cache()
                 
                 logger.info("✅ Clothes model unloaded successfully!")
             except Exception as e:
                 logger.warning(f"Error unloading Clothes model: {e}")
                 self.inference = None
-                self.sam_predictor = None
 
-    def process_image(self, image_path: str, progress_callback=None, auto_unload=True):
+    @staticmethod
+    def check_quality(quality):
+        """回傳有效的品質等級（None 為預設值），未知的等級拋出 ValueError"""
+        quality = quality or DEFAULT_QUALITY
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Unknown quality tier: {quality} (expected one of {list(QUALITY_TIERS)})")
+        return quality
+
+    def process_image(self, image_path: str, progress_callback=None, auto_unload=False, quality=DEFAULT_QUALITY,
+                      points=None):
         """
         處理圖片並生成 3D 模型
         
         Args:
             image_path: 圖片路徑
             progress_callback: 可選的進度回調函數，接收 (stage, progress, message) 參數
-            auto_unload: 處理完成後是否自動卸載模型以釋放 VRAM
+            auto_unload: 處理完成後是否強制卸載模型（預設保持常駐，由 model_registry 管理）
+            quality: 品質等級（preview / standard / high），見 QUALITY_TIERS
+            points: 自訂的 SAM 提示點 [[x, y, label], ...]（像素座標，label 1 為衣物、0 為背景），
+                預設為中心正面提示 + 四角負面提示；換提示點重試時沿用快取的 SAM image embedding
         """
-        def emit_progress(stage, progress, message):
+        quality = self.check_quality(quality)
+        try:
+            with model_registry.use("clothes") as inf:
+                return self._process_image(inf, image_path, progress_callback, quality, points)
+        finally:
+            if auto_unload:
+                self.unload_model()
+
+    def _process_image(self, inf, image_path: str, progress_callback=None, quality=DEFAULT_QUALITY, points=None):
+        def emit_progress(stage, progress, message, **extra):
             if progress_callback:
-                progress_callback(stage, progress, message)
+                progress_callback(stage, progress, message, **extra)
             logger.info(f"[{stage}] {progress:.1f}% - {message}")
         
         try:
-            inf = self.load_model()
             img_pil = Image.open(image_path).convert("RGB")
             img_np = np.array(img_pil)
             
             emit_progress("masking", 5, "Running Auto-Masking with SAM...")
-            mask_bool = self.get_auto_mask(img_np)
+            point_coords = point_labels = None
+            if points:
+                point_coords = np.array([p[:2] for p in points], dtype=np.float32)
+                point_labels = np.array([p[2] for p in points])
+            mask_bool = self.get_auto_mask(img_np, point_coords, point_labels)
             if mask_bool is None: 
                 logger.warning("Auto-masking failed, using full image mask")
                 mask_bool = np.ones(img_np.shape[:2], dtype=bool)
@@ -291,14 +476,24 @@ class ClothesReconstructionService:
             emit_progress("inference", 25, "Running inference pipeline...")
             emit_progress("inference", 30, "Stage 1: Sampling sparse structure...")
             
+            # 直接在 pipeline 內以高品質設定匯出 GLB，避免重複執行 to_glb（網格後處理 + 紋理烘焙只跑一次）
+            from sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils import GLBExportProfile
+            tier = QUALITY_TIERS[quality]
+            logger.info(f"Generating GLB with quality tier '{quality}'...")
+            logger.info(f"  - Run settings: {tier['run']}")
+            logger.info(f"  - Export profile: {tier['export_profile']}")
+            export_profile = GLBExportProfile(**tier["export_profile"])
+
+            preview_callback = None
+            if STREAM_PREVIEWS and progress_callback is not None:
+                preview_callback = self._preview_callback(emit_progress)
+
             with torch.no_grad():
                 output = inf._pipeline.run(
-                    rgba_image, None, seed=42,
-                    stage1_only=False,
-                    with_mesh_postprocess=True,
-                    with_texture_baking=True,    
-                    with_layout_postprocess=False,
-                    use_vertex_color=False       
+                    rgba_image, None, seed=PIPELINE_SEED,
+                    export_profile=export_profile,
+                    preview_callback=preview_callback,
+                    **tier["run"],
                 )
             
             emit_progress("inference", 70, "Inference pipeline completed!")
@@ -306,52 +501,22 @@ class ClothesReconstructionService:
             if not output: return None
             base_name = Path(image_path).stem
 
-            emit_progress("export", 75, "Re-exporting GLB with high-quality settings...")
-            
-            # 始終使用更好的參數重新生成 GLB，確保高品質紋理和細節
-            mesh_obj = None
-            if "mesh" in output and "gaussian" in output:
-                # 直接調用 to_glb 使用更好的參數
-                logger.info("Generating high-quality GLB with improved settings...")
-                logger.info("  - Texture size: 2048 (instead of 1024) for better pattern/logo quality")
-                logger.info("  - Simplify: 0.7 (keeps 30% triangles instead of 5%) for more detail")
-                from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
-                
-                mesh_obj = postprocessing_utils.to_glb(
-                    output["gaussian"][0],
-                    output["mesh"][0],
-                    simplify=0.7,  # 保留 30% 的三角形（而不是 5%），保持更多細節
-                    texture_size=2048,  # 使用 2048 紋理（而不是 1024），更好的圖案/logo 品質
-                    fill_holes=True,
-                    fill_holes_max_size=0.04,
-                    verbose=True,
-                    with_mesh_postprocess=True,
-                    with_texture_baking=True,
-                    use_vertex_color=False,
-                    rendering_engine=inf._pipeline.rendering_engine,
-                )
-                logger.info("High-quality GLB generated successfully!")
-            elif output.get("glb") is not None:
-                # 如果沒有 gaussian/mesh 但已有 GLB，使用它（降級方案）
-                logger.warning("Using pipeline-generated GLB (may have lower quality)")
-                mesh_obj = output.get("glb")
+            emit_progress("export", 75, "Exporting high-quality GLB...")
+            mesh_obj = output.get("glb")
             
             if mesh_obj is not None:
-                glb_path = self.output_dir / f"{base_name}_cloth.glb"
+                suffix = PREVIEW_MODEL_SUFFIX if quality == "preview" else "_cloth"
+                glb_path = self.output_dir / f"{base_name}{suffix}.glb"
                 if isinstance(mesh_obj, trimesh.Trimesh):
                     # --- 自動接地與置中優化 ---
                     # 生成後先做基本接地，後續由用戶在前端手動旋轉
-                    bounds = mesh_obj.bounds
-                    centroid = mesh_obj.centroid
-                    translation = [
-                        -centroid[0],      # X 置中
-                        -bounds[0, 1],     # Y 接地 (底部對齊 0)
-                        -centroid[2]       # Z 置中
-                    ]
+                    translation = self._ground_translation(mesh_obj.bounds, mesh_obj.centroid)
                     mesh_obj.apply_translation(translation)
                     logger.info(f"Initial grounding and centering applied. Translation: {translation}")
                     
-                    mesh_obj.export(str(glb_path))
+                    atomic_export(mesh_obj, glb_path)
+                    if EXPORT_SPLAT and output.get("gs") is not None:
+                        self._export_splat(output["gs"], glb_path, translation)
                 logger.info(f"Success! High-quality textured GLB saved: {glb_path}")
                 emit_progress("export", 100, "Success! 3D model generated.")
                 return str(glb_path)
@@ -364,10 +529,120 @@ class ClothesReconstructionService:
             if progress_callback:
                 progress_callback("error", 0, f"Error: {str(e)}")
             raise e
-        finally:
-            # 處理完成後自動卸載模型以釋放 VRAM
-            if auto_unload:
-                self.unload_model()
+
+    @staticmethod
+    def _dino_embedding_cache():
+        """pipeline 已載入時回傳共用的 DINO embedding 快取（查詢狀態時不匯入模型程式碼）"""
+        module = sys.modules.get("sam3d_objects.model.backbone.dit.embedder.dino")
+        return getattr(module, "dino_embedding_cache", None)
+
+    def _clear_dino_embedding_cache(self):
+        dino_cache = self._dino_embedding_cache()
+        if dino_cache is not None:
+            dino_cache.clear()
+
+    def dino_embedding_stats(self):
+        """DINO embedding 快取統計（第一、二階段與重複生成共用影像 token）"""
+        cache = self._dino_embedding_cache()
+        return cache.stats() if cache is not None else None
+
+    @staticmethod
+    def _ground_translation(bounds, centroid):
+        """X、Z 置中並將底部對齊 Y = 0 的平移量"""
+        return [
+            -centroid[0],      # X 置中
+            -bounds[0, 1],     # Y 接地 (底部對齊 0)
+            -centroid[2]       # Z 置中
+        ]
+
+    def _preview_callback(self, emit_progress):
+        """
+        pipeline 的中間結果寫成以內容雜湊命名的檔案，並以 preview 事件推送其 URL：
+        voxels（第一階段體素點雲 .voxp）-> mesh（烘焙前的頂點顏色 GLB）-> 最終 GLB（complete 事件）
+        """
+        from preview_artifacts import encode_voxels, encode_vertex_color_mesh, write_content_addressed
+
+        preview_dir = self.output_dir / "previews"
+
+        def on_preview(stage, coords=None, mesh=None):
+            if stage == "voxels":
+                path = write_content_addressed(preview_dir, encode_voxels(coords), ".voxp")
+                emit_progress("preview", 45, "Voxel preview ready", preview="voxels",
+                              preview_url=f"/outputs/clothes/previews/{path.name}")
+            elif stage == "mesh" and mesh.success:
+                vertices = mesh.vertices.float()
+                bounds = torch.stack([vertices.min(dim=0).values, vertices.max(dim=0).values]).cpu().numpy()
+                translation = self._ground_translation(bounds, vertices.mean(dim=0).cpu().numpy())
+                data = encode_vertex_color_mesh(mesh, translation=translation)
+                path = write_content_addressed(preview_dir, data, ".glb")
+                emit_progress("preview", 60, "Mesh preview ready (before texture baking)", preview="mesh",
+                              preview_url=f"/outputs/clothes/previews/{path.name}")
+
+        return on_preview
+
+    @staticmethod
+    def splat_path_for(glb_path):
+        """GLB 對應的壓縮 splat 預覽路徑"""
+        return Path(glb_path).with_suffix(".csplat")
+
+    def _export_splat(self, gaussian, glb_path, translation):
+        """以與 GLB 相同的平移輸出壓縮 splat；失敗時不影響 GLB 結果"""
+        try:
+            from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.compressed import (
+                gaussian_to_compressed_splat,
+            )
+            data = gaussian_to_compressed_splat(
+                gaussian, chunk_size=SPLAT_CHUNK_SIZE, translation=translation
+            )
+            splat_path = self.splat_path_for(glb_path)
+            atomic_write_bytes(splat_path, data)
+            logger.info(f"Compressed splat preview saved: {splat_path} ({len(data) / 1024:.1f} KB)")
+        except Exception as e:
+            logger.warning(f"Failed to export compressed splat: {e}")
+
+    def transform_splat(self, glb_path, transform):
+        """
+        對 GLB 旁的壓縮 splat 套用與 GLB 相同的 4x4 剛體變換（旋轉與重新接地），
+        使兩者保持對齊；變換失敗時刪除 splat，避免留下與 GLB 不一致的檔案。
+        回傳變換後的 splat 路徑，沒有或已刪除時回傳 None
+        """
+        splat_path = self.splat_path_for(glb_path)
+        if not splat_path.exists():
+            return None
+        try:
+            # 旋轉可能發生在 pipeline 載入前：與 notebook/inference.py 相同，略過訓練用的初始化
+            os.environ.setdefault("LIDRA_SKIP_INIT", "true")
+            from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.compressed import (
+                transform_compressed_splat,
+            )
+            data = transform_compressed_splat(splat_path.read_bytes(), transform)
+            atomic_write_bytes(splat_path, data)
+            return splat_path
+        except Exception as e:
+            logger.warning(f"Failed to transform compressed splat, removing it: {e}")
+            splat_path.unlink(missing_ok=True)
+            return None
+
+    def cache_config(self, quality=DEFAULT_QUALITY, points=None):
+        """
+        影響輸出結果的設定，用於結果快取鍵（standard 的鍵與加入品質等級前相同，舊快取仍有效）；
+        自訂的 SAM 提示點改變 mask，也是鍵的一部分
+        """
+        quality = self.check_quality(quality)
+        config = {
+            "pipeline": "sam-3d-objects",
+            "seed": PIPELINE_SEED,
+            "run": QUALITY_TIERS[quality]["run"],
+            "export_profile": QUALITY_TIERS[quality]["export_profile"],
+        }
+        if EXPORT_SPLAT:
+            # 關閉時不加入，鍵與加入 splat 輸出前相同
+            config["splat"] = SPLAT_CHUNK_SIZE
+        if quality != DEFAULT_QUALITY:
+            config["quality"] = quality
+        if points:
+            config["points"] = points
+        return config
 
     def get_all_clothes(self, presets_only=False):
         """
@@ -403,8 +678,8 @@ class ClothesReconstructionService:
         if not presets_only:
             for ext in ["*.ply", "*.obj", "*.glb"]:
                 for file in self.output_dir.glob(ext):
-                    # 跳過 presets 目錄
-                    if "presets" in str(file):
+                    # 跳過 presets 目錄與 preview 品質的結果（見 PREVIEW_MODEL_SUFFIX）
+                    if "presets" in str(file) or file.stem.endswith(PREVIEW_MODEL_SUFFIX):
                         continue
                     
                     name = file.stem.replace("_cloth", "")
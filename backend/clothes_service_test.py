@@ -0,0 +1,213 @@
+"""
+clothes_service 的測試，以及各品質等級（QUALITY_TIERS）的延遲比較表：
+
+    python clothes_service_test.py --image shirt.jpg --tiers preview standard high --repeats 3
+
+需要 CUDA 與 checkpoints；pytest 只以假 pipeline 驗證計時流程。
+"""
+import argparse
+import statistics
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+import torch
+
+from clothes_service import QUALITY_TIERS, ClothesReconstructionService
+from conftest import best_time, png_bytes
+from model_registry import model_registry
+
+
+def loop_select_mask(masks, h, w):
+    """原本逐一比較的選擇流程：與目前聯集的重疊率 > 50% 的小 mask 依序併入"""
+    mask_areas = [np.sum(mask) for mask in masks]
+    mask_coverage_ratios = [area / (h * w) for area in mask_areas]
+    valid_indices = [i for i, coverage in enumerate(mask_coverage_ratios) if 0.2 <= coverage <= 0.7]
+    if not valid_indices:
+        best_mask_idx = np.argsort(mask_areas)[len(mask_areas) // 2]
+    else:
+        best_mask_idx = valid_indices[np.argmax([mask_areas[i] for i in valid_indices])]
+
+    mask_bool = masks[best_mask_idx]
+    main_mask_area = mask_areas[best_mask_idx]
+    for idx, mask in enumerate(masks):
+        if idx == best_mask_idx:
+            continue
+        overlap = np.sum(mask & mask_bool)
+        overlap_ratio = overlap / np.sum(mask) if np.sum(mask) > 0 else 0
+        if mask_areas[idx] < main_mask_area * 0.5 and overlap_ratio > 0.5:
+            mask_bool = mask_bool | mask
+    return mask_bool
+
+
+def _chained_masks():
+    # mask 1 與主 mask 重疊 60%；mask 2 只與主 mask 重疊 30%，但與 mask 1 新增的區域重疊，
+    # 只有和聯集比較才會被合併
+    masks = np.zeros((4, 100, 100), dtype=bool)
+    masks[0, :, :50] = True  # 主 mask，覆蓋 50%
+    masks[1, :20, 38:58] = True  # 400 px，240 px 在主 mask 內
+    masks[2, :20, 45:61] = True  # 320 px，主 mask 內 100 px，聯集內 260 px
+    masks[3, 90:, 90:] = True  # 不重疊
+    return masks
+
+
+def test_merges_against_running_union():
+    masks = _chained_masks()
+    selected = ClothesReconstructionService._select_mask(masks, 100, 100)
+    expected = loop_select_mask(masks, 100, 100)
+    np.testing.assert_array_equal(selected, expected)
+    assert selected[0, 60] and selected[10, 59] and not selected[99, 99]  # mask 2 併入、mask 3 未併入
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_loop_on_random_masks(seed):
+    rng = np.random.default_rng(seed)
+    h, w = 48, 64
+    masks = np.zeros((6, h, w), dtype=bool)
+    for mask in masks:
+        y0, x0 = rng.integers(0, h - 4), rng.integers(0, w - 4)
+        mask[y0:y0 + rng.integers(4, h), x0:x0 + rng.integers(4, w)] = True
+    np.testing.assert_array_equal(
+        ClothesReconstructionService._select_mask(masks, h, w), loop_select_mask(masks, h, w)
+    )
+
+
+def test_empty_candidates_are_ignored():
+    masks = np.zeros((3, 10, 10), dtype=bool)
+    masks[1, :5] = True
+    selected = ClothesReconstructionService._select_mask(masks, 10, 10)
+    np.testing.assert_array_equal(selected, loop_select_mask(masks, 10, 10))
+
+
+class FakeDinoCache:
+    def __init__(self):
+        self.entries = 16
+
+    def clear(self):
+        self.entries = 0
+
+
+def test_offloading_the_pipeline_clears_the_dino_cache(monkeypatch):
+    """pipeline 移到 CPU 時，GPU 上的 DINO token 快取（不在 model_registry 的預算內）也一併釋放"""
+    cache = FakeDinoCache()
+    monkeypatch.setitem(
+        sys.modules, "sam3d_objects.model.backbone.dit.embedder.dino",
+        types.SimpleNamespace(dino_embedding_cache=cache),
+    )
+    pipeline = types.SimpleNamespace(models=torch.nn.Linear(2, 2), condition_embedders={"image": torch.nn.Linear(2, 2)})
+    offloader = model_registry._get("clothes").offloader
+    offloader(types.SimpleNamespace(_pipeline=pipeline))
+    assert cache.entries == 0
+    assert pipeline.models.weight.device.type == "cpu"
+
+
+@pytest.mark.benchmark
+def test_benchmark_select_and_refine():
+    # SAM multimask_output 的三個候選，4096 px 的手機照片
+    h, w = 3072, 4096
+    yy, xx = np.ogrid[:h, :w]
+    masks = np.stack([
+        (yy - h / 2) ** 2 / (h * 0.35) ** 2 + (xx - w / 2) ** 2 / (w * 0.3) ** 2 < 1,
+        (yy - h / 3) ** 2 / (h * 0.15) ** 2 + (xx - w / 2) ** 2 / (w * 0.1) ** 2 < 1,
+        np.broadcast_to(yy > h * 0.8, (h, w)),
+    ])
+
+    selected, select_s = best_time(ClothesReconstructionService._select_mask, masks, h, w)
+    expected, loop_s = best_time(loop_select_mask, masks, h, w)
+    np.testing.assert_array_equal(selected, expected)
+
+    _, refine_s = best_time(ClothesReconstructionService._refine_mask, selected)
+    print(f"select: {select_s * 1e3:.1f} ms (loop {loop_s * 1e3:.1f} ms), refine: {refine_s * 1e3:.1f} ms")
+
+
+TIER_STAGES = ("masking", "preparation", "inference", "export")
+
+
+def _stage_times(events, total):
+    """由進度事件的時間戳計算各階段耗時（到下一個階段的第一個事件為止）與第一個預覽的時間"""
+    times = {"first_preview": None}
+    starts = []
+    for stage, at in events:
+        if stage == "preview":
+            if times["first_preview"] is None:
+                times["first_preview"] = at
+        elif not starts:
+            starts.append((stage, 0.0))  # 第一個階段包含讀圖等事件前的時間
+        elif starts[-1][0] != stage:
+            starts.append((stage, at))
+    for (stage, at), (_, end) in zip(starts, starts[1:] + [(None, total)]):
+        times[stage] = times.get(stage, 0.0) + end - at
+    return times
+
+
+def time_tiers(service, image_path, tiers=tuple(QUALITY_TIERS), repeats=1):
+    """依序以各品質等級執行 process_image，每次回傳總時間、各階段時間與第一個預覽的時間（秒）"""
+    runs = []
+    for tier in tiers:
+        for _ in range(repeats):
+            events = []
+            start = time.perf_counter()
+
+            def on_progress(stage, progress, message, **extra):
+                events.append((stage, time.perf_counter() - start))
+
+            service.process_image(str(image_path), progress_callback=on_progress, quality=tier)
+            total = time.perf_counter() - start
+            runs.append({"tier": tier, "total": total, **_stage_times(events, total)})
+    return runs
+
+
+def _steps(tier):
+    run = QUALITY_TIERS[tier]["run"]
+    steps = [run.get(f"stage{i}_inference_steps") for i in (1, 2)]
+    steps = "+".join(str(s) if s is not None else "config" for s in steps)
+    return steps + (" distilled" if run.get("use_stage1_distillation") else "")
+
+
+def format_tier_table(runs):
+    """各等級取中位數的延遲表（秒）"""
+    columns = ["total", *TIER_STAGES, "first_preview"]
+    lines = [f"{'tier':<10}{'steps':<20}" + "".join(f"{c:>15}" for c in columns)]
+    for tier in dict.fromkeys(run["tier"] for run in runs):
+        tier_runs = [run for run in runs if run["tier"] == tier]
+        cells = []
+        for column in columns:
+            values = [run[column] for run in tier_runs if run.get(column) is not None]
+            cells.append(f"{statistics.median(values):>15.2f}" if values else f"{'-':>15}")
+        lines.append(f"{tier:<10}{_steps(tier):<20}" + "".join(cells))
+    return "\n".join(lines)
+
+
+def test_tier_latency_table(stub_clothes_service, tmp_path):
+    service, pipeline = stub_clothes_service
+    image_path = tmp_path / "shirt.png"
+    image_path.write_bytes(png_bytes())
+    runs = time_tiers(service, image_path, repeats=2)
+
+    assert [run["tier"] for run in runs] == [t for t in QUALITY_TIERS for _ in range(2)]
+    # 每個等級的 pipeline 設定都傳入 run
+    assert pipeline.calls[::2] == [QUALITY_TIERS[t]["run"] for t in QUALITY_TIERS]
+    for run in runs:
+        assert set(TIER_STAGES) <= set(run) and run["first_preview"] is not None
+        assert sum(run[stage] for stage in TIER_STAGES) == pytest.approx(run["total"])
+    table = format_tier_table(runs)
+    print(table)
+    rows = {line.split()[0]: line for line in table.splitlines()[1:]}
+    assert list(rows) == list(QUALITY_TIERS)
+    # 假 pipeline 的耗時與步數成正比；各等級的耗時只印出，不以耗時斷言
+    assert "4+4 distilled" in rows["preview"] and "50+50" in rows["high"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", required=True, help="衣物照片")
+    parser.add_argument("--tiers", nargs="+", default=list(QUALITY_TIERS), choices=list(QUALITY_TIERS))
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    service = ClothesReconstructionService()
+    # 先載入模型，計時不含啟動時間
+    service.load_model()
+    print(format_tier_table(time_tiers(service, args.image, args.tiers, args.repeats)))
@@ -0,0 +1,105 @@
+import contextlib
+import io
+import sys
+import time
+import types
+
+import numpy as np
+import pytest
+import torch
+import trimesh
+from PIL import Image
+
+import clothes_service as clothes_service_module
+from clothes_service import ClothesReconstructionService
+
+# 推論腳本（需要 pyrender 與 checkpoints），不是測試
+collect_ignore = ["sam-3d-body/test_inference.py"]
+
+# 假 pipeline 的中間結果：第一階段體素（含 batch 欄位）與烘焙前的頂點顏色網格
+STUB_VOXELS = np.argwhere(np.random.default_rng(0).random((64, 64, 64)) < 0.01)
+STUB_VOXELS = np.concatenate([np.zeros((len(STUB_VOXELS), 1), dtype=np.int64), STUB_VOXELS], axis=1)
+STUB_SPHERE = trimesh.creation.icosphere(subdivisions=2, radius=0.3)
+
+
+def stub_mesh_preview():
+    """pipeline 的 MeshExtractResult 替身：頂點顏色取法向量，位置不在原點"""
+    return types.SimpleNamespace(
+        success=True,
+        vertices=torch.tensor(STUB_SPHERE.vertices + [0.1, 0.2, -0.05], dtype=torch.float32),
+        faces=torch.tensor(STUB_SPHERE.faces),
+        vertex_attrs=torch.tensor((STUB_SPHERE.vertex_normals + 1) / 2, dtype=torch.float32),
+    )
+
+
+class StubPipeline:
+    """
+    取代 InferencePipeline 的假 pipeline：依序送出體素與網格預覽並回傳 GLB，
+    耗時與採樣步數（未指定時 25 步）和紋理烘焙成正比
+    """
+
+    STEP_S = 0.001
+    BAKE_S = 0.03
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, image, mask, seed=None, export_profile=None, preview_callback=None, **kwargs):
+        self.calls.append(kwargs)
+        steps = (kwargs.get("stage1_inference_steps") or 25) + (kwargs.get("stage2_inference_steps") or 25)
+        time.sleep(steps * self.STEP_S / 2)
+        if preview_callback is not None:
+            preview_callback("voxels", coords=torch.from_numpy(STUB_VOXELS))
+        time.sleep(steps * self.STEP_S / 2)
+        if preview_callback is not None:
+            preview_callback("mesh", mesh=stub_mesh_preview())
+        if kwargs["with_texture_baking"]:
+            time.sleep(self.BAKE_S)
+        return {"glb": trimesh.creation.box()}
+
+
+def png_bytes(color=(200, 30, 30), size=(64, 48)):
+    """上傳用的小張 PNG"""
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def best_time(fn, *args, repeats=3):
+    """
+    執行 fn(*args) repeats 次，回傳最後一次的結果與最短耗時（秒）；
+    效能測試只印出耗時，不以耗時斷言（會隨機器與負載變動）
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args)
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+@pytest.fixture
+def stub_clothes_service(tmp_path, monkeypatch):
+    """以假 pipeline 取代模型的 clothes_service（SAM 遮罩為整張圖），輸出寫到 tmp_path"""
+    pipeline = StubPipeline()
+    inference = types.SimpleNamespace(
+        _pipeline=pipeline,
+        merge_mask_to_rgba=lambda image, mask: np.dstack([image, mask.astype(np.uint8) * 255]),
+    )
+    service = ClothesReconstructionService()
+    monkeypatch.setattr(service, "output_dir", tmp_path)
+    monkeypatch.setattr(
+        service, "get_auto_mask",
+        lambda image, point_coords=None, point_labels=None: np.ones(image.shape[:2], dtype=bool),
+    )
+    monkeypatch.setattr(
+        clothes_service_module.model_registry, "use", lambda name: contextlib.nullcontext(inference)
+    )
+    monkeypatch.setattr(clothes_service_module, "STREAM_PREVIEWS", True)
+    # GLBExportProfile 所在的模組需要 kaolin 與 gsplat：以只保存參數的替身取代
+    monkeypatch.setitem(
+        sys.modules,
+        "sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils",
+        types.SimpleNamespace(GLBExportProfile=dict),
+    )
+    return service, pipeline
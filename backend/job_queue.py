@@ -0,0 +1,270 @@
+import asyncio
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("JobQueue")
+
+# 任務狀態
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETE = "complete"
+ERROR = "error"
+
+TERMINAL_STAGES = (COMPLETE, ERROR)
+
+# handler(payload, progress_callback) -> result dict
+# progress_callback 與服務的 (stage, progress, message) 介面相同，可另外帶關鍵字欄位附加到事件
+JobHandler = Callable[[Dict[str, Any], Callable[[str, float, str], None]], Dict[str, Any]]
+
+
+class QueueFullError(Exception):
+    """佇列已滿（對應 HTTP 429）"""
+
+    def __init__(self, kind: str, queue_length: int, max_queue: int):
+        self.kind = kind
+        self.queue_length = queue_length
+        self.max_queue = max_queue
+        super().__init__(f"Job queue '{kind}' is full ({queue_length}/{max_queue})")
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    priority: int = 0
+    seq: int = 0
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    events: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STAGES
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        # list.append 為原子操作，SSE 端可直接依索引讀取
+        self.events.append(event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.events[-1] if self.events else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+@dataclass
+class _JobKind:
+    handler: JobHandler
+    concurrency: int
+    max_queue: int
+    queue: "queue.PriorityQueue" = field(default_factory=queue.PriorityQueue)
+    workers: List[threading.Thread] = field(default_factory=list)
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+
+
+class JobManager:
+    """
+    背景任務佇列：每種任務（模型類型）有獨立的優先佇列與固定數量的 worker 執行緒，
+    限制同時在 GPU 上執行的任務數量，並在佇列滿時拒絕新任務。
+
+    priority 數值越小越先執行，相同 priority 依提交順序（FIFO）。
+    handler 在 worker 執行緒中同步執行，不會阻塞 asyncio event loop。
+    """
+
+    def __init__(self, max_finished_jobs: int = 500):
+        self.max_finished_jobs = max_finished_jobs
+        self._kinds: Dict[str, _JobKind] = {}
+        self._jobs: Dict[str, Job] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def register(self, kind: str, handler: JobHandler, concurrency: int = 1, max_queue: int = 8) -> None:
+        if kind in self._kinds:
+            raise ValueError(f"Job kind '{kind}' is already registered")
+        self._kinds[kind] = _JobKind(handler=handler, concurrency=max(1, concurrency), max_queue=max_queue)
+
+    @property
+    def kinds(self) -> List[str]:
+        return list(self._kinds.keys())
+
+    def submit(self, kind: str, payload: Dict[str, Any], priority: int = 0) -> Job:
+        """提交任務；佇列已滿時拋出 QueueFullError"""
+        if kind not in self._kinds:
+            raise KeyError(f"Unknown job kind: {kind}")
+        job_kind = self._kinds[kind]
+        with self._lock:
+            queue_length = self._queued_count(kind)
+            if queue_length >= job_kind.max_queue:
+                raise QueueFullError(kind, queue_length, job_kind.max_queue)
+            job = Job(id=uuid.uuid4().hex, kind=kind, payload=payload, priority=priority, seq=next(self._seq))
+            self._jobs[job.id] = job
+            self._prune_finished()
+            job_kind.queue.put((job.priority, job.seq, job.id))
+            self._ensure_workers(kind)
+            position = self._queue_position(job)
+        job.emit({
+            "stage": QUEUED,
+            "progress": 0,
+            "message": f"Queued (position {position})",
+            "queue_position": position,
+        })
+        logger.info(f"Job {job.id} ({kind}) queued at position {position}")
+        return job
+
+    def add_completed(self, kind: str, payload: Dict[str, Any], result: Dict[str, Any]) -> Job:
+        """登記一個不需執行的已完成任務（例如快取命中），查詢與 SSE 介面與一般任務相同"""
+        now = time.time()
+        job = Job(
+            id=uuid.uuid4().hex, kind=kind, payload=payload, seq=next(self._seq),
+            status=COMPLETE, started_at=now, finished_at=now, result=result,
+        )
+        job.emit({"stage": COMPLETE, "progress": 100, "message": "Job completed", **result})
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune_finished()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def queue_position(self, job: Job) -> int:
+        """在同類型佇列中的位置（1 起算），非等待中則為 0"""
+        with self._lock:
+            return self._queue_position(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                kind: {
+                    "queued": self._queued_count(kind),
+                    "running": k.running,
+                    "completed": k.completed,
+                    "failed": k.failed,
+                    "concurrency": k.concurrency,
+                    "max_queue": k.max_queue,
+                }
+                for kind, k in self._kinds.items()
+            }
+
+    def _queued_count(self, kind: str) -> int:
+        return sum(1 for j in self._jobs.values() if j.kind == kind and j.status == QUEUED)
+
+    def _queue_position(self, job: Job) -> int:
+        if job.status != QUEUED:
+            return 0
+        ahead = [
+            j for j in self._jobs.values()
+            if j.kind == job.kind and j.status == QUEUED and (j.priority, j.seq) < (job.priority, job.seq)
+        ]
+        return len(ahead) + 1
+
+    def _prune_finished(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished]
+        if len(finished) <= self.max_finished_jobs:
+            return
+        finished.sort(key=lambda j: j.finished_at or 0)
+        for j in finished[: len(finished) - self.max_finished_jobs]:
+            del self._jobs[j.id]
+
+    def _ensure_workers(self, kind: str) -> None:
+        job_kind = self._kinds[kind]
+        job_kind.workers = [w for w in job_kind.workers if w.is_alive()]
+        while len(job_kind.workers) < job_kind.concurrency:
+            worker = threading.Thread(
+                target=self._worker_loop,
+                args=(kind,),
+                name=f"job-worker-{kind}-{len(job_kind.workers)}",
+                daemon=True,
+            )
+            worker.start()
+            job_kind.workers.append(worker)
+
+    def _worker_loop(self, kind: str) -> None:
+        job_kind = self._kinds[kind]
+        while True:
+            _, _, job_id = job_kind.queue.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            with self._lock:
+                job.status = RUNNING
+                job.started_at = time.time()
+                job_kind.running += 1
+            self._run(job, job_kind)
+
+    def _run(self, job: Job, job_kind: _JobKind) -> None:
+        def progress_callback(stage, progress, message, **extra):
+            # 服務內部的 error 事件由 worker 統一送出，避免重複
+            # extra 為附加欄位（例如中間預覽的 preview_url）
+            if stage != ERROR:
+                job.emit({"stage": stage, "progress": progress, "message": message, **extra})
+
+        try:
+            result = job_kind.handler(job.payload, progress_callback) or {}
+            job.result = result
+            job.emit({"stage": COMPLETE, "progress": 100, "message": "Job completed", **result})
+            status = COMPLETE
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}", exc_info=True)
+            job.error = str(e)
+            job.emit({"stage": ERROR, "progress": 0, "message": str(e)})
+            status = ERROR
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            job_kind.running -= 1
+            if status == COMPLETE:
+                job_kind.completed += 1
+            else:
+                job_kind.failed += 1
+
+
+async def wait_for_job(job: Job, poll_interval: float = 0.2) -> Job:
+    """非阻塞地等待任務完成"""
+    while not job.finished:
+        await asyncio.sleep(poll_interval)
+    return job
+
+
+async def stream_job_events(job: Job, poll_interval: float = 0.1, initial_events=None):
+    """
+    以 SSE 格式推送任務進度（從第一個事件開始重播）
+    initial_events 先送出，只屬於這個串流，不會加入任務的事件
+    """
+    for event in initial_events or []:
+        yield f"data: {json.dumps(event)}\n\n"
+    cursor = 0
+    while True:
+        events = job.events[cursor:]
+        for event in events:
+            yield f"data: {json.dumps(event)}\n\n"
+        cursor += len(events)
+        if job.finished and cursor >= len(job.events):
+            break
+        await asyncio.sleep(poll_interval)
+
+
+# 建立全域單例
+job_manager = JobManager()
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import job_queue
+from job_queue import COMPLETE, QUEUED, JobManager, QueueFullError
+from result_cache import ResultCache
+
+PNG = b"\x89PNG\r\n\x1a\nfake image"
+
+
+class StubService:
+    """取代推論的假 handler：可暫停在執行中，並記錄執行順序"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.order = []
+
+    def handler(self, payload, progress_callback):
+        self.order.append(payload.get("name", payload.get("file_path")))
+        self.started.set()
+        progress_callback("inference", 50, "Running stub inference...")
+        assert self.release.wait(10)
+        return {"model_url": f"/outputs/clothes/{payload.get('cache_key', 'x')[:8]}.glb"}
+
+
+def _wait_finished(job, timeout=10):
+    asyncio.run(asyncio.wait_for(job_queue.wait_for_job(job, poll_interval=0.01), timeout))
+
+
+def test_priority_then_fifo_order():
+    service = StubService()
+    manager = JobManager()
+    manager.register("cloth", service.handler, concurrency=1, max_queue=8)
+    first = manager.submit("cloth", {"name": "first"})
+    assert service.started.wait(5)  # worker 執行中，其餘任務排隊
+
+    jobs = [
+        manager.submit("cloth", {"name": "low"}, priority=5),
+        manager.submit("cloth", {"name": "high-1"}, priority=1),
+        manager.submit("cloth", {"name": "high-2"}, priority=1),
+    ]
+    assert [manager.queue_position(j) for j in jobs] == [3, 1, 2]
+    assert jobs[0].events[0]["stage"] == QUEUED
+
+    service.release.set()
+    for job in [first] + jobs:
+        _wait_finished(job)
+    assert service.order == ["first", "high-1", "high-2", "low"]
+    assert manager.stats()["cloth"]["completed"] == 4
+
+
+def test_queue_full_raises():
+    service = StubService()
+    manager = JobManager()
+    manager.register("cloth", service.handler, concurrency=1, max_queue=1)
+    manager.submit("cloth", {"name": "running"})
+    assert service.started.wait(5)
+    manager.submit("cloth", {"name": "queued"})
+    with pytest.raises(QueueFullError) as e:
+        manager.submit("cloth", {"name": "rejected"})
+    assert e.value.queue_length == 1 and e.value.max_queue == 1
+    service.release.set()
+
+
+def test_failed_job_emits_single_error_event():
+    def failing(payload, progress_callback):
+        progress_callback("error", 0, "service-side error")
+        raise RuntimeError("boom")
+
+    manager = JobManager()
+    manager.register("cloth", failing)
+    job = manager.submit("cloth", {})
+    _wait_finished(job)
+    assert job.error == "boom"
+    assert [e["stage"] for e in job.events] == [QUEUED, "error"]
+
+
+def test_stream_replays_events_after_initial_events():
+    manager = JobManager()
+    job = manager.add_completed("cloth", {}, {"model_url": "/outputs/clothes/a.glb"})
+
+    async def collect():
+        return [c async for c in job_queue.stream_job_events(job, initial_events=[{"stage": "upload"}])]
+
+    chunks = asyncio.run(collect())
+    assert [json.loads(c[len("data: "):])["stage"] for c in chunks] == ["upload", COMPLETE]
+    assert [e["stage"] for e in job.events] == [COMPLETE]
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    """只掛上 jobs / clothes router 的 app，任務佇列、快取與上傳目錄都換成測試用的"""
+    from routers import clothes, jobs
+
+    service = StubService()
+    manager = JobManager()
+
+    def handler(payload, progress_callback):
+        result = service.handler(payload, progress_callback)
+        jobs.result_cache.store("cloth", payload["cache_key"], result, [])
+        return result
+
+    manager.register("cloth", handler, concurrency=1, max_queue=1)
+    monkeypatch.setattr(jobs, "job_manager", manager)
+    monkeypatch.setattr(jobs, "result_cache", ResultCache(tmp_path / "outputs"))
+    monkeypatch.setattr(jobs, "UPLOAD_DIRS", {"cloth": tmp_path / "uploads", "body": tmp_path / "uploads"})
+    monkeypatch.setattr(jobs, "_inflight", {})
+
+    app = FastAPI()
+    app.include_router(jobs.router)
+    app.include_router(clothes.router)
+    with TestClient(app) as client:
+        yield client, service, manager
+
+
+def _post_job(client, content=PNG, name="shirt.png"):
+    return client.post(
+        "/jobs", data={"kind": "cloth"}, files={"file": (name, content, "image/png")}
+    )
+
+
+def _release_when_streaming(monkeypatch, service):
+    """
+    串流回應建立後（upload 事件已送出或排入）才讓假任務完成；任務若在端點檢查前就完成，
+    端點會直接回傳結果，不送出 upload 事件
+    """
+    from routers import clothes
+
+    stream_job_response = clothes.stream_job_response
+
+    def releasing_stream_job_response(job, initial_events=None):
+        response = stream_job_response(job, initial_events=initial_events)
+        service.release.set()
+        return response
+
+    monkeypatch.setattr(clothes, "stream_job_response", releasing_stream_job_response)
+
+
+def _stream_events(client, content=PNG, name="shirt.png"):
+    response = client.post(
+        "/clothes/upload/cloth/stream", files={"file": (name, content, "image/png")}
+    )
+    assert response.headers["content-type"].startswith("text/event-stream")
+    return [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+
+
+def test_queue_full_returns_429_with_retry_after(api):
+    client, service, _ = api
+    assert _post_job(client, PNG + b"1").status_code == 202
+    assert service.started.wait(5)
+    assert _post_job(client, PNG + b"2").status_code == 202  # 佔滿 max_queue=1
+
+    response = _post_job(client, PNG + b"3")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    detail = response.json()["detail"]
+    assert detail["queue_length"] == 1 and detail["queue_position"] == 2
+    service.release.set()
+
+
+def test_identical_upload_joins_inflight_job(api, monkeypatch):
+    client, service, manager = api
+    created = _post_job(client).json()
+    joined = _post_job(client).json()
+    assert joined["job_id"] == created["job_id"]
+    assert service.started.wait(5)
+
+    # 串流端點共用同一個任務：upload 事件只出現在這個回應中，任務的進度不會被重設
+    _release_when_streaming(monkeypatch, service)
+    events = _stream_events(client)
+    assert events[0]["stage"] == "upload" and events[0]["job_id"] == created["job_id"]
+    assert events[-1]["stage"] == COMPLETE
+    stages = [e["stage"] for e in manager.get(created["job_id"]).events]
+    assert "upload" not in stages
+    assert stages == [QUEUED, "inference", COMPLETE]
+    assert len(service.order) == 1
+
+    # 之後相同的上傳直接由結果快取完成，不再執行推論
+    events = _stream_events(client)
+    assert [e["stage"] for e in events] == [COMPLETE]
+    assert len(service.order) == 1
+
+
+def test_stream_upload_creating_the_job_emits_upload_event(api, monkeypatch):
+    client, service, manager = api
+    _release_when_streaming(monkeypatch, service)
+    events = _stream_events(client, PNG + b"new")
+    stages = [e["stage"] for e in events]
+    assert stages[0] == QUEUED and "upload" in stages and stages[-1] == COMPLETE
+    job = manager.get(events[stages.index("upload")]["job_id"])
+    assert "upload" in [e["stage"] for e in job.events]
+
+
+def test_negative_priority_is_clamped(api):
+    client, service, manager = api
+    response = client.post(
+        "/jobs", data={"kind": "cloth", "priority": "-5"}, files={"file": ("shirt.png", PNG, "image/png")}
+    )
+    assert response.status_code == 202
+    assert manager.get(response.json()["job_id"]).priority == 0
+    service.release.set()
@@ -26,13 +26,17 @@ except ImportError as e:
 except Exception as e:
     print(f"Unexpected error during utils3d patch: {e}")
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-from routers import body, clothes
+from routers import body, clothes, jobs
 from body_service import body_service
 from clothes_service import clothes_service
+from model_registry import model_registry
+from job_queue import job_manager
+from result_cache import result_cache
 
 import logging
 
@@ -44,7 +48,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger("uvicorn")
 
-app = FastAPI(title="Virtual Fitting Room API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 結果快取的命中時間只在記憶體中更新，關閉前寫回索引
+    result_cache.flush()
+
+
+app = FastAPI(title="Virtual Fitting Room API", lifespan=lifespan)
 
 
 # Enable CORS
@@ -69,10 +80,11 @@ app.mount("/outputs", StaticFiles(directory=str(OUTPUT_DIR)), name="outputs")
 app.include_router(body.router)
 app.include_router(body.bodies_router)
 app.include_router(clothes.router)
+app.include_router(jobs.router)
 
 # 注意：不再在啟動時預加載模型，改為按需加載（lazy loading）
-# 這可以避免在 4090 24GB VRAM 上同時載入兩個模型導致的資源耗盡問題
-# 模型會在首次使用時自動載入（通過 body_service.load_model() 和 clothes_service.load_model()）
+# 模型載入後由 model_registry 保持常駐，僅在超出記憶體預算（MODEL_DEVICE_BUDGET_GB）時
+# 依優先度與 LRU 淘汰閒置模型，避免在 4090 24GB VRAM 上資源耗盡，也避免每次請求重新載入
 
 @app.get("/")
 async def root():
@@ -83,26 +95,42 @@ async def root():
             "list_bodies": "/bodies",
             "upload_cloth_stream": "/clothes/upload/cloth/stream",
             "list_clothes": "/clothes",
+            "submit_job": "/jobs",
+            "job_status": "/jobs/{job_id}",
+            "job_events": "/jobs/{job_id}/events",
             "static_models": "/outputs",
             "health": "/health"
         }
     }
 
 @app.get("/health")
-async def health_check():
-    """健康檢查端點，顯示服務和模型狀態"""
+def health_check():
+    """
+    健康檢查端點，顯示服務和模型狀態
+    各項 stats() 會取得鎖，以一般函式定義讓 FastAPI 在 threadpool 執行，不阻塞 event loop
+    """
     return {
         "status": "healthy",
         "models": {
             "body": {
                 "loaded": body_service.estimator is not None,
+                "state": model_registry.state("body"),
                 "device": body_service.device
             },
             "clothes": {
                 "loaded": clothes_service.inference is not None,
-                "device": clothes_service.device
+                "state": model_registry.state("clothes"),
+                "device": clothes_service.device,
+                "sam_embedding_cache": {
+                    "hits": clothes_service.sam_embedding_hits,
+                    "misses": clothes_service.sam_embedding_misses
+                },
+                "dino_embedding_cache": clothes_service.dino_embedding_stats()
             }
-        }
+        },
+        "model_registry": model_registry.stats(),
+        "jobs": job_manager.stats(),
+        "result_cache": result_cache.stats()
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,423 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger("ModelRegistry")
+
+GB = 1024 ** 3
+
+# 模型狀態
+UNLOADED = "unloaded"    # 未載入（需要完整讀取 checkpoint）
+RESIDENT = "resident"    # 常駐於推論裝置（GPU / MPS / CPU）
+OFFLOADED = "offloaded"  # 權重暫存於 pinned CPU 記憶體，可快速搬回
+LOADING = "loading"      # 載入或從 CPU 搬回中（已預留裝置預算，其他請求等待完成）
+EVICTING = "evicting"    # 搬到 CPU 或卸載中（目標狀態記錄於 evict_to）
+
+
+@dataclass
+class ModelEntry:
+    """註冊表中單一模型的設定、狀態與統計"""
+    name: str
+    loader: Callable[[], Any]
+    unloader: Callable[[Any], None]
+    size_bytes: int
+    priority: int = 0
+    offloader: Optional[Callable[[Any], None]] = None
+    restorer: Optional[Callable[[Any], None]] = None
+
+    model: Any = None
+    state: str = UNLOADED
+    evict_to: Optional[str] = None
+    in_use: int = 0
+    last_used: float = 0.0
+
+    hits: int = 0
+    misses: int = 0
+    restores: int = 0
+    evictions: int = 0
+    offloads: int = 0
+    total_load_time: float = 0.0
+    last_load_time: float = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "in_use": self.in_use,
+            "priority": self.priority,
+            "size_gb": round(self.size_bytes / GB, 3),
+            "hits": self.hits,
+            "misses": self.misses,
+            "restores": self.restores,
+            "evictions": self.evictions,
+            "offloads": self.offloads,
+            "total_load_time_s": round(self.total_load_time, 3),
+            "last_load_time_s": round(self.last_load_time, 3),
+        }
+
+
+class ModelRegistry:
+    """
+    集中管理模型常駐：在記憶體預算內盡量保留已載入的模型，
+    空間不足時依 (priority, 最近使用時間) 淘汰閒置模型。
+
+    - device_budget_bytes: 推論裝置上可用的預算，None 表示不限制
+    - host_budget_bytes: pinned CPU 暫存區的預算，None 表示不限制
+    - offload_to_cpu: 淘汰時若模型提供 offloader，先搬到 CPU 而非刪除
+    - memory_probe: 回傳目前裝置已用記憶體（bytes），用於量測模型實際大小
+
+    策略本身不依賴 torch，可用假模型與假預算在 CPU 上測試。
+
+    鎖只保護狀態與統計：loader / restorer / offloader / unloader 都在鎖外執行，
+    進行中的模型處於 LOADING / EVICTING 狀態，要取得同一模型的請求在 Condition 上等待，
+    其他模型的 acquire / release 與 stats() 不會被阻塞。
+    """
+
+    def __init__(
+        self,
+        device_budget_bytes: Optional[int] = None,
+        host_budget_bytes: Optional[int] = None,
+        offload_to_cpu: bool = False,
+        memory_probe: Optional[Callable[[], int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.device_budget_bytes = device_budget_bytes
+        self.host_budget_bytes = host_budget_bytes
+        self.offload_to_cpu = offload_to_cpu
+        self.memory_probe = memory_probe
+        self.clock = clock
+        self._entries: Dict[str, ModelEntry] = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+
+    def register(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        unloader: Callable[[Any], None],
+        size_bytes: int,
+        priority: int = 0,
+        offloader: Optional[Callable[[Any], None]] = None,
+        restorer: Optional[Callable[[Any], None]] = None,
+    ) -> ModelEntry:
+        """
+        註冊模型（不會立即載入）
+
+        Args:
+            loader: 載入並回傳模型
+            unloader: 釋放模型（接收 loader 回傳的物件）
+            size_bytes: 預估的裝置記憶體用量，載入後若有 memory_probe 會以實測值取代
+            priority: 越高越晚被淘汰
+            offloader / restorer: 將權重搬到 pinned CPU / 搬回推論裝置
+        """
+        with self._lock:
+            if name in self._entries:
+                raise ValueError(f"Model '{name}' is already registered")
+            entry = ModelEntry(
+                name=name,
+                loader=loader,
+                unloader=unloader,
+                size_bytes=size_bytes,
+                priority=priority,
+                offloader=offloader,
+                restorer=restorer,
+            )
+            self._entries[name] = entry
+            return entry
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._entries
+
+    def state(self, name: str) -> str:
+        return self._get(name).state
+
+    def acquire(self, name: str) -> Any:
+        """取得模型，必要時載入或從 CPU 搬回，並更新命中統計"""
+        return self._acquire(name, pin=False)
+
+    @contextmanager
+    def use(self, name: str):
+        """取得模型並在使用期間鎖定，避免被其他請求淘汰"""
+        model = self._acquire(name, pin=True)
+        entry = self._entries[name]
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = self.clock()
+
+    def _acquire(self, name: str, pin: bool) -> Any:
+        with self._lock:
+            entry = self._wait_idle(self._get(name))
+            if entry.state == RESIDENT:
+                entry.hits += 1
+                return self._checkout(entry, pin)
+            restoring = entry.state == OFFLOADED
+            previous = entry.state
+            if not restoring:
+                entry.misses += 1
+            # 挑出要淘汰的模型後預留預算，實際的搬移與載入都在鎖外進行
+            victims = self._make_device_room(entry.size_bytes, exclude=entry)
+            entry.state = LOADING
+
+        try:
+            self._run_evictions(victims)
+            before = self.memory_probe() if self.memory_probe else None
+            start = self.clock()
+            if restoring:
+                entry.restorer(entry.model)
+                model = entry.model
+            else:
+                model = entry.loader()
+            elapsed = self.clock() - start
+            # 其他模型同時載入時量測值會偏大，僅在看起來合理時採用
+            measured = self.memory_probe() - before if before is not None else 0
+        except BaseException:
+            with self._lock:
+                entry.state = previous
+                self._changed.notify_all()
+            raise
+
+        with self._lock:
+            entry.model = model
+            entry.state = RESIDENT
+            if restoring:
+                entry.restores += 1
+                logger.info(f"Restored '{name}' from CPU in {elapsed:.2f}s")
+            else:
+                entry.last_load_time = elapsed
+                entry.total_load_time += elapsed
+                if measured > 0:
+                    entry.size_bytes = measured
+                logger.info(
+                    f"Loaded '{name}' in {elapsed:.2f}s ({entry.size_bytes / GB:.2f} GB)"
+                )
+            self._changed.notify_all()
+            return self._checkout(entry, pin)
+
+    def _checkout(self, entry: ModelEntry, pin: bool) -> Any:
+        # 與狀態更新在同一段鎖內完成，避免取得後、鎖定前被其他請求淘汰
+        if pin:
+            entry.in_use += 1
+        entry.last_used = self.clock()
+        return entry.model
+
+    def _wait_idle(self, entry: ModelEntry) -> ModelEntry:
+        """等待模型進行中的載入 / 淘汰完成（呼叫端需持有鎖）"""
+        while entry.state in (LOADING, EVICTING):
+            self._changed.wait()
+        return entry
+
+    def unload(self, name: str) -> None:
+        """強制完全卸載模型"""
+        with self._lock:
+            entry = self._wait_idle(self._get(name))
+            if entry.state == UNLOADED:
+                return
+            victims = [self._begin_eviction(entry, UNLOADED)]
+        self._run_evictions(victims)
+
+    def unload_all(self) -> None:
+        with self._lock:
+            victims = [
+                self._begin_eviction(entry, UNLOADED)
+                for entry in self._entries.values()
+                if entry.state in (RESIDENT, OFFLOADED) and entry.in_use == 0
+            ]
+        self._run_evictions(victims)
+
+    def device_used_bytes(self) -> int:
+        # 載入中的模型已預留預算；淘汰中的模型依目標狀態計算
+        return sum(
+            e.size_bytes for e in self._entries.values()
+            if e.state in (RESIDENT, LOADING)
+        )
+
+    def host_used_bytes(self) -> int:
+        return sum(
+            e.size_bytes for e in self._entries.values()
+            if e.state == OFFLOADED or (e.state == EVICTING and e.evict_to == OFFLOADED)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """提供給 /health 的統計資訊"""
+        with self._lock:
+            hits = sum(e.hits for e in self._entries.values())
+            misses = sum(e.misses for e in self._entries.values())
+            restores = sum(e.restores for e in self._entries.values())
+            requests = hits + misses + restores
+            return {
+                "device_budget_gb": _to_gb(self.device_budget_bytes),
+                "device_used_gb": _to_gb(self.device_used_bytes()),
+                "host_budget_gb": _to_gb(self.host_budget_bytes),
+                "host_used_gb": _to_gb(self.host_used_bytes()),
+                "offload_to_cpu": self.offload_to_cpu,
+                "hits": hits,
+                "misses": misses,
+                "restores": restores,
+                "hit_rate": round(hits / requests, 4) if requests else None,
+                "models": {name: e.stats() for name, e in self._entries.items()},
+            }
+
+    def _get(self, name: str) -> ModelEntry:
+        if name not in self._entries:
+            raise KeyError(f"Model '{name}' is not registered")
+        return self._entries[name]
+
+    def _eviction_order(self, state: str, exclude: ModelEntry) -> List[ModelEntry]:
+        candidates = [
+            e for e in self._entries.values()
+            if e.state == state and e.in_use == 0 and e is not exclude
+        ]
+        return sorted(candidates, key=lambda e: (e.priority, e.last_used))
+
+    def _make_device_room(self, needed: int, exclude: ModelEntry) -> List[ModelEntry]:
+        """挑出需要淘汰的模型並標記為 EVICTING（呼叫端需持有鎖），回傳待執行的淘汰"""
+        victims = []
+        if self.device_budget_bytes is None:
+            return victims
+        for victim in self._eviction_order(RESIDENT, exclude):
+            if self.device_used_bytes() + needed <= self.device_budget_bytes:
+                return victims
+            if self.offload_to_cpu and victim.offloader is not None:
+                host_victims = self._make_host_room(victim.size_bytes, exclude)
+                if host_victims is not None:
+                    victims.extend(host_victims)
+                    victims.append(self._begin_eviction(victim, OFFLOADED))
+                    continue
+            victims.append(self._begin_eviction(victim, UNLOADED))
+        if self.device_used_bytes() + needed > self.device_budget_bytes:
+            logger.warning(
+                f"Device budget exceeded: need {needed / GB:.2f} GB, "
+                f"{self.device_used_bytes() / GB:.2f} GB pinned by models in use"
+            )
+        return victims
+
+    def _make_host_room(self, needed: int, exclude: ModelEntry) -> Optional[List[ModelEntry]]:
+        """pinned CPU 暫存區的空間規劃；放不下時回傳 None 且不淘汰任何模型"""
+        if self.host_budget_bytes is None:
+            return []
+        if needed > self.host_budget_bytes:
+            return None
+        planned = []
+        freed = 0
+        for victim in self._eviction_order(OFFLOADED, exclude):
+            if self.host_used_bytes() - freed + needed <= self.host_budget_bytes:
+                break
+            planned.append(victim)
+            freed += victim.size_bytes
+        if self.host_used_bytes() - freed + needed > self.host_budget_bytes:
+            return None
+        return [self._begin_eviction(victim, UNLOADED) for victim in planned]
+
+    def _begin_eviction(self, entry: ModelEntry, target: str) -> ModelEntry:
+        entry.state = EVICTING
+        entry.evict_to = target
+        return entry
+
+    def _run_evictions(self, victims: List[ModelEntry]) -> None:
+        """在鎖外執行 offloader / unloader，完成後更新狀態並喚醒等待的請求"""
+        for victim in victims:
+            target = victim.evict_to
+            if target == OFFLOADED:
+                try:
+                    victim.offloader(victim.model)
+                    logger.info(f"Offloaded '{victim.name}' to pinned CPU memory")
+                except Exception as e:
+                    logger.warning(f"Error offloading '{victim.name}', unloading instead: {e}")
+                    target = UNLOADED
+            if target == UNLOADED:
+                logger.info(f"Unloading '{victim.name}'")
+                try:
+                    victim.unloader(victim.model)
+                except Exception as e:
+                    logger.warning(f"Error unloading '{victim.name}': {e}")
+            with self._lock:
+                victim.state = target
+                victim.evict_to = None
+                if target == OFFLOADED:
+                    victim.offloads += 1
+                else:
+                    victim.model = None
+                    victim.evictions += 1
+                self._changed.notify_all()
+
+
+def _to_gb(value: Optional[int]) -> Optional[float]:
+    return None if value is None else round(value / GB, 3)
+
+
+def _env_gb(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return None
+    return int(float(value) * GB)
+
+
+def offload_modules_to_cpu(modules: Iterable[Any]) -> None:
+    """將 nn.Module 搬到 CPU；有 CUDA 時改用 pinned memory 以加速搬回"""
+    import torch
+
+    pin = torch.cuda.is_available()
+    for module in modules:
+        if module is None:
+            continue
+        module.to("cpu")
+        if pin:
+            for tensor in list(module.parameters()) + list(module.buffers()):
+                tensor.data = tensor.data.pin_memory()
+
+
+def restore_modules(modules: Iterable[Any], device) -> None:
+    """將 nn.Module 從 CPU 搬回推論裝置"""
+    for module in modules:
+        if module is not None:
+            module.to(device, non_blocking=True)
+
+
+def release_device_cache() -> None:
+    """清理 CUDA / MPS 快取"""
+    import torch
+
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    elif torch.backends.mps.is_available():
+        torch.mps.empty_cache()
+
+
+def _create_default_registry() -> ModelRegistry:
+    """
+    依環境變數建立全域註冊表：
+    - MODEL_DEVICE_BUDGET_GB: 裝置預算（預設為 GPU 總記憶體的 90%，無 GPU 則不限制）
+    - MODEL_HOST_BUDGET_GB: pinned CPU 暫存預算（預設不限制）
+    - MODEL_OFFLOAD_TO_CPU: 設為 1 時淘汰改為搬到 CPU
+    """
+    import torch
+
+    device_budget = _env_gb("MODEL_DEVICE_BUDGET_GB")
+    memory_probe = None
+    if torch.cuda.is_available():
+        if device_budget is None:
+            total = torch.cuda.get_device_properties(0).total_memory
+            device_budget = int(total * 0.9)
+        memory_probe = torch.cuda.memory_allocated
+    registry = ModelRegistry(
+        device_budget_bytes=device_budget,
+        host_budget_bytes=_env_gb("MODEL_HOST_BUDGET_GB"),
+        offload_to_cpu=os.environ.get("MODEL_OFFLOAD_TO_CPU", "0") == "1",
+        memory_probe=memory_probe,
+    )
+    logger.info(
+        f"ModelRegistry: device budget {_to_gb(registry.device_budget_bytes)} GB, "
+        f"host budget {_to_gb(registry.host_budget_bytes)} GB, "
+        f"offload_to_cpu={registry.offload_to_cpu}"
+    )
+    return registry
+
+
+# 建立全域單例，供 body / clothes 服務共用
+model_registry = _create_default_registry()
@@ -0,0 +1,264 @@
+import threading
+import time
+
+import pytest
+
+from model_registry import (
+    EVICTING,
+    LOADING,
+    OFFLOADED,
+    RESIDENT,
+    UNLOADED,
+    ModelRegistry,
+)
+
+GB = 1024 ** 3
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class FakeModel:
+    """記錄 loader / unloader / offloader / restorer 呼叫次數的假模型"""
+
+    def __init__(self, name):
+        self.name = name
+        self.device = None
+        self.calls = []
+
+    def register(self, registry, size_gb, priority=0, offload=False):
+        def loader():
+            self.calls.append("load")
+            self.device = "cuda"
+            return self
+
+        def unloader(model):
+            assert model is self
+            self.calls.append("unload")
+            self.device = None
+
+        def offloader(model):
+            self.calls.append("offload")
+            self.device = "cpu"
+
+        def restorer(model):
+            self.calls.append("restore")
+            self.device = "cuda"
+
+        registry.register(
+            self.name,
+            loader=loader,
+            unloader=unloader,
+            size_bytes=int(size_gb * GB),
+            priority=priority,
+            offloader=offloader if offload else None,
+            restorer=restorer if offload else None,
+        )
+        return self
+
+
+def _registry(**kwargs):
+    kwargs.setdefault("device_budget_bytes", 10 * GB)
+    return ModelRegistry(clock=FakeClock(), **kwargs)
+
+
+def test_resident_models_are_hits():
+    registry = _registry()
+    a = FakeModel("a").register(registry, 4)
+    assert registry.acquire("a") is a
+    assert registry.acquire("a") is a
+    assert a.calls == ["load"]
+    stats = registry.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["models"]["a"]["state"] == RESIDENT
+
+
+def test_evicts_least_recently_used_within_budget():
+    registry = _registry()
+    a, b, c = (FakeModel(n).register(registry, 4) for n in "abc")
+    registry.acquire("a")
+    registry.acquire("b")
+    registry.acquire("a")  # b 成為最久未使用
+
+    registry.acquire("c")
+    assert registry.state("b") == UNLOADED
+    assert registry.state("a") == RESIDENT and registry.state("c") == RESIDENT
+    assert b.calls == ["load", "unload"]
+    assert registry.device_used_bytes() == 8 * GB
+
+
+def test_lower_priority_is_evicted_first():
+    registry = _registry()
+    FakeModel("pipeline").register(registry, 4, priority=1)
+    FakeModel("sam").register(registry, 4, priority=0)
+    FakeModel("body").register(registry, 4)
+    registry.acquire("pipeline")  # 最舊但優先權較高
+    registry.acquire("sam")
+
+    registry.acquire("body")
+    assert registry.state("pipeline") == RESIDENT
+    assert registry.state("sam") == UNLOADED
+
+
+def test_offload_and_restore():
+    registry = _registry(offload_to_cpu=True)
+    a = FakeModel("a").register(registry, 6, offload=True)
+    b = FakeModel("b").register(registry, 6, offload=True)
+    registry.acquire("a")
+    registry.acquire("b")
+    assert registry.state("a") == OFFLOADED and a.device == "cpu"
+    assert registry.host_used_bytes() == 6 * GB
+
+    assert registry.acquire("a") is a
+    assert a.calls == ["load", "offload", "restore"]
+    assert registry.state("b") == OFFLOADED
+    stats = registry.stats()
+    assert stats["restores"] == 1 and stats["models"]["a"]["offloads"] == 1
+
+
+def test_host_budget_unloads_oldest_offloaded_model():
+    registry = _registry(offload_to_cpu=True, host_budget_bytes=5 * GB)
+    a, b, c, d = (FakeModel(n).register(registry, 4, offload=True) for n in "abcd")
+    registry.acquire("a")
+    registry.acquire("b")
+    registry.acquire("c")  # a 搬到 CPU
+    registry.acquire("d")  # b 搬到 CPU，需先從暫存區卸載 a
+    assert registry.state("a") == UNLOADED
+    assert registry.state("b") == OFFLOADED
+    assert a.calls == ["load", "offload", "unload"]
+    assert registry.host_used_bytes() == 4 * GB
+
+    # 超過整個暫存預算的模型直接卸載
+    registry = _registry(offload_to_cpu=True, host_budget_bytes=2 * GB)
+    big = FakeModel("big").register(registry, 6, offload=True)
+    FakeModel("other").register(registry, 6)
+    registry.acquire("big")
+    registry.acquire("other")
+    assert registry.state("big") == UNLOADED
+    assert big.calls == ["load", "unload"]
+
+
+def test_models_in_use_are_not_evicted():
+    registry = _registry()
+    a, b, c = (FakeModel(n).register(registry, 4) for n in "abc")
+    registry.acquire("b")
+    with registry.use("a") as model:
+        assert model is a
+        registry.acquire("c")  # a 比 b 舊但使用中
+        assert registry.state("a") == RESIDENT
+        assert registry.state("b") == UNLOADED
+        assert registry.stats()["models"]["a"]["in_use"] == 1
+    assert registry.stats()["models"]["a"]["in_use"] == 0
+
+
+def test_over_budget_when_everything_is_pinned():
+    registry = _registry()
+    FakeModel("a").register(registry, 6)
+    FakeModel("b").register(registry, 6)
+    with registry.use("a"), registry.use("b"):
+        assert registry.state("a") == RESIDENT and registry.state("b") == RESIDENT
+        assert registry.device_used_bytes() == 12 * GB
+
+
+def test_failed_load_can_be_retried():
+    registry = _registry()
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("checkpoint not found")
+        return "model"
+
+    registry.register("a", loader=loader, unloader=lambda m: None, size_bytes=GB)
+    with pytest.raises(RuntimeError):
+        registry.acquire("a")
+    assert registry.state("a") == UNLOADED
+    assert registry.acquire("a") == "model"
+
+
+def _run_in_thread(fn):
+    result = {}
+
+    def target():
+        result["value"] = fn()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_loading_does_not_block_other_models_or_stats():
+    registry = _registry(device_budget_bytes=None)
+    FakeModel("resident").register(registry, 1)
+    registry.acquire("resident")
+
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_loader():
+        loads.append(1)
+        started.set()
+        assert release.wait(5)
+        return "slow"
+
+    registry.register("slow", loader=slow_loader, unloader=lambda m: None, size_bytes=GB)
+    loading, loaded = _run_in_thread(lambda: registry.acquire("slow"))
+    assert started.wait(5)
+
+    # loader 在鎖外執行：其他模型與 stats() 不受影響
+    assert registry.state("slow") == LOADING
+    assert registry.stats()["models"]["slow"]["state"] == LOADING
+    with registry.use("resident") as model:
+        assert model.name == "resident"
+
+    # 同一模型的第二個請求等待同一次載入
+    waiting, waited = _run_in_thread(lambda: registry.acquire("slow"))
+    time.sleep(0.05)
+    assert waiting.is_alive()
+
+    release.set()
+    loading.join(5)
+    waiting.join(5)
+    assert loaded["value"] == "slow" and waited["value"] == "slow"
+    assert len(loads) == 1
+    assert registry.stats()["models"]["slow"]["hits"] == 1
+
+
+def test_eviction_runs_outside_the_lock():
+    registry = _registry(device_budget_bytes=4 * GB)
+    started, release = threading.Event(), threading.Event()
+
+    def slow_unloader(model):
+        started.set()
+        assert release.wait(5)
+
+    registry.register("old", loader=lambda: "old", unloader=slow_unloader, size_bytes=4 * GB)
+    FakeModel("new").register(registry, 4)
+    registry.acquire("old")
+
+    loading, loaded = _run_in_thread(lambda: registry.acquire("new"))
+    assert started.wait(5)
+    assert registry.state("old") == EVICTING
+    assert registry.state("new") == LOADING
+    # 淘汰中模型的預算已轉給載入中的模型
+    assert registry.device_used_bytes() == 4 * GB
+    registry.stats()
+
+    # 取得淘汰中的模型會等淘汰完成後重新載入
+    waiting, waited = _run_in_thread(lambda: registry.acquire("old"))
+    time.sleep(0.05)
+    assert waiting.is_alive()
+
+    release.set()
+    loading.join(5)
+    waiting.join(5)
+    assert loaded["value"].name == "new"
+    assert waited["value"] == "old"
+    assert registry.stats()["models"]["old"]["evictions"] == 1
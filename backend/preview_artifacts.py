@@ -0,0 +1,78 @@
+import hashlib
+import logging
+import struct
+from pathlib import Path
+
+import numpy as np
+import trimesh
+
+from result_cache import atomic_write_bytes
+
+logger = logging.getLogger("PreviewArtifacts")
+
+# 體素點雲格式（.voxp，little-endian）：
+#   header  magic "VOXP", resolution u32, num_points u32
+#   points  uint8 x, y, z（體素格座標），位置 = xyz / resolution - 0.5（與 stage1_only 的 voxel 相同）
+VOXEL_MAGIC = b"VOXP"
+VOXEL_HEADER = struct.Struct("<4sII")
+VOXEL_RESOLUTION = 64
+
+# 預覽檔只在生成過程中使用，超過數量時刪除最舊的
+MAX_PREVIEW_FILES = 200
+
+
+def encode_voxels(coords, resolution: int = VOXEL_RESOLUTION) -> bytes:
+    """將 (N, 4)（含 batch 欄位）或 (N, 3) 的體素座標編碼為每點 3 bytes 的點雲"""
+    if hasattr(coords, "detach"):
+        coords = coords.detach().cpu().numpy()
+    coords = np.asarray(coords)
+    if coords.shape[1] == 4:
+        coords = coords[:, 1:]
+    points = np.ascontiguousarray(np.clip(coords, 0, resolution - 1), dtype=np.uint8)
+    return VOXEL_HEADER.pack(VOXEL_MAGIC, resolution, points.shape[0]) + points.tobytes()
+
+
+def decode_voxels(data: bytes) -> np.ndarray:
+    """還原為 (N, 3) float32 位置"""
+    magic, resolution, n = VOXEL_HEADER.unpack_from(data, 0)
+    if magic != VOXEL_MAGIC:
+        raise ValueError(f"Not a voxel preview (magic={magic})")
+    points = np.frombuffer(data, dtype=np.uint8, count=3 * n, offset=VOXEL_HEADER.size)
+    return points.reshape(n, 3).astype(np.float32) / resolution - 0.5
+
+
+def encode_vertex_color_mesh(mesh, translation=None) -> bytes:
+    """將 MeshExtractResult（貼圖烘焙前）輸出為頂點顏色的 GLB"""
+    vertices = mesh.vertices.float().cpu().numpy()
+    if translation is not None:
+        vertices = vertices + np.asarray(translation, dtype=np.float32)[None]
+    colors = np.clip(mesh.vertex_attrs[:, :3].float().cpu().numpy(), 0, 1)
+    tm = trimesh.Trimesh(
+        vertices=vertices,
+        faces=mesh.faces.cpu().numpy(),
+        vertex_colors=(colors * 255).astype(np.uint8),
+        process=False,
+    )
+    return tm.export(file_type="glb")
+
+
+def write_content_addressed(directory: Path, data: bytes, suffix: str) -> Path:
+    """以內容雜湊命名並原子寫入；相同內容已存在時直接沿用"""
+    directory = Path(directory)
+    path = directory / f"{hashlib.sha256(data).hexdigest()[:16]}{suffix}"
+    if not path.exists():
+        atomic_write_bytes(path, data)
+        _prune(directory)
+    return path
+
+
+def _prune(directory: Path, max_files: int = MAX_PREVIEW_FILES) -> None:
+    files = sorted(
+        (f for f in directory.iterdir() if f.is_file() and not f.name.startswith(".")),
+        key=lambda f: f.stat().st_mtime,
+    )
+    for f in files[: max(0, len(files) - max_files)]:
+        try:
+            f.unlink()
+        except OSError as e:
+            logger.warning(f"Failed to remove old preview {f}: {e}")
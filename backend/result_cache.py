@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("ResultCache")
+
+GB = 1024 ** 3
+
+
+def content_key(data: bytes, config: Dict[str, Any]) -> str:
+    """以圖片內容與 pipeline 設定計算快取鍵（sha256）"""
+    h = hashlib.sha256()
+    h.update(data)
+    h.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def atomic_write_bytes(path: Path, data: bytes) -> None:
+    """先寫入同目錄的暫存檔再 os.replace，避免讀到寫一半的檔案"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_export(mesh, path: Path, file_type: Optional[str] = None) -> None:
+    """以原子寫入匯出 trimesh 物件"""
+    path = Path(path)
+    data = mesh.export(file_type=file_type or path.suffix[1:])
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    atomic_write_bytes(path, data)
+
+
+class ResultCache:
+    """
+    以內容雜湊為鍵的結果快取：相同圖片 + 相同設定直接回傳已生成的 GLB / OBJ。
+
+    - 索引保存在 outputs/.result_cache.json（原子寫入），重啟後仍有效
+    - 只管理經由快取登記的檔案，presets 不受影響
+    - 總大小超過 max_bytes 時依最近使用時間（LRU）刪除最舊的結果；單一結果超過 max_bytes 時不快取
+    - 命中只更新記憶體中的 last_used，索引在 store / 淘汰時或距上次寫入超過 save_interval 秒才寫回
+    """
+
+    def __init__(self, root: Path, max_bytes: Optional[int] = None, save_interval: float = 60.0):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.save_interval = save_interval
+        self.index_path = self.root / ".result_cache.json"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._load_index()
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def lookup(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        """命中時回傳當初的結果，檔案已不存在則視為未命中"""
+        entry_key = f"{kind}:{key}"
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and not all(Path(f).exists() for f in entry["files"]):
+                del self._entries[entry_key]
+                self._dirty = True
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                entry["last_used"] = time.time()
+                self._dirty = True
+            self._maybe_save_index()
+            return None if entry is None else dict(entry["result"])
+
+    def store(self, kind: str, key: str, result: Dict[str, Any], files: List[str]) -> None:
+        files = [str(f) for f in files if f and Path(f).exists()]
+        size = sum(Path(f).stat().st_size for f in files)
+        entry_key = f"{kind}:{key}"
+        if self.max_bytes is not None and size > self.max_bytes:
+            # 放不進快取的結果不登記，也不淘汰其他結果
+            logger.info(
+                f"Not caching {entry_key}: {size / 1024 ** 2:.1f} MB exceeds the cache size limit"
+            )
+            return
+        with self._lock:
+            self._entries[entry_key] = {
+                "result": result,
+                "files": files,
+                "size": size,
+                "last_used": time.time(),
+            }
+            self._evict(keep=entry_key)
+            self._save_index()
+
+    def refresh_file(self, path: Path) -> int:
+        """
+        引用此檔案的快取項目改為指向修改後的內容（例如用戶旋轉後的 GLB），之後相同的上傳
+        直接回傳修改後的結果，不會重新推論並覆蓋它：重新計算大小，已被刪除的檔案（例如無法
+        跟著旋轉的 splat）從項目與 result 中指向它的 URL 一併移除；回傳更新的項目數
+        """
+        path = Path(path).resolve()
+        with self._lock:
+            entries = [
+                e for e in self._entries.values()
+                if any(Path(f).resolve() == path for f in e["files"])
+            ]
+            for entry in entries:
+                removed = {Path(f).name for f in entry["files"] if not Path(f).exists()}
+                entry["files"] = [f for f in entry["files"] if Path(f).exists()]
+                entry["result"] = {
+                    k: v for k, v in entry["result"].items()
+                    if not (isinstance(v, str) and Path(v).name in removed)
+                }
+                entry["size"] = sum(Path(f).stat().st_size for f in entry["files"])
+            if entries:
+                self._save_index()
+            return len(entries)
+
+    def flush(self) -> None:
+        """將命中時更新的 last_used 寫回索引"""
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_gb": round(self._total_size() / GB, 3),
+                "max_gb": None if self.max_bytes is None else round(self.max_bytes / GB, 3),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _total_size(self) -> int:
+        return sum(e["size"] for e in self._entries.values())
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """依 LRU 淘汰至 max_bytes 以內；keep（剛存入的項目）不會被淘汰"""
+        if self.max_bytes is None:
+            return
+        for entry_key, entry in sorted(self._entries.items(), key=lambda kv: kv[1]["last_used"]):
+            if self._total_size() <= self.max_bytes:
+                break
+            if entry_key == keep:
+                continue
+            for f in entry["files"]:
+                try:
+                    os.remove(f)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Failed to evict {f}: {e}")
+            del self._entries[entry_key]
+            self.evictions += 1
+            logger.info(f"Evicted cached result {entry_key} ({entry['size'] / 1024 ** 2:.1f} MB)")
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self.index_path.exists():
+            return {}
+        try:
+            entries = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable result cache index: {e}")
+            return {}
+        return {k: e for k, e in entries.items() if all(Path(f).exists() for f in e["files"])}
+
+    def _maybe_save_index(self) -> None:
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self._save_index()
+
+    def _save_index(self) -> None:
+        atomic_write_bytes(self.index_path, json.dumps(self._entries).encode("utf-8"))
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+
+def _max_bytes_from_env() -> Optional[int]:
+    value = os.environ.get("RESULT_CACHE_MAX_GB", "10")
+    if value == "" or float(value) <= 0:
+        return None
+    return int(float(value) * GB)
+
+
+# 建立全域單例，管理 outputs/ 下的生成結果
+result_cache = ResultCache(Path(__file__).parent / "outputs", max_bytes=_max_bytes_from_env())
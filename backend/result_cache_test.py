@@ -0,0 +1,167 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+import trimesh
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import result_cache as result_cache_module
+from job_queue import JobManager
+from result_cache import ResultCache
+
+
+def _write(path, size):
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def _index(cache):
+    return json.loads(cache.index_path.read_text(encoding="utf-8"))
+
+
+def test_hit_returns_stored_result(tmp_path):
+    cache = ResultCache(tmp_path)
+    glb = _write(tmp_path / "a.glb", 10)
+    cache.store("cloth", "k", {"model_url": "/outputs/clothes/a.glb"}, [glb])
+    assert cache.lookup("cloth", "k") == {"model_url": "/outputs/clothes/a.glb"}
+    assert cache.lookup("cloth", "other") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_hit_with_missing_file_is_a_miss(tmp_path):
+    cache = ResultCache(tmp_path)
+    glb = _write(tmp_path / "a.glb", 10)
+    cache.store("cloth", "k", {}, [glb])
+    glb.unlink()
+    assert cache.lookup("cloth", "k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lookup_does_not_rewrite_the_index(tmp_path):
+    cache = ResultCache(tmp_path, save_interval=3600)
+    cache.store("cloth", "k", {}, [_write(tmp_path / "a.glb", 10)])
+    stored = _index(cache)["cloth:k"]["last_used"]
+
+    for _ in range(5):
+        cache.lookup("cloth", "k")
+    assert _index(cache)["cloth:k"]["last_used"] == stored
+
+    cache.flush()
+    assert _index(cache)["cloth:k"]["last_used"] > stored
+    # 重啟後沿用寫回的索引
+    assert ResultCache(tmp_path).lookup("cloth", "k") == {}
+
+
+def test_lookup_saves_after_interval(tmp_path):
+    cache = ResultCache(tmp_path, save_interval=0)
+    cache.store("cloth", "k", {}, [_write(tmp_path / "a.glb", 10)])
+    stored = _index(cache)["cloth:k"]["last_used"]
+    cache.lookup("cloth", "k")
+    assert _index(cache)["cloth:k"]["last_used"] > stored
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=25)
+    a = _write(tmp_path / "a.glb", 10)
+    b = _write(tmp_path / "b.glb", 10)
+    cache.store("cloth", "a", {}, [a])
+    cache.store("cloth", "b", {}, [b])
+    cache.lookup("cloth", "a")  # b 成為最久未使用
+
+    c = _write(tmp_path / "c.glb", 10)
+    cache.store("cloth", "c", {}, [c])
+    assert cache.lookup("cloth", "b") is None and not b.exists()
+    assert cache.lookup("cloth", "a") == {} and cache.lookup("cloth", "c") == {}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_just_stored_entry_is_not_evicted(tmp_path, monkeypatch):
+    # 時間解析度不足時所有項目的 last_used 相同，剛存入的項目仍需保留
+    monkeypatch.setattr(result_cache_module.time, "time", lambda: 1000.0)
+    cache = ResultCache(tmp_path, max_bytes=15)
+    cache.store("cloth", "old", {}, [_write(tmp_path / "old.glb", 10)])
+    new = _write(tmp_path / "new.glb", 10)
+    cache.store("cloth", "new", {}, [new])
+    assert new.exists() and cache.lookup("cloth", "new") == {}
+    assert cache.lookup("cloth", "old") is None
+
+
+def test_result_larger_than_cache_is_not_cached(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=15)
+    small = _write(tmp_path / "small.glb", 10)
+    cache.store("cloth", "small", {}, [small])
+
+    big = _write(tmp_path / "big.glb", 20)
+    cache.store("cloth", "big", {}, [big])
+    assert big.exists() and small.exists()
+    assert cache.lookup("cloth", "big") is None
+    assert cache.lookup("cloth", "small") == {}
+    assert cache.stats()["evictions"] == 0
+
+
+def test_refresh_file_points_the_entry_at_the_modified_files(tmp_path):
+    cache = ResultCache(tmp_path)
+    glb = _write(tmp_path / "a.glb", 10)
+    splat = _write(tmp_path / "a.csplat", 4)
+    result = {"model_url": "/outputs/clothes/a.glb", "splat_url": "/outputs/clothes/a.csplat"}
+    cache.store("cloth", "k", result, [glb, splat, _write(tmp_path / "a_thumb.jpg", 1)])
+
+    # GLB 被改寫、splat 被刪除：項目保留，只移除 splat 與它的 URL
+    _write(glb, 30)
+    splat.unlink()
+    assert cache.refresh_file(tmp_path / "." / "a.glb") == 1
+    assert cache.lookup("cloth", "k") == {"model_url": "/outputs/clothes/a.glb"}
+    entry = _index(cache)["cloth:k"]
+    assert entry["size"] == 31
+    assert [Path(f).name for f in entry["files"]] == ["a.glb", "a_thumb.jpg"]
+    assert cache.refresh_file(tmp_path / "other.glb") == 0
+
+
+def test_cache_hit_skips_inference(monkeypatch, tmp_path):
+    from routers import jobs
+
+    class NoInference(JobManager):
+        def submit(self, *args, **kwargs):
+            raise AssertionError("a cached result must not be submitted for inference")
+
+    cache = ResultCache(tmp_path)
+    glb = _write(tmp_path / "a.glb", 10)
+    cache.store("cloth", "k", {"model_url": "/outputs/clothes/a.glb"}, [glb])
+    monkeypatch.setattr(jobs, "result_cache", cache)
+    monkeypatch.setattr(jobs, "job_manager", NoInference())
+
+    job = jobs.submit_job("cloth", tmp_path / "upload.png", "k")
+    assert job.finished and job.result == {"model_url": "/outputs/clothes/a.glb"}
+
+
+@pytest.fixture
+def rotate_client(monkeypatch, tmp_path):
+    from routers import clothes
+
+    cache = ResultCache(tmp_path)
+    monkeypatch.setattr(clothes, "result_cache", cache)
+    monkeypatch.setattr(clothes.clothes_service, "output_dir", tmp_path)
+    app = FastAPI()
+    app.include_router(clothes.router)
+    with TestClient(app) as client:
+        yield client, cache
+
+
+def test_rotate_keeps_the_cached_result(rotate_client, tmp_path):
+    client, cache = rotate_client
+    glb = tmp_path / "shirt.glb"
+    trimesh.creation.box(extents=(1, 2, 3)).export(str(glb))
+    cache.store("cloth", "k", {"model_url": "/outputs/clothes/shirt.glb"}, [glb])
+
+    response = client.post("/clothes/rotate", json={"filename": "shirt.glb", "rotation_x": 1})
+    assert response.status_code == 200
+    # 快取項目指向旋轉後的模型
+    assert cache.lookup("cloth", "k") == {"model_url": "/outputs/clothes/shirt.glb"}
+    assert _index(cache)["cloth:k"]["size"] == glb.stat().st_size
+    assert not list(tmp_path.glob(".shirt.glb.*.tmp"))
+
+    rotated = trimesh.load(str(glb), force="mesh")
+    np.testing.assert_allclose(rotated.extents, (1, 3, 2), atol=1e-5)
+    assert abs(rotated.bounds[0, 1]) < 1e-5  # 接地
@@ -2,6 +2,8 @@ from fastapi import APIRouter, File, UploadFile, HTTPException
 import shutil
 from pathlib import Path
 from body_service import body_service
+from job_queue import wait_for_job, COMPLETE
+from routers.jobs import save_upload, submit_job
 
 # 檔案驗證設定
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
@@ -27,7 +29,7 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 @router.post("/body")
 async def upload_body(file: UploadFile = File(...)):
     """
-    接收前端上傳的人體照片，執行 AI 生成，並回傳 .obj 檔案的 URL
+    接收前端上傳的人體照片，執行 AI 生成，並回傳 .glb（或 .obj）檔案的 URL
     """
     # 驗證檔案類型
     if file.content_type not in ALLOWED_IMAGE_TYPES:
@@ -45,32 +47,32 @@ async def upload_body(file: UploadFile = File(...)):
             detail=f"檔案大小超過限制。最大允許 {MAX_FILE_SIZE_MB}MB，收到: {file_size / (1024 * 1024):.2f}MB"
         )
     
-    # 1. 儲存上傳的檔案（直接寫入已讀取的內容）
-    file_path = UPLOAD_DIR / file.filename
+    # 1. 儲存上傳的檔案（以內容雜湊命名，避免同名檔案互相覆蓋）
     try:
-        with file_path.open("wb") as buffer:
-            buffer.write(file_content)
+        file_path, cache_key = save_upload("body", file.filename, file_content)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save upload: {e}")
     
+    # 2. 提交到任務佇列（佇列已滿時回傳 429；相同圖片已生成過時直接回傳）
+    print(f"Start processing body reconstruction for: {file.filename}")
+    job = submit_job("body", file_path, cache_key)
+    
     try:
-        # 2. 呼叫 AI 服務進行處理
-        print(f"Start processing body reconstruction for: {file.filename}")
-        generated_files = body_service.process_image(str(file_path))
-        
-        if not generated_files:
-            raise HTTPException(status_code=500, detail="AI failed to generate 3D model")
+        # 3. 非阻塞地等待完成，避免佔用 event loop
+        await wait_for_job(job)
         
-        # 3. 轉換為可訪問的 URL 路徑
-        file_urls = [f"/outputs/bodies/{Path(f).name}" for f in generated_files]
+        if job.status != COMPLETE:
+            raise HTTPException(status_code=500, detail=job.error or "AI failed to generate 3D model")
         
         return {
             "status": "success",
-            "message": f"Successfully generated {len(generated_files)} 3D models",
-            "models": file_urls,
-            "count": len(generated_files)
+            "message": job.result["message"],
+            "models": job.result["models"],
+            "count": job.result["count"]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error during AI processing: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,13 +1,20 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import logging
-import json
-import threading
-import queue
 from pathlib import Path
 from clothes_service import clothes_service
-import cv2
+from job_queue import wait_for_job, COMPLETE
+from result_cache import atomic_export, result_cache
+from routers.jobs import (
+    save_upload,
+    inflight_job,
+    submit_job,
+    stream_job_response,
+    check_quality,
+    check_points,
+    submit_quality_upgrade,
+    upgrade_info,
+)
 import trimesh
 import numpy as np
 
@@ -15,9 +22,6 @@ logger = logging.getLogger("ClothesRouter")
 
 router = APIRouter(prefix="/clothes", tags=["clothes"])
 
-UPLOAD_DIR = Path("uploads/clothes")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 # 檔案驗證設定
 ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
 MAX_FILE_SIZE_MB = 10
@@ -32,13 +36,20 @@ class RotateRequest(BaseModel):
 
 @router.post("/upload/cloth")
 async def upload_cloth(
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    quality: str = Form(None),
+    points: str = Form(None)
 ):
     """
     上傳衣物照片並生成 3D 模型
     生成後需跳轉到旋轉調整頁面讓用戶手動調整方向
+    quality：preview / standard（預設）/ high；preview 先回傳快速結果，並在背景排入 standard 升級任務
+    points：可選的 SAM 提示點 JSON [[x, y, label], ...]（label 1 為衣物、0 為背景），自動 mask 不理想時
+        以不同的提示點重新生成（同一張圖片的 SAM image embedding 已快取）
     """
-    logger.info(f"Received clothing upload request: {file.filename}")
+    logger.info(f"Received clothing upload request: {file.filename} (quality={quality})")
+    quality = check_quality("cloth", quality)
+    points = check_points("cloth", points)
     
     # 驗證檔案類型
     if file.content_type not in ALLOWED_IMAGE_TYPES:
@@ -57,55 +68,55 @@ async def upload_cloth(
         )
     
     try:
-        # 1. 儲存上傳的檔案
-        file_path = UPLOAD_DIR / file.filename
-        logger.info(f"Saving upload to {file_path}")
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
+        # 1. 儲存上傳的檔案（以內容雜湊命名，避免同名檔案互相覆蓋）
+        file_path, cache_key = save_upload("cloth", file.filename, file_content, quality, points)
+        logger.info(f"Saved upload to {file_path}")
         
-        # 2. 呼叫 AI 服務進行處理（生成後用戶將手動調整旋轉）
-        logger.info(f"Calling clothes_service.process_image...")
-        result_path = clothes_service.process_image(str(file_path))
+        # 2. 提交到任務佇列並非阻塞地等待完成；相同圖片已生成過時直接回傳（生成後用戶將手動調整旋轉）
+        logger.info(f"Submitting cloth job for {file_path}...")
+        job = submit_job("cloth", file_path, cache_key, quality=quality, points=points)
+        upgrade_job = None
+        if quality == "preview":
+            upgrade_job = submit_quality_upgrade(file.filename, file_content, points=points)
+        await wait_for_job(job)
         
-        if not result_path:
-            logger.error("clothes_service returned None")
-            raise HTTPException(status_code=500, detail="Failed to generate 3D model")
+        if job.status != COMPLETE:
+            logger.error(f"Cloth job {job.id} failed: {job.error}")
+            return {"status": "error", "message": job.error or "Failed to generate 3D model"}
         
         # 3. 準備回傳結果
-        relative_model_path = f"/outputs/clothes/{Path(result_path).name}"
-        
-        # 嘗試生成縮圖 (Thumbnail)
-        thumb_filename = f"{Path(file_path).stem}_thumb.jpg"
-        thumb_path = clothes_service.output_dir / thumb_filename
-        try:
-            img = cv2.imread(str(file_path))
-            if img is not None:
-                cv2.imwrite(str(thumb_path), img)
-                logger.info(f"Thumbnail created at {thumb_path}")
-        except Exception as thumb_e:
-            logger.warning(f"Failed to create thumbnail: {thumb_e}")
-
-        logger.info(f"Successfully generated model: {relative_model_path}")
+        logger.info(f"Successfully generated model: {job.result['model_url']}")
         
         return {
             "status": "success",
-            "model_url": relative_model_path,
-            "thumbnail_url": f"/outputs/clothes/{thumb_filename}",
-            "message": "Clothing model generated successfully"
+            "model_url": job.result["model_url"],
+            "thumbnail_url": job.result["thumbnail_url"],
+            "splat_url": job.result.get("splat_url"),
+            "quality": job.result.get("quality", "standard"),
+            "message": "Clothing model generated successfully",
+            **upgrade_info(upgrade_job),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload_cloth: {e}", exc_info=True)
         return {"status": "error", "message": str(e)}
 
 @router.post("/upload/cloth/stream")
 async def upload_cloth_stream(
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    quality: str = Form(None),
+    points: str = Form(None)
 ):
     """
     上傳衣物照片並生成 3D 模型，使用 SSE 推送進度更新
     生成後需跳轉到旋轉調整頁面讓用戶手動調整方向
+    quality：同 /upload/cloth；preview 的升級任務 id 會附在第一個進度事件中
+    points：同 /upload/cloth
     """
-    logger.info(f"Received clothing upload request (with progress): {file.filename}")
+    logger.info(f"Received clothing upload request (with progress): {file.filename} (quality={quality})")
+    quality = check_quality("cloth", quality)
+    points = check_points("cloth", points)
     
     # 驗證檔案類型
     if file.content_type not in ALLOWED_IMAGE_TYPES:
@@ -123,124 +134,32 @@ async def upload_cloth_stream(
             detail=f"檔案大小超過限制。最大允許 {MAX_FILE_SIZE_MB}MB，收到: {file_size / (1024 * 1024):.2f}MB"
         )
     
-    async def generate_progress():
-        try:
-            # 1. 儲存上傳的檔案
-            file_path = UPLOAD_DIR / file.filename
-            logger.info(f"Saving upload to {file_path}")
-            
-            with open(file_path, "wb") as buffer:
-                buffer.write(file_content)
-            
-            # 生成縮圖 URL（用於顯示）
-            thumb_filename = f"{Path(file_path).stem}_thumb.jpg"
-            thumbnail_url = f"/outputs/clothes/{thumb_filename}"
-            
-            # 發送初始狀態（包含縮圖）
-            yield f"data: {json.dumps({'stage': 'upload', 'progress': 0, 'message': 'File uploaded', 'thumbnail_url': thumbnail_url})}\n\n"
-            
-            # 2. 定義進度回調（使用線程安全的隊列）
-            progress_queue = queue.Queue()
-            
-            def progress_callback(stage, progress, message):
-                try:
-                    progress_queue.put({
-                        'stage': stage,
-                        'progress': progress,
-                        'message': message
-                    })
-                except:
-                    pass
-            
-            # 3. 在後台線程執行處理（生成後用戶將手動調整旋轉）
-            def process_in_background():
-                try:
-                    result_path = clothes_service.process_image(str(file_path), progress_callback=progress_callback)
-                    
-                    if not result_path:
-                        progress_queue.put({
-                            'stage': 'error',
-                            'progress': 0,
-                            'message': 'Failed to generate 3D model'
-                        })
-                        return
-                    
-                    # 生成縮圖
-                    thumb_path = clothes_service.output_dir / thumb_filename
-                    try:
-                        img = cv2.imread(str(file_path))
-                        if img is not None:
-                            cv2.imwrite(str(thumb_path), img)
-                            logger.info(f"Thumbnail created at {thumb_path}")
-                    except Exception as thumb_e:
-                        logger.warning(f"Failed to create thumbnail: {thumb_e}")
-                    
-                    # 發送完成消息
-                    relative_model_path = f"/outputs/clothes/{Path(result_path).name}"
-                    progress_queue.put({
-                        'stage': 'complete',
-                        'progress': 100,
-                        'message': 'Success! 3D model generated.',
-                        'model_url': relative_model_path,
-                        'thumbnail_url': f"/outputs/clothes/{thumb_filename}"
-                    })
-                except Exception as e:
-                    logger.error(f"Error in process_in_background: {e}", exc_info=True)
-                    progress_queue.put({
-                        'stage': 'error',
-                        'progress': 0,
-                        'message': str(e)
-                    })
-            
-            # 啟動後台線程
-            thread = threading.Thread(target=process_in_background, daemon=True)
-            thread.start()
-            
-            # 4. 持續推送進度更新
-            while True:
-                try:
-                    # 等待進度更新（使用超時避免阻塞）
-                    try:
-                        progress_data = progress_queue.get(timeout=0.1)
-                        yield f"data: {json.dumps(progress_data)}\n\n"
-                        
-                        # 如果完成或出錯，結束
-                        if progress_data['stage'] in ['complete', 'error']:
-                            break
-                    except queue.Empty:
-                        # 檢查線程是否還在運行
-                        if not thread.is_alive():
-                            # 線程已結束，檢查是否有最後的消息
-                            try:
-                                while True:
-                                    progress_data = progress_queue.get_nowait()
-                                    yield f"data: {json.dumps(progress_data)}\n\n"
-                                    if progress_data['stage'] in ['complete', 'error']:
-                                        break
-                            except queue.Empty:
-                                pass
-                            break
-                        continue
-                except Exception as e:
-                    logger.error(f"Error in progress loop: {e}")
-                    break
-            
-            # 等待線程完成
-            thread.join(timeout=1)
-            
-        except Exception as e:
-            logger.error(f"Error in upload_cloth_stream: {e}", exc_info=True)
-            yield f"data: {json.dumps({'stage': 'error', 'progress': 0, 'message': str(e)})}\n\n"
+    # 1. 儲存上傳的檔案（以內容雜湊命名，避免同名檔案互相覆蓋）
+    file_path, cache_key = save_upload("cloth", file.filename, file_content, quality, points)
+    logger.info(f"Saved upload to {file_path}")
     
-    return StreamingResponse(
-        generate_progress(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    # 2. 提交到任務佇列（佇列已滿時回傳 429；快取命中時立即完成），並以 SSE 推送該任務的進度
+    joined = inflight_job("cloth", cache_key)
+    job = submit_job("cloth", file_path, cache_key, quality=quality, points=points)
+    upgrade_job = None
+    if quality == "preview":
+        upgrade_job = submit_quality_upgrade(file.filename, file_content, points=points)
+    if job.finished:
+        return stream_job_response(job)
+    thumb_filename = f"{Path(file_path).stem}_thumb.jpg"
+    upload_event = {
+        'stage': 'upload',
+        'progress': 0,
+        'message': 'File uploaded',
+        'thumbnail_url': f"/outputs/clothes/{thumb_filename}",
+        'job_id': job.id,
+        **upgrade_info(upgrade_job),
+    }
+    if job is joined:
+        # 共用進行中的任務：上傳事件只送給這個請求，避免其他訂閱者的進度被重設為 0
+        return stream_job_response(job, initial_events=[upload_event])
+    job.emit(upload_event)
+    return stream_job_response(job)
 
 @router.get("/")
 async def list_clothes():
@@ -256,9 +175,11 @@ async def list_clothes():
         return {"status": "error", "message": str(e)}
 
 @router.post("/rotate")
-async def rotate_model(request: RotateRequest):
+def rotate_model(request: RotateRequest):
     """
     旋轉已生成的 3D 模型並保存
+    網格的載入 / 匯出與 splat 的解碼 / 重新編碼都是同步的 CPU 工作（每 1M 個 Gaussian 約 1.3 秒），
+    因此以一般函式定義，由 FastAPI 在執行緒池中執行，不阻塞事件迴圈
     
     Args:
         filename: GLB 檔案名稱
@@ -286,23 +207,27 @@ async def rotate_model(request: RotateRequest):
             else:
                 raise HTTPException(status_code=400, detail="No valid mesh found in the model")
         
-        # 應用旋轉（每次 90°）
+        # 應用旋轉（每次 90°）；transform 累積套用到模型的變換，供 splat 預覽使用
+        transform = np.eye(4)
         if request.rotation_x != 0:
             angle = request.rotation_x * (np.pi / 2)
             rotation = trimesh.transformations.rotation_matrix(angle, [1, 0, 0])
             mesh.apply_transform(rotation)
+            transform = rotation @ transform
             logger.info(f"Applied X rotation: {request.rotation_x * 90}°")
         
         if request.rotation_y != 0:
             angle = request.rotation_y * (np.pi / 2)
             rotation = trimesh.transformations.rotation_matrix(angle, [0, 1, 0])
             mesh.apply_transform(rotation)
+            transform = rotation @ transform
             logger.info(f"Applied Y rotation: {request.rotation_y * 90}°")
         
         if request.rotation_z != 0:
             angle = request.rotation_z * (np.pi / 2)
             rotation = trimesh.transformations.rotation_matrix(angle, [0, 0, 1])
             mesh.apply_transform(rotation)
+            transform = rotation @ transform
             logger.info(f"Applied Z rotation: {request.rotation_z * 90}°")
         
         # --- 自動接地與置中優化 ---
@@ -320,17 +245,26 @@ async def rotate_model(request: RotateRequest):
         ]
         
         mesh.apply_translation(translation)
+        transform[:3, 3] += translation
         logger.info(f"Applied auto-grounding and centering. Translation: {translation}")
         
-        # 保存回原檔案
-        mesh.export(str(model_path))
+        # 原子寫回原檔案；壓縮 splat 預覽套用相同的旋轉與接地，與 GLB 保持對齊
+        atomic_export(mesh, model_path)
+        splat_path = clothes_service.transform_splat(model_path, transform)
+        # 結果快取的項目改為指向旋轉後的模型：之後相同的上傳直接回傳用戶調整過的方向，
+        # 不會重新生成並覆蓋同一路徑上的 GLB、splat 與縮圖
+        if result_cache.refresh_file(model_path):
+            logger.info(f"Updated cached result for {request.filename}")
         logger.info(f"Model saved to {model_path}")
         
-        return {
+        response = {
             "status": "success",
             "message": "Model rotated and saved successfully",
             "model_url": f"/outputs/clothes/{request.filename}"
         }
+        if splat_path is not None:
+            response["splat_url"] = f"/outputs/clothes/{splat_path.name}"
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,297 @@
+import hashlib
+import importlib.util
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+import trimesh
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import clothes_service as clothes_service_module
+from clothes_service import clothes_service
+from conftest import STUB_SPHERE, STUB_VOXELS, png_bytes
+from job_queue import COMPLETE, JobManager
+from preview_artifacts import VOXEL_RESOLUTION, decode_voxels
+from result_cache import ResultCache, atomic_export
+from routers import clothes, jobs
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(clothes_service, "output_dir", tmp_path)
+    app = FastAPI()
+    app.include_router(clothes.router)
+    return TestClient(app)
+
+
+def _garment(tmp_path, seed=0):
+    """不對稱的凸包網格（90° 旋轉後不會與自身重合），已接地置中後輸出為 GLB"""
+    points = np.random.default_rng(seed).random((60, 3)) * [0.6, 0.9, 0.3]
+    mesh = trimesh.convex.convex_hull(points)
+    mesh.apply_translation(clothes_service._ground_translation(mesh.bounds, mesh.centroid))
+    glb_path = tmp_path / "shirt_cloth.glb"
+    atomic_export(mesh, glb_path)
+    return glb_path, trimesh.load(str(glb_path), force="mesh")
+
+
+def _rotate(client, **rotation):
+    response = client.post("/clothes/rotate", json={"filename": "shirt_cloth.glb", **rotation})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rotate_transforms_the_splat_with_the_glb(client, tmp_path, monkeypatch):
+    pytest.importorskip("kaolin")  # representations 套件需要 kaolin
+    monkeypatch.setenv("LIDRA_SKIP_INIT", "true")
+    if importlib.util.find_spec("spconv") is None:
+        monkeypatch.setenv("SPARSE_BACKEND", "torch")
+    from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.compressed import (
+        decode_compressed_splat,
+        encode_compressed_splat,
+    )
+
+    glb_path, mesh = _garment(tmp_path)
+    # splat 點放在 GLB 頂點上，方向為單位四元數
+    n = len(mesh.vertices)
+    splat_path = clothes_service.splat_path_for(glb_path)
+    splat_path.write_bytes(
+        encode_compressed_splat(
+            mesh.vertices.astype(np.float32),
+            np.full((n, 3), 0.5),
+            np.ones(n),
+            np.full((n, 3), 0.01),
+            np.tile([1.0, 0.0, 0.0, 0.0], (n, 1)),
+        )
+    )
+
+    result = _rotate(client, rotation_x=1, rotation_z=-1)
+    assert result["splat_url"] == "/outputs/clothes/shirt_cloth.csplat"
+
+    rotated = trimesh.load(str(glb_path), force="mesh")
+    splat = decode_compressed_splat(splat_path.read_bytes())
+    # 每個 splat 點都落在旋轉並重新接地後的 GLB 頂點上（誤差在量化範圍內）
+    distances = np.linalg.norm(splat["xyz"][:, None] - rotated.vertices[None], axis=-1).min(axis=1)
+    assert distances.max() < 2e-3
+    # 方向跟著旋轉：R = Rz(-90°) @ Rx(90°)
+    expected = (
+        trimesh.transformations.rotation_matrix(-np.pi / 2, [0, 0, 1])
+        @ trimesh.transformations.rotation_matrix(np.pi / 2, [1, 0, 0])
+    )
+    for q in splat["rotations"]:
+        np.testing.assert_allclose(
+            trimesh.transformations.quaternion_matrix(q)[:3, :3], expected[:3, :3], atol=5e-3
+        )
+
+
+def test_rotate_removes_a_splat_it_cannot_transform(client, tmp_path):
+    glb_path, mesh = _garment(tmp_path)
+    splat_path = clothes_service.splat_path_for(glb_path)
+    splat_path.write_bytes(b"not a splat")
+
+    result = _rotate(client, rotation_y=1)
+    assert "splat_url" not in result
+    assert not splat_path.exists()
+    rotated = trimesh.load(str(glb_path), force="mesh")
+    assert rotated.bounds[0, 1] == pytest.approx(0, abs=1e-6)
+    assert not np.allclose(rotated.bounds, mesh.bounds)
+
+
+def test_rotate_without_splat(client, tmp_path):
+    _garment(tmp_path)
+    result = _rotate(client, rotation_x=2)
+    assert "splat_url" not in result
+    assert not (tmp_path / "shirt_cloth.csplat").exists()
+
+
+def test_rotate_does_not_block_the_event_loop(tmp_path, monkeypatch):
+    """splat 轉換進行中，其他請求仍能完成"""
+    monkeypatch.setattr(clothes_service, "output_dir", tmp_path)
+    _garment(tmp_path)
+    entered, release, released = threading.Event(), threading.Event(), []
+
+    def blocking_transform_splat(glb_path, transform):
+        entered.set()
+        released.append(release.wait(timeout=5))
+
+    monkeypatch.setattr(clothes_service, "transform_splat", blocking_transform_splat)
+    app = FastAPI()
+    app.include_router(clothes.router)
+    with TestClient(app) as client:
+        rotation = threading.Thread(target=_rotate, args=(client,), kwargs={"rotation_y": 1})
+        rotation.start()
+        assert entered.wait(timeout=5)
+        assert client.get("/clothes/").status_code == 200
+        release.set()
+        rotation.join()
+    assert released == [True]
+
+
+@pytest.fixture
+def stream_client(stub_clothes_service, tmp_path, monkeypatch):
+    """上傳 -> 任務佇列 -> process_cloth_job -> clothes_service（假 pipeline）的完整流程"""
+    manager = JobManager()
+    manager.register("cloth", jobs.process_cloth_job, concurrency=1, max_queue=4)
+    monkeypatch.setattr(jobs, "job_manager", manager)
+    cache = ResultCache(tmp_path / "cache")
+    monkeypatch.setattr(jobs, "result_cache", cache)
+    monkeypatch.setattr(clothes, "result_cache", cache)
+    monkeypatch.setattr(jobs, "UPLOAD_DIRS", {"cloth": tmp_path / "uploads", "body": tmp_path / "uploads"})
+    monkeypatch.setattr(jobs, "_inflight", {})
+    app = FastAPI()
+    app.include_router(jobs.router)
+    app.include_router(clothes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def _stream_upload(client, content):
+    response = client.post(
+        "/clothes/upload/cloth/stream", files={"file": ("shirt.png", content, "image/png")}
+    )
+    assert response.status_code == 200
+    return [
+        json.loads(line[len("data: "):])
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
+
+
+def _preview_file(tmp_path, event):
+    prefix = "/outputs/clothes/previews/"
+    assert event["preview_url"].startswith(prefix)
+    path = tmp_path / "previews" / event["preview_url"][len(prefix):]
+    data = path.read_bytes()
+    # 以內容雜湊命名
+    assert path.stem == hashlib.sha256(data).hexdigest()[:16]
+    return path, data
+
+
+def test_stream_pushes_preview_artifacts(stream_client, tmp_path):
+    events = _stream_upload(stream_client, png_bytes())
+    stages = [e["stage"] for e in events]
+    assert stages[-1] == COMPLETE
+    previews = [e for e in events if e["stage"] == "preview"]
+    # 體素 -> 網格預覽，都在最終 GLB（complete 事件）之前
+    assert [e["preview"] for e in previews] == ["voxels", "mesh"]
+    assert [e["progress"] for e in previews] == [45, 60]
+    assert stages.index("preview") < stages.index(COMPLETE)
+
+    path, data = _preview_file(tmp_path, previews[0])
+    assert path.suffix == ".voxp"
+    np.testing.assert_array_equal(
+        decode_voxels(data), STUB_VOXELS[:, 1:].astype(np.float32) / VOXEL_RESOLUTION - 0.5
+    )
+
+    path, data = _preview_file(tmp_path, previews[1])
+    assert path.suffix == ".glb"
+    mesh = trimesh.load(str(path), force="mesh", process=False)
+    assert len(mesh.faces) == len(STUB_SPHERE.faces)
+    # 與最終 GLB 相同的接地：X、Z 置中，底部對齊 Y = 0
+    assert mesh.bounds[0, 1] == pytest.approx(0, abs=1e-6)
+    np.testing.assert_allclose(mesh.vertices.mean(axis=0)[[0, 2]], 0, atol=1e-6)
+    colors = mesh.visual.vertex_colors[:, :3] / 255
+    np.testing.assert_allclose(colors, (STUB_SPHERE.vertex_normals + 1) / 2, atol=1 / 255)
+
+    # 另一張圖片產生相同的預覽內容：沿用同一個檔案
+    again = [e for e in _stream_upload(stream_client, png_bytes(color=(20, 30, 200))) if e["stage"] == "preview"]
+    assert [e["preview_url"] for e in again] == [e["preview_url"] for e in previews]
+    assert len(list((tmp_path / "previews").iterdir())) == 2
+
+
+def test_previews_can_be_turned_off(stream_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(clothes_service_module, "STREAM_PREVIEWS", False)
+    events = _stream_upload(stream_client, png_bytes())
+    assert events[-1]["stage"] == COMPLETE
+    assert "preview" not in [e["stage"] for e in events]
+    assert not (tmp_path / "previews").exists()
+
+
+def test_reupload_after_rotate_serves_the_rotated_model(stream_client, stub_clothes_service, tmp_path):
+    _, pipeline = stub_clothes_service
+
+    def upload():
+        response = stream_client.post(
+            "/clothes/upload/cloth", files={"file": ("shirt.png", png_bytes(), "image/png")}
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    first = upload()
+    glb_path = tmp_path / first["model_url"].rsplit("/", 1)[1]
+    rotated = stream_client.post("/clothes/rotate", json={"filename": glb_path.name, "rotation_z": 1})
+    assert rotated.status_code == 200
+    rotated_glb = glb_path.read_bytes()
+
+    # 相同的照片再次上傳：回傳旋轉後的模型，不重新推論、不覆蓋
+    again = upload()
+    assert again["model_url"] == first["model_url"]
+    assert len(pipeline.calls) == 1
+    assert glb_path.read_bytes() == rotated_glb
+
+
+def test_listing_skips_the_preview_of_an_upgraded_garment(stream_client, stub_clothes_service):
+    response = stream_client.post(
+        "/clothes/upload/cloth",
+        data={"quality": "preview"},
+        files={"file": ("shirt.png", png_bytes(), "image/png")},
+    )
+    preview = response.json()
+    assert preview["model_url"].endswith("_preview.glb")
+    upgrade = jobs.job_manager.get(preview["upgrade_job_id"])
+    for _ in range(500):
+        if upgrade.finished:
+            break
+        time.sleep(0.01)
+    assert upgrade.status == COMPLETE
+
+    # 清單中只有升級後的 standard 結果，preview 的 GLB 仍可由其 URL 取得
+    listed = stream_client.get("/clothes/").json()["clothes"]
+    assert [cloth["url"] for cloth in listed] == [upgrade.result["model_url"]]
+    assert upgrade.result["model_url"].endswith("_cloth.glb")
+
+
+def _upload(client, **data):
+    return client.post("/clothes/upload/cloth", data=data, files={"file": ("shirt.png", png_bytes(), "image/png")})
+
+
+def test_upload_with_mask_points_re_prompts_sam(stream_client, stub_clothes_service, monkeypatch):
+    service, pipeline = stub_clothes_service
+    prompts = []
+
+    def auto_mask(image, point_coords=None, point_labels=None):
+        prompts.append((point_coords, point_labels))
+        return np.ones(image.shape[:2], dtype=bool)
+
+    monkeypatch.setattr(service, "get_auto_mask", auto_mask)
+    default = _upload(stream_client).json()
+    points = json.dumps([[32, 24, 1], [2, 2, 0]])
+    retried = _upload(stream_client, points=points).json()
+
+    # 換提示點是另一個結果，不由預設 mask 的快取回傳
+    assert retried["model_url"] != default["model_url"]
+    assert len(pipeline.calls) == 2
+    assert prompts[0] == (None, None)
+    np.testing.assert_array_equal(prompts[1][0], [[32, 24], [2, 2]])
+    np.testing.assert_array_equal(prompts[1][1], [1, 0])
+    # 相同的提示點命中結果快取
+    assert _upload(stream_client, points=points).json()["model_url"] == retried["model_url"]
+    assert len(pipeline.calls) == 2
+
+
+@pytest.mark.parametrize(
+    "points", ["not json", "[]", "[[1, 2]]", "[[1, 2, 0]]", "[[1, 2, 2]]", "[[1, true, 1]]", json.dumps([[1, 2, 1]] * 33)]
+)
+def test_invalid_mask_points_are_rejected(stream_client, stub_clothes_service, points):
+    _, pipeline = stub_clothes_service
+    assert _upload(stream_client, points=points).status_code == 400
+    assert pipeline.calls == []
+
+
+def test_mask_points_are_cloth_only(stream_client):
+    response = stream_client.post(
+        "/jobs", data={"kind": "body", "points": "[[1, 2, 1]]"}, files={"file": ("me.png", png_bytes(), "image/png")}
+    )
+    assert response.status_code == 400
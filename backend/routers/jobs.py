@@ -0,0 +1,324 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form
+from fastapi.responses import StreamingResponse
+import json
+import logging
+import os
+import cv2
+from pathlib import Path
+from body_service import body_service
+from clothes_service import clothes_service, DEFAULT_QUALITY
+from job_queue import job_manager, QueueFullError, stream_job_events
+from result_cache import result_cache, content_key, atomic_write_bytes
+
+logger = logging.getLogger("JobsRouter")
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+BASE_DIR = Path(__file__).parent.parent
+UPLOAD_DIRS = {
+    "cloth": BASE_DIR / "uploads" / "clothes",
+    "body": BASE_DIR / "uploads",
+}
+for _upload_dir in UPLOAD_DIRS.values():
+    _upload_dir.mkdir(parents=True, exist_ok=True)
+
+# 檔案驗證設定
+ALLOWED_IMAGE_TYPES = ['image/jpeg', 'image/jpg', 'image/png', 'image/webp']
+MAX_FILE_SIZE_MB = 10
+MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+MAX_MASK_POINTS = 32
+
+SERVICES = {
+    "cloth": clothes_service,
+    "body": body_service,
+}
+
+# 執行中或排隊中、且內容相同的任務（避免同一張圖片同時重跑）
+_inflight = {}
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no"
+}
+
+
+def save_upload(kind: str, filename: str, file_content: bytes, quality: str = None, points=None):
+    """
+    以內容雜湊命名並原子寫入上傳檔案，回傳 (file_path, cache_key)
+    同名但內容不同的圖片不會互相覆蓋，輸出檔名（沿用上傳檔名）也因此唯一
+    quality / points 只適用於 cloth；不同品質等級或提示點的鍵與檔名不同，輸出不會互相覆蓋
+    """
+    options = {}
+    if quality:
+        options["quality"] = quality
+    if points:
+        options["points"] = points
+    config = SERVICES[kind].cache_config(**options)
+    cache_key = content_key(file_content, config)
+    name = Path(filename or "upload").name
+    file_path = UPLOAD_DIRS[kind] / f"{Path(name).stem}_{cache_key[:12]}{Path(name).suffix}"
+    atomic_write_bytes(file_path, file_content)
+    return file_path, cache_key
+
+
+def process_cloth_job(payload, progress_callback):
+    """衣物重建任務：生成 GLB 並建立縮圖"""
+    file_path = payload["file_path"]
+    quality = payload.get("quality") or DEFAULT_QUALITY
+    result_path = clothes_service.process_image(
+        file_path, progress_callback=progress_callback, quality=quality, points=payload.get("points")
+    )
+    if not result_path:
+        raise RuntimeError("Failed to generate 3D model")
+
+    thumb_filename = f"{Path(file_path).stem}_thumb.jpg"
+    thumb_path = clothes_service.output_dir / thumb_filename
+    try:
+        img = cv2.imread(str(file_path))
+        if img is not None:
+            cv2.imwrite(str(thumb_path), img)
+            logger.info(f"Thumbnail created at {thumb_path}")
+    except Exception as thumb_e:
+        logger.warning(f"Failed to create thumbnail: {thumb_e}")
+
+    result = {
+        "message": "Success! 3D model generated.",
+        "model_url": f"/outputs/clothes/{Path(result_path).name}",
+        "thumbnail_url": f"/outputs/clothes/{thumb_filename}",
+        "quality": quality,
+    }
+    files = [result_path, thumb_path]
+    splat_path = clothes_service.splat_path_for(result_path)
+    if splat_path.exists():
+        result["splat_url"] = f"/outputs/clothes/{splat_path.name}"
+        files.append(splat_path)
+    result_cache.store("cloth", payload["cache_key"], result, files)
+    return result
+
+
+def process_body_job(payload, progress_callback):
+    """人體重建任務：生成 .glb（或 .obj）"""
+    progress_callback("inference", 10, "Running body reconstruction...")
+    generated_files = body_service.process_image(payload["file_path"])
+    if not generated_files:
+        raise RuntimeError("AI failed to generate 3D model")
+    result = {
+        "message": f"Successfully generated {len(generated_files)} 3D models",
+        "models": [f"/outputs/bodies/{Path(f).name}" for f in generated_files],
+        "count": len(generated_files),
+    }
+    result_cache.store("body", payload["cache_key"], result, generated_files)
+    return result
+
+
+# 每種模型類型的並行數與佇列長度上限（可由環境變數調整）
+job_manager.register(
+    "cloth",
+    process_cloth_job,
+    concurrency=int(os.environ.get("JOB_CONCURRENCY_CLOTH", 1)),
+    max_queue=int(os.environ.get("JOB_MAX_QUEUE_CLOTH", 8)),
+)
+job_manager.register(
+    "body",
+    process_body_job,
+    concurrency=int(os.environ.get("JOB_CONCURRENCY_BODY", 1)),
+    max_queue=int(os.environ.get("JOB_MAX_QUEUE_BODY", 8)),
+)
+
+
+def check_quality(kind: str, quality: str = None):
+    """驗證品質等級（僅 cloth 支援），無效時回傳 HTTP 400"""
+    if quality is None:
+        return None
+    if kind != "cloth":
+        raise HTTPException(status_code=400, detail=f"Quality tiers are not supported for {kind} jobs")
+    try:
+        return clothes_service.check_quality(quality)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def check_points(kind: str, points: str = None):
+    """
+    驗證自訂的 SAM 提示點（僅 cloth 支援），用於以不同的提示點重新生成 mask：
+    JSON 陣列 [[x, y, label], ...]，x / y 為上傳圖片的像素座標，label 1 為衣物、0 為背景，
+    至少一個衣物點；無效時回傳 HTTP 400
+    """
+    if points is None or points == "":
+        return None
+    if kind != "cloth":
+        raise HTTPException(status_code=400, detail=f"Mask points are not supported for {kind} jobs")
+    try:
+        parsed = json.loads(points)
+    except json.JSONDecodeError:
+        parsed = None
+    valid = (
+        isinstance(parsed, list)
+        and 0 < len(parsed) <= MAX_MASK_POINTS
+        and all(
+            isinstance(p, list) and len(p) == 3
+            and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in p)
+            and p[2] in (0, 1)
+            for p in parsed
+        )
+        and any(p[2] == 1 for p in parsed)
+    )
+    if not valid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"points 必須是 1 到 {MAX_MASK_POINTS} 個 [x, y, label] 的 JSON 陣列（label 1 為衣物、0 為背景，至少一個衣物點）",
+        )
+    return [[float(x), float(y), int(label)] for x, y, label in parsed]
+
+
+def inflight_job(kind: str, cache_key: str):
+    """相同內容且尚未結束的任務（沒有則為 None）"""
+    job = _inflight.get((kind, cache_key))
+    if job is None or job.finished:
+        return None
+    return job
+
+
+def submit_job(kind: str, file_path: Path, cache_key: str, priority: int = 0, quality: str = None, points=None):
+    """
+    提交任務；相同內容與設定的結果已存在時直接回傳已完成的任務（不執行推論），
+    相同內容的任務正在執行時共用該任務；佇列已滿時回傳 HTTP 429（附目前佇列長度與可排入的位置）
+    """
+    payload = {"file_path": str(file_path), "cache_key": cache_key}
+    if quality is not None:
+        payload["quality"] = quality
+    if points:
+        payload["points"] = points
+    cached = result_cache.lookup(kind, cache_key)
+    if cached is not None:
+        logger.info(f"Result cache hit for {kind} {cache_key[:12]}")
+        return job_manager.add_completed(kind, payload, cached)
+
+    inflight = inflight_job(kind, cache_key)
+    if inflight is not None:
+        logger.info(f"Joining in-flight {kind} job {inflight.id}")
+        return inflight
+
+    try:
+        job = job_manager.submit(kind, payload, priority=priority)
+        _inflight[(kind, cache_key)] = job
+        # 清除已結束的任務，避免無限增長
+        for k in [k for k, j in _inflight.items() if j.finished]:
+            _inflight.pop(k, None)
+        return job
+    except QueueFullError as e:
+        logger.warning(str(e))
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "message": "伺服器忙碌中，請稍後再試",
+                "kind": e.kind,
+                "queue_length": e.queue_length,
+                "queue_position": e.queue_length + 1,
+                "max_queue": e.max_queue,
+            },
+            headers={"Retry-After": "30"},
+        )
+
+
+def submit_quality_upgrade(filename: str, file_content: bytes, priority: int = 1, points=None):
+    """
+    preview 任務之後在背景以 standard 品質（相同的提示點）重新生成，完成後由前端換上正式的 GLB
+    排在 preview 之後（priority 較大）；佇列已滿時略過，preview 結果仍然有效
+    """
+    file_path, cache_key = save_upload("cloth", filename, file_content, DEFAULT_QUALITY, points)
+    try:
+        return submit_job("cloth", file_path, cache_key, priority=priority, quality=DEFAULT_QUALITY, points=points)
+    except HTTPException:
+        logger.warning("Queue full, skipping background quality upgrade")
+        return None
+
+
+def upgrade_info(upgrade_job):
+    """背景升級任務的回傳欄位（沒有升級任務時為空）"""
+    if upgrade_job is None:
+        return {}
+    return {
+        "upgrade_job_id": upgrade_job.id,
+        "upgrade_status_url": f"/jobs/{upgrade_job.id}",
+        "upgrade_events_url": f"/jobs/{upgrade_job.id}/events",
+    }
+
+
+def stream_job_response(job, initial_events=None):
+    """initial_events 只送給這個回應，不寫入任務（不影響其他訂閱者看到的進度）"""
+    return StreamingResponse(
+        stream_job_events(job, initial_events=initial_events),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+
+@router.post("", status_code=202)
+async def create_job(
+    kind: str = Form(...),
+    priority: int = Form(0),
+    quality: str = Form(None),
+    points: str = Form(None),
+    file: UploadFile = File(...)
+):
+    """
+    提交重建任務（kind: cloth / body），立即回傳 job_id
+    priority 數值越小越先執行；用戶端的 priority 最小為 0（負值視為 0），不能插隊到其他上傳之前
+    quality（僅 cloth）：preview / standard / high；preview 會另外排入 standard 的背景升級任務
+    points（僅 cloth）：自訂的 SAM 提示點，見 check_points
+    """
+    if kind not in UPLOAD_DIRS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+    quality = check_quality(kind, quality)
+    points = check_points(kind, points)
+
+    if file.content_type not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支援的檔案類型。請上傳圖片檔案 (JPG, PNG, WEBP)。收到: {file.content_type}"
+        )
+
+    file_content = await file.read()
+    file_size = len(file_content)
+    if file_size > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"檔案大小超過限制。最大允許 {MAX_FILE_SIZE_MB}MB，收到: {file_size / (1024 * 1024):.2f}MB"
+        )
+
+    priority = max(priority, 0)
+    file_path, cache_key = save_upload(kind, file.filename, file_content, quality, points)
+    job = submit_job(kind, file_path, cache_key, priority=priority, quality=quality, points=points)
+    upgrade_job = None
+    if quality == "preview":
+        upgrade_job = submit_quality_upgrade(file.filename, file_content, priority=priority + 1, points=points)
+    return {
+        "status": job.status,
+        "job_id": job.id,
+        "queue_position": job_manager.queue_position(job),
+        "status_url": f"/jobs/{job.id}",
+        "events_url": f"/jobs/{job.id}/events",
+        **upgrade_info(upgrade_job),
+    }
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """查詢任務狀態與結果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    info = job.to_dict()
+    info["queue_position"] = job_manager.queue_position(job)
+    return info
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """以 SSE 推送任務進度（沿用服務的 progress_callback 階段）"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return stream_job_response(job)
@@ -96,6 +96,10 @@ class MHRHead(nn.Module):
         self.keypoint_mapping = nn.Parameter(
             torch.zeros(308, 18439 + 127), requires_grad=False
         )
+        # Gather-sum form of keypoint_mapping, rebuilt lazily whenever the
+        # dense parameter is loaded, modified or moved (see _sparse_keypoint_mapping)
+        self._keypoint_gather = None
+        self._keypoint_gather_key = None
         # Some special buffers for the hand-version
         self.right_wrist_coords = nn.Parameter(torch.zeros(3), requires_grad=False)
         self.root_coords = nn.Parameter(torch.zeros(3), requires_grad=False)
@@ -166,6 +170,49 @@ class MHRHead(nn.Module):
 
         return full_pose_params  # B x 207
 
+    def _sparse_keypoint_mapping(self):
+        """
+        Row-wise top-k (index, weight) form of the mostly-zero keypoint_mapping.
+
+        Each of the 308 keypoints only depends on a handful of vertices/joints,
+        so the regression becomes a gather of K points plus a weighted sum
+        instead of a dense 308 x (18439 + 127) matmul. Rows with fewer than K
+        non-zeros are padded with zero weights. Returns None when the mapping
+        is too dense for this to pay off.
+        """
+        mapping = self.keypoint_mapping
+        key = (mapping.data_ptr(), mapping._version, mapping.device, mapping.dtype)
+        if self._keypoint_gather_key != key:
+            nnz_per_row = (mapping != 0).sum(dim=1)
+            k = max(int(nnz_per_row.max().item()), 1)
+            if k * 4 > mapping.shape[1]:
+                self._keypoint_gather = None
+            else:
+                weights, indices = mapping.abs().topk(k, dim=1)
+                weights = torch.gather(mapping, 1, indices)
+                self._keypoint_gather = (indices, weights)
+            self._keypoint_gather_key = key
+        return self._keypoint_gather
+
+    def regress_keypoints(self, model_vert_joints):
+        """
+        Sapiens 308 keypoints from B x (num_verts + 127) x 3 vertices and joints.
+        """
+        gather = self._sparse_keypoint_mapping()
+        if gather is None:
+            return (
+                (
+                    self.keypoint_mapping
+                    @ model_vert_joints.permute(1, 0, 2).flatten(1, 2)
+                )
+                .reshape(-1, model_vert_joints.shape[0], 3)
+                .permute(1, 0, 2)
+            )
+        indices, weights = gather
+        # B x 308 x K x 3 gathered points, weighted and summed over K
+        points = model_vert_joints[:, indices]
+        return (points * weights[None, :, :, None].to(points.dtype)).sum(dim=2)
+
     def mhr_forward(
         self,
         global_trans,
@@ -267,14 +314,7 @@ class MHRHead(nn.Module):
             model_vert_joints = torch.cat(
                 [curr_skinned_verts, curr_joint_coords], dim=1
             )  # B x (num_verts + 127) x 3
-            model_keypoints_pred = (
-                (
-                    self.keypoint_mapping
-                    @ model_vert_joints.permute(1, 0, 2).flatten(1, 2)
-                )
-                .reshape(-1, model_vert_joints.shape[0], 3)
-                .permute(1, 0, 2)
-            )
+            model_keypoints_pred = self.regress_keypoints(model_vert_joints)
 
             if self.enable_hand_model:
                 # Zero out everything except for the right hand
@@ -0,0 +1,122 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Sparse gather-sum keypoint regression against the dense keypoint_mapping matmul
+it replaced. Run the benchmark from the backend folder, where it is deselected by
+default:
+
+    python -m pytest -s -m benchmark sam-3d-body/sam_3d_body/models/heads/mhr_head_test.py
+"""
+import time
+
+import pytest
+import torch
+import torch.nn as nn
+
+from sam_3d_body.models.heads.mhr_head import MHRHead
+
+NUM_KEYPOINTS = 308
+NUM_POINTS = 18439 + 127
+
+
+def _mapping(max_nnz=8, seed=0):
+    """Sapiens-like mapping: each keypoint is a convex combination of a few vertices/joints"""
+    generator = torch.Generator().manual_seed(seed)
+    mapping = torch.zeros(NUM_KEYPOINTS, NUM_POINTS)
+    for row in mapping:
+        nnz = int(torch.randint(1, max_nnz + 1, (1,), generator=generator))
+        cols = torch.randperm(NUM_POINTS, generator=generator)[:nnz]
+        weights = torch.rand(nnz, generator=generator)
+        row[cols] = weights / weights.sum()
+    return mapping
+
+
+def _head(mapping):
+    # only the keypoint mapping is needed, so skip loading the MHR model
+    head = MHRHead.__new__(MHRHead)
+    nn.Module.__init__(head)
+    head.keypoint_mapping = nn.Parameter(mapping, requires_grad=False)
+    head._keypoint_gather = None
+    head._keypoint_gather_key = None
+    return head
+
+
+def dense_regress_keypoints(mapping, model_vert_joints):
+    """Previous implementation: dense [308, num_points] @ [num_points, B * 3]"""
+    return (
+        (mapping @ model_vert_joints.permute(1, 0, 2).flatten(1, 2))
+        .reshape(-1, model_vert_joints.shape[0], 3)
+        .permute(1, 0, 2)
+    )
+
+
+def _vert_joints(batch_size, seed=1):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(batch_size, NUM_POINTS, 3, generator=generator)
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 5])
+def test_matches_dense_matmul(batch_size):
+    mapping = _mapping()
+    head = _head(mapping)
+    verts = _vert_joints(batch_size)
+    out = head.regress_keypoints(verts)
+    assert out.shape == (batch_size, NUM_KEYPOINTS, 3)
+    assert head._keypoint_gather is not None
+    torch.testing.assert_close(out, dense_regress_keypoints(mapping, verts), rtol=1e-5, atol=1e-5)
+
+
+def test_gather_is_rebuilt_when_the_mapping_changes():
+    head = _head(_mapping(seed=0))
+    verts = _vert_joints(2)
+    head.regress_keypoints(verts)
+    cached = head._keypoint_gather
+
+    head.regress_keypoints(verts)
+    assert head._keypoint_gather is cached
+
+    # checkpoint load copies into the parameter in place
+    other = _mapping(seed=1)
+    head.load_state_dict({"keypoint_mapping": other})
+    torch.testing.assert_close(
+        head.regress_keypoints(verts), dense_regress_keypoints(other, verts), rtol=1e-5, atol=1e-5
+    )
+    assert head._keypoint_gather is not cached
+
+
+def test_dense_mapping_falls_back_to_matmul():
+    generator = torch.Generator().manual_seed(0)
+    mapping = torch.rand(NUM_KEYPOINTS, NUM_POINTS, generator=generator)
+    head = _head(mapping)
+    verts = _vert_joints(2)
+    out = head.regress_keypoints(verts)
+    assert head._keypoint_gather is None
+    torch.testing.assert_close(out, dense_regress_keypoints(mapping, verts))
+
+
+def _best_ms(fn, repeats=20):
+    times = []
+    with torch.no_grad():
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+    return min(times) * 1e3
+
+
+@pytest.mark.benchmark
+def test_benchmark_sparse_vs_dense():
+    mapping = _mapping()
+    head = _head(mapping)
+    start = time.perf_counter()
+    head._sparse_keypoint_mapping()
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    # body + hand crops are decoded together, and mhr_forward runs on every decoder layer
+    for batch_size in (1, 3):
+        verts = _vert_joints(batch_size)
+        sparse_ms = _best_ms(lambda: head.regress_keypoints(verts))
+        dense_ms = _best_ms(lambda: dense_regress_keypoints(mapping, verts))
+        print(
+            f"B={batch_size}: gather {sparse_ms:.3f} ms, dense matmul {dense_ms:.3f} ms "
+            f"(one-off gather build {build_ms:.1f} ms)"
+        )
@@ -39,6 +39,20 @@ KEY_BODY = [5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 41, 62]  # key body joints for pr
 KEY_RIGHT_HAND = list(range(21, 42))
 # fmt: on
 
+# Per-person keys produced by prepare_batch, shaped [B, num_person, ...]
+PERSON_BATCH_KEYS = (
+    "img",
+    "img_size",
+    "ori_img_size",
+    "bbox_center",
+    "bbox_scale",
+    "bbox",
+    "affine_trans",
+    "mask",
+    "mask_score",
+    "person_valid",
+)
+
 
 class SAM3DBody(BaseModel):
     pelvis_idx = [9, 10]  # left_hip, right_hip
@@ -1194,6 +1208,66 @@ class SAM3DBody(BaseModel):
 
         return pose_output
 
+    def _concat_person_batches(self, batches) -> Dict:
+        """
+        Concatenate batches of the same image along the person dimension, so that
+        the crops of all batches go through a single backbone/decoder pass.
+        Non per-person entries (e.g. cam_int) are taken from the first batch.
+        """
+        fused = dict(batches[0])
+        for key in PERSON_BATCH_KEYS:
+            if key in fused:
+                fused[key] = torch.cat([b[key] for b in batches], dim=1)
+        return fused
+
+    def _split_person_output(
+        self, x: Any, batch_size: int, num_person: int
+    ) -> Tuple[Any, Any]:
+        """
+        Split the output of a fused [batch_size, 2 * num_person, ...] batch (see
+        _concat_person_batches) back into the two batches. Per-crop tensors are
+        flattened by _flatten_person to batch_size * 2 * num_person rows, ordered
+        by image, then batch (left/right), then person; anything that is not a tensor (None, the
+        shared faces array) belongs to both halves.
+        """
+        if isinstance(x, dict):
+            halves = {
+                k: self._split_person_output(v, batch_size, num_person)
+                for k, v in x.items()
+            }
+            return (
+                {k: v[0] for k, v in halves.items()},
+                {k: v[1] for k, v in halves.items()},
+            )
+        if not isinstance(x, torch.Tensor):
+            return x, x
+        assert x.dim() > 0 and x.shape[0] == batch_size * 2 * num_person, (
+            f"Unexpected fused output shape {tuple(x.shape)} for "
+            f"batch_size={batch_size} and 2 x {num_person} persons"
+        )
+        x = x.unflatten(0, (batch_size, 2, num_person))
+        return x[:, 0].flatten(0, 1), x[:, 1].flatten(0, 1)
+
+    def forward_hands_fused(
+        self, batch_lhand: Dict, batch_rhand: Dict, body_batch: Dict
+    ) -> Tuple[Dict, Dict]:
+        """
+        Run the hand decoder on the left (flipped) and right hand crops of all
+        persons in one pass: the crops are stacked along the person dimension,
+        the backbone runs once on the 2N crops and forward_decoder_hand decodes
+        both hands in a single batched call.
+        """
+        assert batch_lhand["img"].shape == batch_rhand["img"].shape
+        batch_size, num_person = batch_rhand["img"].shape[:2]
+        fused_batch = self._concat_person_batches([batch_lhand, batch_rhand])
+        # _flatten_person uses the batch layout of the current batch
+        self._initialize_batch(fused_batch)
+        try:
+            fused_output = self.forward_step(fused_batch, decoder_type="hand")
+        finally:
+            self._initialize_batch(body_batch)
+        return self._split_person_output(fused_output, batch_size, num_person)
+
     def run_inference(
         self,
         img,
@@ -1201,6 +1275,7 @@ class SAM3DBody(BaseModel):
         inference_type: str = "full",
         transform_hand: Any = None,
         thresh_wrist_angle=1.4,
+        fuse_hands: bool = True,
     ):
         """
         Run 3DB inference (optionally with hand detector).
@@ -1209,6 +1284,11 @@ class SAM3DBody(BaseModel):
             - full: full-body inference with both body and hand decoders
             - body: inference with body decoder only (still full-body output)
             - hand: inference with hand decoder only (only hand output)
+
+        fuse_hands: for full inference, decode the left and right hands of all
+            persons in one batched hand pass (see forward_hands_fused) instead
+            of two sequential passes. Both paths give the same outputs up to
+            floating-point differences of batched kernels.
         """
 
         height, width = img.shape[:2]
@@ -1244,7 +1324,20 @@ class SAM3DBody(BaseModel):
             flipped_img, transform_hand, left_xyxy, cam_int=cam_int.clone()
         )
         batch_lhand = recursive_to(batch_lhand, self.device)
-        lhand_output = self.forward_step(batch_lhand, decoder_type="hand")
+
+        ## Right...
+        batch_rhand = prepare_batch(
+            img, transform_hand, right_xyxy, cam_int=cam_int.clone()
+        )
+        batch_rhand = recursive_to(batch_rhand, self.device)
+
+        if fuse_hands:
+            lhand_output, rhand_output = self.forward_hands_fused(
+                batch_lhand, batch_rhand, batch
+            )
+        else:
+            lhand_output = self.forward_step(batch_lhand, decoder_type="hand")
+            rhand_output = self.forward_step(batch_rhand, decoder_type="hand")
 
         # Unflip output
         ## Flip scale
@@ -1275,13 +1368,6 @@ class SAM3DBody(BaseModel):
             width - batch_lhand["bbox_center"][:, :, 0] - 1
         )
 
-        ## Right...
-        batch_rhand = prepare_batch(
-            img, transform_hand, right_xyxy, cam_int=cam_int.clone()
-        )
-        batch_rhand = recursive_to(batch_rhand, self.device)
-        rhand_output = self.forward_step(batch_rhand, decoder_type="hand")
-
         # Step 3. replace hand pose estimation from the body decoder.
         ## CRITERIA 1: LOCAL WRIST POSE DIFFERENCE
         joint_rotations = pose_output["mhr"]["joint_global_rots"]
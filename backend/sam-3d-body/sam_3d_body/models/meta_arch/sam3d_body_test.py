@@ -0,0 +1,99 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Fused left/right hand decoding (forward_hands_fused) against the two sequential
+hand passes. Run from the sam-3d-body folder:
+
+    python -m pytest sam_3d_body/models/meta_arch/sam3d_body_test.py
+"""
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from sam_3d_body.models.meta_arch.sam3d_body import SAM3DBody
+
+CROP = 16
+
+
+class TinyHandModel(SAM3DBody):
+    """
+    SAM3DBody whose hand pass is a tiny per-crop network. Like the real
+    forward_step it reads the crops through _flatten_person, and it returns the
+    same kinds of entries: per-crop tensors, None and the shared faces array.
+    """
+
+    def __init__(self):
+        nn.Module.__init__(self)
+        self._max_num_person = None
+        self._person_valid = None
+        self.backbone = nn.Sequential(nn.Conv2d(3, 8, 3, stride=2), nn.ReLU())
+        self.head = nn.Linear(8 + 2, 12)
+
+    def forward_step(self, batch, decoder_type="body"):
+        assert decoder_type == "hand"
+        image_embeddings = self.backbone(self._flatten_person(batch["img"]))
+        bbox_center = self._flatten_person(batch["bbox_center"])
+        tokens = torch.cat([image_embeddings.mean(dim=(2, 3)), bbox_center], dim=1)
+        hand = self.head(tokens)
+        return {
+            "mhr": None,
+            "mhr_hand": {
+                "hand": hand,
+                "pred_keypoints_2d": bbox_center[:, None] + hand.view(-1, 6, 2),
+                "pred_pose_rotmat": None,
+                "faces": np.zeros((4, 3), dtype=np.int64),
+            },
+            "condition_info": bbox_center,
+            "image_embeddings": image_embeddings,
+        }
+
+
+def _batch(batch_size, num_person, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return {
+        "img": torch.rand(batch_size, num_person, 3, CROP, CROP, generator=generator),
+        "bbox_center": torch.rand(batch_size, num_person, 2, generator=generator) * 100,
+        "person_valid": torch.ones(batch_size, num_person),
+        "cam_int": torch.eye(3).expand(batch_size, 3, 3),
+    }
+
+
+def _assert_same(fused, sequential):
+    if isinstance(fused, dict):
+        assert fused.keys() == sequential.keys()
+        for key in fused:
+            _assert_same(fused[key], sequential[key])
+    elif isinstance(fused, torch.Tensor):
+        torch.testing.assert_close(fused, sequential, rtol=1e-5, atol=1e-5)
+    elif isinstance(fused, np.ndarray):
+        np.testing.assert_array_equal(fused, sequential)
+    else:
+        assert fused is sequential
+
+
+@pytest.mark.parametrize("batch_size, num_person", [(1, 1), (1, 3), (2, 2)])
+def test_fused_hands_match_sequential_passes(batch_size, num_person):
+    torch.manual_seed(0)
+    model = TinyHandModel().eval()
+    body_batch = _batch(batch_size, num_person, seed=0)
+    batch_lhand = _batch(batch_size, num_person, seed=1)
+    batch_rhand = _batch(batch_size, num_person, seed=2)
+
+    with torch.no_grad():
+        model._initialize_batch(body_batch)
+        lhand_fused, rhand_fused = model.forward_hands_fused(
+            batch_lhand, batch_rhand, body_batch
+        )
+        # the body batch layout is restored for the rest of run_inference
+        assert model._max_num_person == num_person
+        lhand = model.forward_step(batch_lhand, decoder_type="hand")
+        rhand = model.forward_step(batch_rhand, decoder_type="hand")
+
+    _assert_same(lhand_fused, lhand)
+    _assert_same(rhand_fused, rhand)
+
+
+def test_unexpected_fused_shape_is_rejected():
+    model = TinyHandModel()
+    with pytest.raises(AssertionError, match="Unexpected fused output shape"):
+        model._split_person_output({"hand": torch.zeros(5, 3)}, 1, 2)
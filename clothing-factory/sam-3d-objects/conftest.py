@@ -0,0 +1,19 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+import importlib.util
+import os
+
+# tests import submodules directly, without the training-time initialization
+os.environ.setdefault("LIDRA_SKIP_INIT", "1")
+
+# CPU-only environments without spconv use the pure PyTorch sparse backend
+if importlib.util.find_spec("spconv") is None:
+    os.environ.setdefault("SPARSE_BACKEND", "torch")
+
+# the representations package imports FlexiCubes, which needs kaolin: its tests, and
+# those of the models package (which imports the decoders built on it), cannot even be
+# imported without it
+if importlib.util.find_spec("kaolin") is None:
+    collect_ignore_glob = [
+        "sam3d_objects/model/backbone/tdfy_dit/representations/*",
+        "sam3d_objects/model/backbone/tdfy_dit/models/*",
+    ]
@@ -14,7 +14,7 @@ from PIL import Image
 import torch.nn.functional as F
 from pytorch3d.structures import Meshes
 from pytorch3d.renderer import PerspectiveCameras, RasterizationSettings, MeshRasterizer, TexturesVertex
-from moge.model.v1 import MoGeModel
+from sam3d_objects.pipeline.depth_models.moge import load_moge_model
 
 
 def load_3db_mesh(mesh_path, device='cuda'):
@@ -34,7 +34,7 @@ def load_3db_mesh(mesh_path, device='cuda'):
 
 def get_moge_pointcloud(image_tensor, device='cuda'):
     """Generate MoGe point cloud from image tensor."""
-    moge_model = MoGeModel.from_pretrained("Ruicheng/moge-vitl").to(device)
+    moge_model = load_moge_model("Ruicheng/moge-vitl").to(device)
     moge_model.eval()
     with torch.no_grad():
         moge_output = moge_model.infer(image_tensor)
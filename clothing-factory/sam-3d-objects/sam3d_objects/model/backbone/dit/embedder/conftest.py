@@ -0,0 +1,83 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+import pytest
+import torch
+from torch import nn
+
+from sam3d_objects.model.backbone.dit.embedder import dino as dino_module
+
+INPUT_SIZE = 28
+PATCH_SIZE = 14
+EMBED_DIM = 16
+
+
+class TinyViT(nn.Module):
+    """
+    Stand-in for a DINOv2 hub model: patch embedding, class token, two transformer
+    layers and the `forward_features` outputs `Dino` reads.
+    """
+
+    def __init__(self, embed_dim=EMBED_DIM, patch_size=PATCH_SIZE, input_size=INPUT_SIZE):
+        super().__init__()
+        self.embed_dim = embed_dim
+        self.patch_embed = nn.Conv2d(3, embed_dim, patch_size, stride=patch_size)
+        self.patch_embed.patch_size = (patch_size, patch_size)
+        num_patches = (input_size // patch_size) ** 2
+        self.cls_token = nn.Parameter(torch.randn(1, 1, embed_dim) * 0.02)
+        self.pos_embed = nn.Parameter(torch.randn(1, num_patches + 1, embed_dim) * 0.02)
+        self.mask_token = nn.Parameter(torch.zeros(1, embed_dim))
+        self.blocks = nn.ModuleList(
+            [
+                nn.TransformerEncoderLayer(
+                    embed_dim, nhead=2, dim_feedforward=2 * embed_dim, dropout=0.0, batch_first=True
+                )
+                for _ in range(2)
+            ]
+        )
+        self.norm = nn.LayerNorm(embed_dim)
+
+    def forward_features(self, x):
+        x = self.patch_embed(x).flatten(2).transpose(1, 2)
+        x = torch.cat([self.cls_token.expand(x.shape[0], -1, -1), x], dim=1) + self.pos_embed
+        for block in self.blocks:
+            x = block(x)
+        x_norm = self.norm(x)
+        return {
+            "x_norm_clstoken": x_norm[:, 0],
+            "x_norm_patchtokens": x_norm[:, 1:],
+            "x_prenorm": x,
+        }
+
+
+@pytest.fixture
+def tiny_dino(monkeypatch):
+    """Factory of `Dino` embedders on a seeded `TinyViT`, without torch.hub"""
+
+    def make(seed=0, **kwargs):
+        torch.manual_seed(seed)
+        backbone = TinyViT()
+        monkeypatch.setattr(torch.hub, "load", lambda *args, **kw: backbone)
+        return dino_module.Dino(input_size=INPUT_SIZE, source="local", **kwargs)
+
+    return make
+
+
+@pytest.fixture
+def backbone_batches(monkeypatch):
+    """Batch size of every TinyViT forward"""
+    batches = []
+    forward_features = TinyViT.forward_features
+
+    def counting_forward_features(self, x):
+        batches.append(x.shape[0])
+        return forward_features(self, x)
+
+    monkeypatch.setattr(TinyViT, "forward_features", counting_forward_features)
+    return batches
+
+
+@pytest.fixture
+def embedding_cache(monkeypatch):
+    """Replaces the process-wide DINO embedding cache; disabled unless resized"""
+    cache = dino_module.DinoEmbeddingCache(max_entries=0)
+    monkeypatch.setattr(dino_module, "dino_embedding_cache", cache)
+    return cache
@@ -1,11 +1,94 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+import os
+import hashlib
+import threading
+from collections import OrderedDict
 import torch
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Hashable
 import warnings
 from torchvision.transforms import Normalize
 import torch.nn.functional as F
 from loguru import logger
 
+from sam3d_objects.model.snapshots import resolve_snapshot
+
+
+class DinoEmbeddingCache:
+    """
+    LRU cache of DINO tokens shared by all `Dino` instances, keyed by
+    (backbone weights fingerprint, preprocessed input digest).
+
+    Stage 1 and stage 2 conditioning embed the same pixels with the same backbone,
+    and repeated runs on an image (seed sweeps, quality upgrades) do it again;
+    all of them reuse the first forward. Tokens stay on the device they were
+    computed on, so `max_entries` bounds the extra device memory.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def input_digest(x: torch.Tensor) -> str:
+        data = x.detach().contiguous().view(torch.uint8).cpu().numpy()
+        h = hashlib.sha1(data.tobytes())
+        h.update(f"{tuple(x.shape)}{x.dtype}{x.device}".encode())
+        return h.hexdigest()
+
+    def get(self, key: Hashable) -> Optional[torch.Tensor]:
+        with self._lock:
+            tokens = self._entries.get(key)
+            if tokens is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tokens
+
+    def put(self, key: Hashable, tokens: torch.Tensor) -> None:
+        with self._lock:
+            self._entries[key] = tokens
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def _autocast_state(device_type: str):
+    # tokens computed under a different autocast precision are not interchangeable
+    if not torch.is_autocast_enabled(device_type):
+        return None
+    return str(torch.get_autocast_dtype(device_type))
+
+
+dino_embedding_cache = DinoEmbeddingCache(
+    max_entries=int(os.environ.get("DINO_EMBEDDING_CACHE_SIZE", 16))
+)
+
 
 class Dino(torch.nn.Module):
     def __init__(
@@ -31,7 +114,13 @@ class Dino(torch.nn.Module):
             logger.info(f"Loading DINO model: {dino_model} from {repo_or_dir} (source: {source})")
             if backbone_kwargs:
                 logger.info(f"DINO backbone kwargs: {backbone_kwargs}")
-            
+
+            if source == "github":
+                # prefer a local snapshot of the hub repo over GitHub
+                local_repo = resolve_snapshot(repo_or_dir.split(":")[0].split("/")[-1])
+                if local_repo is not None:
+                    repo_or_dir, source = local_repo, "local"
+
             self.backbone = torch.hub.load(
                 repo_or_dir=repo_or_dir,
                 model=dino_model,
@@ -108,9 +197,69 @@ class Dino(torch.nn.Module):
         return tokens
 
     def forward(self, x, **kwargs):
-        _resized_images = self._preprocess_input(x)
-        tokens = self._forward_last_layer(_resized_images)
-        return tokens.to(x.dtype)
+        return self.forward_batched([x])[0]
+
+    def forward_batched(self, xs):
+        """
+        Embed several inputs with one backbone pass. Inputs may differ in size and
+        channels (e.g. image and mask) since they are resized to `input_size` first.
+        Inputs found in the shared embedding cache are not embedded again.
+        """
+        _resized_images = [self._preprocess_input(x) for x in xs]
+        use_cache = self._use_embedding_cache()
+        keys = [
+            (
+                self._weights_fingerprint(),
+                _autocast_state(r.device.type),
+                dino_embedding_cache.input_digest(r),
+            )
+            if use_cache
+            else None
+            for r in _resized_images
+        ]
+        tokens = [
+            dino_embedding_cache.get(key) if use_cache else None for key in keys
+        ]
+        missing = [i for i, t in enumerate(tokens) if t is None]
+        if missing:
+            computed = self._forward_last_layer(
+                torch.cat([_resized_images[i] for i in missing], dim=0)
+            )
+            computed = computed.split(
+                [_resized_images[i].shape[0] for i in missing], dim=0
+            )
+            for i, t in zip(missing, computed):
+                tokens[i] = t
+                if use_cache:
+                    # a copy: a view would keep the whole batched output alive
+                    dino_embedding_cache.put(keys[i], t.clone())
+        return [t.to(x.dtype) for t, x in zip(tokens, xs)]
+
+    def _use_embedding_cache(self) -> bool:
+        return (
+            dino_embedding_cache.enabled
+            and not self.training
+            and not torch.is_grad_enabled()
+            and not torch.compiler.is_compiling()
+        )
+
+    def _weights_fingerprint(self) -> str:
+        """
+        Identifies the backbone weights (and the settings affecting the tokens), so
+        separately loaded copies of the same checkpoint share cache entries.
+        """
+        fingerprint = getattr(self, "_weights_fingerprint_value", None)
+        if fingerprint is None:
+            sums = torch.stack(
+                [p.detach().double().sum() for p in self.backbone.parameters()]
+            )
+            h = hashlib.sha1(sums.cpu().numpy().tobytes())
+            h.update(
+                f"{type(self.backbone).__name__}{self.embed_dim}{self.prenorm_features}".encode()
+            )
+            fingerprint = h.hexdigest()
+            self._weights_fingerprint_value = fingerprint
+        return fingerprint
 
     def _prune_network(self):
         """
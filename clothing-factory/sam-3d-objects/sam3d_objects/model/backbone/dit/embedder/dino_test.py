@@ -0,0 +1,143 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+`DinoEmbeddingCache` on a tiny ViT: the stage-2 condition embedder reuses the
+stage-1 tokens, the cache stays within `max_entries`, and the weights fingerprint
+and the autocast state are part of the key.
+"""
+import pytest
+import torch
+
+from sam3d_objects.model.backbone.dit.embedder.embedder_fuser import EmbedderFuser
+
+BATCH = 2
+
+
+def _conditions(seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return {
+        "image": torch.rand(BATCH, 3, 40, 32, generator=generator),
+        "mask": (torch.rand(BATCH, 1, 40, 32, generator=generator) > 0.5).float(),
+    }
+
+
+def _condition_embedder(dino, seed):
+    torch.manual_seed(seed)
+    return EmbedderFuser(
+        embedder_list=[(dino, [("image", "cropped"), ("mask", "cropped")])],
+        projection_net_hidden_dim_multiplier=2.0,
+    ).eval()
+
+
+def test_stage_two_reuses_stage_one_tokens(tiny_dino, embedding_cache, backbone_batches):
+    # each stage loads its own copy of the same DINO checkpoint, with its own projection
+    ss_embedder = _condition_embedder(tiny_dino(seed=0), seed=1)
+    slat_embedder = _condition_embedder(tiny_dino(seed=0), seed=2)
+    with torch.no_grad():
+        # both preprocessors produce the same pixels, as separate tensors
+        reference = ss_embedder(**_conditions()), slat_embedder(**_conditions())
+        backbone_batches.clear()
+
+        embedding_cache.max_entries = 16
+        ss_tokens = ss_embedder(**_conditions())
+        slat_tokens = slat_embedder(**_conditions())
+    torch.testing.assert_close(ss_tokens, reference[0], rtol=0, atol=0)
+    torch.testing.assert_close(slat_tokens, reference[1], rtol=0, atol=0)
+    assert backbone_batches == [2 * BATCH]
+    assert embedding_cache.stats() == {
+        "entries": 2,
+        "max_entries": 16,
+        "hits": 2,
+        "misses": 2,
+        "evictions": 0,
+        "hit_rate": 0.5,
+    }
+
+    # a seed sweep on the same image does not run the backbone again
+    with torch.no_grad():
+        for _ in range(3):
+            ss_embedder(**_conditions())
+            slat_embedder(**_conditions())
+    assert backbone_batches == [2 * BATCH]
+    assert embedding_cache.stats()["hits"] == 2 + 3 * 4
+
+
+def test_cache_is_bounded(tiny_dino, embedding_cache, backbone_batches):
+    dino = tiny_dino()
+    embedding_cache.max_entries = 2
+    images = [_conditions(seed)["image"] for seed in range(4)]
+    with torch.no_grad():
+        # one batched forward for the misses; every entry owns only its own tokens
+        dino.forward_batched(images[:3])
+        assert embedding_cache.stats()["entries"] == 2
+        assert embedding_cache.stats()["evictions"] == 1
+        for tokens in embedding_cache._entries.values():
+            assert tokens.untyped_storage().nbytes() == tokens.numel() * tokens.element_size()
+
+        # least recently used first: reading image 1 makes image 2 the next eviction
+        backbone_batches.clear()
+        dino(images[1])
+        dino(images[3])
+        dino(images[1])
+        assert backbone_batches == [BATCH]
+        dino(images[2])
+        assert backbone_batches == [BATCH, BATCH]
+    assert embedding_cache.stats()["entries"] == 2
+    assert embedding_cache.stats()["evictions"] == 3
+
+
+def test_weights_fingerprint_is_part_of_the_key(tiny_dino, embedding_cache, backbone_batches):
+    image = _conditions()["image"]
+    embedding_cache.max_entries = 16
+    with torch.no_grad():
+        first = tiny_dino(seed=0)
+        tokens = first(image)
+        # another load of the same weights shares the entry
+        second = tiny_dino(seed=0)
+        assert second._weights_fingerprint() == first._weights_fingerprint()
+        torch.testing.assert_close(second(image), tokens, rtol=0, atol=0)
+        assert backbone_batches == [BATCH]
+
+        # other weights do not
+        other = tiny_dino(seed=1)
+        assert other._weights_fingerprint() != first._weights_fingerprint()
+        other_tokens = other(image)
+        assert backbone_batches == [BATCH, BATCH]
+        assert not torch.allclose(other_tokens, tokens)
+        embedding_cache.max_entries = 0
+        torch.testing.assert_close(other_tokens, other(image), rtol=0, atol=0)
+
+
+def test_autocast_state_is_part_of_the_key(tiny_dino, embedding_cache, backbone_batches):
+    dino = tiny_dino()
+    image = _conditions()["image"]
+    with torch.no_grad():
+        reference = dino(image)
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            autocast_reference = dino(image)
+        assert not torch.equal(autocast_reference, reference)
+        backbone_batches.clear()
+
+        embedding_cache.max_entries = 16
+        for _ in range(2):
+            torch.testing.assert_close(dino(image), reference, rtol=0, atol=0)
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                torch.testing.assert_close(dino(image), autocast_reference, rtol=0, atol=0)
+    assert backbone_batches == [BATCH, BATCH]
+    assert embedding_cache.stats()["entries"] == 2
+
+
+@pytest.mark.parametrize("mode", ["grad", "train"])
+def test_no_caching_with_grad_or_in_training(tiny_dino, embedding_cache, mode):
+    dino = tiny_dino()
+    embedding_cache.max_entries = 16
+    image = _conditions()["image"]
+    if mode == "grad":
+        dino(image)
+        dino(image)
+    else:
+        dino.train()
+        with torch.no_grad():
+            dino(image)
+            dino(image)
+    assert embedding_cache.stats()["entries"] == 0
+    assert embedding_cache.stats()["hits"] == embedding_cache.stats()["misses"] == 0
@@ -94,6 +94,9 @@ class EmbedderFuser(torch.nn.Module):
         self.drop_modalities_weight = drop_modalities_weight if drop_modalities_weight is not None else []
         self.dropout_prob = dropout_prob
         self.force_drop_modalities = force_drop_modalities
+        # set by batched CFG: the batch is split into equally sized chunks (one per cfg branch),
+        # each chunk with its own list of forced drop modalities
+        self.chunked_force_drop_modalities = None
 
         if freeze:
             self.requires_grad_(False)
@@ -151,7 +154,30 @@ class EmbedderFuser(torch.nn.Module):
         
         return dropout_configs, cumsum_weights
     
+    def _apply_chunked_force_drop(self, kwarg_names: List[str], tokens: List[torch.Tensor]):
+        num_chunks = len(self.chunked_force_drop_modalities)
+        result_tokens = []
+
+        for kwarg_name, token_tensor in zip(kwarg_names, tokens):
+            # Create mask per chunk: 0 for forced drop, 1 otherwise
+            chunk_mask = torch.tensor(
+                [
+                    0.0 if drop_modalities and kwarg_name in drop_modalities else 1.0
+                    for drop_modalities in self.chunked_force_drop_modalities
+                ],
+                dtype=token_tensor.dtype,
+                device=token_tensor.device,
+            )
+            batch_size = token_tensor.shape[0]
+            mask = chunk_mask.repeat_interleave(batch_size // num_chunks)
+            mask = mask.view([batch_size] + [1] * (token_tensor.ndim - 1))
+            result_tokens.append(token_tensor * mask)
+
+        return result_tokens
+
     def _apply_force_drop(self, kwarg_names: List[str], tokens: List[torch.Tensor]):
+        if self.chunked_force_drop_modalities is not None:
+            return self._apply_chunked_force_drop(kwarg_names, tokens)
         if not self.force_drop_modalities:
             return tokens
         
@@ -200,29 +226,77 @@ class EmbedderFuser(torch.nn.Module):
         
         return result_tokens
 
+    def _kept_rows(self, kwarg_name: str, input_cond) -> Optional[torch.Tensor]:
+        """
+        Batch rows whose tokens survive the chunked forced drop (None: all rows).
+        Dropped chunks are zeroed afterwards, so they are not embedded at all.
+        """
+        if self.chunked_force_drop_modalities is None or not torch.is_tensor(input_cond):
+            return None
+        keep = [
+            not (drop_modalities and kwarg_name in drop_modalities)
+            for drop_modalities in self.chunked_force_drop_modalities
+        ]
+        if all(keep):
+            return None
+        chunk_size = input_cond.shape[0] // len(keep)
+        # embed one chunk even if the modality is dropped everywhere, for the token shape
+        kept_chunks = [c for c, k in enumerate(keep) if k] or [0]
+        return torch.cat(
+            [
+                torch.arange(c * chunk_size, (c + 1) * chunk_size, device=input_cond.device)
+                for c in kept_chunks
+            ]
+        )
+
+    def _embed_inputs(self, condition_embedder, inputs: List[torch.Tensor]):
+        # inputs sharing an embedder are resized to the same size by it: one backbone pass
+        if len(inputs) > 1 and hasattr(condition_embedder, "forward_batched"):
+            return condition_embedder.forward_batched(inputs)
+        return [condition_embedder(input_cond) for input_cond in inputs]
+
     def forward(self, *args, **kwargs):
         tokens = []
         kwarg_names = []
-        
+
         for i, (condition_embedder, kwargs_info) in enumerate(self.embedder_list):
-            # Ideally, we would batch the inputs; but that assumes same-sized inputs
-            for kwarg_name, pos_group in kwargs_info:
+            for kwarg_name, _ in kwargs_info:
                 if kwarg_name not in kwargs:
                     logger.warning(f"{kwarg_name} not in kwargs to condition embedder!")
-                input_cond = kwargs[kwarg_name]
-                cond_token = condition_embedder(input_cond)
+            inputs = [kwargs[kwarg_name] for kwarg_name, _ in kwargs_info]
+            rows = [
+                self._kept_rows(kwarg_name, input_cond)
+                for (kwarg_name, _), input_cond in zip(kwargs_info, inputs)
+            ]
+            cond_tokens = self._embed_inputs(
+                condition_embedder,
+                [
+                    input_cond if kept is None else input_cond[kept]
+                    for input_cond, kept in zip(inputs, rows)
+                ],
+            )
+
+            for (kwarg_name, pos_group), cond_token, input_cond, kept in zip(
+                kwargs_info, cond_tokens, inputs, rows
+            ):
                 if self.projection_net_hidden_dim_multiplier > 0:
                     cond_token = self.projection_nets[i](cond_token)
                 if pos_group is not None:
                     pos_idx = self.positional_embed_map[pos_group]
                     if self.use_pos_embedding == "random":
-                        cond_token += self.idx_emb[pos_idx : pos_idx + 1]
+                        cond_token = cond_token + self.idx_emb[pos_idx : pos_idx + 1]
                     elif self.use_pos_embedding == "learned":
-                        cond_token += self.idx_emb[pos_idx : pos_idx + 1, None]
+                        cond_token = cond_token + self.idx_emb[pos_idx : pos_idx + 1, None]
                     else:
                         raise NotImplementedError(
                             f"Unknown pos embedding {self.use_pos_embedding}"
                         )
+                if kept is not None:
+                    full_token = cond_token.new_zeros(
+                        (input_cond.shape[0],) + cond_token.shape[1:]
+                    )
+                    full_token[kept] = cond_token
+                    cond_token = full_token
                 tokens.append(cond_token)
                 kwarg_names.append(kwarg_name)
 
@@ -0,0 +1,168 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Batched condition embedding: `EmbedderFuser` with `Dino.forward_batched` on a tiny
+ViT gives the same tokens as the previous per-input path (one backbone forward per
+kwarg), in one backbone forward per embedder.
+"""
+import pytest
+import torch
+from torch import nn
+
+from sam3d_objects.model.backbone.dit.embedder.embedder_fuser import EmbedderFuser
+
+BATCH = 2
+POINTMAP_DIM = 8
+
+
+class PointmapEmbedder(nn.Module):
+    """Embedder without `forward_batched`: still called once per input"""
+
+    def __init__(self, embed_dim):
+        super().__init__()
+        self.embed_dim = embed_dim
+        self.proj = nn.Linear(POINTMAP_DIM, embed_dim)
+
+    def forward(self, x):
+        return self.proj(x)
+
+
+def _per_input_tokens(embedder, x):
+    """Previous `Dino.forward`: one backbone forward per input"""
+    if not hasattr(embedder, "forward_batched"):
+        return embedder(x)
+    tokens = embedder._forward_last_layer(embedder._preprocess_input(x))
+    return tokens.to(x.dtype)
+
+
+def per_input_forward(fuser, **kwargs):
+    """Previous `EmbedderFuser.forward`: embeds every kwarg separately, then drops"""
+    tokens = []
+    kwarg_names = []
+    for i, (condition_embedder, kwargs_info) in enumerate(fuser.embedder_list):
+        for kwarg_name, pos_group in kwargs_info:
+            cond_token = _per_input_tokens(condition_embedder, kwargs[kwarg_name])
+            if fuser.projection_net_hidden_dim_multiplier > 0:
+                cond_token = fuser.projection_nets[i](cond_token)
+            if pos_group is not None:
+                pos_idx = fuser.positional_embed_map[pos_group]
+                if fuser.use_pos_embedding == "random":
+                    cond_token += fuser.idx_emb[pos_idx : pos_idx + 1]
+                else:
+                    cond_token += fuser.idx_emb[pos_idx : pos_idx + 1, None]
+            tokens.append(cond_token)
+            kwarg_names.append(kwarg_name)
+    tokens = fuser._dropout_modalities(kwarg_names, tokens)
+    return torch.cat(tokens, dim=1)
+
+
+def _fuser(tiny_dino, use_pos_embedding="learned", projection=4.0):
+    dino = tiny_dino()
+    torch.manual_seed(1)
+    return EmbedderFuser(
+        embedder_list=[
+            (
+                dino,
+                [
+                    ("image", "cropped"),
+                    ("mask", "cropped"),
+                    ("rgb_image", "full"),
+                    ("rgb_image_mask", "full"),
+                ],
+            ),
+            (PointmapEmbedder(dino.embed_dim), [("pointmap", None)]),
+        ],
+        use_pos_embedding=use_pos_embedding,
+        projection_net_hidden_dim_multiplier=projection,
+    ).eval()
+
+
+def _conditions(batch_size=BATCH, seed=0):
+    """Crops and full images of different sizes, 3-channel images and 1-channel masks"""
+    generator = torch.Generator().manual_seed(seed)
+    return {
+        "image": torch.rand(batch_size, 3, 40, 32, generator=generator),
+        "mask": (torch.rand(batch_size, 1, 40, 32, generator=generator) > 0.5).float(),
+        "rgb_image": torch.rand(batch_size, 3, 64, 48, generator=generator),
+        "rgb_image_mask": (torch.rand(batch_size, 1, 64, 48, generator=generator) > 0.5).float(),
+        "pointmap": torch.randn(batch_size, 6, POINTMAP_DIM, generator=generator),
+    }
+
+
+@pytest.mark.parametrize("use_pos_embedding", ["learned", "random"])
+@pytest.mark.parametrize("projection", [4.0, 0], ids=["projection", "no_projection"])
+def test_matches_per_input_path(
+    tiny_dino, embedding_cache, backbone_batches, use_pos_embedding, projection
+):
+    fuser = _fuser(tiny_dino, use_pos_embedding, projection)
+    conditions = _conditions()
+    with torch.no_grad():
+        reference = per_input_forward(fuser, **conditions)
+        backbone_batches.clear()
+        tokens = fuser(**conditions)
+
+    torch.testing.assert_close(tokens, reference)
+    # 4 DINO inputs in one backbone forward
+    assert backbone_batches == [4 * BATCH]
+    # cls token + 4 patch tokens per DINO input, 6 pointmap tokens
+    assert tokens.shape == (BATCH, 4 * 5 + 6, fuser.embed_dims)
+
+
+def test_matches_per_input_path_with_gradients(tiny_dino, embedding_cache):
+    fuser = _fuser(tiny_dino).train()
+    conditions = _conditions()
+    reference = per_input_forward(fuser, **conditions)
+    reference.square().sum().backward()
+    reference_grad = fuser.projection_nets[0][1].w1.weight.grad.clone()
+    fuser.zero_grad()
+
+    tokens = fuser(**conditions)
+    tokens.square().sum().backward()
+    torch.testing.assert_close(tokens, reference)
+    torch.testing.assert_close(fuser.projection_nets[0][1].w1.weight.grad, reference_grad)
+
+
+@pytest.mark.parametrize(
+    "chunked_drop",
+    [
+        [None, ["image", "mask", "rgb_image", "rgb_image_mask"]],
+        [["pointmap"], ["image", "mask"], None],
+        [["image", "mask", "rgb_image", "rgb_image_mask", "pointmap"]] * 2,
+    ],
+    ids=["cfg_drop_image", "three_branches", "all_dropped"],
+)
+def test_forced_drop_chunks_are_not_embedded(
+    tiny_dino, embedding_cache, backbone_batches, chunked_drop
+):
+    fuser = _fuser(tiny_dino)
+    fuser.chunked_force_drop_modalities = chunked_drop
+    # the batched CFG batch: one chunk of BATCH rows per branch
+    conditions = {
+        k: torch.cat([v] * len(chunked_drop)) for k, v in _conditions().items()
+    }
+    with torch.no_grad():
+        reference = per_input_forward(fuser, **conditions)
+        backbone_batches.clear()
+        tokens = fuser(**conditions)
+
+    torch.testing.assert_close(tokens, reference)
+    # dropped chunks are zeros without being embedded; a modality dropped in every
+    # chunk still embeds one chunk for the token shape
+    kept_rows = sum(
+        max(sum(not (drop and name in drop) for drop in chunked_drop), 1) * BATCH
+        for name in ("image", "mask", "rgb_image", "rgb_image_mask")
+    )
+    assert backbone_batches == [kept_rows]
+
+
+def test_single_input_keeps_the_plain_forward(tiny_dino, embedding_cache, backbone_batches):
+    dino = tiny_dino()
+    fuser = EmbedderFuser(
+        embedder_list=[(dino, [("image", None)])],
+        projection_net_hidden_dim_multiplier=0,
+    ).eval()
+    image = _conditions()["image"]
+    with torch.no_grad():
+        reference = _per_input_tokens(dino, image)
+        backbone_batches.clear()
+        torch.testing.assert_close(fuser(image=image), reference)
+    assert backbone_batches == [BATCH]
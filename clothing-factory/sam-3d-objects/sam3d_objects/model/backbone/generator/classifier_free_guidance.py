@@ -55,6 +55,62 @@ def add_flag(args, kwargs):
     return args, kwargs
 
 
+def _cat_batch(structs):
+    return _pytree.tree_map(lambda *xs: torch.cat(xs, dim=0), *structs)
+
+
+def _split_batch(struct, batch_size, num_branches):
+    leaves, spec = _pytree.tree_flatten(struct)
+    chunks = [leaf.split(batch_size, dim=0) for leaf in leaves]
+    return [
+        _pytree.tree_unflatten([chunk[i] for chunk in chunks], spec)
+        for i in range(num_branches)
+    ]
+
+
+def _stack_branches(branches, batch_size, device):
+    """
+    Stack the (args, kwargs) of several CFG branches along the batch dimension.
+    Tensors with a batch dimension are concatenated, everything else has to be
+    shared by all branches. Returns None if the branches cannot be stacked.
+    """
+    cfg_flags = []
+    flat_branches = []
+    spec = None
+    for args, kwargs in branches:
+        kwargs = dict(kwargs)
+        cfg_flags.append(kwargs.pop("cfg", False))
+        leaves, branch_spec = _pytree.tree_flatten((args, kwargs))
+        if spec is None:
+            spec = branch_spec
+        elif branch_spec != spec:
+            return None
+        flat_branches.append(leaves)
+
+    stacked = []
+    for leaves in zip(*flat_branches):
+        first = leaves[0]
+        if (
+            all(isinstance(leaf, torch.Tensor) for leaf in leaves)
+            and first.ndim > 0
+            and first.shape[0] == batch_size
+            and all(leaf.shape == first.shape for leaf in leaves)
+        ):
+            stacked.append(torch.cat(leaves, dim=0))
+        elif all(leaf is first for leaf in leaves):
+            stacked.append(first)
+        else:
+            return None
+    args, kwargs = _pytree.tree_unflatten(stacked, spec)
+
+    # per-sample flag, so the backbone only drops the condition of the unconditional samples
+    if any(flag is not False for flag in cfg_flags):
+        kwargs["cfg"] = torch.tensor(
+            [bool(flag) for flag in cfg_flags], device=device
+        ).repeat_interleave(batch_size)
+    return args, kwargs
+
+
 class ClassifierFreeGuidance(torch.nn.Module):
     UNCONDITIONAL_HANDLING_TYPES = {
         "zeros": zero_out,
@@ -74,6 +130,9 @@ class ClassifierFreeGuidance(torch.nn.Module):
         # "add_flag" = add an argument in kwargs as "cfg" and defer the handling to generator backbone
         unconditional_handling="zeros",
         interval=None,  # only perform cfg if t within interval
+        # run all cfg branches in a single backbone forward, stacked along the batch dimension
+        # (faster, but uses more memory; set to False on memory-constrained GPUs)
+        batch_branches=False,
     ):
         super().__init__()
 
@@ -90,6 +149,7 @@ class ClassifierFreeGuidance(torch.nn.Module):
         self.strength = strength
         self.unconditional_handling = unconditional_handling
         self.interval = interval
+        self.batch_branches = batch_branches
         self._make_unconditional_args = (
             ClassifierFreeGuidance.UNCONDITIONAL_HANDLING_TYPES[
                 self.unconditional_handling
@@ -105,7 +165,36 @@ class ClassifierFreeGuidance(torch.nn.Module):
         else:
             return _pytree.tree_map(partial(self._cfg_step_tensor, strength=strength), y_cond, y_uncond)
 
+    def _batched_backbone(self, x, t, branches):
+        """
+        Run the backbone once on all branches stacked along the batch dimension.
+        Returns the per-branch outputs, or None if the branches cannot be stacked.
+        """
+        first_x = _pytree.tree_flatten(x)[0][0]
+        batch_size = first_x.shape[0]
+        stacked = _stack_branches(branches, batch_size, first_x.device)
+        if stacked is None:
+            return None
+        args, kwargs = stacked
+        x = _cat_batch([x] * len(branches))
+        y = self.backbone(x, t, *args, **kwargs)
+        return _split_batch(y, batch_size, len(branches))
+
     def inner_forward(self, x, t, is_cond, strength, *args_cond, **kwargs_cond):
+        if not is_cond and self.batch_branches:
+            args_uncond, kwargs_uncond = self._make_unconditional_args(
+                args_cond,
+                dict(kwargs_cond),
+            )
+            ys = self._batched_backbone(
+                x,
+                t,
+                [(args_cond, kwargs_cond), (args_uncond, kwargs_uncond)],
+            )
+            if ys is not None:
+                y_cond, y_uncond = ys
+                return self._cfg_step(y_cond, y_uncond, strength)
+
         y_cond = self.backbone(x, t, *args_cond, **kwargs_cond)
         if is_cond:
             return y_cond
@@ -177,7 +266,47 @@ class PointmapCFG(ClassifierFreeGuidance):
         else:
             return _pytree.tree_map(partial(self._cfg_step_tensor, strength=strength, strength_pm=strength_pm), y_cond, y_uncond, y_pm)
 
+    def _batched_inner_forward(self, x, t, strength, strength_pm, *args_cond, **kwargs_cond):
+        condition_embedder = self.backbone.condition_embedder
+        if not hasattr(condition_embedder, "chunked_force_drop_modalities"):
+            return None
+
+        args_uncond, kwargs_uncond = self._make_unconditional_args(
+            args_cond,
+            dict(kwargs_cond),
+        )
+        force_drop_modalities = condition_embedder.force_drop_modalities
+        # cond, no-pointmap and uncond branches, in this order along the batch dimension
+        condition_embedder.chunked_force_drop_modalities = [
+            force_drop_modalities,
+            ['pointmap', 'rgb_pointmap'],
+            force_drop_modalities,
+        ]
+        try:
+            ys = self._batched_backbone(
+                x,
+                t,
+                [
+                    (args_cond, kwargs_cond),
+                    (args_cond, kwargs_cond),
+                    (args_uncond, kwargs_uncond),
+                ],
+            )
+        finally:
+            condition_embedder.chunked_force_drop_modalities = None
+        if ys is None:
+            return None
+        y_cond, y_pm, y_uncond = ys
+        return self._cfg_step(y_cond, y_uncond, y_pm, strength, strength_pm)
+
     def inner_forward(self, x, t, is_cond, strength, strength_pm, *args_cond, **kwargs_cond):
+        if not is_cond and self.batch_branches:
+            y = self._batched_inner_forward(
+                x, t, strength, strength_pm, *args_cond, **kwargs_cond
+            )
+            if y is not None:
+                return y
+
         y_cond = self.backbone(x, t, *args_cond, **kwargs_cond)
 
         if is_cond:
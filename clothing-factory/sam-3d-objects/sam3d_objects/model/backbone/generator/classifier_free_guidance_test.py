@@ -0,0 +1,167 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Batched CFG (all branches in one backbone forward) must match the sequential
+branches on a tiny backbone, for every unconditional handling that can be stacked.
+"""
+import pytest
+import torch
+from torch import nn
+
+from sam3d_objects.model.backbone.dit.embedder.embedder_fuser import EmbedderFuser
+from sam3d_objects.model.backbone.generator.classifier_free_guidance import (
+    ClassifierFreeGuidance,
+    PointmapCFG,
+)
+from sam3d_objects.model.backbone.tdfy_dit.modules.utils import zero_cfg_condition
+
+BATCH, TOKENS, DIM = 3, 5, 8
+
+
+class TinyBackbone(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.x_proj = nn.Linear(DIM, DIM)
+        self.cond_proj = nn.Linear(DIM, DIM)
+        self.t_proj = nn.Linear(1, DIM)
+
+    def forward(self, x, t, cond=None, cfg=False):
+        y = self.x_proj(x) + self.t_proj(torch.full_like(x[..., :1], float(t)))
+        if cond is not None:
+            cond = zero_cfg_condition(cond, cfg)
+            y = y + self.cond_proj(cond).mean(dim=1, keepdim=True)
+        return {"x": torch.tanh(y), "scale": y.mean(dim=(1, 2))}
+
+
+class TokenEmbedder(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embed_dim = DIM
+        self.proj = nn.Linear(DIM, DIM)
+
+    def forward(self, x):
+        return self.proj(x)
+
+
+class TinyConditionedBackbone(nn.Module):
+    """Backbone with an EmbedderFuser, as used by the pointmap CFG"""
+
+    def __init__(self):
+        super().__init__()
+        self.condition_embedder = EmbedderFuser(
+            embedder_list=[
+                (TokenEmbedder(), [("image", "rgb"), ("rgb_pointmap", "rgb")]),
+                (TokenEmbedder(), [("pointmap", None)]),
+            ],
+            projection_net_hidden_dim_multiplier=0,
+        )
+        self.backbone = TinyBackbone()
+
+    def forward(self, x, t, cfg=False, **kwargs):
+        return self.backbone(x, t, cond=self.condition_embedder(**kwargs), cfg=cfg)
+
+
+def _inputs():
+    x = torch.randn(BATCH, TOKENS, DIM)
+    cond = torch.randn(BATCH, 4, DIM)
+    return x, cond
+
+
+def _assert_close(y_batched, y_sequential):
+    assert y_batched.keys() == y_sequential.keys()
+    for key in y_batched:
+        torch.testing.assert_close(y_batched[key], y_sequential[key], rtol=1e-5, atol=1e-5)
+
+
+def _run(cfg, batch_branches, *args, **kwargs):
+    cfg.batch_branches = batch_branches
+    with torch.no_grad():
+        return cfg(*args, **kwargs)
+
+
+@pytest.mark.parametrize("unconditional_handling", ["zeros", "add_flag"])
+def test_batched_branches_match_sequential(unconditional_handling):
+    torch.manual_seed(0)
+    x, cond = _inputs()
+    cfg = ClassifierFreeGuidance(
+        TinyBackbone(),
+        strength=2.5,
+        unconditional_handling=unconditional_handling,
+        interval=(0.0, 1.0),
+    ).eval()
+
+    y_sequential = _run(cfg, False, x, 0.5, cond=cond)
+    y_batched = _run(cfg, True, x, 0.5, cond=cond)
+    _assert_close(y_batched, y_sequential)
+
+
+def test_batched_branches_use_single_backbone_forward(monkeypatch):
+    torch.manual_seed(0)
+    x, cond = _inputs()
+    backbone = TinyBackbone()
+    cfg = ClassifierFreeGuidance(backbone, strength=2.5, interval=(0.0, 1.0)).eval()
+    batch_sizes = []
+    forward = backbone.forward
+
+    def counting_forward(x, *args, **kwargs):
+        batch_sizes.append(x.shape[0])
+        return forward(x, *args, **kwargs)
+
+    monkeypatch.setattr(backbone, "forward", counting_forward)
+    _run(cfg, True, x, 0.5, cond=cond)
+    assert batch_sizes == [2 * BATCH]
+
+    batch_sizes.clear()
+    _run(cfg, False, x, 0.5, cond=cond)
+    assert batch_sizes == [BATCH, BATCH]
+
+
+def test_outside_interval_runs_conditional_branch_only():
+    torch.manual_seed(0)
+    x, cond = _inputs()
+    backbone = TinyBackbone().eval()
+    cfg = ClassifierFreeGuidance(backbone, strength=2.5, interval=(0.0, 0.4)).eval()
+
+    with torch.no_grad():
+        expected = backbone(x, 0.5, cond=cond)
+    _assert_close(_run(cfg, True, x, 0.5, cond=cond), expected)
+
+
+def test_unstackable_branches_fall_back_to_sequential():
+    torch.manual_seed(0)
+    x, cond = _inputs()
+    # "discard" removes the condition of the unconditional branch: nothing to stack
+    cfg = ClassifierFreeGuidance(
+        TinyBackbone(),
+        strength=2.5,
+        unconditional_handling="discard",
+        interval=(0.0, 1.0),
+    ).eval()
+
+    _assert_close(
+        _run(cfg, True, x, 0.5, cond=cond),
+        _run(cfg, False, x, 0.5, cond=cond),
+    )
+
+
+def test_pointmap_cfg_batched_matches_sequential():
+    torch.manual_seed(0)
+    x = torch.randn(BATCH, TOKENS, DIM)
+    conditions = {
+        name: torch.randn(BATCH, 4, DIM)
+        for name in ("image", "rgb_pointmap", "pointmap")
+    }
+    backbone = TinyConditionedBackbone()
+    cfg = PointmapCFG(
+        backbone,
+        strength=2.0,
+        strength_pm=1.5,
+        unconditional_handling="add_flag",
+        interval=(0.0, 1.0),
+    ).eval()
+
+    y_sequential = _run(cfg, False, x, 0.5, **conditions)
+    y_batched = _run(cfg, True, x, 0.5, **conditions)
+    _assert_close(y_batched, y_sequential)
+    # the chunked drop is only set for the duration of the batched forward
+    assert backbone.condition_embedder.chunked_force_drop_modalities is None
+    assert backbone.condition_embedder.force_drop_modalities is None
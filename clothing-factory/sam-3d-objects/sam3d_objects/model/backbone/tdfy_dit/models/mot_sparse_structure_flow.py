@@ -6,7 +6,7 @@ import torch
 import torch.nn as nn
 from ..modules.utils import convert_module_to_f16, convert_module_to_f32
 from collections import namedtuple
-from ..modules.utils import FP16_TYPE
+from ..modules.utils import FP16_TYPE, zero_cfg_condition
 from ..modules.transformer import (
     MOTModulatedTransformerCrossBlock,
 )
@@ -212,11 +212,9 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
         d = condition_kwargs.pop("d", None)
             
         cfg_activate = condition_kwargs.pop("cfg", False)
-        if self.force_zeros_cond and cfg_activate:
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
-            cond = cond * 0
-        else:
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        if self.force_zeros_cond:
+            cond = zero_cfg_condition(cond, cfg_activate)
 
         # concatenate input
         latent_dict = self.project_input(latents_dict)
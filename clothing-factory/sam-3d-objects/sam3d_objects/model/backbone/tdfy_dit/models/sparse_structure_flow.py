@@ -6,7 +6,7 @@ import torch.nn.functional as F
 import numpy as np
 from ..modules.utils import convert_module_to_f16, convert_module_to_f32
 from collections import namedtuple
-from ..modules.utils import FP16_TYPE
+from ..modules.utils import FP16_TYPE, zero_cfg_condition
 from ..modules.transformer import (
     AbsolutePositionEmbedder,
     ModulatedTransformerCrossBlock,
@@ -276,12 +276,10 @@ class SparseStructureFlowTdfyWrapper(SparseStructureFlowModel):
         **condition_kwargs,
     ) -> torch.Tensor:
         cfg_activate = condition_kwargs.pop("cfg", False)
-        if self.force_zeros_cond and cfg_activate:
+        cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        if self.force_zeros_cond:
             # TODO: @weiyaowang, refactor to read directly from embedder
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
-            cond = cond * 0
-        else:
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
+            cond = zero_cfg_condition(cond, cfg_activate)
         if self.include_pose:
             pose = x[:, -1:]
             x = x[:, :-1]
@@ -4,7 +4,12 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-from ..modules.utils import zero_module, convert_module_to_f16, convert_module_to_f32
+from ..modules.utils import (
+    zero_module,
+    convert_module_to_f16,
+    convert_module_to_f32,
+    zero_cfg_condition,
+)
 from ..modules.transformer import AbsolutePositionEmbedder
 from ..modules.norm import LayerNorm32
 from ..modules import sparse as sp
@@ -316,6 +321,20 @@ class SLatFlowModelTdfyWrapper(SLatFlowModel):
         self.force_zeros_cond = force_zeros_cond
         # self.null_condition = None
 
+    @staticmethod
+    def _batched_coords(coords, batch_size: int, device) -> torch.Tensor:
+        coords = torch.tensor(coords).to(device)
+        if batch_size > 1:
+            # batched CFG branches share the same voxels, one copy per batch index
+            coords = torch.cat(
+                [
+                    torch.cat([torch.full_like(coords[:, :1], i), coords[:, 1:]], dim=1)
+                    for i in range(batch_size)
+                ],
+                dim=0,
+            )
+        return coords
+
     def forward(
         self,
         x: torch.Tensor,
@@ -337,18 +356,27 @@ class SLatFlowModelTdfyWrapper(SLatFlowModel):
             condition_args = condition_args[:-1]
             d = condition_kwargs.pop("d", None)
             
-        coords = torch.tensor(coords).to(x.device)
+        batch_size = x.shape[0]
+        partition_cache = sp.active_partition_cache()
+        if partition_cache is not None:
+            # the same coords are passed at every step: reuse the tensor so cached
+            # window / serialization partitions keep matching it
+            coords = partition_cache.coords(
+                coords,
+                (batch_size, str(x.device)),
+                lambda: self._batched_coords(coords, batch_size, x.device),
+            )
+        else:
+            coords = self._batched_coords(coords, batch_size, x.device)
         x = sp.SparseTensor(
-            feats=x[0],
+            feats=x.reshape(-1, x.shape[-1]),
             coords=coords,
         )
         cfg_activate = condition_kwargs.pop("cfg", False)
-        if self.force_zeros_cond and cfg_activate:
+        cond = self.condition_embedder(*condition_args, **condition_kwargs)
+        if self.force_zeros_cond:
             # TODO: @weiyaowang, refactor to read directly from embedder
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
-            cond = cond * 0
-        else:
-            cond = self.condition_embedder(*condition_args, **condition_kwargs)
+            cond = zero_cfg_condition(cond, cfg_activate)
         h = super().forward(x, t, cond, d)
-        h = h.feats[None]
+        h = h.feats.view(batch_size, -1, h.feats.shape[-1])
         return h
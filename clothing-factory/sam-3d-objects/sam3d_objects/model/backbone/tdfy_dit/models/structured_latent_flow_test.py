@@ -0,0 +1,81 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Partition sharing across the steps of a SLAT flow generation: inside a
+`partition_cache_scope` (as opened by `sample_slat`), the wrapper reuses the coords
+tensor built from the same array, so every downsample mapping is computed once per
+generation instead of once per step.
+"""
+import collections
+
+import numpy as np
+import pytest
+import torch
+
+from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_flow import (
+    SLatFlowModelTdfyWrapper,
+)
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+
+RESOLUTION = 16
+IN_CHANNELS = 8
+COND_CHANNELS = 16
+NUM_STEPS = 4
+
+
+def _flow_model():
+    torch.manual_seed(0)
+    model = SLatFlowModelTdfyWrapper(
+        resolution=RESOLUTION,
+        in_channels=IN_CHANNELS,
+        model_channels=32,
+        cond_channels=COND_CHANNELS,
+        out_channels=IN_CHANNELS,
+        num_blocks=2,
+        num_head_channels=16,
+        patch_size=2,
+        io_block_channels=[16],
+    )
+    # the output layer is zero-initialized: randomize it so the outputs depend on the input
+    torch.nn.init.normal_(model.out_layer.weight, std=0.1)
+    return model.eval()
+
+
+@pytest.fixture
+def downsample_counts(monkeypatch):
+    counts = collections.Counter()
+    downsample_coords = sp.SparseDownsample._downsample_coords
+
+    def counting_downsample(coords, factor):
+        counts[(coords.shape[0], factor)] += 1
+        return downsample_coords(coords, factor)
+
+    monkeypatch.setattr(sp.SparseDownsample, "_downsample_coords", staticmethod(counting_downsample))
+    return counts
+
+
+def _sample(model, coords, batch_size):
+    """Euler steps, with the coords array passed as the last condition at every step"""
+    generator = torch.Generator().manual_seed(0)
+    x = torch.randn(batch_size, len(coords), IN_CHANNELS, generator=generator)
+    cond = torch.randn(batch_size, 3, COND_CHANNELS, generator=generator)
+    with torch.no_grad():
+        for t in torch.linspace(1, 0, NUM_STEPS + 1)[:-1]:
+            x = x - model(x, t.repeat(batch_size) * 1000, cond, coords) / NUM_STEPS
+    return x
+
+
+@pytest.mark.parametrize("batch_size", [1, 2], ids=["single", "cfg_batch"])
+def test_each_partition_is_computed_once_per_generation(downsample_counts, batch_size):
+    model = _flow_model()
+    coords = np.argwhere(np.random.default_rng(0).random((RESOLUTION,) * 3) < 0.1)
+    coords = np.concatenate([np.zeros((len(coords), 1)), coords], axis=1).astype(np.int32)
+
+    reference = _sample(model, coords, batch_size)
+    assert set(downsample_counts.values()) == {NUM_STEPS}
+    downsample_counts.clear()
+
+    with sp.partition_cache_scope("sample_slat") as cache:
+        cached = _sample(model, coords, batch_size)
+    assert len(downsample_counts) == 1 and set(downsample_counts.values()) == {1}
+    assert cache.stats() == {"hits": NUM_STEPS - 1, "misses": 1, "entries": 1}
+    torch.testing.assert_close(cached, reference)
@@ -101,51 +101,58 @@ class SLatGaussianDecoder(SparseTransformerBase):
             start += v["size"]
         self.out_channels = start
 
+    def _new_representation(self) -> Gaussian:
+        return Gaussian(
+            sh_degree=0,
+            aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0],
+            mininum_kernel_size=self.rep_config["3d_filter_kernel_size"],
+            scaling_bias=self.rep_config["scaling_bias"],
+            opacity_bias=self.rep_config["opacity_bias"],
+            scaling_activation=self.rep_config["scaling_activation"],
+        )
+
     def to_representation(self, x: sp.SparseTensor) -> List[Gaussian]:
         """
         Convert a batch of network outputs to 3D representations.
 
+        The attributes are computed once for the whole batch. Each one is scaled by
+        its lr straight from its channel slice, so the packed features are read once
+        and every attribute is written to its own contiguous buffer. Each
+        representation holds row views of these batch-wide buffers.
+
         Args:
             x: The [N x * x C] sparse tensor output by the network.
 
         Returns:
             list of representations
         """
+        num_gaussians = self.rep_config["num_gaussians"]
+        attrs = {}
+        for (k, v), feats in zip(
+            self.layout.items(),
+            torch.split(x.feats, [v["size"] for v in self.layout.values()], dim=1),
+        ):
+            # the product of a column slice is already a new dense tensor
+            attrs[k] = (feats * self.rep_config["lr"][k]).reshape(-1, *v["shape"])
+
+        offset = attrs["_xyz"]
+        if self.rep_config["perturb_offset"]:
+            offset += self.offset_perturbation
+        offset = torch.tanh(offset) / self.resolution * 0.5 * self.rep_config["voxel_size"]
+        xyz = (x.coords[:, 1:].float() + 0.5) / self.resolution
+        attrs["_xyz"] = xyz.unsqueeze(1) + offset
+
+        # [N_voxels * num_gaussians, ...] buffers for the whole batch
+        attrs = {k: v.flatten(0, 1) for k, v in attrs.items()}
+
         ret = []
         for i in range(x.shape[0]):
-            representation = Gaussian(
-                sh_degree=0,
-                aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0],
-                mininum_kernel_size=self.rep_config["3d_filter_kernel_size"],
-                scaling_bias=self.rep_config["scaling_bias"],
-                opacity_bias=self.rep_config["opacity_bias"],
-                scaling_activation=self.rep_config["scaling_activation"],
+            rows = slice(
+                x.layout[i].start * num_gaussians, x.layout[i].stop * num_gaussians
             )
-            xyz = (x.coords[x.layout[i]][:, 1:].float() + 0.5) / self.resolution
-            for k, v in self.layout.items():
-                if k == "_xyz":
-                    offset = x.feats[x.layout[i]][
-                        :, v["range"][0] : v["range"][1]
-                    ].reshape(-1, *v["shape"])
-                    offset = offset * self.rep_config["lr"][k]
-                    if self.rep_config["perturb_offset"]:
-                        offset = offset + self.offset_perturbation
-                    offset = (
-                        torch.tanh(offset)
-                        / self.resolution
-                        * 0.5
-                        * self.rep_config["voxel_size"]
-                    )
-                    _xyz = xyz.unsqueeze(1) + offset
-                    setattr(representation, k, _xyz.flatten(0, 1))
-                else:
-                    feats = (
-                        x.feats[x.layout[i]][:, v["range"][0] : v["range"][1]]
-                        .reshape(-1, *v["shape"])
-                        .flatten(0, 1)
-                    )
-                    feats = feats * self.rep_config["lr"][k]
-                    setattr(representation, k, feats)
+            representation = self._new_representation()
+            for k, v in attrs.items():
+                setattr(representation, k, v[rows])
             ret.append(representation)
         return ret
 
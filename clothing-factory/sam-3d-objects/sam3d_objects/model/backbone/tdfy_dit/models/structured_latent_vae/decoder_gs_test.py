@@ -0,0 +1,163 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Batched `SLatGaussianDecoder.to_representation` against the per-item loop it
+replaced, on random SparseTensors, plus a CPU micro-benchmark:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/models/structured_latent_vae/decoder_gs_test.py
+"""
+import pytest
+import torch
+
+from sam3d_objects.model.backbone.tdfy_dit.models.structured_latent_vae import decoder_gs
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+from sam3d_objects.utils.benchmark import best_time
+
+RESOLUTION = 64
+NUM_GAUSSIANS = 32
+# representation settings of the released Gaussian decoder
+REPRESENTATION_CONFIG = {
+    "lr": {
+        "_xyz": 1.0,
+        "_features_dc": 1.0,
+        "_opacity": 1.0,
+        "_scaling": 1.0,
+        "_rotation": 0.1,
+    },
+    "perturb_offset": True,
+    "voxel_size": 1.5,
+    "num_gaussians": NUM_GAUSSIANS,
+    "2d_filter_kernel_size": 0.1,
+    "3d_filter_kernel_size": 9e-4,
+    "scaling_bias": 4e-3,
+    "opacity_bias": 0.1,
+    "scaling_activation": "softplus",
+}
+
+
+class _Representation:
+    """Attribute holder standing in for `Gaussian`, which keeps its biases on CUDA"""
+
+    def __init__(self, **kwargs):
+        self.init_params = kwargs
+
+
+@pytest.fixture(autouse=True)
+def _cpu_representation(monkeypatch):
+    monkeypatch.setattr(decoder_gs, "Gaussian", _Representation)
+
+
+def _decoder(perturb_offset=True):
+    # to_representation only depends on the output layout, not on the transformer
+    return decoder_gs.SLatGaussianDecoder(
+        resolution=RESOLUTION,
+        model_channels=32,
+        latent_channels=8,
+        num_blocks=0,
+        num_head_channels=16,
+        attn_mode="full",
+        representation_config={**REPRESENTATION_CONFIG, "perturb_offset": perturb_offset},
+    )
+
+
+def _random_output(out_channels, voxels_per_item, seed=0):
+    """Network output for a batch: distinct random voxels per item, random features"""
+    generator = torch.Generator().manual_seed(seed)
+    coords = []
+    for i, num_voxels in enumerate(voxels_per_item):
+        sites = torch.randperm(RESOLUTION**3, generator=generator)[:num_voxels]
+        xyz = torch.stack(torch.unravel_index(sites, (RESOLUTION,) * 3), dim=1)
+        coords.append(torch.cat([torch.full((num_voxels, 1), i), xyz], dim=1))
+    coords = torch.cat(coords).int()
+    feats = torch.randn(coords.shape[0], out_channels, generator=generator)
+    return sp.SparseTensor(feats, coords)
+
+
+def per_item_representation(decoder, x):
+    """Previous to_representation: slices and scales x.feats per item and attribute"""
+    ret = []
+    for i in range(x.shape[0]):
+        representation = decoder_gs.Gaussian(
+            sh_degree=0,
+            aabb=[-0.5, -0.5, -0.5, 1.0, 1.0, 1.0],
+            mininum_kernel_size=decoder.rep_config["3d_filter_kernel_size"],
+            scaling_bias=decoder.rep_config["scaling_bias"],
+            opacity_bias=decoder.rep_config["opacity_bias"],
+            scaling_activation=decoder.rep_config["scaling_activation"],
+        )
+        xyz = (x.coords[x.layout[i]][:, 1:].float() + 0.5) / decoder.resolution
+        for k, v in decoder.layout.items():
+            if k == "_xyz":
+                offset = x.feats[x.layout[i]][:, v["range"][0] : v["range"][1]].reshape(
+                    -1, *v["shape"]
+                )
+                offset = offset * decoder.rep_config["lr"][k]
+                if decoder.rep_config["perturb_offset"]:
+                    offset = offset + decoder.offset_perturbation
+                offset = (
+                    torch.tanh(offset)
+                    / decoder.resolution
+                    * 0.5
+                    * decoder.rep_config["voxel_size"]
+                )
+                _xyz = xyz.unsqueeze(1) + offset
+                setattr(representation, k, _xyz.flatten(0, 1))
+            else:
+                feats = (
+                    x.feats[x.layout[i]][:, v["range"][0] : v["range"][1]]
+                    .reshape(-1, *v["shape"])
+                    .flatten(0, 1)
+                )
+                feats = feats * decoder.rep_config["lr"][k]
+                setattr(representation, k, feats)
+        ret.append(representation)
+    return ret
+
+
+def _assert_same_representations(batched, reference):
+    assert len(batched) == len(reference)
+    for rep, ref in zip(batched, reference):
+        assert rep.init_params == ref.init_params
+        for k in ("_xyz", "_features_dc", "_scaling", "_rotation", "_opacity"):
+            torch.testing.assert_close(getattr(rep, k), getattr(ref, k), rtol=0, atol=1e-7)
+
+
+@pytest.mark.parametrize("perturb_offset", [True, False])
+@pytest.mark.parametrize("voxels_per_item", [[300], [200, 1, 57, 120]], ids=["single", "batch"])
+def test_matches_per_item_loop(perturb_offset, voxels_per_item):
+    decoder = _decoder(perturb_offset)
+    x = _random_output(decoder.out_channels, voxels_per_item)
+    batched = decoder.to_representation(x)
+    _assert_same_representations(batched, per_item_representation(decoder, x))
+    for rep, num_voxels in zip(batched, voxels_per_item):
+        assert rep._xyz.shape == (num_voxels * NUM_GAUSSIANS, 3)
+        assert rep._features_dc.shape == (num_voxels * NUM_GAUSSIANS, 1, 3)
+        assert rep._rotation.is_contiguous()
+
+
+def test_keeps_the_feature_dtype():
+    decoder = _decoder().double()
+    x = _random_output(decoder.out_channels, [40, 40])
+    x = x.replace(x.feats.double())
+    batched = decoder.to_representation(x)
+    assert batched[0]._rotation.dtype == torch.float64
+    _assert_same_representations(batched, per_item_representation(decoder, x))
+
+
+@pytest.mark.benchmark
+def test_benchmark_against_per_item_loop():
+    """
+    The per-item loop runs ~15 small ops per item. The batched path runs them once,
+    so it wins when there are many items. With a few large items both are bound by
+    the same feature copies, and the gain is small and noisy on CPU.
+    """
+    decoder = _decoder()
+    for voxels_per_item in ([20_000] * 2, [2_000] * 16, [200] * 64, [50] * 128):
+        x = _random_output(decoder.out_channels, voxels_per_item)
+        with torch.no_grad():
+            _, batched_s = best_time(lambda: decoder.to_representation(x), repeats=10)
+            _, loop_s = best_time(lambda: per_item_representation(decoder, x), repeats=10)
+        print(
+            f"{len(voxels_per_item)} items x {voxels_per_item[0]} voxels x {NUM_GAUSSIANS} "
+            f"Gaussians: batched {batched_s * 1e3:.1f} ms vs per-item loop {loop_s * 1e3:.1f} ms "
+            f"({loop_s / batched_s:.2f}x)"
+        )
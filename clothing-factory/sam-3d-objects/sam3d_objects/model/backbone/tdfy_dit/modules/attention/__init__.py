@@ -44,4 +44,5 @@ def set_debug(debug: bool):
 
 
 from .full_attn import *
+from .kv_cache import *
 from .modules import *
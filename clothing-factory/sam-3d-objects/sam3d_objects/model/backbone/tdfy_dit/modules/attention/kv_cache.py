@@ -0,0 +1,124 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+from typing import *
+from contextlib import contextmanager
+from contextvars import ContextVar
+import weakref
+import torch
+from loguru import logger
+
+
+__all__ = [
+    "ContextKVCache",
+    "context_kv_cache_scope",
+    "cached_context_kv",
+]
+
+
+class ContextKVCache:
+    """
+    Cross-attention K/V projections of the conditioning tokens, shared across ODE steps.
+
+    The condition is rebuilt as a new tensor at every step (and per CFG branch), so
+    each context tensor is first resolved to a canonical context: by identity if it
+    was seen before, otherwise by value against the known contexts (once per tensor,
+    not once per block). K/V are then keyed by (module, canonical context), which also
+    means a changed condition simply resolves to a new context and is projected again.
+    Canonical contexts are private copies, so writing in place to a context tensor
+    after its first use cannot make it match its own stale K/V.
+    """
+
+    def __init__(self, max_contexts: int = 8):
+        self.max_contexts = max_contexts
+        self._contexts: List[torch.Tensor] = []
+        self._aliases: Dict[Tuple, Tuple[weakref.ref, int]] = {}
+        self._kv: Dict[Tuple[int, int], torch.Tensor] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _tensor_key(t: torch.Tensor) -> Tuple:
+        return (t.data_ptr(), t._version, tuple(t.shape), t.dtype, str(t.device))
+
+    def _resolve(self, context: torch.Tensor) -> Optional[int]:
+        key = self._tensor_key(context)
+        alias = self._aliases.get(key)
+        if alias is not None and alias[0]() is context:
+            return alias[1]
+        for i, known in enumerate(self._contexts):
+            if (
+                known.shape == context.shape
+                and known.dtype == context.dtype
+                and known.device == context.device
+                and torch.equal(known, context)
+            ):
+                break
+        else:
+            if len(self._contexts) >= self.max_contexts:
+                return None
+            self._contexts.append(context.detach().clone())
+            i = len(self._contexts) - 1
+        self._aliases[key] = (weakref.ref(context), i)
+        return i
+
+    def get(
+        self, module: torch.nn.Module, context: torch.Tensor, project: Callable
+    ) -> torch.Tensor:
+        index = self._resolve(context)
+        if index is None:
+            return project(context)
+        key = (id(module), index)
+        kv = self._kv.get(key)
+        if kv is not None:
+            self.hits += 1
+            return kv
+        self.misses += 1
+        kv = project(context)
+        self._kv[key] = kv
+        return kv
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "contexts": len(self._contexts),
+        }
+
+
+_active_cache: ContextVar[Optional[ContextKVCache]] = ContextVar(
+    "context_kv_cache", default=None
+)
+
+
+@contextmanager
+def context_kv_cache_scope(enabled: bool = True, name: str = "context kv cache"):
+    """
+    Reuse cross-attention K/V within the scope (e.g. one generator call). The cache
+    holds one K/V tensor per cross-attention block and context, and is dropped on exit.
+    """
+    if not enabled:
+        yield None
+        return
+    cache = ContextKVCache()
+    token = _active_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _active_cache.reset(token)
+        stats = cache.stats()
+        logger.debug(
+            f"[ATTENTION] {name}: {stats['misses']} K/V projections, {stats['hits']} reused"
+        )
+
+
+def cached_context_kv(
+    module: torch.nn.Module, context: Any, project: Callable
+) -> Any:
+    """`project(context)`, reused across calls with the same context inside a scope."""
+    cache = _active_cache.get()
+    if (
+        cache is None
+        or not isinstance(context, torch.Tensor)
+        or torch.is_grad_enabled()
+    ):
+        return project(context)
+    return cache.get(module, context, project)
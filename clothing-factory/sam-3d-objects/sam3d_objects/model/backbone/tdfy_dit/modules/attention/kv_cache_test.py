@@ -0,0 +1,188 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Cross-attention K/V cache on a tiny DiT: sampling gives the same outputs with and
+without `context_kv_cache_scope`, each block projects each condition once per
+generation, a changed condition is projected again, and a CPU benchmark of the
+per-step time:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/modules/attention/kv_cache_test.py
+"""
+import pytest
+import torch
+import torch.nn as nn
+
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+from sam3d_objects.model.backbone.tdfy_dit.modules.attention import (
+    ContextKVCache,
+    context_kv_cache_scope,
+)
+from sam3d_objects.model.backbone.tdfy_dit.modules.sparse.attention import (
+    SparseMultiHeadAttention,
+)
+from sam3d_objects.model.backbone.tdfy_dit.modules.transformer.modulated import (
+    ModulatedTransformerCrossBlock,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+NUM_BLOCKS = 4
+NUM_STEPS = 6
+CFG_STRENGTH = 3.0
+
+
+class _TinyDiT(nn.Module):
+    """Timestep-modulated cross-attention blocks over [B, L, C] latents"""
+
+    def __init__(self, channels=32, ctx_channels=48, num_blocks=NUM_BLOCKS, num_heads=4):
+        super().__init__()
+        self.t_embedder = nn.Sequential(nn.Linear(1, channels), nn.SiLU())
+        self.blocks = nn.ModuleList(
+            [
+                ModulatedTransformerCrossBlock(channels, ctx_channels, num_heads=num_heads)
+                for _ in range(num_blocks)
+            ]
+        )
+
+    def forward(self, x, t, context):
+        mod = self.t_embedder(t[:, None])
+        for block in self.blocks:
+            x = block(x, mod, context)
+        return x
+
+
+def _inputs(model, num_tokens=16, num_ctx_tokens=24, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    channels = model.blocks[0].cross_attn.channels
+    ctx_channels = model.blocks[0].cross_attn.ctx_channels
+    noise = torch.randn(1, num_tokens, channels, generator=generator)
+    condition = torch.randn(1, num_ctx_tokens, ctx_channels, generator=generator)
+    return noise, condition
+
+
+def _sample(model, noise, condition, batch_cfg=True, num_steps=NUM_STEPS):
+    """
+    Euler sampling with CFG. As in the pipeline, the condition is rebuilt as new
+    tensors at every step: the concatenated CFG batch, or one tensor per branch.
+    """
+    x = noise
+    with torch.no_grad():
+        for t in torch.linspace(1, 0, num_steps + 1)[:-1]:
+            cond, uncond = condition.clone(), torch.zeros_like(condition)
+            if batch_cfg:
+                v_cond, v_uncond = model(
+                    torch.cat([x, x]), t.repeat(2), torch.cat([cond, uncond])
+                ).chunk(2)
+            else:
+                v_cond = model(x, t.repeat(1), cond)
+                v_uncond = model(x, t.repeat(1), uncond)
+            x = x - (v_uncond + CFG_STRENGTH * (v_cond - v_uncond)) / num_steps
+    return x
+
+
+@pytest.mark.parametrize("batch_cfg", [True, False], ids=["batched_cfg", "sequential_cfg"])
+def test_outputs_are_unchanged(batch_cfg):
+    model = _TinyDiT().eval()
+    noise, condition = _inputs(model)
+    reference = _sample(model, noise, condition, batch_cfg)
+    with context_kv_cache_scope() as cache:
+        cached = _sample(model, noise, condition, batch_cfg)
+    torch.testing.assert_close(cached, reference, rtol=0, atol=0)
+
+    # one context (the CFG batch) or two (cond, uncond); each projected once per block
+    num_contexts = 1 if batch_cfg else 2
+    forwards_per_step = 1 if batch_cfg else 2
+    assert cache.stats() == {
+        "hits": (NUM_STEPS * forwards_per_step - num_contexts) * NUM_BLOCKS,
+        "misses": num_contexts * NUM_BLOCKS,
+        "contexts": num_contexts,
+    }
+
+
+def test_changed_condition_is_projected_again():
+    model = _TinyDiT().eval()
+    noise, condition = _inputs(model)
+    _, other_condition = _inputs(model, seed=1)
+    with context_kv_cache_scope() as cache:
+        first = _sample(model, noise, condition)
+        second = _sample(model, noise, other_condition)
+    torch.testing.assert_close(first, _sample(model, noise, condition), rtol=0, atol=0)
+    torch.testing.assert_close(second, _sample(model, noise, other_condition), rtol=0, atol=0)
+    assert cache.stats()["contexts"] == 2
+    assert cache.stats()["misses"] == 2 * NUM_BLOCKS
+
+
+def test_in_place_update_of_a_context_is_not_served_stale():
+    projection = nn.Linear(4, 8)
+    context = torch.randn(1, 3, 4)
+    cache = ContextKVCache()
+    with torch.no_grad():
+        cache.get(projection, context, projection)
+        context.add_(1)
+        kv = cache.get(projection, context, projection)
+        torch.testing.assert_close(kv, projection(context), rtol=0, atol=0)
+    assert cache.stats() == {"hits": 0, "misses": 2, "contexts": 2}
+
+
+def test_no_caching_with_grad_or_outside_a_scope():
+    model = _TinyDiT()
+    noise, condition = _inputs(model)
+    context = torch.cat([condition, torch.zeros_like(condition)])
+    x, t = torch.cat([noise, noise]), torch.ones(2)
+    with context_kv_cache_scope() as cache:
+        model(x, t, context).sum().backward()  # training: K/V must stay in the graph
+    assert cache.stats() == {"hits": 0, "misses": 0, "contexts": 0}
+    assert model.blocks[0].cross_attn.to_kv.weight.grad is not None
+
+    with context_kv_cache_scope(enabled=False) as cache:
+        assert cache is None
+
+
+def test_contexts_beyond_the_limit_are_projected_directly():
+    projection = nn.Linear(4, 8)
+    cache = ContextKVCache(max_contexts=2)
+    contexts = [torch.full((1, 3, 4), float(i)) for i in range(3)]
+    with torch.no_grad():
+        for _ in range(2):
+            for context in contexts:
+                torch.testing.assert_close(cache.get(projection, context, projection), projection(context))
+    assert cache.stats() == {"hits": 2, "misses": 2, "contexts": 2}
+
+
+def test_sparse_cross_attention():
+    attention = SparseMultiHeadAttention(32, num_heads=4, ctx_channels=48, type="cross").eval()
+    generator = torch.Generator().manual_seed(0)
+    coords = torch.cat(
+        [torch.tensor([[0]] * 10 + [[1]] * 6), torch.randint(0, 8, (16, 3), generator=generator)], dim=1
+    ).int()
+    x = sp.SparseTensor(torch.randn(16, 32, generator=generator), coords)
+    context = torch.randn(2, 24, 48, generator=generator)
+    with torch.no_grad():
+        reference = [attention(x, context.clone()).feats for _ in range(3)]
+        with context_kv_cache_scope() as cache:
+            cached = [attention(x, context.clone()).feats for _ in range(3)]
+    for out, ref in zip(cached, reference):
+        torch.testing.assert_close(out, ref, rtol=0, atol=0)
+    assert cache.stats() == {"hits": 2, "misses": 1, "contexts": 1}
+
+
+def _best_step_ms(fn):
+    _, seconds = best_time(fn)
+    return seconds / NUM_STEPS * 1e3
+
+
+@pytest.mark.benchmark
+def test_benchmark_per_step():
+    # DINO-like condition: long context, wide tokens; a small latent grid
+    model = _TinyDiT(channels=128, ctx_channels=512, num_blocks=6, num_heads=8).eval()
+    noise, condition = _inputs(model, num_tokens=256, num_ctx_tokens=1024)
+
+    def cached():
+        with context_kv_cache_scope():
+            return _sample(model, noise, condition)
+
+    uncached_ms = _best_step_ms(lambda: _sample(model, noise, condition))
+    cached_ms = _best_step_ms(cached)
+    print(
+        f"tiny DiT, 6 blocks, 256 latent / 1024 context tokens, batched CFG: "
+        f"{uncached_ms:.1f} ms/step without the K/V cache, {cached_ms:.1f} ms/step with it "
+        f"({uncached_ms / cached_ms:.2f}x)"
+    )
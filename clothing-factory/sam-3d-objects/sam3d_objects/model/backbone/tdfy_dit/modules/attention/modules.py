@@ -6,6 +6,7 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from .full_attn import scaled_dot_product_attention
+from .kv_cache import cached_context_kv
 from sam3d_objects.data.utils import (
     tree_reduce_unique,
 )
@@ -28,7 +29,11 @@ class RotaryPositionEmbedder(nn.Module):
         self.hidden_size = hidden_size
         self.in_channels = in_channels
         self.freq_dim = hidden_size // in_channels // 2
-        self.freqs = torch.arange(self.freq_dim, dtype=torch.float32) / self.freq_dim
+        # a plain attribute, moved to the input's device on use: built on CPU so that it
+        # stays a real tensor when the module is instantiated on the meta device
+        self.freqs = (
+            torch.arange(self.freq_dim, dtype=torch.float32, device="cpu") / self.freq_dim
+        )
         self.freqs = 1.0 / (10000**self.freqs)
 
     def _get_phases(self, indices: torch.Tensor) -> torch.Tensor:
@@ -162,7 +167,7 @@ class MultiHeadAttention(nn.Module):
         else:
             Lkv = context.shape[1]
             q = self.to_q(x)
-            kv = self.to_kv(context)
+            kv = cached_context_kv(self.to_kv, context, self.to_kv)
             q = q.reshape(B, L, self.num_heads, -1)
             kv = kv.reshape(B, Lkv, 2, self.num_heads, -1)
             if self.qk_rms_norm:
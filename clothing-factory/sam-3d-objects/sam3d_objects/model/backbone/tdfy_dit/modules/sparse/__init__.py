@@ -4,6 +4,7 @@ from loguru import logger
 
 BACKEND = "spconv"
 # BACKEND = "torchsparse"
+# BACKEND = "torch"  # pure PyTorch, no compiled extension (CPU-only workers)
 DEBUG = False
 ATTN = "sdpa"
 
@@ -24,6 +25,7 @@ def __from_env():
     if env_sparse_backend is not None and env_sparse_backend in [
         "spconv",
         "torchsparse",
+        "torch",
     ]:
         BACKEND = env_sparse_backend
     if env_sparse_debug is not None:
@@ -42,7 +44,7 @@ def __from_env():
 __from_env()
 
 
-def set_backend(backend: Literal["spconv", "torchsparse"]):
+def set_backend(backend: Literal["spconv", "torchsparse", "torch"]):
     global BACKEND
     BACKEND = backend
 
@@ -4,3 +4,4 @@ from .serialized_attn import *
 from .windowed_attn import *
 from .modules import *
 from .masked_sdpa import *
+from .partition_cache import *
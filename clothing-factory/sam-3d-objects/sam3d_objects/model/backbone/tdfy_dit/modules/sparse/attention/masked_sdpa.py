@@ -27,34 +27,132 @@ def block_diag_attn_mask(q_seqlens, kv_seqlens, device=None, dtype=torch.float32
     return attn_mask
 
 
-def masked_sdpa(q, k, v, q_seqlen, kv_seqlen):
+# Upper bound on the number of attention logits (B * H * L_q * L_kv) computed
+# by a single scaled_dot_product_attention call. Groups that exceed it are
+# split along the batch and, for very long sequences, along the query axis.
+MAX_ATTN_ELEMENTS = 1 << 28
+
+
+def _seq_offsets(seqlens):
+    offsets = [0]
+    for seqlen in seqlens:
+        offsets.append(offsets[-1] + seqlen)
+    return offsets
+
+
+def _dense_sdpa(q, k, v):
     """
-    Mimic xFormers' memory_efficient_attention using PyTorch 2.0 scaled_dot_product_attention.
+    Dense attention on [B, L, H, C] inputs, returning [B, L_q, H, C_v].
     """
-    # Build the block-diagonal additive mask
-    # shape: [sum_q_len, sum_kv_len] with 0 where allowed, -inf where masked
-    attn_mask_2d = block_diag_attn_mask(
-        q_seqlen, kv_seqlen, device=q.device, dtype=q.dtype
-    )
+    q = q.permute(0, 2, 1, 3)  # [B, H, L, C]
+    k = k.permute(0, 2, 1, 3)  # [B, H, L, C]
+    v = v.permute(0, 2, 1, 3)  # [B, H, L, C]
+    out = F.scaled_dot_product_attention(q, k, v, dropout_p=0.0, is_causal=False)
+    return out.permute(0, 2, 1, 3)  # [B, L, H, C]
+
 
-    # PyTorch’s scaled_dot_product_attention expects a mask broadcastable to
-    # [batch_size, n_heads, q_len, kv_len]. For a single batch, single head:
-    attn_mask_4d = attn_mask_2d.unsqueeze(0).unsqueeze(0)
-    q = q.permute(0, 2, 1, 3)  # [N, H, L, C]
-    k = k.permute(0, 2, 1, 3)  # [N, H, L, C]
-    v = v.permute(0, 2, 1, 3)  # [N, H, L, C]
-
-    # Now call PyTorch 2.0’s built-in SDPA
-    # By default, it will automatically apply the "1/sqrt(dim)" scaling internally.
-    out = F.scaled_dot_product_attention(
-        query=q,
-        key=k,
-        value=v,
-        attn_mask=attn_mask_4d,  # Additive mask
-        dropout_p=0.0,  # or whatever dropout you need
-        is_causal=False,  # True if you want a causal (triangular) mask
+def _chunked_dense_sdpa(q, k, v, max_elements=MAX_ATTN_ELEMENTS):
+    """
+    Dense attention on [B, L, H, C] inputs, chunked so that no single call
+    materializes more than ``max_elements`` attention logits.
+    """
+    B, L_q, H, _ = q.shape
+    L_kv = k.shape[1]
+    per_seq = H * L_q * L_kv
+    if B * per_seq <= max_elements:
+        return _dense_sdpa(q, k, v)
+
+    if per_seq <= max_elements:
+        batch_chunk = max(1, max_elements // per_seq)
+        return torch.cat(
+            [
+                _dense_sdpa(
+                    q[i : i + batch_chunk],
+                    k[i : i + batch_chunk],
+                    v[i : i + batch_chunk],
+                )
+                for i in range(0, B, batch_chunk)
+            ],
+            dim=0,
+        )
+
+    # A single sequence is too long: query rows are independent, so split them.
+    q_chunk = max(1, max_elements // (H * L_kv))
+    return torch.cat(
+        [
+            torch.cat(
+                [
+                    _dense_sdpa(
+                        q[b : b + 1, i : i + q_chunk], k[b : b + 1], v[b : b + 1]
+                    )
+                    for i in range(0, L_q, q_chunk)
+                ],
+                dim=1,
+            )
+            for b in range(B)
+        ],
+        dim=0,
     )
-    # out is shape [1, sum_q_len, dim]
-    out = out.permute(0, 2, 1, 3)
 
-    return out[0]
+
+def _gather_group(x, starts, seqlen):
+    """
+    Gather equal-length sequences starting at ``starts`` from a packed
+    [T, H, C] tensor into a dense [B, L, H, C] batch.
+    """
+    index = starts.unsqueeze(1) + torch.arange(seqlen, device=x.device).unsqueeze(0)
+    return x[index.reshape(-1)].reshape(len(starts), seqlen, *x.shape[1:]), index
+
+
+def masked_sdpa(q, k, v, q_seqlen, kv_seqlen):
+    """
+    Mimic xFormers' memory_efficient_attention with a block-diagonal mask using
+    PyTorch 2.0 scaled_dot_product_attention.
+
+    Instead of building a dense [sum_q, sum_kv] mask, sequences sharing the same
+    (q_len, kv_len) are gathered into dense batches and attended without a
+    mask, so peak memory scales with the per-sequence L^2 rather than N^2.
+
+    Args:
+        q (torch.Tensor): [1, T_Q, H, C] packed queries.
+        k (torch.Tensor): [1, T_KV, H, C] packed keys.
+        v (torch.Tensor): [1, T_KV, H, C_v] packed values.
+        q_seqlen (List[int]): Query length of every sequence.
+        kv_seqlen (List[int]): Key/value length of every sequence.
+
+    Returns:
+        (torch.Tensor): [T_Q, H, C_v] packed outputs.
+    """
+    assert len(q_seqlen) == len(
+        kv_seqlen
+    ), f"masked_sdpa: got {len(q_seqlen)} query and {len(kv_seqlen)} key sequences"
+    q, k, v = q[0], k[0], v[0]
+
+    groups = {}
+    for i, lens in enumerate(zip(q_seqlen, kv_seqlen)):
+        groups.setdefault(lens, []).append(i)
+
+    # Every sequence has the same shape: the packed tensors are already a
+    # dense batch, no gather/scatter needed.
+    if len(groups) == 1:
+        (q_len, kv_len), _ = next(iter(groups.items()))
+        B = len(q_seqlen)
+        out = _chunked_dense_sdpa(
+            q.reshape(B, q_len, *q.shape[1:]),
+            k.reshape(B, kv_len, *k.shape[1:]),
+            v.reshape(B, kv_len, *v.shape[1:]),
+        )
+        return out.reshape(B * q_len, *out.shape[2:])
+
+    q_offsets = torch.tensor(_seq_offsets(q_seqlen)[:-1], device=q.device)
+    kv_offsets = torch.tensor(_seq_offsets(kv_seqlen)[:-1], device=k.device)
+    out = q.new_empty(q.shape[0], q.shape[1], v.shape[2])
+    for (q_len, kv_len), seq_ids in groups.items():
+        seq_ids = torch.tensor(seq_ids, device=q.device)
+        q_group, q_index = _gather_group(q, q_offsets[seq_ids], q_len)
+        k_group, _ = _gather_group(k, kv_offsets[seq_ids], kv_len)
+        v_group, _ = _gather_group(v, kv_offsets[seq_ids], kv_len)
+        out_group = _chunked_dense_sdpa(q_group, k_group, v_group)
+        out[q_index.reshape(-1)] = out_group.reshape(-1, *out_group.shape[2:])
+
+    return out
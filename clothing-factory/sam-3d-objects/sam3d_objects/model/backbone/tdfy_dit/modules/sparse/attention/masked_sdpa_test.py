@@ -0,0 +1,159 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Grouped varlen `masked_sdpa` against the previous implementation, which attended
+over the whole packed batch with a dense block-diagonal [sum_q, sum_kv] mask.
+
+The benchmark runs each implementation in a fresh interpreter so that the peak
+RSS of one does not hide the other. It is deselected by default; run it with
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/modules/sparse/attention/masked_sdpa_test.py
+
+or print the measurements as JSON:
+
+    python sam3d_objects/model/backbone/tdfy_dit/modules/sparse/attention/masked_sdpa_test.py
+"""
+import importlib
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from sam3d_objects.utils.benchmark import best_time
+
+# the package re-exports the `masked_sdpa` function under the module's name
+sdpa = importlib.import_module(
+    "sam3d_objects.model.backbone.tdfy_dit.modules.sparse.attention.masked_sdpa"
+)
+
+REPO_ROOT = Path(__file__).resolve().parents[7]
+
+# ragged batch of sparse-structure-like sequences
+BENCH_NUM_SEQS = 32
+BENCH_HEADS = 4
+BENCH_CHANNELS = 32
+
+
+def block_diag_masked_sdpa(q, k, v, q_seqlen, kv_seqlen):
+    """Previous implementation: one SDPA call with the dense block-diagonal mask"""
+    attn_mask = sdpa.block_diag_attn_mask(q_seqlen, kv_seqlen, device=q.device, dtype=q.dtype)
+    out = F.scaled_dot_product_attention(
+        q.permute(0, 2, 1, 3),
+        k.permute(0, 2, 1, 3),
+        v.permute(0, 2, 1, 3),
+        attn_mask=attn_mask[None, None],
+    )
+    return out.permute(0, 2, 1, 3)[0]
+
+
+def _packed(q_seqlen, kv_seqlen, heads=2, channels=16, v_channels=None, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    q = torch.randn(1, sum(q_seqlen), heads, channels, generator=generator)
+    k = torch.randn(1, sum(kv_seqlen), heads, channels, generator=generator)
+    v = torch.randn(1, sum(kv_seqlen), heads, v_channels or channels, generator=generator)
+    return q, k, v
+
+
+@pytest.mark.parametrize(
+    "q_seqlen, kv_seqlen",
+    [
+        ([7, 7, 7], [7, 7, 7]),  # uniform: no gather
+        ([5, 9, 5, 1, 9], [5, 9, 5, 1, 9]),  # self attention, ragged
+        ([4, 6, 4], [10, 3, 10]),  # cross attention, ragged
+        ([12], [12]),
+    ],
+)
+def test_matches_block_diagonal_mask(q_seqlen, kv_seqlen):
+    q, k, v = _packed(q_seqlen, kv_seqlen, v_channels=8)
+    out = sdpa.masked_sdpa(q, k, v, q_seqlen, kv_seqlen)
+    assert out.shape == (sum(q_seqlen), 2, 8)
+    torch.testing.assert_close(
+        out, block_diag_masked_sdpa(q, k, v, q_seqlen, kv_seqlen), rtol=1e-5, atol=1e-5
+    )
+
+
+@pytest.mark.parametrize("max_elements", [2 * 9 * 9, 2 * 9 * 9 * 2, 2 * 9 * 4, 1])
+def test_chunked_dense_matches_single_call(max_elements):
+    # batch chunks, query-row chunks, and the degenerate one-row chunks
+    q, k, v = _packed([9] * 5, [9] * 5)
+    q, k, v = (x.reshape(5, 9, *x.shape[2:]) for x in (q, k, v))
+    torch.testing.assert_close(
+        sdpa._chunked_dense_sdpa(q, k, v, max_elements=max_elements),
+        sdpa._dense_sdpa(q, k, v),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+
+
+def _bench_seqlens(num_seqs):
+    generator = torch.Generator().manual_seed(0)
+    return torch.randint(64, 160, (num_seqs,), generator=generator).tolist()
+
+
+def _rss_kib(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+
+def _measure(impl, num_seqs, repeats=3):
+    """Peak RSS growth (MiB) and best time (ms) of one implementation in this process"""
+    seqlens = _bench_seqlens(num_seqs)
+    q, k, v = _packed(seqlens, seqlens, heads=BENCH_HEADS, channels=BENCH_CHANNELS)
+    fn = {"grouped": sdpa.masked_sdpa, "block_diag": block_diag_masked_sdpa}[impl]
+    # reset the peak RSS (VmHWM) to the current RSS, so imports do not hide the peak
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    rss_before = _rss_kib("VmRSS")
+    with torch.no_grad():
+        _, seconds = best_time(lambda: fn(q, k, v, seqlens, seqlens), repeats=repeats)
+    rss_peak = _rss_kib("VmHWM")
+    return {
+        "impl": impl,
+        "tokens": sum(seqlens),
+        "peak_rss_mib": (rss_peak - rss_before) / 1024,
+        "time_ms": seconds * 1e3,
+    }
+
+
+def _measure_in_subprocess(impl, num_seqs):
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), LIDRA_SKIP_INIT="1")
+    result = subprocess.run(
+        [sys.executable, __file__, impl, str(num_seqs)],
+        env=env,
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.benchmark
+@pytest.mark.skipif(sys.platform != "linux", reason="reads the peak RSS from /proc")
+def test_benchmark_peak_rss_and_time():
+    results = [_measure_in_subprocess(impl, BENCH_NUM_SEQS) for impl in ("block_diag", "grouped")]
+    for r in results:
+        print(
+            f"{r['impl']:>10}: {r['tokens']} tokens, "
+            f"peak RSS +{r['peak_rss_mib']:.1f} MiB, {r['time_ms']:.1f} ms"
+        )
+    block_diag, grouped = results
+    # the dense mask and its [H, sum_q, sum_kv] logits dominate the previous implementation
+    assert grouped["peak_rss_mib"] < block_diag["peak_rss_mib"] / 2
+
+
+if __name__ == "__main__":
+    impl = sys.argv[1] if len(sys.argv) > 1 else None
+    num_seqs = int(sys.argv[2]) if len(sys.argv) > 2 else BENCH_NUM_SEQS
+    torch.set_num_threads(1)
+    if impl is None:
+        for name in ("block_diag", "grouped"):
+            print(json.dumps(_measure_in_subprocess(name, num_seqs)))
+    else:
+        print(json.dumps(_measure(impl, num_seqs)))
@@ -10,7 +10,7 @@ from .serialized_attn import (
     sparse_serialized_scaled_dot_product_self_attention,
 )
 from .windowed_attn import sparse_windowed_scaled_dot_product_self_attention
-from ...attention import RotaryPositionEmbedder
+from ...attention import RotaryPositionEmbedder, cached_context_kv
 
 
 class SparseMultiHeadRMSNorm(nn.Module):
@@ -154,7 +154,9 @@ class SparseMultiHeadAttention(nn.Module):
         else:
             q = self._linear(self.to_q, x)
             q = self._reshape_chs(q, (self.num_heads, -1))
-            kv = self._linear(self.to_kv, context)
+            kv = cached_context_kv(
+                self.to_kv, context, lambda ctx: self._linear(self.to_kv, ctx)
+            )
             kv = self._fused_pre(kv, num_fused=2)
             if self.qk_rms_norm:
                 q = self.q_rms_norm(q)
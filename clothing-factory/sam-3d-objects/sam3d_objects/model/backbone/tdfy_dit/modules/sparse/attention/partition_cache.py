@@ -0,0 +1,116 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+from typing import *
+from contextlib import contextmanager
+from contextvars import ContextVar
+import torch
+from loguru import logger
+
+
+__all__ = [
+    "PartitionCache",
+    "partition_cache_scope",
+    "active_partition_cache",
+    "cached_partition",
+]
+
+
+class PartitionCache:
+    """
+    Window / serialization partitions keyed by coordinates rather than by SparseTensor.
+
+    The spatial cache of a SparseTensor is lost whenever a new tensor is built from
+    scratch (e.g. at every flow step), although the coordinates are unchanged. Entries
+    here are keyed by the coords tensor (storage, version and shape) and the partition
+    parameters, and hold a reference to the coords so the storage cannot be reused by
+    another tensor while the cache is alive.
+    """
+
+    def __init__(self):
+        self._partitions = {}
+        self._coords = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _coords_key(coords: torch.Tensor) -> Tuple:
+        return (
+            coords.data_ptr(),
+            coords._version,
+            tuple(coords.shape),
+            tuple(coords.stride()),
+            str(coords.device),
+        )
+
+    def partition(self, coords: torch.Tensor, name: str, compute: Callable[[], Any]) -> Any:
+        key = (name,) + self._coords_key(coords)
+        entry = self._partitions.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        value = compute()
+        self._partitions[key] = (coords, value)
+        return value
+
+    def coords(self, source: Any, key: Hashable, build: Callable[[], torch.Tensor]) -> torch.Tensor:
+        """
+        Reuse the coords tensor built from the same `source` object, so that partitions
+        computed for it at one step are found again at the next.
+        """
+        entry = self._coords.get((id(source), key))
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        tensor = build()
+        self._coords[(id(source), key)] = (source, tensor)
+        return tensor
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._partitions),
+        }
+
+
+_active_cache: ContextVar[Optional[PartitionCache]] = ContextVar(
+    "sparse_partition_cache", default=None
+)
+
+
+def active_partition_cache() -> Optional[PartitionCache]:
+    return _active_cache.get()
+
+
+@contextmanager
+def partition_cache_scope(name: str = "partition cache"):
+    """
+    Share window / serialization partitions across blocks and steps within the scope
+    (e.g. one `sample_slat` call). Scopes are per thread / context.
+    """
+    cache = PartitionCache()
+    token = _active_cache.set(cache)
+    try:
+        yield cache
+    finally:
+        _active_cache.reset(token)
+        stats = cache.stats()
+        logger.debug(
+            f"[SPARSE] {name}: {stats['misses']} partitions computed, {stats['hits']} reused"
+        )
+
+
+def cached_partition(tensor, name: str, compute: Callable[[], Any]) -> Any:
+    """
+    Look up a partition in the tensor's spatial cache, then in the active partition
+    cache, and compute it only if neither has it.
+    """
+    value = tensor.get_spatial_cache(name)
+    if value is not None:
+        return value
+    cache = _active_cache.get()
+    if cache is None:
+        value = compute()
+    else:
+        value = cache.partition(tensor.coords, name, compute)
+    tensor.register_spatial_cache(name, value)
+    return value
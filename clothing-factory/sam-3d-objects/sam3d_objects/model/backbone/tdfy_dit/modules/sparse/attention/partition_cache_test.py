@@ -0,0 +1,161 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+`PartitionCache` over a multi-step generation: every distinct window partition and
+downsample mapping is computed once per `partition_cache_scope`, while each step
+builds fresh SparseTensors from the same coords, as the flow solver does.
+"""
+import collections
+import importlib
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+from sam3d_objects.model.backbone.tdfy_dit.modules.sparse.transformer import (
+    SparseTransformerBlock,
+)
+
+# the package re-exports the attention functions under the modules' names
+windowed_attn = importlib.import_module(
+    "sam3d_objects.model.backbone.tdfy_dit.modules.sparse.attention.windowed_attn"
+)
+
+RESOLUTION = 16
+CHANNELS = 16
+WINDOW_SIZE = 4
+NUM_STEPS = 5
+# swin blocks alternate two window partitions at each resolution, and one downsample
+DISTINCT_PARTITIONS = 2 + 1 + 2
+
+
+class _TinyNet(nn.Module):
+    """Swin blocks, a 2x downsample, and swin blocks on the downsampled voxels"""
+
+    def __init__(self, num_blocks=4):
+        super().__init__()
+
+        def swin(i):
+            return SparseTransformerBlock(
+                CHANNELS,
+                num_heads=2,
+                attn_mode="windowed",
+                window_size=WINDOW_SIZE,
+                shift_window=WINDOW_SIZE // 2 * (i % 2),
+            )
+
+        self.blocks = nn.ModuleList([swin(i) for i in range(num_blocks)])
+        self.downsample = sp.SparseDownsample(2)
+        self.low_res_blocks = nn.ModuleList([swin(i) for i in range(num_blocks)])
+
+    def forward(self, x):
+        for block in self.blocks:
+            x = block(x)
+        x = self.downsample(x)
+        for block in self.low_res_blocks:
+            x = block(x)
+        return x
+
+
+def _coords(batch_size=2, occupancy=0.15, seed=0):
+    occupied = np.random.default_rng(seed).random((batch_size,) + (RESOLUTION,) * 3) < occupancy
+    return np.argwhere(occupied).astype(np.int32)
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    """Number of times each partition (kind, number of voxels, parameters) is computed"""
+    counts = collections.Counter()
+    calc_window_partition = windowed_attn.calc_window_partition
+    downsample_coords = sp.SparseDownsample._downsample_coords
+
+    def counting_window_partition(tensor, window_size, shift_window=0):
+        counts[("window", tensor.coords.shape[0], window_size, shift_window)] += 1
+        return calc_window_partition(tensor, window_size, shift_window)
+
+    def counting_downsample(coords, factor):
+        counts[("downsample", coords.shape[0], factor)] += 1
+        return downsample_coords(coords, factor)
+
+    monkeypatch.setattr(windowed_attn, "calc_window_partition", counting_window_partition)
+    monkeypatch.setattr(sp.SparseDownsample, "_downsample_coords", staticmethod(counting_downsample))
+    return counts
+
+
+def _generate(net, coords, num_steps=NUM_STEPS):
+    """Flow-solver-like loop: a new SparseTensor per step, from the same coords array"""
+    generator = torch.Generator().manual_seed(0)
+    outputs = []
+    with torch.no_grad():
+        for _ in range(num_steps):
+            cache = sp.active_partition_cache()
+            if cache is None:
+                tensor = torch.tensor(coords)
+            else:
+                tensor = cache.coords(coords, "coords", lambda: torch.tensor(coords))
+            feats = torch.randn(len(coords), CHANNELS, generator=generator)
+            outputs.append(net(sp.SparseTensor(feats, tensor)).feats)
+    return outputs
+
+
+def test_each_partition_is_computed_once_per_generation(counts):
+    net, coords = _TinyNet().eval(), _coords()
+    with sp.partition_cache_scope() as cache:
+        _generate(net, coords)
+
+    assert len(counts) == DISTINCT_PARTITIONS
+    assert set(counts.values()) == {1}
+    # the blocks of one step share the tensor's spatial cache; the later steps hit
+    assert cache.stats() == {
+        "hits": (NUM_STEPS - 1) * DISTINCT_PARTITIONS,
+        "misses": DISTINCT_PARTITIONS,
+        "entries": DISTINCT_PARTITIONS,
+    }
+
+    # a new generation starts with an empty cache
+    with sp.partition_cache_scope() as cache:
+        _generate(net, coords)
+    assert set(counts.values()) == {2}
+    assert cache.stats()["misses"] == DISTINCT_PARTITIONS
+
+
+def test_without_scope_every_step_recomputes(counts):
+    _generate(_TinyNet().eval(), _coords())
+    assert len(counts) == DISTINCT_PARTITIONS
+    assert set(counts.values()) == {NUM_STEPS}
+
+
+def test_cached_partitions_give_the_same_outputs():
+    net, coords = _TinyNet().eval(), _coords()
+    reference = _generate(net, coords)
+    with sp.partition_cache_scope():
+        cached = _generate(net, coords)
+    for out, ref in zip(cached, reference):
+        torch.testing.assert_close(out, ref)
+
+
+def test_modified_coords_are_not_reused(counts):
+    net = _TinyNet().eval()
+    coords = torch.tensor(_coords())
+    feats = torch.randn(len(coords), CHANNELS)
+    with sp.partition_cache_scope() as cache, torch.no_grad():
+        net(sp.SparseTensor(feats, coords))
+        # an in-place write (a mirror: same voxel counts) bumps the version, so the
+        # cached partitions no longer apply
+        coords[:, 1:] = RESOLUTION - 1 - coords[:, 1:]
+        net(sp.SparseTensor(feats, coords))
+        # other coords with the same shape are different keys as well
+        net(sp.SparseTensor(feats, coords.clone()))
+    assert set(counts.values()) == {3}
+    assert cache.stats()["hits"] == 0
+
+
+def test_coords_are_rebuilt_for_another_source():
+    cache = sp.PartitionCache()
+    first, second = _coords(seed=0), _coords(seed=0)
+    built = cache.coords(first, "coords", lambda: torch.tensor(first))
+    assert cache.coords(first, "coords", lambda: torch.tensor(first)) is built
+    # equal arrays are different sources: the key is the object, not its content
+    assert cache.coords(second, "coords", lambda: torch.tensor(second)) is not built
+    assert cache.coords(first, "other", lambda: torch.tensor(first)) is not built
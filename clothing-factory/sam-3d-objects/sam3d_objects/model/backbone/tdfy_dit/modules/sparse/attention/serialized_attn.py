@@ -5,6 +5,7 @@ import torch
 import math
 from .. import SparseTensor
 from .. import DEBUG, ATTN
+from .partition_cache import cached_partition
 
 if ATTN == "xformers":
     import xformers.ops as xops
@@ -173,21 +174,11 @@ def sparse_serialized_scaled_dot_product_self_attention(
     serialization_spatial_cache_name = (
         f"serialization_{serialize_mode}_{window_size}_{shift_sequence}_{shift_window}"
     )
-    serialization_spatial_cache = qkv.get_spatial_cache(
-        serialization_spatial_cache_name
+    fwd_indices, bwd_indices, seq_lens, seq_batch_indices = cached_partition(
+        qkv,
+        serialization_spatial_cache_name,
+        lambda: calc_serialization(qkv, window_size, serialize_mode, shift_sequence, shift_window),
     )
-    if serialization_spatial_cache is None:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = calc_serialization(
-            qkv, window_size, serialize_mode, shift_sequence, shift_window
-        )
-        qkv.register_spatial_cache(
-            serialization_spatial_cache_name,
-            (fwd_indices, bwd_indices, seq_lens, seq_batch_indices),
-        )
-    else:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = (
-            serialization_spatial_cache
-        )
 
     M = fwd_indices.shape[0]
     T = qkv.feats.shape[0]
@@ -4,6 +4,7 @@ import torch
 import math
 from .. import SparseTensor
 from .. import DEBUG, ATTN
+from .partition_cache import cached_partition
 
 if ATTN == "xformers":
     import xformers.ops as xops
@@ -93,21 +94,11 @@ def sparse_windowed_scaled_dot_product_self_attention(
     ), f"Invalid shape for qkv, got {qkv.shape}, expected [N, *, 3, H, C]"
 
     serialization_spatial_cache_name = f"window_partition_{window_size}_{shift_window}"
-    serialization_spatial_cache = qkv.get_spatial_cache(
-        serialization_spatial_cache_name
+    fwd_indices, bwd_indices, seq_lens, seq_batch_indices = cached_partition(
+        qkv,
+        serialization_spatial_cache_name,
+        lambda: calc_window_partition(qkv, window_size, shift_window),
     )
-    if serialization_spatial_cache is None:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = calc_window_partition(
-            qkv, window_size, shift_window
-        )
-        qkv.register_spatial_cache(
-            serialization_spatial_cache_name,
-            (fwd_indices, bwd_indices, seq_lens, seq_batch_indices),
-        )
-    else:
-        fwd_indices, bwd_indices, seq_lens, seq_batch_indices = (
-            serialization_spatial_cache
-        )
 
     M = fwd_indices.shape[0]
     T = qkv.feats.shape[0]
@@ -7,6 +7,33 @@ if BACKEND == "torchsparse":
     from torchsparse import SparseTensor as SparseTensorData
 elif BACKEND == "spconv":
     from spconv.pytorch import SparseConvTensor as SparseTensorData
+elif BACKEND == "torch":
+
+    class SparseTensorData:
+        """
+        Minimal sparse tensor container for the pure-PyTorch backend.
+        Mirrors the parts of spconv's SparseConvTensor used here.
+        """
+
+        def __init__(self, features, indices, spatial_shape=None, batch_size=None):
+            self.features = features
+            self.indices = indices
+            self.spatial_shape = spatial_shape
+            self.batch_size = batch_size
+
+        def dense(self) -> torch.Tensor:
+            spatial_shape = self.spatial_shape
+            if spatial_shape is None:
+                spatial_shape = (self.indices[:, 1:].max(0)[0] + 1).tolist()
+            batch_size = self.batch_size
+            if batch_size is None:
+                batch_size = self.indices[:, 0].max().item() + 1
+            feats = self.features.reshape(self.features.shape[0], -1)
+            out = feats.new_zeros(batch_size, *spatial_shape, feats.shape[1])
+            idx = self.indices.long()
+            out[idx[:, 0], idx[:, 1], idx[:, 2], idx[:, 3]] = feats
+            return out.permute(0, 4, 1, 2, 3).contiguous()
+
 
 __all__ = [
     "SparseTensor",
@@ -19,7 +46,7 @@ __all__ = [
 
 class SparseTensor:
     """
-    Sparse tensor with support for both torchsparse and spconv backends.
+    Sparse tensor with support for torchsparse, spconv and pure-PyTorch backends.
 
     Parameters:
     - feats (torch.Tensor): Features of the sparse tensor.
@@ -90,6 +117,8 @@ class SparseTensor:
                     **kwargs,
                 )
                 self.data._features = feats
+            elif BACKEND == "torch":
+                self.data = SparseTensorData(feats, coords, batch_size=shape[0])
         elif method_id == 1:
             data, shape, layout = args + (None,) * (3 - len(args))
             if "data" in kwargs:
@@ -166,28 +195,28 @@ class SparseTensor:
     def feats(self) -> torch.Tensor:
         if BACKEND == "torchsparse":
             return self.data.F
-        elif BACKEND == "spconv":
+        elif BACKEND in ["spconv", "torch"]:
             return self.data.features
 
     @feats.setter
     def feats(self, value: torch.Tensor):
         if BACKEND == "torchsparse":
             self.data.F = value
-        elif BACKEND == "spconv":
+        elif BACKEND in ["spconv", "torch"]:
             self.data.features = value
 
     @property
     def coords(self) -> torch.Tensor:
         if BACKEND == "torchsparse":
             return self.data.C
-        elif BACKEND == "spconv":
+        elif BACKEND in ["spconv", "torch"]:
             return self.data.indices
 
     @coords.setter
     def coords(self, value: torch.Tensor):
         if BACKEND == "torchsparse":
             self.data.C = value
-        elif BACKEND == "spconv":
+        elif BACKEND in ["spconv", "torch"]:
             self.data.indices = value
 
     @property
@@ -259,7 +288,7 @@ class SparseTensor:
     def dense(self) -> torch.Tensor:
         if BACKEND == "torchsparse":
             return self.data.dense()
-        elif BACKEND == "spconv":
+        elif BACKEND in ["spconv", "torch"]:
             return self.data.dense()
 
     def reshape(self, *shape) -> "SparseTensor":
@@ -301,6 +330,13 @@ class SparseTensor:
             new_data.int8_scale = self.data.int8_scale
             if coords is not None:
                 new_data.indices = coords
+        elif BACKEND == "torch":
+            new_data = SparseTensorData(
+                feats,
+                self.data.indices if coords is None else coords,
+                self.data.spatial_shape,
+                self.data.batch_size,
+            )
         new_tensor = SparseTensor(
             new_data,
             shape=torch.Size(new_shape),
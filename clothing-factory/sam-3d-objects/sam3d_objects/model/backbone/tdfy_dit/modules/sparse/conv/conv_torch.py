@@ -0,0 +1,359 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Pure-PyTorch sparse convolution backend (SPARSE_BACKEND=torch).
+
+Used on workers without spconv/torchsparse (e.g. CPU-only nodes). Each
+convolution is computed as gather-GEMM-scatter over the kernel offsets. The
+kernel maps (input/output index pairs per offset) are built from a sorted
+coordinate hash and cached on the SparseTensor via its spatial cache, so all
+convolutions at the same scale share them.
+"""
+from typing import *
+import itertools
+import math
+import torch
+import torch.nn as nn
+from .. import SparseTensor
+from .. import DEBUG
+
+__all__ = [
+    "SparseConv3d",
+    "SparseInverseConv3d",
+]
+
+
+def _to_3tuple(x) -> Tuple[int, int, int]:
+    return tuple(x) if isinstance(x, (list, tuple)) else (x, x, x)
+
+
+def _kernel_offsets(kernel_size, dilation, centered, device) -> torch.Tensor:
+    """
+    Kernel offsets in spconv's (kD, kH, kW) weight order, as a [K, 3] tensor.
+    """
+    ranges = [
+        range(-(k // 2), k - k // 2) if centered else range(k) for k in kernel_size
+    ]
+    offsets = torch.tensor(list(itertools.product(*ranges)), dtype=torch.long)
+    offsets = offsets.reshape(-1, 3) * torch.tensor(dilation, dtype=torch.long)
+    return offsets.to(device)
+
+
+def _coord_extent(coords: torch.Tensor, margin: int = 0) -> int:
+    """
+    Per-axis key range covering the (x, y, z) of [N, 4] coordinates, plus a margin
+    on both sides.
+    """
+    max_coord = int(coords[:, 1:].max().item()) if coords.shape[0] > 0 else 0
+    return max_coord + 1 + 2 * margin
+
+
+def _encode_coords(coords: torch.Tensor, extent: int, margin: int = 0) -> torch.Tensor:
+    """
+    Pack [N, 4] (batch, x, y, z) coordinates into batch-major int64 keys.
+    """
+    c = coords.long()
+    s, m = extent, margin
+    return ((c[:, 0] * s + c[:, 1] + m) * s + c[:, 2] + m) * s + c[:, 3] + m
+
+
+class _CoordIndex:
+    """
+    Hashed index over [N, 4] (batch, x, y, z) coordinates.
+
+    Coordinates are packed into int64 keys and sorted once; lookups are a
+    vectorized searchsorted over the sorted keys.
+    """
+
+    def __init__(self, coords: torch.Tensor, margin: int = 0):
+        self.margin = margin
+        self.extent = _coord_extent(coords, margin)
+        self.keys, self.order = torch.sort(self.encode(coords))
+
+    def encode(self, coords: torch.Tensor) -> torch.Tensor:
+        return _encode_coords(coords, self.extent, self.margin)
+
+    def lookup(self, coords: torch.Tensor) -> torch.Tensor:
+        """
+        Index of each query coordinate in the indexed coordinates, -1 if absent.
+        """
+        if self.keys.shape[0] == 0:
+            return torch.full_like(coords[:, 0], -1, dtype=torch.long)
+        xyz = coords[:, 1:]
+        in_range = ((xyz >= -self.margin) & (xyz < self.extent - self.margin)).all(
+            dim=1
+        )
+        keys = self.encode(coords)
+        pos = torch.searchsorted(self.keys, keys).clamp_(max=self.keys.shape[0] - 1)
+        found = in_range & (self.keys[pos] == keys)
+        return torch.where(found, self.order[pos], torch.full_like(pos, -1))
+
+
+def _submanifold_kernel_map(
+    coords: torch.Tensor, kernel_size, dilation
+) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    """
+    Kernel map of a submanifold convolution: outputs live on the input coords.
+    """
+    offsets = _kernel_offsets(kernel_size, dilation, True, coords.device)
+    index = _CoordIndex(coords, margin=int(offsets.abs().max().item()))
+    N, K = coords.shape[0], offsets.shape[0]
+    query = coords.long().unsqueeze(0).repeat(K, 1, 1)  # [K, N, 4]
+    query[:, :, 1:] += offsets.unsqueeze(1)
+    in_idx = index.lookup(query.reshape(K * N, 4)).reshape(K, N)
+    out_idx = torch.arange(N, device=coords.device)
+    kmap = []
+    for k in range(K):
+        mask = in_idx[k] >= 0
+        kmap.append((in_idx[k][mask], out_idx[mask]))
+    return kmap
+
+
+def _cached_submanifold_kernel_map(
+    x: SparseTensor, kernel_size, dilation
+) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    """
+    Submanifold kernel map of x, shared through its spatial cache. The cached map
+    is only reused for the very same coords tensor, unmodified since (its version
+    counter is unchanged).
+    """
+    cache_name = f"torch_subm_kmap_{kernel_size}_{dilation}"
+    cached = x.get_spatial_cache(cache_name)
+    if cached is not None:
+        coords, version, kmap = cached
+        if coords is x.coords and version == x.coords._version:
+            return kmap
+    kmap = _submanifold_kernel_map(x.coords, kernel_size, dilation)
+    x.register_spatial_cache(cache_name, (x.coords, x.coords._version, kmap))
+    return kmap
+
+
+def _strided_kernel_map(
+    coords: torch.Tensor, kernel_size, stride, dilation, padding
+) -> Tuple[torch.Tensor, List[Tuple[torch.Tensor, torch.Tensor]]]:
+    """
+    Output coordinates and kernel map of a regular (strided) sparse convolution,
+    following spconv: ``out * stride = in + padding - k * dilation``, with the
+    output spatial shape spconv derives from the input one (max coords + 1).
+    """
+    device = coords.device
+    offsets = _kernel_offsets(kernel_size, dilation, False, device)  # [K, 3]
+    stride_t = torch.tensor(stride, dtype=torch.long, device=device)
+    padding_t = torch.tensor(padding, dtype=torch.long, device=device)
+    kernel_t = torch.tensor(kernel_size, dtype=torch.long, device=device)
+    dilation_t = torch.tensor(dilation, dtype=torch.long, device=device)
+    K = offsets.shape[0]
+
+    if coords.shape[0] > 0:
+        in_shape = coords[:, 1:].long().max(dim=0).values + 1
+    else:
+        in_shape = torch.zeros(3, dtype=torch.long, device=device)
+    out_shape = (in_shape + 2 * padding_t - dilation_t * (kernel_t - 1) - 1) // stride_t + 1
+    cand = coords[:, 1:].long().unsqueeze(0) + padding_t - offsets.unsqueeze(1)
+    valid = (
+        ((cand % stride_t) == 0).all(dim=-1)
+        & (cand >= 0).all(dim=-1)
+        & (cand < out_shape * stride_t).all(dim=-1)
+    )  # [K, N]
+    k_idx, n_idx = valid.nonzero(as_tuple=True)
+    out_all = torch.cat(
+        [coords[n_idx, :1].long(), cand[k_idx, n_idx] // stride_t], dim=1
+    )  # [P, 4]
+
+    # Keys are batch-major, so unique() leaves every batch contiguous.
+    s = _coord_extent(out_all)
+    keys, inverse = torch.unique(_encode_coords(out_all, s), return_inverse=True)
+    out_coords = torch.stack(
+        [keys // s**3, (keys // s**2) % s, (keys // s) % s, keys % s], dim=1
+    ).int()
+
+    kmap = []
+    for k in range(K):
+        mask = k_idx == k
+        kmap.append((n_idx[mask], inverse[mask]))
+    return out_coords, kmap
+
+
+def _gather_gemm_scatter(
+    feats: torch.Tensor,
+    kmap: List[Tuple[torch.Tensor, torch.Tensor]],
+    weight: torch.Tensor,
+    bias: Optional[torch.Tensor],
+    num_out: int,
+    transpose: bool = False,
+) -> torch.Tensor:
+    """
+    Args:
+        feats: [N_in, C_in] input features.
+        kmap: Per kernel offset (in_idx, out_idx) pairs.
+        weight: [C_out, K, C_in] weights.
+        transpose: Use the kernel map in reverse (inverse convolution).
+    """
+    out = feats.new_zeros(num_out, weight.shape[0])
+    for k, (in_idx, out_idx) in enumerate(kmap):
+        if transpose:
+            in_idx, out_idx = out_idx, in_idx
+        if in_idx.shape[0] == 0:
+            continue
+        out.index_add_(0, out_idx, feats[in_idx] @ weight[:, k].t())
+    if bias is not None:
+        out = out + bias
+    return out
+
+
+class _SparseConvParams(nn.Module):
+    """
+    Convolution parameters stored in spconv's [C_out, kD, kH, kW, C_in] layout,
+    so checkpoints trained with spconv load unchanged (``conv.weight``).
+    """
+
+    def __init__(self, in_channels, out_channels, kernel_size, bias=True):
+        super(_SparseConvParams, self).__init__()
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = kernel_size
+        self.weight = nn.Parameter(
+            torch.empty(out_channels, *kernel_size, in_channels)
+        )
+        if bias:
+            self.bias = nn.Parameter(torch.empty(out_channels))
+        else:
+            self.register_parameter("bias", None)
+        self.reset_parameters()
+
+    def reset_parameters(self):
+        fan_in = self.in_channels * math.prod(self.kernel_size)
+        bound = 1 / math.sqrt(fan_in)
+        nn.init.uniform_(self.weight, -bound, bound)
+        if self.bias is not None:
+            nn.init.uniform_(self.bias, -bound, bound)
+
+    def flat_weight(self) -> torch.Tensor:
+        return self.weight.reshape(self.out_channels, -1, self.in_channels)
+
+
+class SparseConv3d(nn.Module):
+    def __init__(
+        self,
+        in_channels,
+        out_channels,
+        kernel_size,
+        stride=1,
+        dilation=1,
+        padding=None,
+        bias=True,
+        indice_key=None,
+    ):
+        super(SparseConv3d, self).__init__()
+        self.kernel_size = _to_3tuple(kernel_size)
+        self.dilation = _to_3tuple(dilation)
+        self.conv = _SparseConvParams(
+            in_channels, out_channels, self.kernel_size, bias=bias
+        )
+        self.stride = _to_3tuple(stride)
+        self.padding = padding
+
+    def forward(self, x: SparseTensor) -> SparseTensor:
+        spatial_changed = any(s != 1 for s in self.stride) or (self.padding is not None)
+        new_shape = [x.shape[0], self.conv.out_channels]
+
+        if not spatial_changed:
+            kmap = _cached_submanifold_kernel_map(x, self.kernel_size, self.dilation)
+            new_feats = _gather_gemm_scatter(
+                x.feats,
+                kmap,
+                self.conv.flat_weight(),
+                self.conv.bias,
+                x.coords.shape[0],
+            )
+            return x.replace(new_feats)
+
+        padding = _to_3tuple(0 if self.padding is None else self.padding)
+        new_coords, kmap = _strided_kernel_map(
+            x.coords, self.kernel_size, self.stride, self.dilation, padding
+        )
+        new_feats = _gather_gemm_scatter(
+            x.feats,
+            kmap,
+            self.conv.flat_weight(),
+            self.conv.bias,
+            new_coords.shape[0],
+        )
+        out = SparseTensor(
+            new_feats,
+            new_coords,
+            shape=torch.Size(new_shape),
+            scale=tuple([s * stride for s, stride in zip(x._scale, self.stride)]),
+            spatial_cache=x._spatial_cache,
+        )
+        # Everything the inverse convolution needs to map back onto x.
+        out.register_spatial_cache(f"conv_{self.stride}_kmap", kmap)
+        out.register_spatial_cache(f"conv_{self.stride}_src_coords", x.coords)
+        out.register_spatial_cache(f"conv_{self.stride}_src_layout", x.layout)
+        return out
+
+
+class SparseInverseConv3d(nn.Module):
+    def __init__(
+        self,
+        in_channels,
+        out_channels,
+        kernel_size,
+        stride=1,
+        dilation=1,
+        bias=True,
+        indice_key=None,
+    ):
+        super(SparseInverseConv3d, self).__init__()
+        self.kernel_size = _to_3tuple(kernel_size)
+        self.dilation = _to_3tuple(dilation)
+        self.conv = _SparseConvParams(
+            in_channels, out_channels, self.kernel_size, bias=bias
+        )
+        self.stride = _to_3tuple(stride)
+
+    def forward(self, x: SparseTensor) -> SparseTensor:
+        spatial_changed = any(s != 1 for s in self.stride)
+        new_shape = [x.shape[0], self.conv.out_channels]
+
+        if not spatial_changed:
+            # A stride-1 inverse conv is the transposed submanifold conv.
+            kmap = _cached_submanifold_kernel_map(x, self.kernel_size, self.dilation)
+            new_feats = _gather_gemm_scatter(
+                x.feats,
+                kmap,
+                self.conv.flat_weight(),
+                self.conv.bias,
+                x.coords.shape[0],
+                transpose=True,
+            )
+            return x.replace(new_feats)
+
+        kmap = x.get_spatial_cache(f"conv_{self.stride}_kmap")
+        src_coords = x.get_spatial_cache(f"conv_{self.stride}_src_coords")
+        src_layout = x.get_spatial_cache(f"conv_{self.stride}_src_layout")
+        assert (
+            kmap is not None
+        ), f"SparseInverseConv3d: no matching SparseConv3d with stride {self.stride}"
+        new_feats = _gather_gemm_scatter(
+            x.feats,
+            kmap,
+            self.conv.flat_weight(),
+            self.conv.bias,
+            src_coords.shape[0],
+            transpose=True,
+        )
+        if DEBUG:
+            assert all(
+                int(out_idx.max()) < x.coords.shape[0]
+                for _, out_idx in kmap
+                if out_idx.shape[0] > 0
+            ), "SparseInverseConv3d: kernel map does not match the input"
+        out = SparseTensor(
+            new_feats,
+            src_coords,
+            shape=torch.Size(new_shape),
+            layout=src_layout,
+            scale=tuple([s // stride for s, stride in zip(x._scale, self.stride)]),
+            spatial_cache=x._spatial_cache,
+        )
+        return out
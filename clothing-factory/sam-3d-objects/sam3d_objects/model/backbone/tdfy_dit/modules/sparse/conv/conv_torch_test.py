@@ -0,0 +1,157 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Pure-PyTorch sparse convolutions against dense `F.conv3d` / `F.conv_transpose3d`
+on the densified input, for submanifold, strided and inverse convolutions.
+"""
+import importlib
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+
+pytestmark = pytest.mark.skipif(
+    sp.BACKEND != "torch", reason="tests the SPARSE_BACKEND=torch convolutions"
+)
+
+RESOLUTION = 8
+BATCH = 2
+C_IN, C_OUT = 3, 5
+
+
+def _random_sparse(occupancy=0.2, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    occupied = torch.rand(BATCH, RESOLUTION, RESOLUTION, RESOLUTION, generator=generator) < occupancy
+    coords = occupied.nonzero().int()  # batch-major, as produced by the sparse structure
+    # the spatial shape (max coords + 1) is the full dense grid
+    assert (coords[:, 1:].max(dim=0).values == RESOLUTION - 1).all()
+    feats = torch.randn(coords.shape[0], C_IN, generator=generator)
+    return sp.SparseTensor(feats, coords)
+
+
+def _dense(feats, coords, size):
+    dense = feats.new_zeros(BATCH, feats.shape[1], size, size, size)
+    b, x, y, z = coords.long().unbind(dim=1)
+    dense[b, :, x, y, z] = feats
+    return dense
+
+
+def _at(dense, coords):
+    b, x, y, z = coords.long().unbind(dim=1)
+    return dense[b, :, x, y, z]
+
+
+def _dense_weight(conv):
+    # spconv layout [C_out, kD, kH, kW, C_in] -> [C_out, C_in, kD, kH, kW]
+    return conv.conv.weight.permute(0, 4, 1, 2, 3)
+
+
+@pytest.mark.parametrize("kernel_size, dilation", [(3, 1), (3, 2), (1, 1)])
+def test_submanifold_matches_dense(kernel_size, dilation):
+    torch.manual_seed(0)
+    x = _random_sparse()
+    conv = sp.SparseConv3d(C_IN, C_OUT, kernel_size, dilation=dilation)
+    with torch.no_grad():
+        out = conv(x)
+        dense = F.conv3d(
+            _dense(x.feats, x.coords, RESOLUTION),
+            _dense_weight(conv),
+            conv.conv.bias,
+            padding=dilation * (kernel_size // 2),
+            dilation=dilation,
+        )
+    assert torch.equal(out.coords, x.coords)
+    torch.testing.assert_close(out.feats, _at(dense, x.coords), rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("kernel_size, stride, padding", [(2, 2, None), (3, 2, 1), (3, 1, 1)])
+def test_strided_matches_dense(kernel_size, stride, padding):
+    torch.manual_seed(0)
+    x = _random_sparse()
+    conv = sp.SparseConv3d(C_IN, C_OUT, kernel_size, stride=stride, padding=padding)
+    with torch.no_grad():
+        out = conv(x)
+        dense = F.conv3d(
+            _dense(x.feats, x.coords, RESOLUTION),
+            _dense_weight(conv),
+            conv.conv.bias,
+            stride=stride,
+            padding=padding or 0,
+        )
+
+    # active outputs: every dense position that receives at least one input
+    reached = F.conv3d(
+        _dense(torch.ones_like(x.feats[:, :1]), x.coords, RESOLUTION),
+        torch.ones(1, 1, kernel_size, kernel_size, kernel_size),
+        stride=stride,
+        padding=padding or 0,
+    )
+    expected_coords = (reached[:, 0] > 0).nonzero().int()
+    assert torch.equal(out.coords, expected_coords)
+    torch.testing.assert_close(out.feats, _at(dense, out.coords), rtol=1e-5, atol=1e-5)
+
+
+def test_inverse_matches_dense_transpose():
+    torch.manual_seed(0)
+    x = _random_sparse(occupancy=0.3)
+    down = sp.SparseConv3d(C_IN, C_OUT, 2, stride=2)
+    up = sp.SparseInverseConv3d(C_OUT, C_IN, 2, stride=2)
+    with torch.no_grad():
+        h = down(x)
+        out = up(h)
+        dense = F.conv_transpose3d(
+            _dense(h.feats, h.coords, RESOLUTION // 2),
+            # [C_out, kD, kH, kW, C_in] -> [C_in, C_out, kD, kH, kW]
+            up.conv.weight.permute(4, 0, 1, 2, 3),
+            up.conv.bias,
+            stride=2,
+        )
+    assert torch.equal(out.coords, x.coords)
+    torch.testing.assert_close(out.feats, _at(dense, x.coords), rtol=1e-5, atol=1e-5)
+
+
+def test_submanifold_kernel_map_cache(monkeypatch):
+    conv_torch = importlib.import_module(
+        "sam3d_objects.model.backbone.tdfy_dit.modules.sparse.conv.conv_torch"
+    )
+    built = []
+    build = conv_torch._submanifold_kernel_map
+
+    def counting_build(coords, *args):
+        built.append(coords)
+        return build(coords, *args)
+
+    monkeypatch.setattr(conv_torch, "_submanifold_kernel_map", counting_build)
+    x = _random_sparse()
+    conv = sp.SparseConv3d(C_IN, C_IN, 3)
+    with torch.no_grad():
+        h = conv(conv(x))  # the map is shared by the stacked convolutions
+        assert len(built) == 1
+
+        # another coords tensor with the same number of points: the map is rebuilt
+        other = sp.SparseTensor(x.feats, x.coords.clone(), spatial_cache=x._spatial_cache)
+        conv(other)
+        assert len(built) == 2
+
+        # coords modified in place: the map is rebuilt as well
+        h.coords[:, 1:] = h.coords[:, 1:].flip(0)
+        out = conv(h)
+        assert len(built) == 3
+        dense = F.conv3d(
+            _dense(h.feats, h.coords, RESOLUTION), _dense_weight(conv), conv.conv.bias, padding=1
+        )
+        torch.testing.assert_close(out.feats, _at(dense, h.coords), rtol=1e-5, atol=1e-5)
+
+
+def test_strided_extent_does_not_build_an_index(monkeypatch):
+    conv_torch = importlib.import_module(
+        "sam3d_objects.model.backbone.tdfy_dit.modules.sparse.conv.conv_torch"
+    )
+
+    def no_index(*args, **kwargs):
+        raise AssertionError("the strided kernel map should not sort an index")
+
+    monkeypatch.setattr(conv_torch, "_CoordIndex", no_index)
+    with torch.no_grad():
+        sp.SparseConv3d(C_IN, C_OUT, 2, stride=2)(_random_sparse())
@@ -3,6 +3,7 @@ from typing import *
 import torch
 import torch.nn as nn
 from . import SparseTensor
+from .attention.partition_cache import cached_partition
 
 __all__ = ["SparseDownsample", "SparseUpsample", "SparseSubdivide"]
 
@@ -17,14 +18,12 @@ class SparseDownsample(nn.Module):
         super(SparseDownsample, self).__init__()
         self.factor = tuple(factor) if isinstance(factor, (list, tuple)) else factor
 
-    def forward(self, input: SparseTensor) -> SparseTensor:
-        DIM = input.coords.shape[-1] - 1
-        factor = self.factor if isinstance(self.factor, tuple) else (self.factor,) * DIM
-        assert DIM == len(
-            factor
-        ), "Input coordinates must have the same dimension as the downsample factor."
-
-        coord = list(input.coords.unbind(dim=-1))
+    @staticmethod
+    def _downsample_coords(
+        coords: torch.Tensor, factor: Tuple[int, ...]
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        DIM = len(factor)
+        coord = list(coords.unbind(dim=-1))
         for i, f in enumerate(factor):
             coord[i + 1] = coord[i + 1] // f
 
@@ -32,10 +31,30 @@ class SparseDownsample(nn.Module):
         OFFSET = torch.cumprod(torch.tensor(MAX[::-1]), 0).tolist()[::-1] + [1]
         code = sum([c * o for c, o in zip(coord, OFFSET)])
         code, idx = code.unique(return_inverse=True)
+        new_coords = torch.stack(
+            [code // OFFSET[0]]
+            + [(code // OFFSET[i + 1]) % MAX[i] for i in range(DIM)],
+            dim=-1,
+        )
+        return new_coords, idx
+
+    def forward(self, input: SparseTensor) -> SparseTensor:
+        DIM = input.coords.shape[-1] - 1
+        factor = self.factor if isinstance(self.factor, tuple) else (self.factor,) * DIM
+        assert DIM == len(
+            factor
+        ), "Input coordinates must have the same dimension as the downsample factor."
+
+        # the mapping only depends on coords: share it across steps in a partition cache scope
+        new_coords, idx = cached_partition(
+            input,
+            f"downsample_{factor}",
+            lambda: self._downsample_coords(input.coords, factor),
+        )
 
         new_feats = torch.scatter_reduce(
             torch.zeros(
-                code.shape[0],
+                new_coords.shape[0],
                 input.feats.shape[1],
                 device=input.feats.device,
                 dtype=input.feats.dtype,
@@ -45,11 +64,6 @@ class SparseDownsample(nn.Module):
             src=input.feats,
             reduce="mean",
         )
-        new_coords = torch.stack(
-            [code // OFFSET[0]]
-            + [(code // OFFSET[i + 1]) % MAX[i] for i in range(DIM)],
-            dim=-1,
-        )
         out = SparseTensor(
             new_feats,
             new_coords,
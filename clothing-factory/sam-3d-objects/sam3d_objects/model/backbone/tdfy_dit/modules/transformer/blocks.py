@@ -16,7 +16,11 @@ class AbsolutePositionEmbedder(nn.Module):
         self.channels = channels
         self.in_channels = in_channels
         self.freq_dim = channels // in_channels // 2
-        self.freqs = torch.arange(self.freq_dim, dtype=torch.float32) / self.freq_dim
+        # a plain attribute, moved to the input's device on use: built on CPU so that it
+        # stays a real tensor when the module is instantiated on the meta device
+        self.freqs = (
+            torch.arange(self.freq_dim, dtype=torch.float32, device="cpu") / self.freq_dim
+        )
         self.freqs = 1.0 / (10000**self.freqs)
 
     def _sin_cos_embedding(self, x: torch.Tensor) -> torch.Tensor:
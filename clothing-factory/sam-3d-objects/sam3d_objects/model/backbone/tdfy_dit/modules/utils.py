@@ -70,3 +70,17 @@ def scale_module(module, scale):
 
 def modulate(x, shift, scale):
     return x * (1 + scale.unsqueeze(1)) + shift.unsqueeze(1)
+
+
+def zero_cfg_condition(cond, cfg_activate):
+    """
+    Zero out the condition of unconditional (CFG) samples.
+    `cfg_activate` is a bool for the whole batch, or a per-sample bool tensor when
+    the CFG branches are stacked along the batch dimension.
+    """
+    if isinstance(cfg_activate, torch.Tensor):
+        keep = (~cfg_activate).to(cond.dtype)
+        return cond * keep.view(-1, *[1] * (cond.ndim - 1))
+    if cfg_activate:
+        return cond * 0
+    return cond
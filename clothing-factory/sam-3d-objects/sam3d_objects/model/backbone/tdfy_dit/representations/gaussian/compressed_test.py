@@ -0,0 +1,186 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+".csplat" encoding accuracy, rigid transforms of encoded splats (the GLB rotation
+endpoint), and a size / decode-speed benchmark against the float32 PLY of
+`Gaussian.save_ply`:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/representations/gaussian/compressed_test.py
+"""
+import os
+
+import numpy as np
+import pytest
+import trimesh
+
+from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.compressed import (
+    BYTES_PER_POINT,
+    _matrix_to_quaternion,
+    decode_compressed_splat,
+    encode_compressed_splat,
+    transform_compressed_splat,
+)
+from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.ply_io import (
+    read_float_ply,
+    write_float_ply,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+# Gaussian.save_ply columns with sh_degree 0: xyz, normals, f_dc, opacity, scale, rot
+PLY_NAMES = (
+    ["x", "y", "z", "nx", "ny", "nz", "f_dc_0", "f_dc_1", "f_dc_2", "opacity"]
+    + [f"scale_{i}" for i in range(3)]
+    + [f"rot_{i}" for i in range(4)]
+)
+LATTICE = 32
+
+
+def _splat(num_points, seed=0, lattice=True):
+    """
+    Random Gaussians. With `lattice`, positions are distinct sites of a 1/32 grid,
+    far apart compared to the quantization error, so decoded points can be matched
+    back to their inputs.
+    """
+    rng = np.random.default_rng(seed)
+    rotations = rng.standard_normal((num_points, 4))
+    if lattice:
+        sites = rng.choice(LATTICE**3, num_points, replace=False)
+        xyz = np.stack(np.unravel_index(sites, (LATTICE,) * 3), axis=1) / LATTICE - 0.5
+    else:
+        xyz = rng.random((num_points, 3)) - 0.5
+    return {
+        "xyz": xyz.astype(np.float32),
+        "colors": rng.random((num_points, 3)).astype(np.float32),
+        "opacities": rng.random(num_points).astype(np.float32),
+        "scales": np.exp(rng.uniform(-7, -3, (num_points, 3))).astype(np.float32),
+        "rotations": (rotations / np.linalg.norm(rotations, axis=1, keepdims=True)).astype(np.float32),
+    }
+
+
+def _encode(splat, chunk_size=256):
+    return encode_compressed_splat(
+        splat["xyz"], splat["colors"], splat["opacities"], splat["scales"], splat["rotations"],
+        chunk_size=chunk_size,
+    )
+
+
+def _matched(splat, decoded):
+    """decoded points are in Morton order: match them back to the input by lattice site"""
+    def order(xyz):
+        return np.lexsort(np.round(xyz * LATTICE).T)
+
+    return (
+        {k: v[order(splat["xyz"])] for k, v in splat.items()},
+        {k: v[order(decoded["xyz"])] for k, v in decoded.items()},
+    )
+
+
+def _quaternion_matrix(q):
+    return trimesh.transformations.quaternion_matrix(q)[:3, :3]
+
+
+def _assert_close_to(splat, decoded, position_tol):
+    assert np.abs(decoded["xyz"] - splat["xyz"]).max() < position_tol
+    assert np.abs(decoded["colors"] - splat["colors"]).max() <= 0.5 / 255 + 1e-6
+    assert np.abs(decoded["opacities"] - splat["opacities"]).max() <= 0.5 / 255 + 1e-6
+    log_range = np.log(splat["scales"]).max() - np.log(splat["scales"]).min()
+    assert np.abs(np.log(decoded["scales"]) - np.log(splat["scales"])).max() <= log_range / 255
+    # q and -q are the same rotation
+    dots = np.abs((decoded["rotations"] * splat["rotations"]).sum(axis=1))
+    assert np.degrees(2 * np.arccos(np.clip(dots, 0, 1))).max() < 0.5
+
+
+def test_round_trip_accuracy():
+    splat = _splat(2000)
+    data = _encode(splat)
+    assert len(data) == 28 + 8 * 24 + 2000 * BYTES_PER_POINT
+    splat, decoded = _matched(splat, decode_compressed_splat(data))
+    # 10 bits over a chunk extent of at most the unit cube
+    _assert_close_to(splat, decoded, position_tol=1 / 1023)
+
+
+def test_empty_splat():
+    data = _encode(_splat(0))
+    decoded = decode_compressed_splat(data)
+    assert decoded["xyz"].shape == (0, 3) and decoded["rotations"].shape == (0, 4)
+    transformed = decode_compressed_splat(transform_compressed_splat(data, np.eye(4)))
+    assert transformed["xyz"].shape == (0, 3)
+
+
+def test_not_a_splat():
+    with pytest.raises(ValueError):
+        decode_compressed_splat(b"\0" * 28)
+
+
+@pytest.mark.parametrize("axis", [[1, 0, 0], [0, 1, 0], [0, 0, 1], [1, 1, 0]])
+@pytest.mark.parametrize("quarter_turns", [1, 2, 3])
+def test_matrix_to_quaternion(axis, quarter_turns):
+    rotation = trimesh.transformations.rotation_matrix(quarter_turns * np.pi / 2, axis)[:3, :3]
+    np.testing.assert_allclose(_quaternion_matrix(_matrix_to_quaternion(rotation)), rotation, atol=1e-12)
+
+
+def test_transform_rotates_points_and_orientations():
+    splat = _splat(500, seed=1)
+    transform = (
+        trimesh.transformations.rotation_matrix(np.pi / 2, [0, 0, 1])
+        @ trimesh.transformations.rotation_matrix(np.pi / 2, [1, 0, 0])
+    )
+    transform[:3, 3] = np.array([3, 12, -7]) / LATTICE
+    transformed = decode_compressed_splat(transform_compressed_splat(_encode(splat), transform))
+
+    expected = dict(splat)
+    expected["xyz"] = (splat["xyz"] @ transform[:3, :3].T + transform[:3, 3]).astype(np.float32)
+    expected["rotations"] = np.stack(
+        [
+            trimesh.transformations.quaternion_from_matrix(
+                transform @ trimesh.transformations.quaternion_matrix(q)
+            )
+            for q in splat["rotations"]
+        ]
+    ).astype(np.float32)
+    expected, transformed = _matched(expected, transformed)
+    # quantized twice: once when encoded, once when re-encoded
+    _assert_close_to(expected, transformed, position_tol=2 / 1023)
+
+
+def test_identity_transform_keeps_the_splat():
+    data = _encode(_splat(300, seed=2))
+    decoded, again = _matched(
+        decode_compressed_splat(data),
+        decode_compressed_splat(transform_compressed_splat(data, np.eye(4))),
+    )
+    np.testing.assert_allclose(again["xyz"], decoded["xyz"], atol=1 / 1023)
+    np.testing.assert_array_equal(again["colors"], decoded["colors"])
+
+
+@pytest.mark.benchmark
+def test_benchmark_size_and_decode_speed(tmp_path):
+    num_points = 1_000_000
+    splat = _splat(num_points, lattice=False)
+    ply = np.concatenate(
+        [
+            splat["xyz"],
+            np.zeros_like(splat["xyz"]),
+            splat["colors"],
+            splat["opacities"][:, None],
+            np.log(splat["scales"]),
+            splat["rotations"],
+        ],
+        axis=1,
+    )
+    ply_path = str(tmp_path / "gs.ply")
+    _, ply_write_s = best_time(lambda: write_float_ply(ply_path, PLY_NAMES, ply))
+    _, ply_read_s = best_time(
+        lambda: np.asarray(read_float_ply(ply_path)[1][:, np.arange(len(PLY_NAMES))], dtype=np.float32)
+    )
+    data, encode_s = best_time(lambda: _encode(splat), repeats=1)
+    _, decode_s = best_time(lambda: decode_compressed_splat(data))
+    _, transform_s = best_time(lambda: transform_compressed_splat(data, np.eye(4)), repeats=1)
+
+    ply_size = os.path.getsize(ply_path)
+    print(
+        f"{num_points} Gaussians: csplat {len(data) / 2**20:.1f} MiB vs PLY {ply_size / 2**20:.1f} MiB "
+        f"({ply_size / len(data):.1f}x smaller)\n"
+        f"  csplat encode {encode_s:.2f} s, decode {decode_s:.2f} s, rotate {transform_s:.2f} s; "
+        f"PLY write {ply_write_s:.2f} s, read {ply_read_s:.2f} s"
+    )
+    assert ply_size / len(data) > 4
@@ -0,0 +1,96 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Fast binary PLY I/O for point attributes stored as one float32 matrix.
+
+Files are written as `binary_little_endian` with a single `vertex` element of
+`float` properties, the layout used by Gaussian splatting tools, so they stay
+readable by plyfile and common viewers.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+_PLY_FLOAT_TYPES = ("float", "float32")
+
+
+def write_float_ply(path: str, names: List[str], data: np.ndarray) -> None:
+    """
+    Write an (N, C) float32 matrix as a binary PLY with one float property per column.
+    The matrix is written directly from its buffer, without per-point records.
+    """
+    assert data.ndim == 2 and data.shape[1] == len(names)
+    data = np.ascontiguousarray(data, dtype="<f4")
+    header = "\n".join(
+        ["ply", "format binary_little_endian 1.0", f"element vertex {data.shape[0]}"]
+        + [f"property float {name}" for name in names]
+        + ["end_header"]
+    )
+    with open(path, "wb") as f:
+        f.write((header + "\n").encode("ascii"))
+        if data.size > 0:
+            f.write(memoryview(data).cast("B"))
+
+
+def _parse_header(f) -> Tuple[int, List[str], bool]:
+    """Returns (num_vertices, property names, whether the fast layout applies)."""
+    if f.readline().strip() != b"ply":
+        raise ValueError("Not a PLY file")
+    num_vertices, names, supported = None, [], True
+    num_elements = 0
+    while True:
+        line = f.readline()
+        if not line:
+            raise ValueError("Unexpected end of PLY header")
+        tokens = line.decode("ascii").split()
+        if not tokens or tokens[0] in ("comment", "obj_info"):
+            continue
+        if tokens[0] == "end_header":
+            break
+        if tokens[0] == "format":
+            supported &= tokens[1] == "binary_little_endian"
+        elif tokens[0] == "element":
+            num_elements += 1
+            if tokens[1] == "vertex":
+                num_vertices = int(tokens[2])
+            else:
+                supported = False
+        elif tokens[0] == "property":
+            if tokens[1] == "list" or tokens[1] not in _PLY_FLOAT_TYPES:
+                supported = False
+            names.append(tokens[-1])
+    supported &= num_elements == 1 and num_vertices is not None
+    return num_vertices, names, supported
+
+
+def read_float_ply(path: str, mmap: bool = True) -> Tuple[List[str], np.ndarray]:
+    """
+    Read the vertex element of a PLY as (property names, (N, C) float32 matrix).
+
+    Files written by `write_float_ply` (and other binary little-endian float-only
+    PLYs) are memory-mapped without parsing individual records; anything else
+    falls back to plyfile.
+    """
+    with open(path, "rb") as f:
+        num_vertices, names, supported = _parse_header(f)
+        offset = f.tell()
+    if supported:
+        if num_vertices == 0:
+            # np.memmap cannot map an empty body
+            return names, np.zeros((0, len(names)), dtype=np.float32)
+        if mmap:
+            data = np.memmap(
+                path, dtype="<f4", mode="r", offset=offset,
+                shape=(num_vertices, len(names)),
+            )
+        else:
+            data = np.fromfile(
+                path, dtype="<f4", count=num_vertices * len(names), offset=offset
+            ).reshape(num_vertices, len(names))
+        return names, data
+
+    from plyfile import PlyData
+
+    vertex = PlyData.read(path)["vertex"]
+    names = [p.name for p in vertex.properties]
+    data = np.stack([np.asarray(vertex[n], dtype=np.float32) for n in names], axis=1)
+    return names, data
@@ -0,0 +1,169 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Float-matrix PLY I/O against plyfile, the reader/writer it replaced: round trips in
+both directions, the plyfile fallback for other layouts, empty files, and a
+1M-Gaussian write/read benchmark:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/representations/gaussian/ply_io_test.py
+"""
+import numpy as np
+import pytest
+import torch
+from plyfile import PlyData, PlyElement
+
+from sam3d_objects.model.backbone.tdfy_dit.representations.gaussian.ply_io import (
+    read_float_ply,
+    write_float_ply,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+# attribute layout of Gaussian.save_ply with sh_degree 0
+NAMES = (
+    ["x", "y", "z", "nx", "ny", "nz", "f_dc_0", "f_dc_1", "f_dc_2", "opacity"]
+    + [f"scale_{i}" for i in range(3)]
+    + [f"rot_{i}" for i in range(4)]
+)
+
+
+def _attributes(num_points, seed=0):
+    return np.random.default_rng(seed).standard_normal((num_points, len(NAMES))).astype(np.float32)
+
+
+def plyfile_write(path, names, data, text=False):
+    """Previous Gaussian.save_ply: a structured array filled from one tuple per point"""
+    elements = np.empty(data.shape[0], dtype=[(name, "f4") for name in names])
+    elements[:] = list(map(tuple, data))
+    PlyData([PlyElement.describe(elements, "vertex")], text=text).write(path)
+
+
+def plyfile_read(path):
+    """Previous Gaussian.load_ply: one np.asarray per property"""
+    vertex = PlyData.read(path).elements[0]
+    names = [p.name for p in vertex.properties]
+    return names, np.stack([np.asarray(vertex[name]) for name in names], axis=1)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_round_trip(tmp_path, mmap):
+    data = _attributes(1000)
+    path = str(tmp_path / "gs.ply")
+    write_float_ply(path, NAMES, data)
+    names, loaded = read_float_ply(path, mmap=mmap)
+    assert names == NAMES
+    assert loaded.dtype == np.float32
+    np.testing.assert_array_equal(loaded, data)
+
+
+def test_written_files_are_read_by_plyfile(tmp_path):
+    data = _attributes(257)
+    path = str(tmp_path / "gs.ply")
+    write_float_ply(path, NAMES, data)
+    names, loaded = plyfile_read(path)
+    assert names == NAMES
+    np.testing.assert_array_equal(loaded, data)
+
+
+def test_plyfile_binary_files_take_the_fast_path(tmp_path):
+    data = _attributes(300)
+    path = str(tmp_path / "gs.ply")
+    plyfile_write(path, NAMES, data)
+    names, loaded = read_float_ply(path)
+    assert isinstance(loaded, np.memmap)
+    assert names == NAMES
+    np.testing.assert_array_equal(loaded, data)
+
+
+def _double_ply(path, data):
+    elements = np.empty(data.shape[0], dtype=[(name, "f8") for name in NAMES])
+    elements[:] = list(map(tuple, data))
+    PlyData([PlyElement.describe(elements, "vertex")]).write(path)
+
+
+def _mesh_ply(path, data):
+    vertices = np.empty(data.shape[0], dtype=[(name, "f4") for name in NAMES])
+    vertices[:] = list(map(tuple, data))
+    faces = np.empty(1, dtype=[("vertex_indices", "i4", (3,))])
+    faces[0] = ([0, 1, 2],)
+    PlyData(
+        [PlyElement.describe(vertices, "vertex"), PlyElement.describe(faces, "face")]
+    ).write(path)
+
+
+@pytest.mark.parametrize(
+    "writer",
+    [
+        lambda path, data: plyfile_write(path, NAMES, data, text=True),
+        _double_ply,
+        _mesh_ply,
+    ],
+    ids=["ascii", "double", "with_faces"],
+)
+def test_other_layouts_fall_back_to_plyfile(tmp_path, writer):
+    data = _attributes(50)
+    path = str(tmp_path / "other.ply")
+    writer(path, data)
+    names, loaded = read_float_ply(path)
+    assert not isinstance(loaded, np.memmap)
+    assert names == NAMES and loaded.dtype == np.float32
+    np.testing.assert_allclose(loaded, data, rtol=1e-6)
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_empty_file(tmp_path, mmap):
+    path = str(tmp_path / "empty.ply")
+    write_float_ply(path, NAMES, np.zeros((0, len(NAMES)), dtype=np.float32))
+    names, loaded = read_float_ply(path, mmap=mmap)
+    assert names == NAMES and loaded.shape == (0, len(NAMES))
+    assert plyfile_read(path)[1].shape == (0, len(NAMES))
+
+
+def test_not_a_ply(tmp_path):
+    path = tmp_path / "bad.ply"
+    path.write_bytes(b"solid mesh\n")
+    with pytest.raises(ValueError):
+        read_float_ply(str(path))
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="Gaussian keeps its biases on CUDA")
+def test_gaussian_round_trip(tmp_path):
+    from sam3d_objects.model.backbone.tdfy_dit.representations import Gaussian
+
+    aabb = [-0.5, -0.5, -0.5, 1.0, 1.0, 1.0]
+    gaussian = Gaussian(aabb=aabb)
+    gaussian.from_xyz(torch.rand(100, 3, device="cuda") - 0.5)
+    gaussian.from_features(torch.randn(100, 1, 3, device="cuda"))
+    gaussian.from_scaling(torch.rand(100, 3, device="cuda") * 0.01 + 0.01)
+    gaussian.from_rotation(torch.nn.functional.normalize(torch.randn(100, 4, device="cuda")))
+    gaussian.from_opacity(torch.rand(100, 1, device="cuda") * 0.8 + 0.1)
+    path = str(tmp_path / "gs.ply")
+    gaussian.save_ply(path)
+
+    loaded = Gaussian(aabb=aabb)
+    loaded.load_ply(path)
+    for name in ("get_xyz", "get_features", "get_scaling", "get_rotation", "get_opacity"):
+        torch.testing.assert_close(getattr(loaded, name), getattr(gaussian, name), rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.benchmark
+def test_benchmark_1m_gaussians(tmp_path):
+    data = _attributes(1_000_000)
+    new_path, old_path = str(tmp_path / "new.ply"), str(tmp_path / "old.ply")
+
+    _, write_s = best_time(lambda: write_float_ply(new_path, NAMES, data), repeats=2)
+    _, old_write_s = best_time(lambda: plyfile_write(old_path, NAMES, data), repeats=1)
+    # the mapped columns are gathered into memory, as load_ply does
+    loaded, read_s = best_time(
+        lambda: np.asarray(read_float_ply(new_path)[1][:, np.arange(len(NAMES))], dtype=np.float32),
+        repeats=2,
+    )
+    (_, old_loaded), old_read_s = best_time(lambda: plyfile_read(old_path), repeats=2)
+    np.testing.assert_array_equal(loaded, data)
+    np.testing.assert_array_equal(old_loaded, data)
+    with open(new_path, "rb") as new, open(old_path, "rb") as old:
+        # same body, only the headers differ
+        assert new.read()[-data.nbytes :] == old.read()[-data.nbytes :]
+
+    print(
+        f"1M Gaussians ({data.nbytes / 2**20:.0f} MiB): write {write_s:.2f} s vs plyfile "
+        f"{old_write_s:.2f} s, read {read_s * 1e3:.0f} ms vs plyfile {old_read_s * 1e3:.0f} ms"
+    )
@@ -52,21 +52,32 @@ class MeshExtractResult:
 
 
 class SparseFeatures2Mesh:
-    def __init__(self, device="cuda", res=64, use_color=True):
+    def __init__(self, device="cuda", res=64, use_color=True, sparse=True):
         """
         a model to generate a mesh from sparse features structures using flexicube
+
+        sparse: run flexicube only on the cubes around the occupied voxels instead of
+            the full res^3 grid; the extracted mesh is the same as the dense path
         """
         super().__init__()
         self.device = device
         self.res = res
         self.mesh_extractor = FlexiCubes(device=device)
         self.sdf_bias = -1.0 / res
-        verts, cube = construct_dense_grid(self.res, self.device)
-        self.reg_c = cube.to(self.device)
-        self.reg_v = verts.to(self.device)
+        self.sparse = sparse
+        self.reg_c = None
+        self.reg_v = None
+        if not sparse:
+            self._build_dense_grid()
         self.use_color = use_color
         self._calc_layout()
 
+    def _build_dense_grid(self):
+        if self.reg_c is None:
+            verts, cube = construct_dense_grid(self.res, self.device)
+            self.reg_c = cube.to(self.device)
+            self.reg_v = verts.to(self.device)
+
     def _calc_layout(self):
         LAYOUTS = {
             "sdf": {"shape": (8, 1), "size": 8},
@@ -120,8 +131,25 @@ class SparseFeatures2Mesh:
         v_pos, v_attrs, reg_loss = sparse_cube2verts(
             coords, torch.cat(v_attrs, dim=-1), training=training
         )
-        v_attrs_d = get_dense_attrs(v_pos, v_attrs, res=self.res + 1, sdf_init=True)
-        weights_d = get_dense_attrs(coords, weights, res=self.res, sdf_init=False)
+        if self.sparse:
+            # only cubes with a negative corner can cross the surface, all other
+            # cubes of the dense grid have at least one default (outside) corner
+            cube_coords, grid_v, grid_c = construct_sparse_grid(
+                v_pos[v_attrs[:, 0] < 0], self.res
+            )
+            v_attrs_d = get_sparse_attrs(
+                grid_v, v_pos, v_attrs, res=self.res + 1, sdf_init=True
+            )
+            weights_d = get_sparse_attrs(
+                cube_coords, coords, weights, res=self.res, sdf_init=False
+            )
+        else:
+            self._build_dense_grid()
+            cube_coords, grid_v, grid_c = None, self.reg_v, self.reg_c
+            v_attrs_d = get_dense_attrs(
+                v_pos, v_attrs, res=self.res + 1, sdf_init=True
+            )
+            weights_d = get_dense_attrs(coords, weights, res=self.res, sdf_init=False)
         if self.use_color:
             sdf_d, deform_d, colors_d = (
                 v_attrs_d[..., 0],
@@ -132,18 +160,19 @@ class SparseFeatures2Mesh:
             sdf_d, deform_d = v_attrs_d[..., 0], v_attrs_d[..., 1:4]
             colors_d = None
 
-        x_nx3 = get_defomed_verts(self.reg_v, deform_d, self.res)
+        x_nx3 = get_defomed_verts(grid_v, deform_d, self.res)
 
         vertices, faces, L_dev, colors = self.mesh_extractor(
             voxelgrid_vertices=x_nx3,
             scalar_field=sdf_d,
-            cube_idx=self.reg_c,
+            cube_idx=grid_c,
             resolution=self.res,
             beta=weights_d[:, :12],
             alpha=weights_d[:, 12:20],
             gamma_f=weights_d[:, 20],
             voxelgrid_colors=colors_d,
             training=training,
+            cube_coords=cube_coords,
         )
 
         mesh = MeshExtractResult(
@@ -0,0 +1,128 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Sparse FlexiCubes extraction (construct_sparse_grid / get_sparse_attrs) against the
+dense res^3 grid on a set of voxel-structure fixtures, plus a resolution benchmark:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/representations/mesh/cube2mesh_test.py
+"""
+import pytest
+import torch
+
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+from sam3d_objects.model.backbone.tdfy_dit.representations.mesh.cube2mesh import (
+    SparseFeatures2Mesh,
+)
+from sam3d_objects.model.backbone.tdfy_dit.representations.mesh.utils_cube import (
+    construct_dense_grid,
+    construct_sparse_grid,
+    cube_corners,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+
+def _sphere_sdf(points, radius=0.3, center=(0.0, 0.0, 0.0)):
+    return (points - points.new_tensor(center)).norm(dim=-1) - radius
+
+
+def _sheet_sdf(points):
+    # thin cloth-like slab, bounded in x/y
+    slab = points[..., 2].abs() - 0.02
+    return torch.maximum(slab, (points[..., :2].abs() - 0.35).max(dim=-1).values)
+
+
+def _two_spheres_sdf(points):
+    return torch.minimum(
+        _sphere_sdf(points, 0.15, (-0.2, 0.0, 0.0)), _sphere_sdf(points, 0.12, (0.25, 0.1, 0.0))
+    )
+
+
+def _boundary_sdf(points):
+    # surface crossing the upper grid border, to exercise the cube bounds
+    return _sphere_sdf(points, 0.3, (0.4, 0.4, 0.4))
+
+
+def _structure(sdf_fn, res, use_color=True, seed=0):
+    """voxels around the zero level set, with the analytic SDF at their 8 corners"""
+    generator = torch.Generator().manual_seed(seed)
+    grid = torch.stack(
+        torch.meshgrid(*[torch.arange(res)] * 3, indexing="ij"), dim=-1
+    ).reshape(-1, 3)
+    centers = (grid.float() + 0.5) / res - 0.5
+    coords = grid[sdf_fn(centers).abs() < 1.5 / res]
+    corners = (coords[:, None] + cube_corners[None]).float() / res - 0.5
+    extractor = SparseFeatures2Mesh(device="cpu", res=res, use_color=use_color)
+    feats = torch.randn(coords.shape[0], extractor.feats_channels, generator=generator) * 0.5
+    sdf_range = extractor.layouts["sdf"]["range"]
+    # undo the extractor's sdf bias so that the analytic surface is reproduced
+    feats[:, sdf_range[0] : sdf_range[1]] = sdf_fn(corners) - extractor.sdf_bias
+    coords = torch.cat([torch.zeros_like(coords[:, :1]), coords], dim=1).int()
+    return sp.SparseTensor(feats, coords)
+
+
+FIXTURES = {
+    "sphere": (_sphere_sdf, 32),
+    "sheet": (_sheet_sdf, 48),
+    "two_spheres": (_two_spheres_sdf, 32),
+    "boundary": (_boundary_sdf, 24),
+}
+
+
+def _extract(structure, res, sparse, use_color=True):
+    extractor = SparseFeatures2Mesh(device="cpu", res=res, use_color=use_color, sparse=sparse)
+    return extractor(sp.SparseTensor(structure.feats.clone(), structure.coords))
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+@pytest.mark.parametrize("use_color", [True, False])
+def test_sparse_extraction_matches_dense(name, use_color):
+    sdf_fn, res = FIXTURES[name]
+    structure = _structure(sdf_fn, res, use_color=use_color)
+    sparse = _extract(structure, res, sparse=True, use_color=use_color)
+    dense = _extract(structure, res, sparse=False, use_color=use_color)
+    assert sparse.success and dense.success
+    assert torch.equal(sparse.faces, dense.faces)
+    torch.testing.assert_close(sparse.vertices, dense.vertices)
+    if use_color:
+        torch.testing.assert_close(sparse.vertex_attrs, dense.vertex_attrs)
+    else:
+        assert sparse.vertex_attrs is None and dense.vertex_attrs is None
+
+
+def test_structure_without_inside_voxels_gives_an_empty_mesh():
+    structure = _structure(_sphere_sdf, 16)
+    structure = sp.SparseTensor(structure.feats.abs() + 1, structure.coords)
+    mesh = _extract(structure, 16, sparse=True)
+    assert not mesh.success
+    assert mesh.vertices.shape == (0, 3) and mesh.faces.shape == (0, 3)
+
+
+def test_sparse_grid_is_the_ordered_subset_of_the_dense_grid():
+    res = 8
+    generator = torch.Generator().manual_seed(0)
+    seeds = torch.randint(0, res + 1, (12, 3), generator=generator)
+    seeds[0] = res  # corner of the grid: only one cube touches it
+    cube_coords, verts, cube_fx8 = construct_sparse_grid(seeds, res)
+
+    dense_verts, dense_cubes = construct_dense_grid(res, device="cpu")
+    seed_keys = (seeds[:, 0] * (res + 1) + seeds[:, 1]) * (res + 1) + seeds[:, 2]
+    touching = torch.isin(dense_cubes, seed_keys).any(dim=1).nonzero()[:, 0]
+    dense_cube_coords = dense_verts[dense_cubes[touching, 0]]
+
+    # same cubes, in dense grid order, with the same corner vertices
+    assert torch.equal(cube_coords, dense_cube_coords)
+    assert torch.equal(verts[cube_fx8], dense_verts[dense_cubes[touching]])
+    assert torch.equal(verts, dense_verts[torch.unique(dense_cubes[touching])])
+
+
+@pytest.mark.benchmark
+def test_benchmark_resolution():
+    for res in (64, 128):
+        structure = _structure(_sphere_sdf, res)
+        with torch.no_grad():
+            sparse, sparse_s = best_time(lambda: _extract(structure, res, sparse=True), repeats=2)
+            dense, dense_s = best_time(lambda: _extract(structure, res, sparse=False), repeats=2)
+        assert torch.equal(sparse.faces, dense.faces)
+        print(
+            f"res {res}: {structure.feats.shape[0]} voxels, {sparse.faces.shape[0]} faces, "
+            f"sparse {sparse_s * 1e3:.0f} ms, dense {dense_s * 1e3:.0f} ms"
+        )
@@ -55,7 +55,13 @@ class FlexiCubes:
         self.adj_pairs = torch.tensor([0, 1, 1, 3, 3, 2, 2, 0], dtype=torch.long, device=device)
 
     def __call__(self, voxelgrid_vertices, scalar_field, cube_idx, resolution, qef_reg_scale=1e-3,
-                 weight_scale=0.99, beta=None, alpha=None, gamma_f=None, voxelgrid_colors=None, training=False):
+                 weight_scale=0.99, beta=None, alpha=None, gamma_f=None, voxelgrid_colors=None, training=False,
+                 cube_coords=None):
+        """
+        'cube_idx' may cover the full dense grid of 'resolution' (in grid order) or only a subset of
+        its cubes; in the latter case 'cube_coords' (num_cubes, 3) gives the integer grid coords of
+        each cube, and time and memory scale with the number of given cubes instead of resolution^3.
+        """
         assert torch.is_tensor(voxelgrid_vertices) and \
             check_tensor(voxelgrid_vertices, (None, 3), throw=False), \
             "'voxelgrid_vertices' should be a tensor of shape (num_vertices, 3)"
@@ -94,7 +100,7 @@ class FlexiCubes:
         if voxelgrid_colors is not None:
             voxelgrid_colors = torch.sigmoid(voxelgrid_colors)
 
-        case_ids = self._get_case_id(occ_fx8, surf_cubes, resolution)
+        case_ids = self._get_case_id(occ_fx8, surf_cubes, resolution, cube_coords)
 
         surf_edges, idx_map, edge_counts, surf_edges_mask = self._identify_surf_edges(
             scalar_field, cube_idx, surf_cubes
@@ -142,12 +148,15 @@ class FlexiCubes:
         return beta[surf_cubes], alpha[surf_cubes], gamma_f[surf_cubes]
 
     @torch.no_grad()
-    def _get_case_id(self, occ_fx8, surf_cubes, res):
+    def _get_case_id(self, occ_fx8, surf_cubes, res, cube_coords=None):
         """
         Obtains the ID of topology cases based on cell corner occupancy. This function resolves the 
         ambiguity in the Dual Marching Cubes (DMC) configurations as described in Section 1.3 of the 
         supplementary material. It should be noted that this function assumes a regular grid.
         """
+        if cube_coords is not None:
+            return self._get_case_id_sparse(occ_fx8, surf_cubes, res, cube_coords)
+
         case_ids = (occ_fx8[surf_cubes] * self.cube_corners_idx.to(self.device).unsqueeze(0)).sum(-1)
 
         problem_config = self.check_table.to(self.device)[case_ids]
@@ -184,6 +193,45 @@ class FlexiCubes:
         case_ids.index_put_((idx,), problem_config[to_invert][..., -1])
         return case_ids
 
+    @torch.no_grad()
+    def _get_case_id_sparse(self, occ_fx8, surf_cubes, res, cube_coords):
+        """
+        Same as _get_case_id for a subset of cubes given by their grid coords. Adjacent problematic
+        cubes are looked up by their linear grid index instead of a dense (res^3 x 5) config volume.
+        """
+        case_ids = (occ_fx8[surf_cubes] * self.cube_corners_idx.to(self.device).unsqueeze(0)).sum(-1)
+
+        problem_config = self.check_table.to(self.device)[case_ids]
+        to_check = problem_config[..., 0] == 1
+        problem_config = problem_config[to_check]
+        if not isinstance(res, (list, tuple)):
+            res = [res, res, res]
+
+        def linear_idx(idx):
+            return (idx[..., 0] * res[1] + idx[..., 1]) * res[2] + idx[..., 2]
+
+        vol_idx_problem = cube_coords.long()[surf_cubes][to_check]
+        vol_idx_problem_adj = vol_idx_problem + problem_config[..., 1:4]
+
+        within_range = (
+            vol_idx_problem_adj[..., 0] >= 0) & (
+            vol_idx_problem_adj[..., 0] < res[0]) & (
+            vol_idx_problem_adj[..., 1] >= 0) & (
+            vol_idx_problem_adj[..., 1] < res[1]) & (
+            vol_idx_problem_adj[..., 2] >= 0) & (
+            vol_idx_problem_adj[..., 2] < res[2])
+
+        problem_keys = torch.sort(linear_idx(vol_idx_problem)).values
+        vol_idx_problem_adj = vol_idx_problem_adj[within_range]
+        problem_config = problem_config[within_range]
+        # If two cubes with cases C16 and C19 share an ambiguous face, both cases are inverted.
+        adj_keys = linear_idx(vol_idx_problem_adj)
+        pos = torch.searchsorted(problem_keys, adj_keys).clamp_(max=max(problem_keys.shape[0] - 1, 0))
+        to_invert = problem_keys[pos] == adj_keys if problem_keys.shape[0] > 0 else adj_keys < 0
+        idx = torch.arange(case_ids.shape[0], device=self.device)[to_check][within_range][to_invert]
+        case_ids.index_put_((idx,), problem_config[to_invert][..., -1])
+        return case_ids
+
     @torch.no_grad()
     def _identify_surf_edges(self, scalar_field, cube_idx, surf_cubes):
         """
@@ -39,6 +39,40 @@ def construct_dense_grid(res, device="cuda"):
     return verts, cube_fx8
 
 
+def grid_key(coords: torch.Tensor, res: int):
+    """linear index of integer coords in a res^3 grid (same order as the dense grid)"""
+    coords = coords.long()
+    return (coords[:, 0] * res + coords[:, 1]) * res + coords[:, 2]
+
+
+def construct_sparse_grid(seed_verts: torch.Tensor, res: int):
+    """
+    construct the cubes touching any of the seed vertices (one ring around them)
+    Returns:
+        cube_coords [Mx3] cube coords sorted by their dense grid index
+        verts [Vx3] corner vertices sorted by their dense grid index
+        cube_fx8 [Mx8] verts index for each cube
+    The sorted layout keeps every index order identical to construct_dense_grid,
+    so FlexiCubes produces the same mesh on the sparse grid.
+    """
+    corners = cube_corners.to(seed_verts)
+    cubes = (seed_verts.unsqueeze(1) - corners.unsqueeze(0)).reshape(-1, 3)
+    cubes = cubes[((cubes >= 0) & (cubes < res)).all(dim=1)]
+    cube_keys = torch.unique(grid_key(cubes, res))
+    cube_coords = torch.stack(
+        [cube_keys // (res**2), (cube_keys // res) % res, cube_keys % res], dim=1
+    )
+    res_v = res + 1
+    corner_keys = grid_key(
+        (cube_coords.unsqueeze(1) + corners.long().unsqueeze(0)).reshape(-1, 3), res_v
+    )
+    vert_keys, cube_fx8 = torch.unique(corner_keys, return_inverse=True)
+    verts = torch.stack(
+        [vert_keys // (res_v**2), (vert_keys // res_v) % res_v, vert_keys % res_v], dim=1
+    )
+    return cube_coords, verts, cube_fx8.reshape(-1, 8)
+
+
 def construct_voxel_grid(coords):
     verts = (cube_corners.unsqueeze(0).to(coords) + coords.unsqueeze(1)).reshape(-1, 3)
     verts_unique, inverse_indices = torch.unique(verts, dim=0, return_inverse=True)
@@ -85,6 +119,28 @@ def get_dense_attrs(coords: torch.Tensor, feats: torch.Tensor, res: int, sdf_ini
     return dense_attrs.reshape(-1, F)
 
 
+def get_sparse_attrs(
+    query: torch.Tensor, coords: torch.Tensor, feats: torch.Tensor, res: int, sdf_init=True
+):
+    """
+    sparse counterpart of get_dense_attrs: gather feats at the query coords,
+    coords not present get the same default values as the dense grid
+    """
+    F = feats.shape[-1]
+    keys = grid_key(coords, res)
+    keys, order = torch.sort(keys)
+    query_keys = grid_key(query, res)
+    attrs = torch.zeros([query.shape[0], F], device=feats.device, dtype=feats.dtype)
+    if sdf_init:
+        attrs[:, 0] = 1  # initial outside sdf value
+    if keys.shape[0] == 0:
+        return attrs
+    idx = torch.searchsorted(keys, query_keys).clamp_(max=keys.shape[0] - 1)
+    found = keys[idx] == query_keys
+    attrs[found] = feats[order[idx[found]]]
+    return attrs
+
+
 def get_defomed_verts(v_pos: torch.Tensor, deform: torch.Tensor, res):
     return (v_pos / res - 0.5 + (1 - 1e-8) / (res * 2) * torch.tanh(deform)).to(
         deform.dtype
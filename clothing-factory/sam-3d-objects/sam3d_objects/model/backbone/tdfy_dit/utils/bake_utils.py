@@ -0,0 +1,164 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Rasterizer-independent core of the "opt" texture bake of `bake_texture`: given the
+UV maps of the mesh in every view, optimize a texture that reproduces the
+observations. Only depends on torch, so it can be driven by any rasterizer.
+"""
+from typing import *
+import numpy as np
+import torch
+from tqdm import tqdm
+
+
+def texture_pyramid_sizes(texture_size: int, levels: int, min_size: int = 64) -> List[int]:
+    """Texture sizes of the coarse-to-fine levels, ending at texture_size."""
+    sizes = [texture_size]
+    while len(sizes) < levels and sizes[0] // 2 >= min_size:
+        sizes.insert(0, sizes[0] // 2)
+    return sizes
+
+
+def nvdiffrast_texture(texture: torch.Tensor, uv: torch.Tensor, uv_dr: torch.Tensor) -> torch.Tensor:
+    import nvdiffrast.torch as dr
+
+    return dr.texture(texture, uv, uv_dr)
+
+
+def _tv_loss(texture):
+    return torch.nn.functional.l1_loss(
+        texture[:, :-1, :, :], texture[:, 1:, :, :]
+    ) + torch.nn.functional.l1_loss(texture[:, :, :-1, :], texture[:, :, 1:, :])
+
+
+def _cosine_anealing(step, total_steps, start_lr, end_lr):
+    return end_lr + 0.5 * (start_lr - end_lr) * (1 + np.cos(np.pi * step / total_steps))
+
+
+@torch.inference_mode(False)
+@torch.enable_grad()
+def optimize_texture(
+    uv: torch.Tensor,
+    uv_dr: torch.Tensor,
+    observations: torch.Tensor,
+    masks: torch.Tensor,
+    texture_size: int,
+    lambda_tv: float = 1e-2,
+    max_steps: int = 2500,
+    views_per_step: int = 1,
+    check_interval: int = 100,
+    min_rel_improvement: float = 0.0,
+    pyramid_levels: int = 1,
+    texture_fn: Optional[Callable] = None,
+    verbose: bool = False,
+) -> torch.Tensor:
+    """
+    Optimize a texture against multiview observations.
+
+    Args:
+        uv (torch.Tensor): UV map of the mesh per view, rows bottom-up as rasterized. Shape (V, H, W, 2).
+        uv_dr (torch.Tensor): Screen-space UV derivatives per view. Shape (V, H, W, 4).
+        observations (torch.Tensor): Observations, rows top-down. Shape (V, H, W, 3).
+            uint8 values are scaled to [0, 1].
+        masks (torch.Tensor): Pixels of the observations to fit, rows top-down. Shape (V, H, W).
+        texture_size (int): Size of the texture.
+        lambda_tv (float): Weight of total variation loss.
+        max_steps (int): Maximum number of optimization steps (over all pyramid levels).
+        views_per_step (int): Number of views sampled per optimization step.
+        check_interval (int): Steps between convergence checks of the mean loss.
+        min_rel_improvement (float): Stop a level once the mean loss of a check window
+            improves by less than this fraction over the previous window, after annealing the
+            learning rate to its final value over check_interval more steps. 0 disables early stop.
+        pyramid_levels (int): Number of coarse-to-fine texture levels, each doubling the
+            size up to texture_size (e.g. 3 levels for 2048: 512 -> 1024 -> 2048).
+        texture_fn (Callable): Texture lookup (texture, uv, uv_dr) -> [B, H, W, 3], nvdiffrast's by default.
+        verbose (bool): Whether to print progress.
+
+    Returns:
+        texture (torch.Tensor): Optimized texture, rows in UV order (v = 0 first). Shape (1, S, S, 3).
+    """
+    texture_fn = texture_fn if texture_fn is not None else nvdiffrast_texture
+    device = uv.device
+    num_views = uv.shape[0]
+    obs_scale = 1 / 255.0 if observations.dtype == torch.uint8 else 1.0
+
+    # coarse-to-fine: each level starts from the upsampled result of the previous
+    # one, with its own share of the step budget and its own early stop
+    level_sizes = texture_pyramid_sizes(texture_size, pyramid_levels)
+    level_steps = [max_steps // len(level_sizes)] * len(level_sizes)
+    level_steps[-1] += max_steps - sum(level_steps)
+    views_per_step = max(1, min(views_per_step, num_views))
+    texture = None
+
+    with tqdm(
+        total=max_steps,
+        disable=not verbose,
+        desc="Texture baking (opt): optimizing",
+    ) as pbar:
+        for level_size, total_steps in zip(level_sizes, level_steps):
+            if texture is None:
+                init = torch.zeros((1, level_size, level_size, 3), dtype=torch.float32).to(device)
+            else:
+                init = torch.nn.functional.interpolate(
+                    texture.detach().permute(0, 3, 1, 2),
+                    size=(level_size, level_size),
+                    mode="bilinear",
+                    align_corners=False,
+                ).permute(0, 2, 3, 1).contiguous()
+            texture = torch.nn.Parameter(init)
+            optimizer = torch.optim.Adam([texture], betas=(0.5, 0.9), lr=1e-2)
+
+            # losses stay on device and are read back once per check window
+            window_loss = torch.zeros((), dtype=torch.float32, device=device)
+            prev_window_loss = None
+            # once the loss plateaus: (first step, steps, start lr) of the final annealing,
+            # so an early stopped level does not end at a high learning rate
+            final_anneal = None
+            for step in range(total_steps):
+                optimizer.zero_grad()
+                selected = np.random.choice(num_views, views_per_step, replace=False)
+                selected = torch.from_numpy(selected).to(device)
+                # observations and masks are flipped per use, not copied as a whole
+                observation = (observations[selected].float() * obs_scale).flip(1)
+                mask = masks[selected].flip(1)
+
+                render = texture_fn(texture, uv[selected], uv_dr[selected])
+
+                loss = torch.nn.functional.l1_loss(render[mask], observation[mask])
+                if lambda_tv > 0:
+                    loss += lambda_tv * _tv_loss(texture)
+                loss.backward()
+                optimizer.step()
+                # annealing
+                if final_anneal is None:
+                    lr = _cosine_anealing(step, total_steps, 1e-2, 1e-5)
+                else:
+                    first, steps, start_lr = final_anneal
+                    lr = _cosine_anealing(step - first + 1, steps, start_lr, 1e-5)
+                optimizer.param_groups[0]["lr"] = lr
+                window_loss += loss.detach()
+                pbar.update()
+
+                if final_anneal is not None:
+                    if step + 1 == final_anneal[0] + final_anneal[1]:
+                        pbar.update(total_steps - step - 1)
+                        break
+                elif (step + 1) % check_interval == 0:
+                    cur_window_loss = window_loss.item() / check_interval
+                    window_loss.zero_()
+                    pbar.set_postfix({"loss": cur_window_loss, "res": level_size})
+                    if (
+                        min_rel_improvement > 0
+                        and prev_window_loss is not None
+                        and prev_window_loss - cur_window_loss
+                        < min_rel_improvement * prev_window_loss
+                    ):
+                        if verbose:
+                            tqdm.write(
+                                f"Texture baking (opt): {level_size}px converged after {step + 1} steps"
+                            )
+                        anneal_steps = min(check_interval, total_steps - step - 1)
+                        if anneal_steps == 0:
+                            break
+                        final_anneal = (step + 1, anneal_steps, optimizer.param_groups[0]["lr"])
+                    prev_window_loss = cur_window_loss
+    return texture.detach()
@@ -0,0 +1,188 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Quality/time benchmark of the "opt" texture bake on CPU. A software rasterizer
+(analytic ray casting of a UV sphere) and a bilinear grid_sample texture lookup
+stand in for utils3d/nvdiffrast, and the baked texture is scored by the PSNR of
+held-out views against the ground-truth texture:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/utils/bake_utils_test.py
+"""
+import math
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+from sam3d_objects.model.backbone.tdfy_dit.utils.bake_utils import (
+    optimize_texture,
+    texture_pyramid_sizes,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+RADIUS = 0.4
+# bake settings of the cloth service (EXPORT_PROFILE_KWARGS in backend/clothes_service.py)
+SERVICE = dict(pyramid_levels=3, min_rel_improvement=2e-3)
+
+
+def grid_sample_texture(texture, uv, uv_dr):
+    """Bilinear stand-in for nvdiffrast's dr.texture (no mipmapping, uv_dr unused)"""
+    grid = uv * 2 - 1
+    texture = texture.permute(0, 3, 1, 2).expand(uv.shape[0], -1, -1, -1)
+    render = F.grid_sample(texture, grid, mode="bilinear", padding_mode="border", align_corners=False)
+    return render.permute(0, 2, 3, 1)
+
+
+def rasterize_sphere(directions, resolution, fov=math.radians(40), distance=2.0):
+    """
+    UV maps of a sphere with equirectangular UVs, seen from `distance` along each
+    direction. Buffers are bottom-up like the rasterizer's, and the mask top-down.
+    """
+    ticks = (torch.arange(resolution) + 0.5) / resolution * 2 - 1
+    ys, xs = torch.meshgrid(-ticks, ticks, indexing="ij")  # top-down rows
+    half = math.tan(fov / 2)
+    uvs, masks = [], []
+    for direction in directions:
+        forward = -direction / direction.norm()
+        up = torch.tensor([0.0, 0.0, 1.0])
+        if forward.cross(up, dim=0).norm() < 1e-3:
+            up = torch.tensor([0.0, 1.0, 0.0])
+        right = forward.cross(up, dim=0)
+        right = right / right.norm()
+        up = right.cross(forward, dim=0)
+        rays = forward + half * (xs[..., None] * right + ys[..., None] * up)
+        rays = rays / rays.norm(dim=-1, keepdim=True)
+        origin = -forward * distance
+        # |origin + t * ray| = RADIUS
+        b = (rays * origin).sum(-1)
+        disc = b**2 - (origin.dot(origin) - RADIUS**2)
+        mask = disc > 0
+        t = -b - disc.clamp(min=0).sqrt()
+        points = origin + t[..., None] * rays
+        u = torch.atan2(points[..., 1], points[..., 0]) / (2 * math.pi) + 0.5
+        v = torch.acos((points[..., 2] / RADIUS).clamp(-1, 1)) / math.pi
+        uvs.append(torch.stack([u, v], dim=-1) * mask[..., None])
+        masks.append(mask)
+    uv = torch.stack(uvs).flip(1).contiguous()
+    return uv, torch.zeros(*uv.shape[:3], 4), torch.stack(masks)
+
+
+def _directions(num_views, seed):
+    generator = torch.Generator().manual_seed(seed)
+    directions = torch.randn(num_views, 3, generator=generator)
+    return directions / directions.norm(dim=-1, keepdim=True)
+
+
+def _ground_truth_texture(size):
+    """smooth color ramps under a checkerboard, so both low and high frequencies matter"""
+    ticks = (torch.arange(size) + 0.5) / size
+    v, u = torch.meshgrid(ticks, ticks, indexing="ij")
+    checker = ((u * 16).floor() + (v * 8).floor()) % 2
+    texture = torch.stack([u, v, 0.5 + 0.5 * torch.sin(6 * math.pi * u)], dim=-1)
+    return (0.25 + 0.5 * texture * (0.6 + 0.4 * checker[..., None]))[None]
+
+
+def _render(texture, uv, mask):
+    """top-down renders of a texture through bottom-up uv buffers"""
+    return (grid_sample_texture(texture, uv, None).flip(1) * mask[..., None]).clamp(0, 1)
+
+
+def _scene(num_views=32, resolution=128, texture_size=256, seed=0):
+    """
+    Observations with a per-view gain and pixel noise, like Gaussian renders that do
+    not agree exactly between views, so the loss plateaus above zero.
+    """
+    generator = torch.Generator().manual_seed(seed)
+    texture = _ground_truth_texture(texture_size)
+    uv, uv_dr, masks = rasterize_sphere(_directions(num_views, seed=0), resolution)
+    gain = 1 + 0.05 * torch.randn(num_views, 1, 1, 1, generator=generator)
+    noise = 0.02 * torch.randn(*uv.shape[:3], 3, generator=generator)
+    observations = ((_render(texture, uv, masks) * gain + noise) * masks[..., None]).clamp(0, 1)
+    observations = (observations * 255).round().to(torch.uint8)
+    held_out = rasterize_sphere(_directions(8, seed=1), resolution)
+    return uv, uv_dr, observations, masks, (texture, held_out)
+
+
+def _psnr(texture, reference, held_out):
+    uv, _, masks = held_out
+    render = _render(texture, uv, masks)[masks]
+    target = _render(reference, uv, masks)[masks]
+    return (10 * torch.log10(1 / F.mse_loss(render, target))).item()
+
+
+def _bake(scene, texture_size, seed=0, **kwargs):
+    uv, uv_dr, observations, masks, (reference, held_out) = scene
+    np.random.seed(seed)
+    texture, seconds = best_time(
+        lambda: optimize_texture(
+            uv, uv_dr, observations, masks, texture_size, texture_fn=grid_sample_texture, **kwargs
+        ),
+        repeats=1,
+    )
+    return texture, seconds, _psnr(texture, reference, held_out)
+
+
+def test_texture_pyramid_sizes():
+    assert texture_pyramid_sizes(2048, 1) == [2048]
+    assert texture_pyramid_sizes(2048, 3) == [512, 1024, 2048]
+    assert texture_pyramid_sizes(128, 3) == [64, 128]
+
+
+def test_rasterizer_stand_in_matches_the_bake_conventions():
+    uv, uv_dr, masks = rasterize_sphere(_directions(2, seed=0), 32)
+    assert uv.shape == (2, 32, 32, 2) and uv_dr.shape == (2, 32, 32, 4)
+    assert masks.float().mean() > 0.2 and not masks[:, 0, 0].any()
+    # the uv buffers are bottom-up: their flipped support is the top-down mask
+    assert torch.equal((uv.flip(1).abs().sum(-1) > 0), masks)
+
+
+def test_bake_reproduces_observed_views():
+    scene = _scene(num_views=16, resolution=64, texture_size=64)
+    texture, _, psnr = _bake(scene, 64, max_steps=600)
+    assert texture.shape == (1, 64, 64, 3) and not texture.requires_grad
+    assert psnr > 25
+
+
+def test_early_stop_anneals_the_learning_rate(monkeypatch):
+    """a level that plateaus decays to the final learning rate before it stops"""
+    lrs = []
+
+    class RecordingAdam(torch.optim.Adam):
+        def step(self, *args, **kwargs):
+            lrs.append(self.param_groups[0]["lr"])
+            return super().step(*args, **kwargs)
+
+    monkeypatch.setattr(torch.optim, "Adam", RecordingAdam)
+    scene = _scene(num_views=8, resolution=32, texture_size=32)
+    # any improvement below 100% is a plateau, so the first check stops the level
+    _bake(scene, 32, max_steps=1000, check_interval=20, min_rel_improvement=1.0)
+
+    # 2 check windows, then 20 annealing steps down from the schedule's learning rate
+    assert len(lrs) == 60
+    assert lrs[40] > 5e-3
+    assert all(a >= b for a, b in zip(lrs[40:], lrs[41:]))
+    assert lrs[-1] < 1e-4
+
+
+@pytest.mark.benchmark
+def test_benchmark_psnr_and_time():
+    """
+    Defaults run every step with one view per step, as before the pyramid and
+    early stop were added; both stay opt-in and must not lose quality.
+    """
+    texture_size = 256
+    scene = _scene(texture_size=texture_size)
+    runs = {
+        "defaults (1 view/step, 2500 steps)": {},
+        "4 views/step, early stop": dict(views_per_step=4, min_rel_improvement=2e-3),
+        "service (3-level pyramid, early stop)": SERVICE,
+    }
+    results = {}
+    for name, kwargs in runs.items():
+        _, seconds, psnr = _bake(scene, texture_size, **kwargs)
+        results[name] = (seconds, psnr)
+        print(f"{name:<38} {seconds:6.2f} s  PSNR {psnr:5.2f} dB")
+
+    _, default_psnr = results["defaults (1 view/step, 2500 steps)"]
+    _, service_psnr = results["service (3-level pyramid, early stop)"]
+    assert service_psnr > default_psnr - 0.25
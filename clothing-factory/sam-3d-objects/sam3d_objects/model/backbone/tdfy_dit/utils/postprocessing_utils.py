@@ -1,5 +1,8 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
 from typing import *
+from dataclasses import dataclass, asdict
+from contextlib import contextmanager
+import time
 import numpy as np
 import torch
 import utils3d
@@ -12,12 +15,93 @@ import pyvista as pv
 from pymeshfix import _meshfix
 import igraph
 import cv2
-from .random_utils import sphere_hammersley_sequence
+from .bake_utils import optimize_texture
+from .visibility_utils import sphere_view_origins, accumulate_visibility, outer_face_mask
 from .render_utils import render_multiview
 from ..renderers import GaussianRenderer
 from ..representations import Strivec, Gaussian, MeshExtractResult
 from loguru import logger
 
+
+@dataclass
+class GLBExportProfile:
+    """
+    Settings for a single `to_glb` export.
+
+    Callers that need different export quality (e.g. a larger texture) should pass
+    their own profile to the pipeline instead of re-running `to_glb` on the decoded
+    outputs, so the mesh is postprocessed and the texture baked only once.
+    """
+
+    simplify: float = 0.95  # Ratio of triangles to remove in the simplification process
+    texture_size: int = 1024
+    fill_holes: bool = True
+    fill_holes_max_size: float = 0.04
+    fill_holes_resolution: int = 1024
+    fill_holes_num_views: int = 1000  # view budget, see fill_holes_convergence_tol
+    fill_holes_convergence_tol: float = 0.0  # 0 rasterizes all fill_holes_num_views
+    bake_mode: Literal["fast", "opt"] = "opt"
+    bake_resolution: int = 1024
+    bake_num_views: int = 100
+    bake_max_steps: int = 2500
+    bake_views_per_step: int = 1
+    bake_min_rel_improvement: float = 0.0  # 0 runs all bake_max_steps
+    bake_pyramid_levels: int = 1
+
+    def to_glb_kwargs(self) -> dict:
+        return asdict(self)
+
+
+class PhaseTimer:
+    """
+    Wall-clock time per phase of `to_glb` (render, rasterize, optimize, inpaint, ...).
+    CUDA is synchronized at the phase boundaries so asynchronous kernels are
+    attributed to the phase that launched them.
+    """
+
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+
+    @staticmethod
+    def _sync():
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+
+    @contextmanager
+    def phase(self, name: str):
+        self._sync()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sync()
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def summary(self) -> str:
+        total = sum(self.timings.values())
+        parts = [f"{name}={t:.2f}s" for name, t in self.timings.items()]
+        return f"total={total:.2f}s (" + ", ".join(parts) + ")"
+
+
+@contextmanager
+def _timed(timer: Optional[PhaseTimer], name: str):
+    if timer is None:
+        yield
+    else:
+        with timer.phase(name):
+            yield
+
+
+def _sphere_views(num_views: int, radius: float, device) -> torch.Tensor:
+    """View matrices [N, 4, 4] looking at the origin from `sphere_view_origins`."""
+    origs = sphere_view_origins(num_views, radius, device)
+    return utils3d.torch.view_look_at(
+        origs,
+        torch.zeros_like(origs),
+        torch.tensor([0, 0, 1], dtype=torch.float32, device=device).expand_as(origs),
+    )
+
+
 @torch.no_grad()
 def _fill_holes(
     verts,
@@ -28,6 +112,10 @@ def _fill_holes(
     num_views=500,
     debug=False,
     verbose=False,
+    view_batch_size=8,
+    min_views=100,
+    convergence_tol=0.0,
+    rasterize_fn=None,
 ):
     """
     Rasterize a mesh from multiple views and remove invisible faces.
@@ -40,66 +128,49 @@ def _fill_holes(
         faces (torch.Tensor): Faces of the mesh. Shape (F, 3).
         max_hole_size (float): Maximum area of a hole to fill.
         resolution (int): Resolution of the rasterization.
-        num_views (int): Number of views to rasterize the mesh.
+        num_views (int): Maximum number of views to rasterize the mesh.
         verbose (bool): Whether to print progress.
+        view_batch_size (int): Number of views rasterized together.
+        min_views (int): Number of views rasterized before checking visibility convergence.
+        convergence_tol (float): Stop rasterizing once a batch of views reveals at most this
+            fraction of the faces for the first time. 0 rasterizes all num_views views.
+        rasterize_fn (Callable): Rasterizes the mesh for a batch of views [B, 4, 4] into the
+            1-based face id buffer and the coverage mask, see `accumulate_visibility`.
+            The utils3d CUDA rasterizer (40 degree fov, near 1, far 3) by default.
     """
+    device = verts.device
     # Construct cameras
-    yaws = []
-    pitchs = []
-    for i in range(num_views):
-        y, p = sphere_hammersley_sequence(i, num_views)
-        yaws.append(y)
-        pitchs.append(p)
-    yaws = torch.tensor(yaws).cuda()
-    pitchs = torch.tensor(pitchs).cuda()
     radius = 2.0
-    fov = torch.deg2rad(torch.tensor(40)).cuda()
-    projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
-    views = []
-    for yaw, pitch in zip(yaws, pitchs):
-        orig = (
-            torch.tensor(
-                [
-                    torch.sin(yaw) * torch.cos(pitch),
-                    torch.cos(yaw) * torch.cos(pitch),
-                    torch.sin(pitch),
-                ]
-            )
-            .cuda()
-            .float()
-            * radius
-        )
-        view = utils3d.torch.view_look_at(
-            orig,
-            torch.tensor([0, 0, 0]).float().cuda(),
-            torch.tensor([0, 0, 1]).float().cuda(),
-        )
-        views.append(view)
-    views = torch.stack(views, dim=0)
+    views = _sphere_views(num_views, radius, device)
 
     # Rasterize
-    visblity = torch.zeros(faces.shape[0], dtype=torch.int32, device=verts.device)
-    rastctx = utils3d.torch.RastContext(backend="cuda")
-    for i in tqdm(
-        range(views.shape[0]),
-        total=views.shape[0],
-        disable=not verbose,
-        desc="Rasterizing",
-    ):
-        view = views[i]
-        buffers = utils3d.torch.rasterize_triangle_faces(
-            rastctx,
-            verts[None],
-            faces,
-            resolution,
-            resolution,
-            view=view,
-            projection=projection,
-        )
-        face_id = buffers["face_id"][0][buffers["mask"][0] > 0.95] - 1
-        face_id = torch.unique(face_id).long()
-        visblity[face_id] += 1
-    visblity = visblity.float() / num_views
+    if rasterize_fn is None:
+        fov = torch.deg2rad(torch.tensor(40)).to(device)
+        projection = utils3d.torch.perspective_from_fov_xy(fov, fov, 1, 3)
+        rastctx = utils3d.torch.RastContext(backend="cuda")
+
+        def rasterize_fn(view_batch):
+            buffers = utils3d.torch.rasterize_triangle_faces(
+                rastctx,
+                verts[None].expand(view_batch.shape[0], -1, -1),
+                faces,
+                resolution,
+                resolution,
+                view=view_batch,
+                projection=projection,
+            )
+            return buffers["face_id"], buffers["mask"]
+
+    visblity, num_rendered = accumulate_visibility(
+        rasterize_fn,
+        views,
+        faces.shape[0],
+        batch_size=view_batch_size,
+        min_views=min_views,
+        convergence_tol=convergence_tol,
+        verbose=verbose,
+    )
+    visblity = visblity.float() / num_rendered
 
     # Mincut
     ## construct outer faces
@@ -108,14 +179,14 @@ def _fill_holes(
     connected_components = utils3d.torch.compute_connected_components(
         faces, edges, face2edge
     )
-    outer_face_indices = torch.zeros(
-        faces.shape[0], dtype=torch.bool, device=faces.device
+    component_faces = torch.cat(connected_components)
+    component_labels = torch.repeat_interleave(
+        torch.arange(len(connected_components), device=faces.device),
+        torch.tensor([len(cc) for cc in connected_components], device=faces.device),
     )
-    for i in range(len(connected_components)):
-        outer_face_indices[connected_components[i]] = visblity[
-            connected_components[i]
-        ] > min(max(visblity[connected_components[i]].quantile(0.75).item(), 0.25), 0.5)
-    outer_face_indices = outer_face_indices.nonzero().reshape(-1)
+    outer_face_indices = outer_face_mask(
+        visblity, component_faces, component_labels, len(connected_components)
+    ).nonzero().reshape(-1)
 
     ## construct inner faces
     inner_face_indices = torch.nonzero(visblity == 0).reshape(-1)
@@ -265,8 +336,8 @@ def _fill_holes(
     mesh.fill_small_boundaries(nbe=max_hole_nbe, refine=True)
     verts, faces = mesh.return_arrays()
     verts, faces = torch.tensor(
-        verts, device="cuda", dtype=torch.float32
-    ), torch.tensor(faces, device="cuda", dtype=torch.int32)
+        verts, device=device, dtype=torch.float32
+    ), torch.tensor(faces, device=device, dtype=torch.int32)
 
     return verts, faces
 
@@ -281,6 +352,7 @@ def postprocess_mesh(
     fill_holes_max_hole_nbe: int = 32,
     fill_holes_resolution: int = 1024,
     fill_holes_num_views: int = 1000,
+    fill_holes_convergence_tol: float = 0.0,
     debug: bool = False,
     verbose: bool = False,
 ):
@@ -296,7 +368,9 @@ def postprocess_mesh(
         fill_holes_max_hole_size (float): Maximum area of a hole to fill.
         fill_holes_max_hole_nbe (int): Maximum number of boundary edges of a hole to fill.
         fill_holes_resolution (int): Resolution of the rasterization.
-        fill_holes_num_views (int): Number of views to rasterize the mesh.
+        fill_holes_num_views (int): Maximum number of views to rasterize the mesh.
+        fill_holes_convergence_tol (float): Stop rasterizing once a batch of views reveals at most
+            this fraction of the faces for the first time (0 rasterizes all views).
         verbose (bool): Whether to print progress.
     """
 
@@ -330,6 +404,7 @@ def postprocess_mesh(
             max_hole_nbe=fill_holes_max_hole_nbe,
             resolution=fill_holes_resolution,
             num_views=fill_holes_num_views,
+            convergence_tol=fill_holes_convergence_tol,
             debug=debug,
             verbose=verbose,
         )
@@ -358,16 +433,43 @@ def parametrize_mesh(vertices: np.array, faces: np.array):
 
     return vertices, faces, uvs
 
+def _stack_views(items, device, dtype=None):
+    """Stack per-view arrays / tensors into one tensor [V, ...] on device (no-op for tensors)."""
+    if not torch.is_tensor(items):
+        items = torch.stack([torch.as_tensor(np.asarray(x)) for x in items])
+    return items.to(device=device, dtype=dtype) if dtype is not None else items.to(device)
+
+
+def _rasterize_uv_batches(
+    rastctx, vertices, faces, uvs, views, projections, width, height, batch_size
+):
+    """Rasterize the UVs of the mesh for `batch_size` views at a time."""
+    for start in range(0, views.shape[0], batch_size):
+        end = min(start + batch_size, views.shape[0])
+        n = end - start
+        rast = utils3d.torch.rasterize_triangle_faces(
+            rastctx,
+            vertices[None].expand(n, -1, -1),
+            faces,
+            width,
+            height,
+            uv=uvs[None].expand(n, -1, -1),
+            view=views[start:end],
+            projection=projections[start:end],
+        )
+        yield start, end, rast
+
+
 @torch.inference_mode(False)
 @torch.enable_grad()
 def bake_texture(
     vertices: np.array,
     faces: np.array,
     uvs: np.array,
-    observations: List[np.array],
-    masks: List[np.array],
-    extrinsics: List[np.array],
-    intrinsics: List[np.array],
+    observations: Union[List[np.array], torch.Tensor],
+    masks: Optional[Union[List[np.array], torch.Tensor]],
+    extrinsics: Union[List[np.array], torch.Tensor],
+    intrinsics: Union[List[np.array], torch.Tensor],
     texture_size: int = 2048,
     near: float = 0.1,
     far: float = 10.0,
@@ -376,7 +478,13 @@ def bake_texture(
     verbose: bool = False,
     rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
     device: str = "cuda",
-
+    rasterize_batch_size: int = 8,
+    opt_max_steps: int = 2500,
+    opt_views_per_step: int = 1,
+    opt_check_interval: int = 100,
+    opt_min_rel_improvement: float = 0.0,
+    opt_pyramid_levels: int = 1,
+    timer: Optional[PhaseTimer] = None,
 ):
     """
     Bake texture to a mesh from multiple observations.
@@ -385,32 +493,47 @@ def bake_texture(
         vertices (np.array): Vertices of the mesh. Shape (V, 3).
         faces (np.array): Faces of the mesh. Shape (F, 3).
         uvs (np.array): UV coordinates of the mesh. Shape (V, 2).
-        observations (List[np.array]): List of observations. Each observation is a 2D image. Shape (H, W, 3).
-        masks (List[np.array]): List of masks. Each mask is a 2D image. Shape (H, W).
-        extrinsics (List[np.array]): List of extrinsics. Shape (4, 4).
-        intrinsics (List[np.array]): List of intrinsics. Shape (3, 3).
+        observations (List[np.array] | torch.Tensor): Observations, a list of (H, W, 3) images
+            or a stacked (N, H, W, 3) tensor. uint8 values are scaled to [0, 1].
+        masks (List[np.array] | torch.Tensor | None): Masks of shape (H, W) per observation.
+            Computed from the non-black pixels of the observations if None.
+        extrinsics (List[np.array] | torch.Tensor): Extrinsics. Shape (4, 4) per observation.
+        intrinsics (List[np.array] | torch.Tensor): Intrinsics. Shape (3, 3) per observation.
         texture_size (int): Size of the texture.
         near (float): Near plane of the camera.
         far (float): Far plane of the camera.
         mode (Literal['fast', 'opt']): Mode of texture baking.
         lambda_tv (float): Weight of total variation loss in optimization.
         verbose (bool): Whether to print progress.
+        rasterize_batch_size (int): Number of views rasterized together.
+        opt_max_steps (int): Maximum number of optimization steps (over all pyramid levels).
+        opt_views_per_step (int): Number of views sampled per optimization step.
+        opt_check_interval (int): Steps between convergence checks of the mean loss.
+        opt_min_rel_improvement (float): Stop a level once the mean loss of a check window
+            improves by less than this fraction over the previous window. 0 disables early stop.
+        opt_pyramid_levels (int): Number of coarse-to-fine texture levels, each doubling the
+            size up to texture_size (e.g. 3 levels for 2048: 512 -> 1024 -> 2048).
+        timer (PhaseTimer): Optional timer collecting the time of each phase.
     """
 
-
     vertices = torch.tensor(vertices).to(device)
     faces = torch.tensor(faces.astype(np.int32)).to(device)
     uvs = torch.tensor(uvs).to(device)
-    observations = [torch.tensor(obs / 255.0).float().to(device) for obs in observations]
-    masks = [torch.tensor(m > 0).bool().to(device) for m in masks]
-    views = [
-        utils3d.torch.extrinsics_to_view(torch.tensor(extr).to(device))
-        for extr in extrinsics
-    ]
-    projections = [
-        utils3d.torch.intrinsics_to_perspective(torch.tensor(intr).to(device), near, far)
-        for intr in intrinsics
-    ]
+    # observations stay in their stored dtype (uint8 for renders) and are converted per use
+    observations = _stack_views(observations, device)
+    obs_scale = 1 / 255.0 if observations.dtype == torch.uint8 else 1.0
+    if masks is None:
+        masks = (observations > 0).any(dim=-1)
+    else:
+        masks = _stack_views(masks, device) > 0
+    views = utils3d.torch.extrinsics_to_view(_stack_views(extrinsics, device, torch.float32))
+    projections = utils3d.torch.intrinsics_to_perspective(
+        _stack_views(intrinsics, device, torch.float32), near, far
+    )
+    num_views, height, width = observations.shape[:3]
+
+    def get_observation(idx):
+        return observations[idx].float() * obs_scale
 
     if mode == "fast":
         texture = torch.zeros(
@@ -420,133 +543,88 @@ def bake_texture(
             (texture_size * texture_size), dtype=torch.float32
         ).to(device)
         rastctx = utils3d.torch.RastContext(backend=device if device.startswith("cuda") else "cuda")
-        for observation, view, projection in tqdm(
-            zip(observations, views, projections),
-            total=len(observations),
-            disable=not verbose,
-            desc="Texture baking (fast)",
-        ):
-            with torch.no_grad():
-                rast = utils3d.torch.rasterize_triangle_faces(
-                    rastctx,
-                    vertices[None],
-                    faces,
-                    observation.shape[1],
-                    observation.shape[0],
-                    uv=uvs[None],
-                    view=view,
-                    projection=projection,
+        with _timed(timer, "rasterize"):
+            for start, end, rast in tqdm(
+                _rasterize_uv_batches(
+                    rastctx, vertices, faces, uvs, views, projections,
+                    width, height, rasterize_batch_size,
+                ),
+                total=(num_views + rasterize_batch_size - 1) // rasterize_batch_size,
+                disable=not verbose,
+                desc="Texture baking (fast)",
+            ):
+                with torch.no_grad():
+                    # rasterized buffers are bottom-up, flip them to match the observations
+                    uv_map = rast["uv"].detach().flip(1)
+                    mask = rast["mask"].detach().flip(1).bool() & masks[start:end]
+
+                # nearest neighbor interpolation
+                uv_map = (uv_map * texture_size).floor().long()
+                obs = get_observation(slice(start, end))[mask]
+                uv_map = uv_map[mask]
+                idx = uv_map[:, 0] + (texture_size - uv_map[:, 1] - 1) * texture_size
+                texture = texture.scatter_add(0, idx.view(-1, 1).expand(-1, 3), obs)
+                texture_weights = texture_weights.scatter_add(
+                    0,
+                    idx,
+                    torch.ones((obs.shape[0]), dtype=torch.float32, device=texture.device),
                 )
-                uv_map = rast["uv"][0].detach().flip(0)
-                mask = rast["mask"][0].detach().bool() & masks[0]
-
-            # nearest neighbor interpolation
-            uv_map = (uv_map * texture_size).floor().long()
-            obs = observation[mask]
-            uv_map = uv_map[mask]
-            idx = uv_map[:, 0] + (texture_size - uv_map[:, 1] - 1) * texture_size
-            texture = texture.scatter_add(0, idx.view(-1, 1).expand(-1, 3), obs)
-            texture_weights = texture_weights.scatter_add(
-                0,
-                idx,
-                torch.ones((obs.shape[0]), dtype=torch.float32, device=texture.device),
-            )
-
-        mask = texture_weights > 0
-        texture[mask] /= texture_weights[mask][:, None]
-        texture = np.clip(
-            texture.reshape(texture_size, texture_size, 3).cpu().numpy() * 255, 0, 255
-        ).astype(np.uint8)
 
-        # inpaint
-        mask = (
-            (texture_weights == 0)
-            .cpu()
-            .numpy()
-            .astype(np.uint8)
-            .reshape(texture_size, texture_size)
-        )
-        texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
+        with _timed(timer, "inpaint"):
+            mask = texture_weights > 0
+            texture[mask] /= texture_weights[mask][:, None]
+            texture = np.clip(
+                texture.reshape(texture_size, texture_size, 3).cpu().numpy() * 255, 0, 255
+            ).astype(np.uint8)
+
+            # inpaint
+            mask = (
+                (texture_weights == 0)
+                .cpu()
+                .numpy()
+                .astype(np.uint8)
+                .reshape(texture_size, texture_size)
+            )
+            texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
 
     elif mode == "opt":
         rastctx = utils3d.torch.RastContext(backend=device if device.startswith("cuda") else "cuda")
-        
-        # 使用簡單穩定的處理方式
-        processed_observations = [obs.flip(0) for obs in observations]
-        processed_masks = [m.flip(0) for m in masks]
-        _uv = []
-        _uv_dr = []
-        for i in range(len(views)):
-            with torch.no_grad():
-                rast = utils3d.torch.rasterize_triangle_faces(
-                    rastctx,
-                    vertices[None],
-                    faces,
-                    processed_observations[i].shape[1],
-                    processed_observations[i].shape[0],
-                    uv=uvs[None],
-                    view=views[i],
-                    projection=projections[i],
-                )
-                _uv.append(rast["uv"].detach())
-                _uv_dr.append(rast["uv_dr"].detach())
-
-        texture = torch.nn.Parameter(
-            torch.zeros((1, texture_size, texture_size, 3), dtype=torch.float32).to(device)
-        )
-        optimizer = torch.optim.Adam([texture], betas=(0.5, 0.9), lr=1e-2)
-
-        def exp_anealing(optimizer, step, total_steps, start_lr, end_lr):
-            return start_lr * (end_lr / start_lr) ** (step / total_steps)
 
-        def cosine_anealing(optimizer, step, total_steps, start_lr, end_lr):
-            return end_lr + 0.5 * (start_lr - end_lr) * (
-                1 + np.cos(np.pi * step / total_steps)
+        # 使用簡單穩定的處理方式
+        # 觀測影像與遮罩在取用時才翻轉，避免複製整個 [V, H, W, 3] 張量
+        with _timed(timer, "rasterize"), torch.no_grad():
+            _uv = torch.empty((num_views, height, width, 2), dtype=torch.float32, device=device)
+            _uv_dr = torch.empty((num_views, height, width, 4), dtype=torch.float32, device=device)
+            for start, end, rast in _rasterize_uv_batches(
+                rastctx, vertices, faces, uvs, views, projections,
+                width, height, rasterize_batch_size,
+            ):
+                _uv[start:end] = rast["uv"].detach()
+                _uv_dr[start:end] = rast["uv_dr"].detach()
+
+        with _timed(timer, "optimize"):
+            texture = optimize_texture(
+                _uv,
+                _uv_dr,
+                observations,
+                masks,
+                texture_size,
+                lambda_tv=lambda_tv,
+                max_steps=opt_max_steps,
+                views_per_step=opt_views_per_step,
+                check_interval=opt_check_interval,
+                min_rel_improvement=opt_min_rel_improvement,
+                pyramid_levels=opt_pyramid_levels,
+                verbose=verbose,
             )
-
-        def tv_loss(texture):
-            return torch.nn.functional.l1_loss(
-                texture[:, :-1, :, :], texture[:, 1:, :, :]
-            ) + torch.nn.functional.l1_loss(texture[:, :, :-1, :], texture[:, :, 1:, :])
-
-        total_steps = 2500
-        
-        with tqdm(
-            total=total_steps,
-            disable=not verbose,
-            desc="Texture baking (opt): optimizing",
-            ) as pbar:
-            for step in range(total_steps):
-                optimizer.zero_grad()
-                selected = np.random.randint(0, len(views))
-                uv, uv_dr, observation, mask = (
-                    _uv[selected],
-                    _uv_dr[selected],
-                    processed_observations[selected],
-                    processed_masks[selected],
-                )
-                
-                import nvdiffrast.torch as dr
-                render = dr.texture(texture, uv, uv_dr)[0]
-                    
-                loss = torch.nn.functional.l1_loss(render[mask], observation[mask])
-                if lambda_tv > 0:
-                    loss += lambda_tv * tv_loss(texture)
-                loss.backward()
-                optimizer.step()
-                # annealing
-                optimizer.param_groups[0]["lr"] = cosine_anealing(
-                    optimizer, step, total_steps, 1e-2, 1e-5
-                    )
-                pbar.set_postfix({"loss": loss.item()})
-                pbar.update()
-        texture = np.clip(
-            texture[0].flip(0).detach().cpu().numpy() * 255, 0, 255
-        ).astype(np.uint8)
-        mask = 1 - utils3d.torch.rasterize_triangle_faces(
-            rastctx, (uvs * 2 - 1)[None], faces, texture_size, texture_size
-        )["mask"][0].detach().cpu().numpy().astype(np.uint8)
-        texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
+        with _timed(timer, "inpaint"):
+            texture = np.clip(
+                texture[0].flip(0).detach().cpu().numpy() * 255, 0, 255
+            ).astype(np.uint8)
+            mask = 1 - utils3d.torch.rasterize_triangle_faces(
+                rastctx, (uvs * 2 - 1)[None], faces, texture_size, texture_size
+            )["mask"][0].detach().cpu().numpy().astype(np.uint8)
+            texture = cv2.inpaint(texture, mask, 3, cv2.INPAINT_TELEA)
     else:
         raise ValueError(f"Unknown mode: {mode}")
 
@@ -566,6 +644,17 @@ def to_glb(
     with_texture_baking=True,
     use_vertex_color=False,
     rendering_engine: str = "nvdiffrast",  # nvdiffrast OR "pytorch3d"
+    fill_holes_resolution: int = 1024,
+    fill_holes_num_views: int = 1000,
+    fill_holes_convergence_tol: float = 0.0,
+    bake_mode: Literal["fast", "opt"] = "opt",
+    bake_resolution: int = 1024,
+    bake_num_views: int = 100,
+    bake_max_steps: int = 2500,
+    bake_views_per_step: int = 1,
+    bake_min_rel_improvement: float = 0.0,
+    bake_pyramid_levels: int = 1,
+    timer: Optional[PhaseTimer] = None,
 ) -> trimesh.Trimesh:
     """
     Convert a generated asset to a glb file.
@@ -579,7 +668,22 @@ def to_glb(
         texture_size (int): Size of the texture.
         debug (bool): Whether to print debug information.
         verbose (bool): Whether to print progress.
+        fill_holes_resolution (int): Resolution of the hole-filling rasterization.
+        fill_holes_num_views (int): Maximum number of views used to find invisible faces.
+        fill_holes_convergence_tol (float): Stop the hole-filling rasterization once a batch
+            of views reveals at most this fraction of the faces for the first time (0
+            rasterizes all views).
+        bake_mode (Literal['fast', 'opt']): Mode of texture baking.
+        bake_resolution (int): Resolution of the multiview renders used for baking.
+        bake_num_views (int): Number of multiview renders used for baking.
+        bake_max_steps (int): Maximum optimization steps of the "opt" bake.
+        bake_views_per_step (int): Views sampled per step of the "opt" bake.
+        bake_min_rel_improvement (float): Early-stop threshold of the "opt" bake.
+        bake_pyramid_levels (int): Coarse-to-fine texture levels of the "opt" bake.
+        timer (PhaseTimer): Optional timer collecting the time of each phase; the
+            phase timings are logged at the end either way.
     """
+    timer = timer if timer is not None else PhaseTimer()
     logger.info("=== Starting to_glb conversion ===")
     logger.info(f"  - Mesh vertices: {mesh.vertices.shape[0]}, faces: {mesh.faces.shape[0]}")
     logger.info(f"  - Options: simplify={simplify}, texture_size={texture_size}")
@@ -592,52 +696,59 @@ def to_glb(
     if with_mesh_postprocess:
         # mesh postprocess
         logger.info("Starting mesh postprocessing (simplification, hole filling, etc.)...")
-        vertices, faces = postprocess_mesh(
-            vertices,
-            faces,
-            simplify=simplify > 0,
-            simplify_ratio=simplify,
-            fill_holes=fill_holes,
-            fill_holes_max_hole_size=fill_holes_max_size,
-            fill_holes_max_hole_nbe=int(250 * np.sqrt(1 - simplify)),
-            fill_holes_resolution=1024,
-            fill_holes_num_views=1000,
-            debug=debug,
-            verbose=verbose,
-        )
+        with timer.phase("postprocess"):
+            vertices, faces = postprocess_mesh(
+                vertices,
+                faces,
+                simplify=simplify > 0,
+                simplify_ratio=simplify,
+                fill_holes=fill_holes,
+                fill_holes_max_hole_size=fill_holes_max_size,
+                fill_holes_max_hole_nbe=int(250 * np.sqrt(1 - simplify)),
+                fill_holes_resolution=fill_holes_resolution,
+                fill_holes_num_views=fill_holes_num_views,
+                fill_holes_convergence_tol=fill_holes_convergence_tol,
+                debug=debug,
+                verbose=verbose,
+            )
         logger.info(f"Mesh postprocessing completed. Final vertices: {vertices.shape[0]}, faces: {faces.shape[0]}")
 
     if with_texture_baking:
         # parametrize mesh
-        vertices, faces, uvs = parametrize_mesh(vertices, faces)
+        with timer.phase("parametrize"):
+            vertices, faces, uvs = parametrize_mesh(vertices, faces)
         logger.info("Baking texture ...")
-        logger.info("  Step 1: Rendering multiview observations (100 views, this may take 30-60 seconds)...")
+        logger.info(f"  Step 1: Rendering multiview observations ({bake_num_views} views, this may take 30-60 seconds)...")
 
         # bake texture
-        observations, extrinsics, intrinsics = render_multiview(
-            app_rep, resolution=1024, nviews=100
-        )
+        # 觀測影像以 [V, H, W, 3] uint8 張量留在 GPU 上，遮罩於 bake_texture 內以張量計算
+        with timer.phase("render"):
+            observations, extrinsics, intrinsics = render_multiview(
+                app_rep, resolution=bake_resolution, nviews=bake_num_views, on_device=True
+            )
         logger.info(f"  Step 1 completed: Rendered {len(observations)} views")
-        logger.info("  Step 2: Preparing masks and camera parameters...")
-        masks = [np.any(observation > 0, axis=-1) for observation in observations]
-        extrinsics = [extrinsics[i].cpu().numpy() for i in range(len(extrinsics))]
-        intrinsics = [intrinsics[i].cpu().numpy() for i in range(len(intrinsics))]
-        logger.info("  Step 3: Optimizing texture (2500 iterations, this may take 2-3 minutes)...")
+        logger.info(f"  Step 2: Baking texture (mode={bake_mode}, this may take 2-3 minutes)...")
         texture = bake_texture(
             vertices,
             faces,
             uvs,
             observations,
-            masks,
+            None,
             extrinsics,
             intrinsics,
             texture_size=texture_size,
-            mode="opt",
+            mode=bake_mode,
             lambda_tv=0.01,
             verbose=True,  # 強制顯示進度條
-            rendering_engine=rendering_engine
+            rendering_engine=rendering_engine,
+            opt_max_steps=bake_max_steps,
+            opt_views_per_step=bake_views_per_step,
+            opt_min_rel_improvement=bake_min_rel_improvement,
+            opt_pyramid_levels=bake_pyramid_levels,
+            timer=timer,
         )
-        logger.info("  Step 3 completed: Texture optimization finished")
+        del observations
+        logger.info("  Step 2 completed: Texture optimization finished")
         texture = Image.fromarray(texture)
         material = trimesh.visual.material.PBRMaterial(
             roughnessFactor=0.9, # 降低粗糙度，讓材質更有光澤
@@ -663,6 +774,7 @@ def to_glb(
             ),
         )
 
+    logger.info(f"  Phase timings: {timer.summary()}")
     logger.info("=== to_glb conversion completed successfully ===")
     return mesh
 
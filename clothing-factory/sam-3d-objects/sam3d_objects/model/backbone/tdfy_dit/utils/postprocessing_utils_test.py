@@ -0,0 +1,186 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Per-phase timing harness for `to_glb`, built on `PhaseTimer`.
+
+Runs `to_glb` on a saved asset (a Gaussian PLY written by `Gaussian.save_ply` and the
+extracted mesh with vertex colors), or on a synthetic sphere when no asset is given,
+and prints the time of every phase (postprocess, parametrize, render, rasterize,
+optimize, inpaint) per repeat. Export settings are `GLBExportProfile` fields:
+
+    python sam3d_objects/model/backbone/tdfy_dit/utils/postprocessing_utils_test.py \
+        --gaussian gs.ply --mesh mesh.ply --repeats 3 --set bake_mode=fast --set texture_size=2048
+
+The harness needs CUDA (renderer and rasterizer); the timer itself is tested on CPU.
+"""
+import argparse
+import dataclasses
+import json
+import statistics
+import time
+
+import numpy as np
+import pytest
+import torch
+
+# postprocessing_utils imports the mesh representations (kaolin) and the renderers (gsplat)
+pytest.importorskip("kaolin")
+pytest.importorskip("gsplat")
+
+from sam3d_objects.model.backbone.tdfy_dit.representations import Gaussian, MeshExtractResult
+from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
+from sam3d_objects.model.backbone.tdfy_dit.utils.postprocessing_utils import (
+    GLBExportProfile,
+    PhaseTimer,
+)
+
+SH_C0 = 0.28209479177387814
+# Gaussian settings of the structured-latent Gaussian decoder
+GAUSSIAN_AABB = [-0.5, -0.5, -0.5, 1.0, 1.0, 1.0]
+
+
+def parse_profile(overrides):
+    """GLBExportProfile from `name=value` strings, values coerced to the field's type"""
+    defaults = GLBExportProfile()
+    kwargs = {}
+    for override in overrides:
+        name, _, value = override.partition("=")
+        if not hasattr(defaults, name):
+            raise ValueError(f"unknown GLBExportProfile field: {name}")
+        default = getattr(defaults, name)
+        if isinstance(default, bool):
+            kwargs[name] = value.lower() in ("1", "true", "yes")
+        elif isinstance(default, (int, float)):
+            kwargs[name] = type(default)(value)
+        else:
+            kwargs[name] = value
+    return dataclasses.replace(defaults, **kwargs)
+
+
+def synthetic_asset(subdivisions=5, num_gaussians=200_000, device="cuda"):
+    """Sphere mesh with normal-colored vertices, and Gaussians on its surface"""
+    import trimesh
+
+    sphere = trimesh.creation.icosphere(subdivisions=subdivisions, radius=0.35)
+    colors = (sphere.vertex_normals + 1) / 2
+    mesh = MeshExtractResult(
+        vertices=torch.tensor(sphere.vertices, dtype=torch.float32, device=device),
+        faces=torch.tensor(sphere.faces, device=device),
+        vertex_attrs=torch.tensor(colors, dtype=torch.float32, device=device),
+    )
+
+    points, face_idx = trimesh.sample.sample_surface(sphere, num_gaussians, seed=0)
+    gaussian = Gaussian(aabb=GAUSSIAN_AABB, device=device)
+    gaussian.from_xyz(torch.tensor(points, dtype=torch.float32, device=device))
+    rgb = torch.tensor((sphere.face_normals[face_idx] + 1) / 2, dtype=torch.float32, device=device)
+    gaussian.from_features(((rgb - 0.5) / SH_C0)[:, None, :])
+    gaussian.from_scaling(torch.full((num_gaussians, 3), 0.004, device=device))
+    gaussian.from_rotation(torch.tensor([[1.0, 0, 0, 0]], device=device).expand(num_gaussians, -1))
+    gaussian.from_opacity(torch.full((num_gaussians, 1), 0.95, device=device))
+    return gaussian, mesh
+
+
+def load_asset(gaussian_path, mesh_path, device="cuda"):
+    import trimesh
+
+    gaussian = Gaussian(aabb=GAUSSIAN_AABB, device=device)
+    gaussian.load_ply(gaussian_path)
+    loaded = trimesh.load(mesh_path, force="mesh", process=False)
+    if loaded.visual.kind == "vertex":
+        colors = loaded.visual.vertex_colors[:, :3] / 255.0
+    else:
+        colors = np.full((len(loaded.vertices), 3), 0.5)
+    mesh = MeshExtractResult(
+        vertices=torch.tensor(loaded.vertices, dtype=torch.float32, device=device),
+        faces=torch.tensor(loaded.faces, device=device),
+        vertex_attrs=torch.tensor(colors, dtype=torch.float32, device=device),
+    )
+    return gaussian, mesh
+
+
+def time_to_glb(gaussian, mesh, profile, repeats=1):
+    """Phase timings (seconds) of each `to_glb` run"""
+    runs = []
+    for _ in range(repeats):
+        timer = PhaseTimer()
+        start = time.perf_counter()
+        postprocessing_utils.to_glb(
+            gaussian, mesh, verbose=False, timer=timer, **profile.to_glb_kwargs()
+        )
+        runs.append(dict(timer.timings, wall=time.perf_counter() - start))
+    return runs
+
+
+def format_table(runs):
+    phases = list(dict.fromkeys(name for run in runs for name in run))
+    header = f"{'phase':<12}" + "".join(f"{f'run {i}':>10}" for i in range(len(runs))) + f"{'median':>10}"
+    lines = [header]
+    for name in phases:
+        values = [run.get(name, 0.0) for run in runs]
+        lines.append(
+            f"{name:<12}"
+            + "".join(f"{v:>9.2f}s" for v in values)
+            + f"{statistics.median(values):>9.2f}s"
+        )
+    return "\n".join(lines)
+
+
+def test_phase_timer_accumulates_per_phase():
+    timer = PhaseTimer()
+    with timer.phase("render"):
+        time.sleep(0.01)
+    with timer.phase("optimize"):
+        pass
+    with timer.phase("render"):
+        time.sleep(0.01)
+    assert list(timer.timings) == ["render", "optimize"]
+    assert timer.timings["render"] >= 0.02
+    assert timer.summary().startswith("total=")
+    assert "render=" in timer.summary() and "optimize=" in timer.summary()
+
+
+def test_phase_timer_records_failed_phases():
+    timer = PhaseTimer()
+    with pytest.raises(RuntimeError):
+        with timer.phase("inpaint"):
+            raise RuntimeError("cv2 failed")
+    assert "inpaint" in timer.timings
+
+
+def test_parse_profile_and_table():
+    profile = parse_profile(["bake_mode=fast", "texture_size=2048", "fill_holes=false"])
+    assert profile.bake_mode == "fast" and profile.texture_size == 2048
+    assert profile.fill_holes is False and profile.simplify == GLBExportProfile().simplify
+    with pytest.raises(ValueError):
+        parse_profile(["texture=1"])
+
+    table = format_table([{"render": 1.0, "wall": 3.0}, {"render": 2.0, "optimize": 1.0, "wall": 4.0}])
+    assert table.splitlines()[0].split() == ["phase", "run", "0", "run", "1", "median"]
+    assert [line.split()[0] for line in table.splitlines()[1:]] == ["render", "wall", "optimize"]
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="to_glb renders and rasterizes on CUDA")
+def test_harness_on_synthetic_asset():
+    gaussian, mesh = synthetic_asset(subdivisions=3, num_gaussians=20_000)
+    profile = parse_profile(
+        ["bake_mode=fast", "texture_size=256", "bake_resolution=256", "bake_num_views=8"]
+    )
+    (run,) = time_to_glb(gaussian, mesh, profile)
+    print(format_table([run]))
+    assert {"postprocess", "parametrize", "render", "rasterize", "inpaint"} <= set(run)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gaussian", help="Gaussian PLY (Gaussian.save_ply); synthetic sphere if omitted")
+    parser.add_argument("--mesh", help="extracted mesh with vertex colors (any trimesh format)")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--set", dest="overrides", action="append", default=[], metavar="FIELD=VALUE")
+    parser.add_argument("--json", action="store_true", help="print the timings as JSON")
+    args = parser.parse_args()
+
+    if args.gaussian:
+        gaussian, mesh = load_asset(args.gaussian, args.mesh)
+    else:
+        gaussian, mesh = synthetic_asset()
+    runs = time_to_glb(gaussian, mesh, parse_profile(args.overrides), args.repeats)
+    print(json.dumps(runs, indent=2) if args.json else format_table(runs))
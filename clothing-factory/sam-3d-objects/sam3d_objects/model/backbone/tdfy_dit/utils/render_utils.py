@@ -50,15 +50,7 @@ def yaw_pitch_r_fov_to_extrinsics_intrinsics(yaws, pitchs, rs, fovs):
     return extrinsics, intrinsics
 
 
-def render_frames(
-    sample,
-    extrinsics,
-    intrinsics,
-    options={},
-    colors_overwrite=None,
-    verbose=True,
-    **kwargs,
-):
+def _build_renderer(sample, options={}, **kwargs):
     if isinstance(sample, Octree):
         renderer = OctreeRenderer()
         renderer.rendering_options.resolution = options.get("resolution", 512)
@@ -85,6 +77,19 @@ def render_frames(
         renderer.rendering_options.ssaa = options.get("ssaa", 4)
     else:
         raise ValueError(f"Unsupported sample type: {type(sample)}")
+    return renderer
+
+
+def render_frames(
+    sample,
+    extrinsics,
+    intrinsics,
+    options={},
+    colors_overwrite=None,
+    verbose=True,
+    **kwargs,
+):
+    renderer = _build_renderer(sample, options, **kwargs)
 
     rets = {}
     for j, (extr, intr) in tqdm(
@@ -152,6 +157,40 @@ def render_gaussian_color_stay_in_device(
         rets["color"].append(color)
     return rets
 
+def render_frames_on_device(
+    sample,
+    extrinsics,
+    intrinsics,
+    options={},
+    colors_overwrite=None,
+    verbose=True,
+    **kwargs,
+):
+    """
+    Same as render_frames for the color of Octree / Gaussian samples, but keeps the
+    frames on the render device as one stacked uint8 tensor [V, H, W, 3] (quantized
+    like render_frames) instead of copying every frame to a numpy array.
+    """
+    assert not isinstance(sample, MeshExtractResult)
+    renderer = _build_renderer(sample, options, **kwargs)
+
+    colors = None
+    for j, (extr, intr) in tqdm(
+        enumerate(zip(extrinsics, intrinsics)),
+        total=len(extrinsics),
+        desc="Rendering",
+        disable=not verbose,
+    ):
+        res = renderer.render(sample, extr, intr, colors_overwrite=colors_overwrite)
+        color = (res["color"].detach().permute(1, 2, 0) * 255).clamp_(0, 255)
+        if colors is None:
+            colors = torch.empty(
+                (len(extrinsics), *color.shape), dtype=torch.uint8, device=color.device
+            )
+        colors[j] = color.to(torch.uint8)
+    return colors
+
+
 def render_video(
     sample,
     resolution=512,
@@ -178,7 +217,11 @@ def render_video(
     )
 
 
-def render_multiview(sample, resolution=512, nviews=30):
+def render_multiview(sample, resolution=512, nviews=30, on_device=False):
+    """
+    on_device: return the observations as one uint8 tensor [V, H, W, 3] and the
+        cameras as stacked tensors [V, 4, 4] / [V, 3, 3], all on the render device
+    """
     r = 2
     fov = 40
     cams = [sphere_hammersley_sequence(i, nviews) for i in range(nviews)]
@@ -187,6 +230,14 @@ def render_multiview(sample, resolution=512, nviews=30):
     extrinsics, intrinsics = yaw_pitch_r_fov_to_extrinsics_intrinsics(
         yaws, pitchs, r, fov
     )
+    if on_device:
+        colors = render_frames_on_device(
+            sample,
+            extrinsics,
+            intrinsics,
+            {"resolution": resolution, "bg_color": (0, 0, 0)},
+        )
+        return colors, torch.stack(extrinsics), torch.stack(intrinsics)
     res = render_frames(
         sample,
         extrinsics,
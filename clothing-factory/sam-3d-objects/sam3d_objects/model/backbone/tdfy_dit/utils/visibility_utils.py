@@ -0,0 +1,140 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Rasterizer-independent core of the face visibility test of `_fill_holes`: camera
+placement, per-face visibility counts over batches of views, and the per-component
+visibility thresholds. Only depends on torch, so it can be driven by any rasterizer.
+"""
+from typing import *
+import torch
+from tqdm import tqdm
+
+from .random_utils import sphere_hammersley_sequence, radical_inverse
+
+
+def sphere_view_origins(num_views: int, radius: float, device) -> torch.Tensor:
+    """
+    Camera positions [N, 3] on a Hammersley sphere of cameras looking at the origin.
+    The cameras are reordered by the base-3 radical inverse of their index, so every
+    prefix of the returned cameras is spread over the whole sphere (the Hammersley
+    pitch is index / N, so the plain order sweeps the sphere from pole to pole).
+    """
+    order = sorted(range(num_views), key=lambda i: radical_inverse(3, i))
+    cams = torch.tensor(
+        [sphere_hammersley_sequence(i, num_views) for i in order],
+        dtype=torch.float32,
+        device=device,
+    )
+    yaws, pitchs = cams[:, 0], cams[:, 1]
+    return torch.stack(
+        [
+            torch.sin(yaws) * torch.cos(pitchs),
+            torch.cos(yaws) * torch.cos(pitchs),
+            torch.sin(pitchs),
+        ],
+        dim=-1,
+    ) * radius
+
+
+@torch.no_grad()
+def accumulate_visibility(
+    rasterize_fn: Callable[[torch.Tensor], Tuple[torch.Tensor, torch.Tensor]],
+    views: torch.Tensor,
+    num_faces: int,
+    batch_size: int = 8,
+    min_views: int = 100,
+    convergence_tol: float = 0.0,
+    verbose: bool = False,
+) -> Tuple[torch.Tensor, int]:
+    """
+    Count for each face the number of views in which it is visible.
+
+    Args:
+        rasterize_fn: Rasterizes a batch of views [B, 4, 4] and returns the 1-based face id
+            buffer [B, H, W] (0 for background) and the coverage mask [B, H, W].
+        views (torch.Tensor): View matrices. Shape (N, 4, 4).
+        num_faces (int): Number of faces of the mesh.
+        batch_size (int): Number of views rasterized together.
+        min_views (int): Number of views rendered before checking for convergence.
+        convergence_tol (float): Stop once a batch of views reveals at most this fraction
+            of the faces for the first time. 0 renders all views.
+
+    Returns:
+        visibility (torch.Tensor): Number of views each face is visible in. Shape (F,).
+        num_rendered (int): Number of views rendered.
+    """
+    visibility = torch.zeros(num_faces, dtype=torch.int32, device=views.device)
+    num_seen = 0
+    num_rendered = 0
+    pbar = tqdm(total=views.shape[0], disable=not verbose, desc="Rasterizing")
+    for start in range(0, views.shape[0], batch_size):
+        view_batch = views[start : start + batch_size]
+        face_id, mask = rasterize_fn(view_batch)
+        face_id = face_id.long()
+        valid = (mask > 0.95) & (face_id > 0)
+        view_idx = torch.arange(view_batch.shape[0], device=views.device)
+        view_idx = view_idx.view(-1, 1, 1).expand_as(face_id)[valid]
+        # a face counts once per view however many pixels it covers
+        seen = torch.zeros(
+            (view_batch.shape[0], num_faces), dtype=torch.bool, device=views.device
+        )
+        seen[view_idx, face_id[valid] - 1] = True
+        visibility += seen.sum(dim=0, dtype=torch.int32)
+        num_rendered += view_batch.shape[0]
+        pbar.update(view_batch.shape[0])
+
+        if convergence_tol > 0:
+            new_num_seen = int((visibility > 0).sum())
+            newly_seen = new_num_seen - num_seen
+            num_seen = new_num_seen
+            if num_rendered >= min_views and newly_seen <= convergence_tol * num_faces:
+                break
+    pbar.close()
+    if verbose and num_rendered < views.shape[0]:
+        tqdm.write(f"Visibility converged after {num_rendered}/{views.shape[0]} views")
+    return visibility, num_rendered
+
+
+def segmented_quantile(
+    values: torch.Tensor, labels: torch.Tensor, num_segments: int, q: float
+) -> torch.Tensor:
+    """
+    Per-segment quantile with linear interpolation (same as torch.quantile on each segment).
+    Segments without values get NaN.
+    """
+    order = torch.argsort(values)
+    order = order[torch.argsort(labels[order], stable=True)]
+    sorted_values = values[order]
+    counts = torch.bincount(labels, minlength=num_segments)
+    offsets = torch.cumsum(counts, dim=0) - counts
+    pos = q * (counts - 1).clamp(min=0).to(values.dtype)
+    lo = pos.floor().long()
+    hi = pos.ceil().long()
+    last = max(sorted_values.shape[0] - 1, 0)
+    v_lo = sorted_values[(offsets + lo).clamp(max=last)]
+    v_hi = sorted_values[(offsets + hi).clamp(max=last)]
+    result = v_lo + (v_hi - v_lo) * (pos - lo.to(values.dtype))
+    return torch.where(counts > 0, result, torch.full_like(result, float("nan")))
+
+
+def outer_face_mask(
+    visibility: torch.Tensor,
+    component_faces: torch.Tensor,
+    component_labels: torch.Tensor,
+    num_components: int,
+) -> torch.Tensor:
+    """
+    Faces more visible than the 75% visibility quantile of their connected component,
+    clamped to [0.25, 0.5]: the outer side of each component.
+
+    Args:
+        visibility (torch.Tensor): Fraction of views each face is visible in. Shape (F,).
+        component_faces (torch.Tensor): Face indices of all components, concatenated.
+        component_labels (torch.Tensor): Component index of each entry of component_faces.
+        num_components (int): Number of connected components.
+    """
+    component_thresh = segmented_quantile(
+        visibility[component_faces], component_labels, num_components, 0.75
+    ).clamp(0.25, 0.5)
+    mask = torch.zeros(visibility.shape[0], dtype=torch.bool, device=visibility.device)
+    mask[component_faces] = visibility[component_faces] > component_thresh[component_labels]
+    return mask
@@ -0,0 +1,283 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Face visibility of `_fill_holes` on CPU: a z-buffer software rasterizer stands in
+for the utils3d CUDA rasterizer, and the batched counts, the early stop and the
+per-component thresholds are checked against the per-view / per-component loops
+they replaced, plus a benchmark:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/backbone/tdfy_dit/utils/visibility_utils_test.py
+"""
+import functools
+import math
+
+import pytest
+import torch
+import trimesh
+
+from sam3d_objects.model.backbone.tdfy_dit.utils.random_utils import sphere_hammersley_sequence
+from sam3d_objects.model.backbone.tdfy_dit.utils.visibility_utils import (
+    accumulate_visibility,
+    outer_face_mask,
+    segmented_quantile,
+    sphere_view_origins,
+)
+from sam3d_objects.utils.benchmark import best_time
+
+# camera settings of _fill_holes
+RADIUS = 2.0
+FOV = math.radians(40)
+NEAR, FAR = 1.0, 3.0
+NUM_VIEWS = 96
+
+
+def look_at(origins):
+    """OpenGL view matrices [N, 4, 4] looking at the origin, z up"""
+    forward = -origins / origins.norm(dim=-1, keepdim=True)
+    up = torch.tensor([0.0, 0.0, 1.0]).expand_as(forward)
+    right = torch.cross(forward, up, dim=-1)
+    # cameras right above a pole
+    right = torch.where(
+        right.norm(dim=-1, keepdim=True) < 1e-6, torch.tensor([1.0, 0.0, 0.0]), right
+    )
+    right = right / right.norm(dim=-1, keepdim=True)
+    up = torch.cross(right, forward, dim=-1)
+    rotation = torch.stack([right, up, -forward], dim=1)
+    views = torch.eye(4).repeat(origins.shape[0], 1, 1)
+    views[:, :3, :3] = rotation
+    views[:, :3, 3] = -(rotation @ origins[..., None])[..., 0]
+    return views
+
+
+def perspective(fov, near, far):
+    f = 1 / math.tan(fov / 2)
+    return torch.tensor(
+        [
+            [f, 0, 0, 0],
+            [0, f, 0, 0],
+            [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+            [0, 0, -1, 0],
+        ]
+    )
+
+
+class SoftwareRasterizer:
+    """
+    Stand-in for utils3d.torch.rasterize_triangle_faces: per-pixel z-buffer over all
+    faces, returning the 1-based face id (0 for background) and the coverage mask.
+    The buffers of each view are kept, so the tests rasterize every view only once.
+    """
+
+    def __init__(self, verts, faces, resolution):
+        self.verts = torch.cat([verts, torch.ones_like(verts[:, :1])], dim=-1)
+        self.faces = faces.long()
+        self.projection = perspective(FOV, NEAR, FAR)
+        ticks = (torch.arange(resolution) + 0.5) / resolution * 2 - 1
+        ys, xs = torch.meshgrid(ticks, ticks, indexing="ij")
+        self.pixels = torch.stack([xs.reshape(-1), ys.reshape(-1)], dim=-1)
+        self.resolution = resolution
+        self.calls = 0
+        self._buffers = {}
+
+    def _rasterize(self, view):
+        clip = self.verts @ (self.projection @ view).T
+        ndc = clip[:, :3] / clip[:, 3:]
+        tri = ndc[self.faces]  # [F, 3, 3]
+        a, b, c = tri[:, 0, :2], tri[:, 1, :2], tri[:, 2, :2]
+        area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+        p = self.pixels[:, None]  # [P, 1, 2]
+
+        def edge(u, v):
+            return (v[:, 0] - u[:, 0]) * (p[..., 1] - u[:, 1]) - (v[:, 1] - u[:, 1]) * (p[..., 0] - u[:, 0])
+
+        w0, w1, w2 = edge(b, c) / area, edge(c, a) / area, edge(a, b) / area
+        inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & (area.abs() > 1e-12)
+        depth = w0 * tri[:, 0, 2] + w1 * tri[:, 1, 2] + w2 * tri[:, 2, 2]
+        depth = torch.where(inside & (depth.abs() <= 1), depth, torch.full_like(depth, float("inf")))
+        nearest, face = depth.min(dim=1)
+        covered = torch.isfinite(nearest)
+        face_id = torch.where(covered, face + 1, torch.zeros_like(face))
+        shape = (self.resolution, self.resolution)
+        return face_id.view(shape), covered.float().view(shape)
+
+    def _cached(self, view):
+        key = view.numpy().tobytes()
+        if key not in self._buffers:
+            self._buffers[key] = self._rasterize(view)
+        return self._buffers[key]
+
+    def __call__(self, view_batch):
+        self.calls += 1
+        face_ids, masks = zip(*[self._cached(view) for view in view_batch])
+        return torch.stack(face_ids), torch.stack(masks)
+
+
+def _scene():
+    """
+    A shell with an inner sphere hidden inside it (never visible) and a separate
+    small sphere next to it: three connected components.
+    """
+    parts = [
+        trimesh.creation.icosphere(subdivisions=2, radius=0.4),
+        trimesh.creation.icosphere(subdivisions=1, radius=0.2),
+        trimesh.creation.icosphere(subdivisions=1, radius=0.08).apply_translation([0.0, 0.0, 0.55]),
+    ]
+    mesh = trimesh.util.concatenate(parts)
+    labels = torch.cat([torch.full((len(part.faces),), i) for i, part in enumerate(parts)])
+    verts = torch.tensor(mesh.vertices, dtype=torch.float32)
+    faces = torch.tensor(mesh.faces, dtype=torch.int32)
+    return verts, faces, labels
+
+
+@functools.lru_cache(maxsize=None)
+def _setup():
+    """scene, one rasterizer and the _fill_holes cameras, shared by the tests"""
+    verts, faces, labels = _scene()
+    views = look_at(sphere_view_origins(NUM_VIEWS, RADIUS, "cpu"))
+    return SoftwareRasterizer(verts, faces, 64), views, faces.shape[0], labels
+
+
+def loop_visibility(rasterize_fn, views, num_faces):
+    """Previous implementation: one view at a time, torch.unique of the visible face ids"""
+    visibility = torch.zeros(num_faces, dtype=torch.int32)
+    for view in views:
+        face_id, mask = rasterize_fn(view[None])
+        face_id = face_id[0][mask[0] > 0.95] - 1
+        visibility[torch.unique(face_id).long()] += 1
+    return visibility
+
+
+def loop_outer_faces(visibility, components):
+    """Previous implementation: a torch.quantile per component"""
+    mask = torch.zeros(visibility.shape[0], dtype=torch.bool)
+    for cc in components:
+        thresh = torch.quantile(visibility[cc], 0.75).clamp(0.25, 0.5)
+        mask[cc] = visibility[cc] > thresh
+    return mask
+
+
+def _components(labels):
+    return [torch.nonzero(labels == i).reshape(-1) for i in range(int(labels.max()) + 1)]
+
+
+def test_sphere_view_origins_reorder_the_hammersley_cameras():
+    origins = sphere_view_origins(64, RADIUS, "cpu")
+    torch.testing.assert_close(origins.norm(dim=-1), torch.full((64,), RADIUS))
+    plain = torch.tensor([sphere_hammersley_sequence(i, 64) for i in range(64)])
+    plain = torch.stack(
+        [
+            torch.sin(plain[:, 0]) * torch.cos(plain[:, 1]),
+            torch.cos(plain[:, 0]) * torch.cos(plain[:, 1]),
+            torch.sin(plain[:, 1]),
+        ],
+        dim=-1,
+    ).float() * RADIUS
+    # same cameras, only the order differs
+    assert torch.cdist(origins, plain).min(dim=1).values.max() < 1e-3
+    # a prefix covers both hemispheres, unlike the pole-to-pole plain order
+    assert (origins[:8, 2] > 0).any() and (origins[:8, 2] < 0).any()
+    assert (plain[:8, 2] < 0).all()
+
+
+def test_rasterizer_stand_in_sees_the_shell_only():
+    rasterize_fn, views, _, labels = _setup()
+    face_id, mask = rasterize_fn(views[:2])
+    assert face_id.shape == mask.shape == (2, 64, 64)
+    assert torch.equal(face_id > 0, mask > 0)
+    assert not torch.isin(face_id[face_id > 0] - 1, torch.nonzero(labels == 1)[:, 0]).any()
+
+
+@pytest.mark.parametrize("batch_size", [1, 8, 7])
+def test_batched_visibility_matches_the_per_view_loop(batch_size):
+    rasterize_fn, views, num_faces, labels = _setup()
+    calls = rasterize_fn.calls
+    visibility, num_rendered = accumulate_visibility(
+        rasterize_fn, views, num_faces, batch_size=batch_size
+    )
+    assert num_rendered == NUM_VIEWS
+    assert rasterize_fn.calls - calls == math.ceil(NUM_VIEWS / batch_size)
+    assert torch.equal(visibility, loop_visibility(rasterize_fn, views, num_faces))
+    assert (visibility[labels == 1] == 0).all()
+    assert (visibility[labels != 1] > 0).all()
+
+
+def test_convergence_stops_early_and_keeps_the_hidden_faces():
+    rasterize_fn, views, num_faces, labels = _setup()
+    full, _ = accumulate_visibility(rasterize_fn, views, num_faces)
+    early, num_rendered = accumulate_visibility(
+        rasterize_fn, views, num_faces, min_views=16, convergence_tol=1e-3
+    )
+    assert 16 <= num_rendered < NUM_VIEWS
+    # the faces never seen, which _fill_holes removes, are the same
+    assert torch.equal(early == 0, full == 0)
+    assert torch.equal(early, loop_visibility(rasterize_fn, views[:num_rendered], num_faces))
+
+
+def test_segmented_quantile_matches_torch_quantile():
+    generator = torch.Generator().manual_seed(0)
+    values = torch.rand(500, generator=generator)
+    labels = torch.randint(0, 40, (500,), generator=generator)
+    labels[labels == 7] = 8  # an empty segment
+    result = segmented_quantile(values, labels, 41, 0.75)
+    for i in range(41):
+        if (labels == i).any():
+            torch.testing.assert_close(result[i], torch.quantile(values[labels == i], 0.75))
+        else:
+            assert torch.isnan(result[i])
+
+
+def test_outer_faces_match_the_per_component_loop():
+    rasterize_fn, views, num_faces, labels = _setup()
+    visibility, num_rendered = accumulate_visibility(rasterize_fn, views[:32], num_faces)
+    visibility = visibility.float() / num_rendered
+    components = _components(labels)
+    component_faces = torch.cat(components)
+    component_labels = torch.repeat_interleave(
+        torch.arange(len(components)), torch.tensor([len(cc) for cc in components])
+    )
+    mask = outer_face_mask(visibility, component_faces, component_labels, len(components))
+    assert torch.equal(mask, loop_outer_faces(visibility, components))
+    assert not mask[labels == 1].any() and mask[labels == 0].any()
+
+
+@pytest.mark.benchmark
+def test_benchmark_visibility_and_thresholds():
+    """
+    The stand-in rasterizer replays its buffers here, so the times are those of the
+    visibility bookkeeping; the rasterization saved by the early stop is the number
+    of views it skips.
+    """
+    rasterize_fn, views, num_faces, _ = _setup()
+    rasterize_fn(views)
+
+    loop, loop_s = best_time(lambda: loop_visibility(rasterize_fn, views, num_faces))
+    (batched, _), batched_s = best_time(lambda: accumulate_visibility(rasterize_fn, views, num_faces))
+    (early, num_rendered), early_s = best_time(
+        lambda: accumulate_visibility(
+            rasterize_fn, views, num_faces, min_views=32, convergence_tol=1e-3
+        )
+    )
+    assert torch.equal(loop, batched) and torch.equal(early == 0, loop == 0)
+    print(
+        f"visibility of {num_faces} faces, {NUM_VIEWS} views: per-view loop {loop_s * 1e3:.1f} ms, "
+        f"batched {batched_s * 1e3:.1f} ms, early stop {early_s * 1e3:.1f} ms "
+        f"({num_rendered}/{NUM_VIEWS} views rasterized)"
+    )
+    assert num_rendered < NUM_VIEWS
+
+    # many small components, as in a noisy extracted mesh
+    generator = torch.Generator().manual_seed(0)
+    num_components = 2000
+    component_labels = torch.randint(0, num_components, (200_000,), generator=generator)
+    component_labels = torch.sort(component_labels).values
+    component_faces = torch.arange(component_labels.shape[0])
+    visibility = torch.rand(component_labels.shape[0], generator=generator)
+    components = [component_faces[component_labels == i] for i in range(num_components)]
+    mask, segmented_s = best_time(
+        lambda: outer_face_mask(visibility, component_faces, component_labels, num_components)
+    )
+    reference, loop_s = best_time(lambda: loop_outer_faces(visibility, components))
+    assert torch.equal(mask, reference)
+    print(
+        f"thresholds of {num_components} components: segmented {segmented_s * 1e3:.1f} ms, "
+        f"per-component loop {loop_s * 1e3:.1f} ms"
+    )
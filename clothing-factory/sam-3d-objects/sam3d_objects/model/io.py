@@ -5,12 +5,15 @@ import torch
 from pathlib import Path
 import os
 import re
+import time
+from hydra.utils import instantiate
 from loguru import logger
 from lightning.pytorch.utilities.consolidate_checkpoint import (
     _format_checkpoint,
     _load_distributed_checkpoint,
 )
 from glob import glob
+from safetensors import safe_open
 
 from sam3d_objects.data.utils import get_child, set_child
 
@@ -143,6 +146,59 @@ def load_sharded_checkpoint(path: str, device: Optional[str]):
     return checkpoint
 
 
+def load_checkpoint(checkpoint_path: str, device: Optional[str] = None, mmap: bool = False):
+    if os.path.isfile(checkpoint_path):
+        if mmap:
+            # tensors are paged in from disk when used instead of read upfront
+            try:
+                return torch.load(
+                    checkpoint_path,
+                    map_location=device,
+                    weights_only=False,
+                    mmap=True,
+                )
+            except RuntimeError as e:  # legacy (non zipfile) format
+                logger.warning(f"Cannot mmap {checkpoint_path} ({e}), loading it fully")
+        return torch.load(
+            checkpoint_path,
+            map_location=device,
+            weights_only=False,
+        )
+    elif os.path.isdir(checkpoint_path):  # sharded
+        return load_sharded_checkpoint(checkpoint_path, device=device)
+    else:  # if neither a file nor a directory, path does not exist
+        raise FileNotFoundError(checkpoint_path)
+
+
+def load_safetensors_state_dict(
+    checkpoint_path: str,
+    device: Union[str, torch.device] = "cpu",
+    state_dict_fn: Optional[Callable[[Any], Any]] = None,
+):
+    """
+    Read a safetensors state dict straight onto `device`, reading only the tensors
+    kept by `state_dict_fn` when it just selects / renames keys (the prefix functions
+    of this module), instead of loading the whole file first.
+    """
+    with safe_open(checkpoint_path, framework="pt", device=str(device)) as f:
+        keys = list(f.keys())
+        available = set(keys)
+        names = {key: key for key in keys}
+        if state_dict_fn is not None:
+            # run it on the key names first to find which tensors it keeps
+            try:
+                names = state_dict_fn(names)
+            except Exception:
+                names = None
+        if names is not None and all(
+            isinstance(key, str) and key in available for key in names.values()
+        ):
+            return {name: f.get_tensor(key) for name, key in names.items()}
+        # state_dict_fn transforms the values, apply it to the full state dict
+        state_dict = {key: f.get_tensor(key) for key in keys}
+    return state_dict_fn(state_dict)
+
+
 def load_model_from_checkpoint(
     model: Union[pl.LightningModule, torch.nn.Module],
     checkpoint_path: str,
@@ -154,18 +210,10 @@ def load_model_from_checkpoint(
     remove_name: Union[List[str], None] = None,
     state_dict_key: Union[None, str, Iterable[str]] = "state_dict",
     state_dict_fn: Optional[Callable[[Any], Any]] = None,
+    mmap: bool = False,
 ):
     logger.info(f"Loading checkpoint from {checkpoint_path}")
-    if os.path.isfile(checkpoint_path):
-        checkpoint = torch.load(
-            checkpoint_path,
-            map_location=device,
-            weights_only=False,
-        )
-    elif os.path.isdir(checkpoint_path):  # sharded
-        checkpoint = load_sharded_checkpoint(checkpoint_path, device=device)
-    else:  # if neither a file nor a directory, path does not exist
-        raise FileNotFoundError(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path, device=device, mmap=mmap)
 
     if isinstance(model, pl.LightningModule):
         model.on_load_checkpoint(checkpoint)
@@ -208,3 +256,116 @@ def load_model_from_checkpoint(
         model.eval()
 
     return model
+
+
+def _meta_tensor_attributes(model: torch.nn.Module) -> List[str]:
+    """
+    Names of the plain tensor attributes (neither parameters nor buffers) still on the
+    meta device, e.g. a table computed in `__init__` under meta init.
+    """
+    return [
+        f"{module_name}.{name}" if module_name else name
+        for module_name, module in model.named_modules()
+        for name, value in vars(module).items()
+        if isinstance(value, torch.Tensor) and value.is_meta
+    ]
+
+
+def instantiate_from_state_dict(
+    config: Any,
+    state_dict: Dict[str, torch.Tensor],
+    strict: bool = True,
+    meta_init: bool = False,
+) -> torch.nn.Module:
+    """
+    Instantiate `config` and load `state_dict` into it. With `meta_init`, the model
+    is built on the meta device (no weight init, no allocation) and the checkpoint
+    tensors are assigned to it; this falls back to a regular instantiation when the
+    state dict does not cover every parameter and buffer (e.g. non-persistent
+    buffers computed in `__init__`), parameters are shared, or plain tensor
+    attributes computed in `__init__` are left on the meta device.
+    """
+    if meta_init:
+        with torch.device("meta"):
+            model = instantiate(config)
+        expected = model.state_dict(keep_vars=True)
+        reason = None
+        if len({id(t) for t in expected.values()}) != len(expected):
+            reason = "shared parameters"
+        elif any(name not in expected for name, _ in model.named_buffers()):
+            reason = "non-persistent buffers"
+        elif any(name not in state_dict for name in expected):
+            reason = "missing keys"
+        elif strict and any(name not in expected for name in state_dict):
+            reason = "unexpected keys"
+        if reason is None:
+            # keep the dtypes of the model, as load_state_dict does when copying
+            model.load_state_dict(
+                {name: state_dict[name].to(dtype=t.dtype) for name, t in expected.items()},
+                strict=True,
+                assign=True,
+            )
+            meta_attributes = _meta_tensor_attributes(model)
+            if not meta_attributes:
+                return model
+            reason = f"meta tensor attributes {', '.join(meta_attributes[:3])}"
+            if len(meta_attributes) > 3:
+                reason += f" and {len(meta_attributes) - 3} more"
+        logger.info(
+            f"Meta init not possible for {type(model).__name__} ({reason}), instantiating it"
+        )
+    model = instantiate(config)
+    model.load_state_dict(state_dict, strict=strict)
+    return model
+
+
+def load_model_from_pretrained(
+    config: Any,
+    checkpoint_path: str,
+    state_dict_fn: Optional[Callable[[Any], Any]] = None,
+    state_dict_key: Optional[str] = "state_dict",
+    device: Union[str, torch.device] = "cpu",
+    meta_init: bool = False,
+) -> torch.nn.Module:
+    """
+    Instantiate `config` with the weights of `checkpoint_path` on `device`, frozen and in
+    eval mode. Safetensors are read lazily straight onto `device`, torch checkpoints are
+    memory-mapped; see `instantiate_from_state_dict` for `meta_init`.
+    """
+    start = time.perf_counter()
+    if checkpoint_path.endswith(".safetensors"):
+        # only the tensors kept by state_dict_fn are read, directly on the target device
+        state_dict = load_safetensors_state_dict(
+            checkpoint_path, device=device, state_dict_fn=state_dict_fn
+        )
+        model = instantiate_from_state_dict(
+            config, state_dict, strict=False, meta_init=meta_init
+        )
+        model.eval()
+    elif meta_init:
+        state_dict = load_checkpoint(checkpoint_path, device="cpu", mmap=True)
+        if state_dict_key is not None:
+            state_dict = state_dict[state_dict_key]
+        if state_dict_fn is not None:
+            state_dict = state_dict_fn(state_dict)
+        model = instantiate_from_state_dict(config, state_dict, strict=True, meta_init=True)
+        model.requires_grad_(False)
+        model.eval()
+    else:
+        model = load_model_from_checkpoint(
+            instantiate(config),
+            checkpoint_path,
+            strict=True,
+            device="cpu",
+            freeze=True,
+            eval=True,
+            state_dict_key=state_dict_key,
+            state_dict_fn=state_dict_fn,
+            mmap=True,
+        )
+    model = model.to(device)
+    logger.info(
+        f"Loaded {type(model).__name__} from {os.path.basename(checkpoint_path)} "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+    return model
@@ -0,0 +1,339 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Model startup: meta-device init must give models whose first forward matches a
+regular instantiation, and a per-component benchmark of the time to first
+inference for every checkpoint format and init mode, on tiny CPU configs:
+
+    python -m pytest -s -m benchmark sam3d_objects/model/io_test.py
+"""
+import contextlib
+import statistics
+import time
+
+import pytest
+import torch
+from hydra.utils import instantiate
+from loguru import logger
+from omegaconf import OmegaConf
+from safetensors.torch import save_file
+
+from sam3d_objects.model.io import instantiate_from_state_dict, load_model_from_pretrained
+from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+
+MODULES = "sam3d_objects.model.backbone.tdfy_dit.modules"
+MODELS = "sam3d_objects.model.backbone.tdfy_dit.models"
+RESOLUTION = 8
+# checkpoint suffix and meta init of each load mode
+LOAD_MODES = {
+    "ckpt": (".ckpt", False),
+    "ckpt + meta": (".ckpt", True),
+    "safetensors": (".safetensors", False),
+    "safetensors + meta": (".safetensors", True),
+}
+
+
+class _TensorTable(torch.nn.Module):
+    """A linear layer scaled by a plain tensor attribute created in `__init__`"""
+
+    def __init__(self, channels=4):
+        super().__init__()
+        self.linear = torch.nn.Linear(channels, channels)
+        self.scale = torch.linspace(0.5, 2.0, channels)
+
+    def forward(self, x):
+        return self.linear(x) * self.scale.to(x.device)
+
+
+@contextlib.contextmanager
+def _logged_fallbacks():
+    """Reasons logged when meta init falls back to a regular instantiation"""
+    reasons = []
+    sink = logger.add(
+        lambda message: reasons.append(message.record["message"]),
+        filter=lambda record: record["message"].startswith("Meta init not possible"),
+    )
+    try:
+        yield reasons
+    finally:
+        logger.remove(sink)
+
+
+@pytest.fixture
+def fallbacks():
+    with _logged_fallbacks() as reasons:
+        yield reasons
+
+
+def _randomized(model):
+    # zero-initialized output layers would make every output equal
+    with torch.no_grad():
+        for p in model.parameters():
+            p.add_(torch.randn_like(p) * 0.05)
+    return model.eval()
+
+
+def _instantiate(config, state_dict, meta_init):
+    return instantiate_from_state_dict(
+        OmegaConf.create(config), state_dict, strict=True, meta_init=meta_init
+    ).eval()
+
+
+def test_meta_tensor_attributes_fall_back(fallbacks):
+    config = {"_target_": f"{__name__}._TensorTable"}
+    reference = _randomized(instantiate(OmegaConf.create(config)))
+    model = _instantiate(config, reference.state_dict(), meta_init=True)
+    assert not model.scale.is_meta
+    x = torch.randn(3, 4)
+    with torch.no_grad():
+        torch.testing.assert_close(model(x), reference(x), rtol=0, atol=0)
+    assert fallbacks == [
+        "Meta init not possible for _TensorTable (meta tensor attributes scale), instantiating it"
+    ]
+
+
+@pytest.mark.parametrize(
+    "config, forward",
+    [
+        (
+            {"_target_": f"{MODULES}.transformer.blocks.AbsolutePositionEmbedder", "channels": 48},
+            lambda model, x: model(x),
+        ),
+        (
+            {"_target_": f"{MODULES}.attention.modules.RotaryPositionEmbedder", "hidden_size": 48},
+            lambda model, x: torch.view_as_real(model._get_phases(x.reshape(-1))),
+        ),
+    ],
+    ids=["ape", "rope"],
+)
+def test_meta_init_of_position_embedders(fallbacks, config, forward):
+    """The `freqs` of the position embedders are real tensors under meta init"""
+    reference = _randomized(instantiate(OmegaConf.create(config)))
+    model = _instantiate(config, reference.state_dict(), meta_init=True)
+    positions = torch.rand(5, 3) * 16
+    with torch.no_grad():
+        torch.testing.assert_close(
+            forward(model, positions), forward(reference, positions), rtol=0, atol=0
+        )
+    assert fallbacks == []
+
+
+def _voxels(num_voxels=40, channels=8, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    sites = torch.randperm(RESOLUTION**3, generator=generator)[:num_voxels]
+    xyz = torch.stack(torch.unravel_index(sites, (RESOLUTION,) * 3), dim=1)
+    coords = torch.cat([torch.zeros(num_voxels, 1, dtype=xyz.dtype), xyz], dim=1).int()
+    return coords, torch.randn(num_voxels, channels, generator=generator)
+
+
+def _decoder_network(model):
+    """Decoder forward up to the network output; the representations need CUDA"""
+    coords, feats = _voxels()
+    model.to_representation = lambda h: h
+    return model(sp.SparseTensor(feats, coords)).feats
+
+
+def _slat_generator(model):
+    coords, feats = _voxels()
+    generator = torch.Generator().manual_seed(1)
+    cond = torch.randn(1, 3, 16, generator=generator)
+    return model(feats[None], torch.tensor([500.0]), cond, coords.numpy())
+
+
+def _ss_generator(model):
+    generator = torch.Generator().manual_seed(2)
+    latents = {
+        "shape": torch.randn(1, (RESOLUTION // 2) ** 3, 8, generator=generator),
+        "6drotation": torch.randn(1, 1, 6, generator=generator),
+    }
+    cond = torch.randn(1, 3, 16, generator=generator)
+    outputs = model(latents, torch.tensor([500.0]), cond)
+    return torch.cat([outputs[name].flatten() for name in latents])
+
+
+def _ss_decoder(model):
+    generator = torch.Generator().manual_seed(3)
+    return model(torch.randn(1, (RESOLUTION // 2) ** 3, 8, generator=generator))
+
+
+def _components():
+    """Tiny configs of the generation components, and their first inference"""
+    # the models package imports the decoders built on FlexiCubes
+    pytest.importorskip("kaolin")
+    sparse_transformer = {
+        "resolution": RESOLUTION,
+        "model_channels": 32,
+        "latent_channels": 8,
+        "num_blocks": 2,
+        "num_head_channels": 16,
+        "attn_mode": "full",
+    }
+    return {
+        "ss_generator": (
+            {
+                "_target_": f"{MODELS}.mot_sparse_structure_flow.SparseStructureFlowTdfyWrapper",
+                "in_channels": 8,
+                "model_channels": 32,
+                "cond_channels": 16,
+                "out_channels": 8,
+                "num_blocks": 2,
+                "num_head_channels": 16,
+                "qk_rms_norm": True,
+                "latent_mapping": {
+                    "shape": {
+                        "_target_": f"{MODELS}.mm_latent.Latent",
+                        "in_channels": 8,
+                        "model_channels": 32,
+                        "pos_embedder": {
+                            "_target_": f"{MODELS}.mm_latent.ShapePositionEmbedder",
+                            "model_channels": 32,
+                            "resolution": RESOLUTION,
+                            "patch_size": 2,
+                        },
+                    },
+                    "6drotation": {
+                        "_target_": f"{MODELS}.mm_latent.Latent",
+                        "in_channels": 6,
+                        "model_channels": 32,
+                        "pos_embedder": {
+                            "_target_": f"{MODELS}.mm_latent.LearntPositionEmbedder",
+                            "model_channels": 32,
+                            "token_len": 1,
+                        },
+                    },
+                },
+            },
+            _ss_generator,
+        ),
+        "ss_decoder": (
+            {
+                "_target_": f"{MODELS}.sparse_structure_vae.SparseStructureDecoderTdfyWrapper",
+                "out_channels": 1,
+                "latent_channels": 8,
+                "num_res_blocks": 1,
+                "channels": [16, 8],
+                "reshape_input_to_cube": True,
+            },
+            _ss_decoder,
+        ),
+        "slat_generator": (
+            {
+                "_target_": f"{MODELS}.structured_latent_flow.SLatFlowModelTdfyWrapper",
+                "resolution": RESOLUTION,
+                "in_channels": 8,
+                "model_channels": 32,
+                "cond_channels": 16,
+                "out_channels": 8,
+                "num_blocks": 2,
+                "num_head_channels": 16,
+                "patch_size": 2,
+                "io_block_channels": [16],
+            },
+            _slat_generator,
+        ),
+        "slat_decoder_gs": (
+            {
+                "_target_": f"{MODELS}.structured_latent_vae.decoder_gs.SLatGaussianDecoder",
+                **sparse_transformer,
+                "representation_config": {
+                    "lr": {"_xyz": 1.0, "_features_dc": 1.0, "_opacity": 1.0, "_scaling": 1.0, "_rotation": 0.1},
+                    "perturb_offset": True,
+                    "voxel_size": 1.5,
+                    "num_gaussians": 4,
+                    "2d_filter_kernel_size": 0.1,
+                    "3d_filter_kernel_size": 9e-4,
+                    "scaling_bias": 4e-3,
+                    "opacity_bias": 0.1,
+                    "scaling_activation": "softplus",
+                },
+            },
+            _decoder_network,
+        ),
+        "slat_decoder_mesh": (
+            {
+                "_target_": f"{MODELS}.structured_latent_vae.decoder_mesh.SLatMeshDecoder",
+                **sparse_transformer,
+                # the upsampling blocks group-normalize model_channels // 8 channels
+                "model_channels": 256,
+                "num_head_channels": 64,
+                "representation_config": {"use_color": True},
+                "device": "cpu",
+            },
+            _decoder_network,
+        ),
+    }
+
+
+def _save_checkpoints(model, path_stem):
+    state_dict = {k: v.contiguous() for k, v in model.state_dict().items()}
+    torch.save({"state_dict": state_dict}, f"{path_stem}.ckpt")
+    save_file(state_dict, f"{path_stem}.safetensors")
+
+
+def time_component_startup(name, config, first_inference, directory, repeats=3):
+    """
+    Time to first inference of a component for each load mode: load time, first forward
+    time, and whether meta init applied. The first forward must match the model the
+    checkpoint was saved from.
+    """
+    config = OmegaConf.create(config)
+    torch.manual_seed(0)
+    reference = _randomized(instantiate(config))
+    _save_checkpoints(reference, directory / name)
+    with torch.no_grad():
+        expected = first_inference(reference)
+
+    rows = []
+    for mode, (suffix, meta_init) in LOAD_MODES.items():
+        load_s, forward_s = [], []
+        with _logged_fallbacks() as fallbacks:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                model = load_model_from_pretrained(
+                    config,
+                    str(directory / f"{name}{suffix}"),
+                    state_dict_key="state_dict" if suffix == ".ckpt" else None,
+                    device="cpu",
+                    meta_init=meta_init,
+                )
+                load_s.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                with torch.no_grad():
+                    output = first_inference(model)
+                forward_s.append(time.perf_counter() - start)
+                torch.testing.assert_close(output, expected, rtol=0, atol=0)
+        rows.append(
+            {
+                "component": name,
+                "mode": mode,
+                "load_ms": statistics.median(load_s) * 1e3,
+                "first_inference_ms": statistics.median(forward_s) * 1e3,
+                "meta_init": meta_init and not fallbacks,
+            }
+        )
+    return rows
+
+
+def format_startup_table(rows):
+    lines = [
+        f"{'component':<18} {'mode':<19} {'load ms':>9} {'1st inference ms':>17} {'meta init':>10}",
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['component']:<18} {row['mode']:<19} {row['load_ms']:>9.1f} "
+            f"{row['first_inference_ms']:>17.1f} {str(row['meta_init']):>10}"
+        )
+    return "\n".join(lines)
+
+
+@pytest.mark.benchmark
+def test_startup_benchmark(tmp_path):
+    components = _components()
+    rows = []
+    for name, (config, first_inference) in components.items():
+        rows.extend(time_component_startup(name, config, first_inference, tmp_path))
+    print()
+    print(format_startup_table(rows))
+
+    # every first forward matched the saved model; no component falls back from meta init
+    assert len(rows) == len(components) * len(LOAD_MODES)
+    assert [row for row in rows if row["mode"].endswith("meta") and not row["meta_init"]] == []
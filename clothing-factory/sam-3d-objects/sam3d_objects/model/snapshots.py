@@ -0,0 +1,53 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Local snapshot registry for third-party weights (DINO hub repo, MoGe, SAM).
+
+Snapshots are resolved under `SAM3D_SNAPSHOT_DIR` (default: `<repo>/checkpoints`):
+
+    snapshots/dinov2/          torch.hub repo of facebookresearch/dinov2 (hubconf.py)
+    snapshots/moge-vitl/       MoGe `from_pretrained` directory (or model.pt)
+    sam/sam_vit_h_4b8939.pth   SAM ViT-H checkpoint
+
+A single snapshot can be pointed elsewhere with `SAM3D_SNAPSHOT_<NAME>`
+(upper case, "-" replaced by "_"). With `SAM3D_OFFLINE=1` a missing snapshot is an
+error instead of a fallback to the network.
+"""
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from loguru import logger
+
+DEFAULT_SNAPSHOTS: Dict[str, str] = {
+    "dinov2": "snapshots/dinov2",
+    "moge-vitl": "snapshots/moge-vitl",
+    "sam_vit_h": "sam/sam_vit_h_4b8939.pth",
+}
+
+
+def snapshot_dir() -> Path:
+    env_dir = os.environ.get("SAM3D_SNAPSHOT_DIR")
+    if env_dir:
+        return Path(env_dir)
+    return Path(__file__).resolve().parents[2] / "checkpoints"
+
+
+def is_offline() -> bool:
+    return os.environ.get("SAM3D_OFFLINE", "0") == "1"
+
+
+def resolve_snapshot(name: str) -> Optional[str]:
+    """
+    Local path of the snapshot `name`, or None if it is not on disk (the caller then
+    falls back to downloading). Raises FileNotFoundError in offline mode.
+    """
+    env_path = os.environ.get(f"SAM3D_SNAPSHOT_{name.upper().replace('-', '_')}")
+    path = Path(env_path) if env_path else snapshot_dir() / DEFAULT_SNAPSHOTS.get(name, name)
+    if path.exists():
+        logger.info(f"Using local snapshot for {name}: {path}")
+        return str(path)
+    if is_offline():
+        raise FileNotFoundError(
+            f"Snapshot '{name}' not found at {path} and SAM3D_OFFLINE=1"
+        )
+    return None
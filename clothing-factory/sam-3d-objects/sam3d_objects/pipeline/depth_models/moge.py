@@ -1,6 +1,16 @@
 # Copyright (c) Meta Platforms, Inc. and affiliates.
+from sam3d_objects.model.snapshots import resolve_snapshot
 from .base import DepthModel
 
+
+def load_moge_model(pretrained_model_name_or_path: str = "Ruicheng/moge-vitl"):
+    """`MoGeModel.from_pretrained`, from the local snapshot when there is one."""
+    from moge.model.v1 import MoGeModel
+
+    local_path = resolve_snapshot(pretrained_model_name_or_path.split("/")[-1])
+    return MoGeModel.from_pretrained(local_path or pretrained_model_name_or_path)
+
+
 class MoGe(DepthModel):
     def __call__(self, image):
         output = self.model.infer(
@@ -8,4 +18,4 @@ class MoGe(DepthModel):
         )
         pointmaps = output["points"]
         output["pointmaps"] = pointmaps
-        return output
\ No newline at end of file
+        return output
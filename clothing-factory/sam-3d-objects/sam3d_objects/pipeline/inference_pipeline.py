@@ -22,7 +22,7 @@ def set_attention_backend():
 
 set_attention_backend()
 
-from typing import List, Union
+from typing import List, Optional, Union
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
 import numpy as np
@@ -41,13 +41,13 @@ from sam3d_objects.pipeline.inference_utils import (
 )
 
 from sam3d_objects.model.io import (
-    load_model_from_checkpoint,
+    load_model_from_pretrained,
     filter_and_remove_prefix_state_dict_fn,
 )
 
 from sam3d_objects.model.backbone.tdfy_dit.modules import sparse as sp
+from sam3d_objects.model.backbone.tdfy_dit.modules.attention import context_kv_cache_scope
 from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
-from safetensors.torch import load_file
 
 
 class InferencePipeline:
@@ -88,6 +88,9 @@ class InferencePipeline:
         slat_rescale_t=3,
         slat_cfg_strength=5,
         slat_cfg_interval=[0, 500],
+        cfg_batch_branches=True,  # one backbone forward per step for all cfg branches; disable on memory-constrained GPUs
+        cache_context_kv=False,  # project cross-attention K/V of the condition once per generation (one K/V per block kept in memory)
+        meta_init=False,  # build models on the meta device and assign checkpoint tensors instead of initializing weights
         rendering_engine: str = "nvdiffrast",  # nvdiffrast OR pytorch3d,
         shape_model_dtype=None,
         compile_model=False,
@@ -117,6 +120,9 @@ class InferencePipeline:
             self.slat_rescale_t = slat_rescale_t
             self.slat_cfg_strength = slat_cfg_strength
             self.slat_cfg_interval = slat_cfg_interval
+            self.cfg_batch_branches = cfg_batch_branches
+            self.cache_context_kv = cache_context_kv
+            self.meta_init = meta_init
 
             self.dtype = self._get_dtype(dtype)
             if shape_model_dtype is None:
@@ -175,6 +181,7 @@ class InferencePipeline:
                 rescale_t=ss_rescale_t,
                 cfg_interval=ss_cfg_interval,
                 cfg_strength_pm=ss_cfg_strength_pm,
+                cfg_batch_branches=cfg_batch_branches,
             )
             self.override_slat_generator_cfg_config(
                 slat_generator,
@@ -182,6 +189,7 @@ class InferencePipeline:
                 inference_steps=slat_inference_steps,
                 rescale_t=slat_rescale_t,
                 cfg_interval=slat_cfg_interval,
+                cfg_batch_branches=cfg_batch_branches,
             )
 
             self.models = torch.nn.ModuleDict(
@@ -268,28 +276,14 @@ class InferencePipeline:
         state_dict_key="state_dict",
         device="cuda", 
     ):
-        model = instantiate(config)
-
-        if ckpt_path.endswith(".safetensors"):
-            state_dict = load_file(ckpt_path, device="cuda")
-            if state_dict_fn is not None:
-                state_dict = state_dict_fn(state_dict)
-            model.load_state_dict(state_dict, strict=False)
-            model.eval()
-        else:
-            model = load_model_from_checkpoint(
-                model,
-                ckpt_path,
-                strict=True,
-                device="cpu",
-                freeze=True,
-                eval=True,
-                state_dict_key=state_dict_key,
-                state_dict_fn=state_dict_fn,
-            )
-        model = model.to(device)
-
-        return model
+        return load_model_from_pretrained(
+            config,
+            ckpt_path,
+            state_dict_fn=state_dict_fn,
+            state_dict_key=state_dict_key,
+            device=device,
+            meta_init=self.meta_init,
+        )
 
     def init_pose_decoder(self, ss_generator_config_path, pose_decoder_name):
         if pose_decoder_name is None:
@@ -425,6 +419,7 @@ class InferencePipeline:
         rescale_t=3,
         cfg_interval=[0, 500],
         cfg_strength_pm=0.0,
+        cfg_batch_branches=True,
     ):
         # override generator setting
         ss_generator.inference_steps = inference_steps
@@ -434,14 +429,16 @@ class InferencePipeline:
         ss_generator.reverse_fn.backbone.condition_embedder.normalize_images = True
         ss_generator.reverse_fn.unconditional_handling = "add_flag"
         ss_generator.reverse_fn.strength_pm = cfg_strength_pm
+        ss_generator.reverse_fn.batch_branches = cfg_batch_branches
 
         logger.info(
-            "ss_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, cfg_strength_pm={}",
+            "ss_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, cfg_strength_pm={}, cfg_batch_branches={}",
             inference_steps,
             cfg_strength,
             cfg_interval,
             rescale_t,
             cfg_strength_pm,
+            cfg_batch_branches,
         )
 
     def override_slat_generator_cfg_config(
@@ -451,18 +448,21 @@ class InferencePipeline:
         inference_steps=25,
         rescale_t=3,
         cfg_interval=[0, 500],
+        cfg_batch_branches=True,
     ):
         slat_generator.inference_steps = inference_steps
         slat_generator.reverse_fn.strength = cfg_strength
         slat_generator.reverse_fn.interval = cfg_interval
         slat_generator.rescale_t = rescale_t
+        slat_generator.reverse_fn.batch_branches = cfg_batch_branches
 
         logger.info(
-            "slat_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}",
+            "slat_generator parameters: inference_steps={}, cfg_strength={}, cfg_interval={}, rescale_t={}, cfg_batch_branches={}",
             inference_steps,
             cfg_strength,
             cfg_interval,
             rescale_t,
+            cfg_batch_branches,
         )
 
 
@@ -480,6 +480,9 @@ class InferencePipeline:
         use_stage1_distillation=False,
         use_stage2_distillation=False,
         decode_formats=None,
+        export_profile: Optional[postprocessing_utils.GLBExportProfile] = None,
+        export_glb=True,
+        preview_callback=None,
     ) -> dict:
         """
         Parameters:
@@ -488,6 +491,10 @@ class InferencePipeline:
         - stage1_only (bool, optional): If True, only the sparse structure is sampled and returned. Default is False.
         - with_mesh_postprocess (bool, optional): If True, performs mesh post-processing. Default is True.
         - with_texture_baking (bool, optional): If True, applies texture baking to the 3D model. Default is True.
+        - export_profile (GLBExportProfile, optional): Settings for the GLB export. Default is GLBExportProfile().
+        - export_glb (bool, optional): If False, only the decoded mesh/gaussian are returned and "glb" is None. Default is True.
+        - preview_callback (callable, optional): Called as preview_callback(stage, **artifacts) with intermediate results:
+          "voxels" (coords) after stage 1 and "mesh" (the decoded MeshExtractResult) before postprocessing and texture baking.
         Returns:
         - dict: A dictionary containing the GLB file and additional data from the sparse structure sampling.
         """
@@ -508,6 +515,7 @@ class InferencePipeline:
             if "scale" in ss_return_dict:
                 logger.info(f"Rescaling scale by {ss_return_dict['downsample_factor']}")
                 ss_return_dict["scale"] = ss_return_dict["scale"] * ss_return_dict["downsample_factor"]
+            self.emit_preview(preview_callback, "voxels", coords=ss_return_dict["coords"])
             if stage1_only:
                 logger.info("Finished!")
                 ss_return_dict["voxel"] = ss_return_dict["coords"][:, 1:] / 64 - 0.5
@@ -523,8 +531,15 @@ class InferencePipeline:
             outputs = self.decode_slat(
                 slat, self.decode_formats if decode_formats is None else decode_formats
             )
+            if "mesh" in outputs:
+                self.emit_preview(preview_callback, "mesh", mesh=outputs["mesh"][0])
             outputs = self.postprocess_slat_output(
-                outputs, with_mesh_postprocess, with_texture_baking, use_vertex_color
+                outputs,
+                with_mesh_postprocess,
+                with_texture_baking,
+                use_vertex_color,
+                export_profile=export_profile,
+                export_glb=export_glb,
             )
             logger.info("Finished!")
 
@@ -533,26 +548,43 @@ class InferencePipeline:
                 **outputs,
             }
 
+    @staticmethod
+    def emit_preview(preview_callback, stage, **artifacts):
+        """Hand an intermediate result to the caller; a failing callback never aborts the run."""
+        if preview_callback is None:
+            return
+        try:
+            preview_callback(stage, **artifacts)
+        except Exception as e:
+            logger.warning(f"Preview callback failed at stage {stage}: {e}")
+
     def postprocess_slat_output(
-        self, outputs, with_mesh_postprocess, with_texture_baking, use_vertex_color
+        self,
+        outputs,
+        with_mesh_postprocess,
+        with_texture_baking,
+        use_vertex_color,
+        export_profile=None,
+        export_glb=True,
     ):
+        if export_profile is None:
+            export_profile = postprocessing_utils.GLBExportProfile()
+
         # GLB files can be extracted from the outputs
         logger.info(
             f"Postprocessing mesh with option with_mesh_postprocess {with_mesh_postprocess}, with_texture_baking {with_texture_baking}..."
         )
-        if "mesh" in outputs:
+        if "mesh" in outputs and export_glb:
             logger.info("Calling to_glb to convert mesh to GLB format...")
             glb = postprocessing_utils.to_glb(
                 outputs["gaussian"][0],
                 outputs["mesh"][0],
-                # Optional parameters
-                simplify=0.95,  # Ratio of triangles to remove in the simplification process
-                texture_size=1024,  # Size of the texture used for the GLB
                 verbose=True,  # 啟用詳細日誌和進度條
                 with_mesh_postprocess=with_mesh_postprocess,
                 with_texture_baking=with_texture_baking,
                 use_vertex_color=use_vertex_color,
                 rendering_engine=self.rendering_engine,
+                **export_profile.to_glb_kwargs(),
             )
             logger.info("to_glb completed successfully!")
 
@@ -687,12 +719,13 @@ class InferencePipeline:
                     ss_input_dict,
                     self.ss_condition_input_mapping,
                 )
-                return_dict = ss_generator(
-                    latent_shape_dict,
-                    image.device,
-                    *condition_args,
-                    **condition_kwargs,
-                )
+                with context_kv_cache_scope(self.cache_context_kv, "ss_generator"):
+                    return_dict = ss_generator(
+                        latent_shape_dict,
+                        image.device,
+                        *condition_args,
+                        **condition_kwargs,
+                    )
                 if not self.is_mm_dit():
                     return_dict = {"shape": return_dict}
 
@@ -759,9 +792,14 @@ class InferencePipeline:
                     self.slat_condition_input_mapping,
                 )
                 condition_args += (coords.cpu().numpy(),)
-                slat = slat_generator(
-                    latent_shape, DEVICE, *condition_args, **condition_kwargs
-                )
+                # window / serialization partitions only depend on coords: compute
+                # each one once for all steps and blocks of this generation
+                with sp.partition_cache_scope("sample_slat"), context_kv_cache_scope(
+                    self.cache_context_kv, "slat_generator"
+                ):
+                    slat = slat_generator(
+                        latent_shape, DEVICE, *condition_args, **condition_kwargs
+                    )
                 slat = sp.SparseTensor(
                     coords=coords,
                     feats=slat[0],
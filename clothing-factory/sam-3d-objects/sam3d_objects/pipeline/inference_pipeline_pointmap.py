@@ -399,6 +399,9 @@ class InferencePipelinePointMap(InferencePipeline):
         pointmap=None,
         decode_formats=None,
         estimate_plane=False,
+        export_profile=None,
+        export_glb=True,
+        preview_callback=None,
     ) -> dict:
         image = self.merge_image_and_mask(image, mask)
         with self.device: 
@@ -437,6 +440,7 @@ class InferencePipelinePointMap(InferencePipeline):
             logger.info(f"Rescaling scale by {ss_return_dict['downsample_factor']} after downsampling")
             ss_return_dict["scale"] = ss_return_dict["scale"] * ss_return_dict["downsample_factor"]
 
+            self.emit_preview(preview_callback, "voxels", coords=ss_return_dict["coords"])
             if stage1_only:
                 logger.info("Finished!")
                 ss_return_dict["voxel"] = ss_return_dict["coords"][:, 1:] / 64 - 0.5
@@ -457,8 +461,15 @@ class InferencePipelinePointMap(InferencePipeline):
             outputs = self.decode_slat(
                 slat, self.decode_formats if decode_formats is None else decode_formats
             )
+            if "mesh" in outputs:
+                self.emit_preview(preview_callback, "mesh", mesh=outputs["mesh"][0])
             outputs = self.postprocess_slat_output(
-                outputs, with_mesh_postprocess, with_texture_baking, use_vertex_color
+                outputs,
+                with_mesh_postprocess,
+                with_texture_baking,
+                use_vertex_color,
+                export_profile=export_profile,
+                export_glb=export_glb,
             )
             glb = outputs.get("glb", None)
             gs_input = outputs.get("gaussian", None)
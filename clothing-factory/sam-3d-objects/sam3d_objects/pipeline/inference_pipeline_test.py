@@ -0,0 +1,109 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+"""
+Regression benchmark for the GLB export of a request: `to_glb` (mesh postprocessing)
+and `bake_texture` must run exactly once per `run`, with the caller's export profile.
+
+The GPU stages (hole filling, multiview rendering, texture optimization) are replaced
+by counting fakes, so only the number of invocations and their arguments are checked.
+"""
+import collections
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+# the pipeline imports the mesh representations, which need kaolin, and its
+# inference utilities, which need pytorch3d
+pytest.importorskip("kaolin")
+pytest.importorskip("pytorch3d")
+
+from sam3d_objects.model.backbone.tdfy_dit.utils import postprocessing_utils
+from sam3d_objects.pipeline.inference_pipeline import InferencePipeline
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = collections.defaultdict(list)
+    to_glb = postprocessing_utils.to_glb
+
+    def counting_to_glb(*args, **kwargs):
+        calls["to_glb"].append(kwargs)
+        return to_glb(*args, **kwargs)
+
+    def fake_postprocess_mesh(vertices, faces, **kwargs):
+        calls["postprocess_mesh"].append(kwargs)
+        return vertices, faces
+
+    def fake_parametrize_mesh(vertices, faces):
+        return vertices, faces, np.zeros((vertices.shape[0], 2), dtype=np.float32)
+
+    def fake_render_multiview(app_rep, resolution, nviews, **kwargs):
+        calls["render_multiview"].append(dict(resolution=resolution, nviews=nviews))
+        observations = torch.zeros((nviews, 8, 8, 3), dtype=torch.uint8)
+        return observations, torch.eye(4).expand(nviews, 4, 4), torch.eye(3).expand(nviews, 3, 3)
+
+    def fake_bake_texture(vertices, faces, uvs, observations, masks, extrinsics, intrinsics, **kwargs):
+        calls["bake_texture"].append(kwargs)
+        size = kwargs["texture_size"]
+        return np.zeros((size, size, 3), dtype=np.uint8)
+
+    monkeypatch.setattr(postprocessing_utils, "to_glb", counting_to_glb)
+    monkeypatch.setattr(postprocessing_utils, "postprocess_mesh", fake_postprocess_mesh)
+    monkeypatch.setattr(postprocessing_utils, "parametrize_mesh", fake_parametrize_mesh)
+    monkeypatch.setattr(postprocessing_utils, "render_multiview", fake_render_multiview)
+    monkeypatch.setattr(postprocessing_utils, "bake_texture", fake_bake_texture)
+    return calls
+
+
+def _decoded_outputs():
+    vertices = torch.rand(4, 3)
+    faces = torch.tensor([[0, 1, 2], [0, 2, 3]], dtype=torch.int32)
+    mesh = SimpleNamespace(vertices=vertices, faces=faces, vertex_attrs=torch.rand(4, 6))
+    return {"mesh": [mesh], "gaussian": [object()]}
+
+
+def _postprocess(outputs, **kwargs):
+    pipeline = SimpleNamespace(rendering_engine="nvdiffrast")
+    return InferencePipeline.postprocess_slat_output(
+        pipeline,
+        outputs,
+        with_mesh_postprocess=True,
+        with_texture_baking=True,
+        use_vertex_color=False,
+        **kwargs,
+    )
+
+
+def test_glb_is_exported_once_per_request(calls):
+    profile = postprocessing_utils.GLBExportProfile(
+        simplify=0.7, texture_size=2048, bake_num_views=16
+    )
+    outputs = _postprocess(_decoded_outputs(), export_profile=profile)
+
+    counts = {name: len(c) for name, c in calls.items()}
+    print(f"invocations per request: {counts}")
+    assert counts == {
+        "to_glb": 1,
+        "postprocess_mesh": 1,
+        "render_multiview": 1,
+        "bake_texture": 1,
+    }
+    # the caller's profile reaches the single export
+    assert calls["postprocess_mesh"][0]["simplify_ratio"] == 0.7
+    assert calls["render_multiview"][0]["nviews"] == 16
+    assert calls["bake_texture"][0]["texture_size"] == 2048
+    assert outputs["glb"] is not None
+
+
+def test_default_profile_matches_previous_export(calls):
+    _postprocess(_decoded_outputs())
+    assert len(calls["to_glb"]) == 1
+    assert calls["postprocess_mesh"][0]["simplify_ratio"] == 0.95
+    assert calls["bake_texture"][0]["texture_size"] == 1024
+
+
+def test_export_glb_false_skips_postprocessing(calls):
+    outputs = _postprocess(_decoded_outputs(), export_glb=False)
+    assert outputs["glb"] is None
+    assert not any(calls.values())
@@ -0,0 +1,16 @@
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+import time
+
+
+def best_time(fn, repeats=3):
+    """
+    Call `fn` `repeats` times and return its last result with the best wall-clock
+    time in seconds. Benchmarks print these times and do not assert on them: they
+    depend on the machine and its load.
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
@@ -1,6 +1,6 @@
 import { useRef } from 'react';
 import { useFrame, useLoader } from '@react-three/fiber';
-import { Center } from '@react-three/drei';
+import { Center, useGLTF } from '@react-three/drei';
 import { OBJLoader } from 'three-stdlib';
 import * as THREE from 'three';
 
@@ -8,8 +8,25 @@ interface BodyModelProps {
   url: string;
 }
 
-export function BodyModel({ url }: BodyModelProps) {
+// 生成的人體為 GLB（三角形索引為共用的 MHR 拓樸檔，由 GLTFLoader 依相對路徑載入），預設模型可能仍是 OBJ
+function ObjBody({ url }: BodyModelProps) {
   const obj = useLoader(OBJLoader, url);
+  return <RotatingBody object={obj} />;
+}
+
+function GltfBody({ url }: BodyModelProps) {
+  const { scene } = useGLTF(url);
+  return <RotatingBody object={scene} />;
+}
+
+export function BodyModel({ url }: BodyModelProps) {
+  if (url.toLowerCase().endsWith('.glb')) {
+    return <GltfBody url={url} />;
+  }
+  return <ObjBody url={url} />;
+}
+
+function RotatingBody({ object }: { object: THREE.Object3D }) {
   const meshRef = useRef<THREE.Group>(null!);
 
   useFrame((state) => {
@@ -23,7 +40,7 @@ export function BodyModel({ url }: BodyModelProps) {
     <Center>
       <primitive 
         ref={meshRef} 
-        object={obj} 
+        object={object} 
         scale={1.5} 
         rotation={[Math.PI, Math.PI, 0]} 
       />